@@ -0,0 +1,137 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import collections
+import contextlib
+import time
+
+from neutron_lib.utils import file as file_utils
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+LOG = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """Distribution of durations, in seconds, over fixed buckets."""
+
+    BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+    def __init__(self):
+        # the last bucket counts the values above the highest bound
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        bounds = list(self.BUCKETS) + ['+Inf']
+        return {'count': self.count,
+                'sum': self.sum,
+                'max': self.max,
+                'buckets': [[bound, count]
+                            for bound, count in zip(bounds, self.counts)]}
+
+
+class LoopStats(object):
+    """Per-phase timing of the iterations of an agent loop.
+
+    The time spent in each phase of an iteration is measured with the
+    phase() context manager. A phase can be entered several times per
+    iteration, and phases can be nested: the time spent in an inner phase is
+    not counted in the outer one. When the iteration ends, the time
+    of each phase, the time spent outside of any phase ('other') and the
+    total time are added to histograms. The iterations slower than
+    slow_threshold seconds are logged with their breakdown, and the
+    histograms are written as JSON to stats_file after every iteration.
+    """
+
+    def __init__(self, stats_file=None, slow_threshold=0):
+        self.stats_file = stats_file
+        self.slow_threshold = slow_threshold
+        self.histograms = collections.defaultdict(Histogram)
+        self.iterations = 0
+        self.slow_iterations = 0
+        self.last_iteration = {}
+        self._phases = collections.defaultdict(float)
+        # time spent in the nested phases of each active phase
+        self._nested_elapsed = []
+
+    def start_iteration(self):
+        self._phases.clear()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        self._nested_elapsed.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            self._phases[name] += elapsed - self._nested_elapsed.pop()
+            if self._nested_elapsed:
+                self._nested_elapsed[-1] += elapsed
+
+    def end_iteration(self, iter_num, elapsed):
+        """Records the phases of the iteration which took elapsed seconds.
+
+        :returns: the time spent in each phase of the iteration.
+        """
+        phases = dict(self._phases)
+        phases['other'] = max(0.0, elapsed - sum(phases.values()))
+        for name, phase_elapsed in phases.items():
+            self.histograms[name].observe(phase_elapsed)
+        self.histograms['total'].observe(elapsed)
+        self.iterations += 1
+        self.last_iteration = {'iter_num': iter_num,
+                               'elapsed': elapsed,
+                               'phases': phases}
+        if self.slow_threshold and elapsed > self.slow_threshold:
+            self.slow_iterations += 1
+            LOG.warning("Loop iteration %(iter_num)d took %(elapsed).3f "
+                        "seconds, more than %(threshold)s seconds. Time "
+                        "spent per phase: %(phases)s",
+                        {'iter_num': iter_num, 'elapsed': elapsed,
+                         'threshold': self.slow_threshold,
+                         'phases': self._format_phases(phases)})
+        if self.stats_file:
+            self.write_stats_file()
+        self._phases.clear()
+        return phases
+
+    @staticmethod
+    def _format_phases(phases):
+        return ', '.join('%s=%.3f' % (name, elapsed) for name, elapsed in
+                         sorted(phases.items(), key=lambda p: -p[1]))
+
+    def to_dict(self):
+        return {'iterations': self.iterations,
+                'slow_iterations': self.slow_iterations,
+                'last_iteration': self.last_iteration,
+                'histograms': {name: histogram.to_dict() for name, histogram
+                               in self.histograms.items()}}
+
+    def write_stats_file(self):
+        try:
+            file_utils.replace_file(self.stats_file,
+                                    jsonutils.dumps(self.to_dict()))
+        except (IOError, OSError):
+            LOG.exception("Failed to write loop statistics to %s, they "
+                          "won't be written anymore", self.stats_file)
+            self.stats_file = None
@@ -323,6 +323,14 @@ class OVSBridge(BaseOVS):
     def delete_port(self, port_name):
         self.ovsdb.del_port(port_name, self.br_name).execute()
 
+    def delete_ports_by_name(self, port_names):
+        """Delete several ports in a single OVSDB transaction."""
+        if not port_names:
+            return
+        with self.ovsdb.transaction() as txn:
+            for port_name in port_names:
+                txn.add(self.ovsdb.del_port(port_name, self.br_name))
+
     def run_ofctl(self, cmd, args, process_input=None):
         full_args = ["ovs-ofctl", cmd,
                      "-O", self._highest_protocol_needed,
@@ -489,6 +497,49 @@ class OVSBridge(BaseOVS):
                         dont_fragment=True,
                         tunnel_csum=False,
                         tos=None):
+        attrs = self._get_tunnel_port_attrs(
+            remote_ip, local_ip, tunnel_type, vxlan_udp_port, dont_fragment,
+            tunnel_csum, tos)
+        return self.add_port(port_name, *attrs)
+
+    def add_tunnel_ports(self, tunnels, local_ip,
+                         tunnel_type=p_const.TYPE_GRE,
+                         vxlan_udp_port=p_const.VXLAN_UDP_PORT,
+                         dont_fragment=True,
+                         tunnel_csum=False,
+                         tos=None):
+        """Add several tunnel ports in a single OVSDB transaction.
+
+        :param tunnels: dict of the remote IP of each tunnel port name.
+        :returns: dict of the ofport of each tunnel port name, INVALID_OFPORT
+                  for the ports whose ofport could not be retrieved.
+        """
+        if not tunnels:
+            return {}
+        with self.ovsdb.transaction() as txn:
+            for port_name, remote_ip in tunnels.items():
+                attrs = self._get_tunnel_port_attrs(
+                    remote_ip, local_ip, tunnel_type, vxlan_udp_port,
+                    dont_fragment, tunnel_csum, tos)
+                txn.add(self.ovsdb.add_port(self.br_name, port_name))
+                txn.add(self.ovsdb.db_set('Interface', port_name, *attrs))
+        port_names = list(tunnels)
+        ofports = {}
+        for row in self.get_ports_attributes(
+                'Interface', columns=['name', 'ofport'], ports=port_names,
+                if_exists=True):
+            if not _ovsdb_result_pending(row['ofport']):
+                ofports[row['name']] = row['ofport']
+        # OVS may not have assigned the ofports of the new ports yet
+        for port_name in port_names:
+            if port_name not in ofports:
+                ofports[port_name] = self.get_port_ofport(port_name)
+        return ofports
+
+    @staticmethod
+    def _get_tunnel_port_attrs(remote_ip, local_ip, tunnel_type,
+                               vxlan_udp_port, dont_fragment, tunnel_csum,
+                               tos):
         attrs = [('type', tunnel_type)]
         # TODO(twilson) This is an OrderedDict solely to make a test happy
         options = collections.OrderedDict()
@@ -509,8 +560,7 @@ class OVSBridge(BaseOVS):
         if tos:
             options['tos'] = str(tos)
         attrs.append(('options', options))
-
-        return self.add_port(port_name, *attrs)
+        return attrs
 
     def add_patch_port(self, local_name, remote_name):
         attrs = [('type', 'patch'),
@@ -23,3 +23,4 @@ else:
 
 get_polling_manager = polling.get_polling_manager
 InterfacePollingMinimizer = polling.InterfacePollingMinimizer
+PortTrackerPollingMinimizer = polling.PortTrackerPollingMinimizer
@@ -19,7 +19,7 @@ from neutron.agent.l3 import dvr_local_router
 from neutron.agent.l3 import dvr_snat_ns
 from neutron.agent.l3 import router_info as router
 from neutron.agent.linux import ip_lib
-from neutron.agent.linux import iptables_manager
+from neutron.agent.linux import nftables_manager
 from neutron.common import utils as common_utils
 
 LOG = logging.getLogger(__name__)
@@ -164,7 +164,8 @@ class DvrEdgeRouter(dvr_local_router.DvrLocalRouter):
             self._plug_snat_port(port)
         self._external_gateway_added(ex_gw_port, gw_interface_name,
                                      snat_ns.name, preserve_ips=[])
-        self.snat_iptables_manager = iptables_manager.IptablesManager(
+        self.snat_iptables_manager = nftables_manager.get_iptables_manager(
+            self.agent_conf.packet_filter_backend,
             namespace=snat_ns.name,
             use_ipv6=self.use_ipv6)
 
@@ -27,7 +27,7 @@ from neutron.agent.l3 import link_local_allocator as lla
 from neutron.agent.l3 import namespaces
 from neutron.agent.l3 import router_info
 from neutron.agent.linux import ip_lib
-from neutron.agent.linux import iptables_manager
+from neutron.agent.linux import nftables_manager
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron.common import utils as common_utils
@@ -65,7 +65,8 @@ class FipNamespace(namespaces.Namespace):
         self._rule_priorities = frpa.FipRulePriorityAllocator(path,
                                                               FIP_PR_START,
                                                               FIP_PR_END)
-        self._iptables_manager = iptables_manager.IptablesManager(
+        self._iptables_manager = nftables_manager.get_iptables_manager(
+            agent_conf.packet_filter_backend,
             namespace=self.get_name(),
             use_ipv6=self.use_ipv6)
         path = os.path.join(agent_conf.state_path, 'fip-linklocal-networks')
@@ -288,13 +288,14 @@ class DvrLocalRouter(dvr_router_base.DvrRouterBase):
             lib_constants.ROUTER_INTERFACE_OWNERS +
             tuple(common_utils.get_dvr_allowed_address_pair_device_owners()))
 
-        for p in subnet_ports:
-            if p['device_owner'] not in ignored_device_owners:
-                for fixed_ip in p['fixed_ips']:
-                    self._update_arp_entry(fixed_ip['ip_address'],
-                                           p['mac_address'],
-                                           subnet_id,
-                                           'add')
+        with ip_lib.batch_operations(self.ns_name):
+            for p in subnet_ports:
+                if p['device_owner'] not in ignored_device_owners:
+                    for fixed_ip in p['fixed_ips']:
+                        self._update_arp_entry(fixed_ip['ip_address'],
+                                               p['mac_address'],
+                                               subnet_id,
+                                               'add')
         self._process_arp_cache_for_internal_port(subnet_id)
 
     @staticmethod
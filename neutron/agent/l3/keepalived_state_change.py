@@ -54,12 +54,20 @@ class MonitorDaemon(daemon.Daemon):
         self.interface = interface
         self.cidr = cidr
         self.monitor = None
+        self._state = None
         super(MonitorDaemon, self).__init__(pidfile, uuid=router_id,
                                             user=user, group=group)
 
     def run(self, run_as_root=False):
-        self.monitor = ip_monitor.IPMonitor(namespace=self.namespace,
-                                            run_as_root=run_as_root)
+        if run_as_root:
+            self.monitor = ip_monitor.IPMonitor(namespace=self.namespace,
+                                                run_as_root=run_as_root)
+        else:
+            # the netlink socket of the namespace is opened by this process,
+            # no "ip monitor" process is needed
+            self.monitor = ip_monitor.NetlinkIPMonitor(
+                namespace=self.namespace,
+                resync_callback=self.handle_initial_state)
         self.monitor.start()
         # Only drop privileges if the process is currently running as root
         # (The run_as_root variable name here is unfortunate - It means to
@@ -68,12 +76,20 @@ class MonitorDaemon(daemon.Daemon):
         if not run_as_root:
             super(MonitorDaemon, self).run()
         self.handle_initial_state()
-        for iterable in self.monitor:
-            self.parse_and_handle_event(iterable)
+        for event in self.monitor.iter_events():
+            self.handle_event(event)
 
     def parse_and_handle_event(self, iterable):
         try:
             event = ip_monitor.IPMonitorEvent.from_text(iterable)
+        except Exception:
+            LOG.exception('Failed to process or handle event for line %s',
+                          iterable)
+            return
+        self.handle_event(event)
+
+    def handle_event(self, event):
+        try:
             if event.interface == self.interface and event.cidr == self.cidr:
                 new_state = 'master' if event.added else 'backup'
                 self.write_state_change(new_state)
@@ -89,7 +105,7 @@ class MonitorDaemon(daemon.Daemon):
                 self.send_garp(event)
         except Exception:
             LOG.exception('Failed to process or handle event for line %s',
-                          iterable)
+                          event)
 
     def handle_initial_state(self):
         try:
@@ -98,9 +114,12 @@ class MonitorDaemon(daemon.Daemon):
             for address in ip.addr.list():
                 if address.get('cidr') == self.cidr:
                     state = 'master'
-                    self.write_state_change(state)
-                    self.notify_agent(state)
                     break
+            # when called again after events were lost, the state is only
+            # reported if it changed in the meantime
+            if state != (self._state or 'backup'):
+                self.write_state_change(state)
+                self.notify_agent(state)
 
             LOG.debug('Initial status of router %s is %s',
                       self.router_id, state)
@@ -112,6 +131,7 @@ class MonitorDaemon(daemon.Daemon):
         with open(os.path.join(
                 self.conf_dir, 'state'), 'w') as state_file:
             state_file.write(state)
+        self._state = state
         LOG.debug('Wrote router %s state %s', self.router_id, state)
 
     def notify_agent(self, state):
@@ -138,7 +158,10 @@ class MonitorDaemon(daemon.Daemon):
         )
 
     def _kill_monitor(self):
-        if self.monitor:
+        if isinstance(self.monitor, ip_monitor.NetlinkIPMonitor):
+            # the netlink monitor is a socket of this process
+            self.monitor.stop()
+        elif self.monitor:
             # Kill PID instead of calling self.monitor.stop() because the ip
             # monitor is running as root while keepalived-state-change is not
             # (dropped privileges after launching the ip monitor) and will fail
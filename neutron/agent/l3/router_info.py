@@ -22,7 +22,7 @@ from oslo_log import log as logging
 from neutron._i18n import _
 from neutron.agent.l3 import namespaces
 from neutron.agent.linux import ip_lib
-from neutron.agent.linux import iptables_manager
+from neutron.agent.linux import nftables_manager
 from neutron.agent.linux import ra
 from neutron.common import constants as n_const
 from neutron.common import exceptions as n_exc
@@ -70,7 +70,8 @@ class RouterInfo(object):
                                             ADDRESS_SCOPE_MARK_ID_MAX))
         self._address_scope_to_mark_id = {
             DEFAULT_ADDRESS_SCOPE: self.available_mark_ids.pop()}
-        self.iptables_manager = iptables_manager.IptablesManager(
+        self.iptables_manager = nftables_manager.get_iptables_manager(
+            agent_conf.packet_filter_backend,
             use_ipv6=use_ipv6,
             namespace=self.ns_name)
         self.initialize_address_scope_iptables()
@@ -135,17 +135,19 @@ class LinuxInterfaceDriver(object):
 
             remove_ips.add(cidr)
 
-        # Clean up any old addresses.  This must be done first since there
-        # could be a dynamic address being replaced with a static one.
-        for ip_cidr in remove_ips:
-            if clean_connections:
-                device.delete_addr_and_conntrack_state(ip_cidr)
-            else:
-                device.addr.delete(ip_cidr)
-
-        # add any new addresses
-        for ip_cidr in cidrs:
-            device.addr.add(ip_cidr)
+        with ip_lib.batch_operations(namespace):
+            # Clean up any old addresses.  This must be done first since
+            # there could be a dynamic address being replaced with a static
+            # one.
+            for ip_cidr in remove_ips:
+                if clean_connections:
+                    device.delete_addr_and_conntrack_state(ip_cidr)
+                else:
+                    device.addr.delete(ip_cidr)
+
+            # add any new addresses
+            for ip_cidr in cidrs:
+                device.addr.add(ip_cidr)
 
     def init_router_port(self,
                          device_name,
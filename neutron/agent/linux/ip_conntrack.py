@@ -16,18 +16,32 @@ import re
 import eventlet
 import netaddr
 from oslo_concurrency import lockutils
+from oslo_config import cfg
 from oslo_log import log as logging
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import constants as n_const
 from neutron.common import exceptions as n_exc
+from neutron.conf.agent import common as config
+from neutron.privileged.agent.linux import netlink_lib
 
 LOG = logging.getLogger(__name__)
+config.register_iptables_opts(cfg.CONF)
 CONTRACK_MGRS = {}
 MAX_CONNTRACK_ZONES = 65535
 ZONE_START = 4097
 
 WORKERS = 8
+# maximum number of queued updates coalesced in a single batch
+MAX_BATCH_UPDATES = 1000
+
+# protocols of the entries which can be deleted through netlink
+NETLINK_PROTOCOLS = {
+    'tcp': 'tcp', '6': 'tcp',
+    'udp': 'udp', '17': 'udp',
+    'icmp': 'icmp', '1': 'icmp',
+    'icmpv6': 'icmpv6', 'ipv6-icmp': 'icmpv6', '58': 'icmpv6',
+}
 
 
 class IpConntrackUpdate(object):
@@ -72,6 +86,10 @@ class IpConntrackManager(object):
         self.filtered_ports = filtered_ports
         self.unfiltered_ports = unfiltered_ports
         self.zone_per_port = zone_per_port  # zone per port vs per network
+        # netlink_lib can't delete the entries of another namespace
+        self.use_netlink = (cfg.CONF.AGENT.conntrack_netlink_delete and
+                            not namespace)
+        self.max_queue_depth = 0
         self._populate_initial_zone_map()
         self._queue = eventlet.queue.LightQueue()
         self._start_process_queue()
@@ -91,20 +109,42 @@ class IpConntrackManager(object):
             self._process_queue()
 
     def _process_queue(self):
-        update = None
+        updates = []
         try:
             # this will block until an entry gets added to the queue
-            update = self._queue.get()
-            if update.remote_ips:
-                for remote_ip in update.remote_ips:
-                    self._delete_conntrack_state(
-                        update.device_info_list, update.rule, remote_ip)
+            updates.append(self._queue.get())
+            # coalesce the updates queued in the meantime
+            while len(updates) < MAX_BATCH_UPDATES:
+                try:
+                    updates.append(self._queue.get_nowait())
+                except eventlet.queue.Empty:
+                    break
+            self._record_queue_depth(len(updates))
+            if self.use_netlink:
+                self._delete_conntrack_entries(updates)
             else:
-                self._delete_conntrack_state(
-                    update.device_info_list, update.rule)
+                self._execute_conntrack_cmds(
+                    self._get_updates_conntrack_cmds(updates))
         except Exception:
-            LOG.exception("Failed to process ip_conntrack queue entry: %s",
-                          update)
+            LOG.exception("Failed to process ip_conntrack queue entries: %s",
+                          updates)
+
+    def _record_queue_depth(self, batch_size):
+        """Track the number of updates waiting to be processed.
+
+        The depth is the size of the batch taken from the queue plus the
+        updates still queued behind it.
+        """
+        depth = batch_size + self._queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        LOG.debug("Processing %(batch)d conntrack updates, queue depth "
+                  "%(depth)d (max %(max)d)",
+                  {'batch': batch_size, 'depth': depth,
+                   'max': self.max_queue_depth})
+
+    def get_queue_depth(self):
+        """Return the number of updates waiting to be processed."""
+        return self._queue.qsize()
 
     def _process(self, device_info_list, rule, remote_ips=None):
         # queue the update to allow the caller to resume its work
@@ -127,10 +167,8 @@ class IpConntrackManager(object):
         cmd_ns.extend(cmd)
         return cmd_ns
 
-    def _get_conntrack_cmds(self, device_info_list, rule, remote_ip=None):
-        conntrack_cmds = set()
-        cmd = self._generate_conntrack_cmd_by_rule(rule, self.namespace)
-        ethertype = rule.get('ethertype')
+    def _get_device_ips(self, device_info_list, ethertype):
+        """Yield the zone and the fixed IPs of ethertype of the devices."""
         for device_info in device_info_list:
             zone_id = self.get_device_zone(device_info, create=False)
             if not zone_id:
@@ -144,20 +182,56 @@ class IpConntrackManager(object):
                 net = netaddr.IPNetwork(ip)
                 if str(net.version) not in ethertype:
                     continue
-                ip_cmd = [str(net.ip), '-w', zone_id]
-                if remote_ip and str(
-                        netaddr.IPNetwork(remote_ip).version) in ethertype:
-                    if rule.get('direction') == 'ingress':
-                        direction = '-s'
-                    else:
-                        direction = '-d'
-                    ip_cmd.extend([direction, str(remote_ip)])
-                conntrack_cmds.add(tuple(cmd + ip_cmd))
+                yield zone_id, net
+
+    def _get_conntrack_cmds(self, device_info_list, rule, remote_ip=None):
+        conntrack_cmds = set()
+        cmd = self._generate_conntrack_cmd_by_rule(rule, self.namespace)
+        ethertype = rule.get('ethertype')
+        for zone_id, net in self._get_device_ips(device_info_list, ethertype):
+            ip_cmd = [str(net.ip), '-w', zone_id]
+            if remote_ip and str(
+                    netaddr.IPNetwork(remote_ip).version) in ethertype:
+                if rule.get('direction') == 'ingress':
+                    direction = '-s'
+                else:
+                    direction = '-d'
+                ip_cmd.extend([direction, str(remote_ip)])
+            conntrack_cmds.add(tuple(cmd + ip_cmd))
         return conntrack_cmds
 
+    def _get_conntrack_filters(self, device_info_list, rule, protocol,
+                               remote_ip=None):
+        """Return the netlink_lib filters equivalent to the conntrack cmds.
+
+        A filter is a (zone, ipversion, protocol, src_ip, dst_ip) tuple.
+        """
+        conntrack_filters = set()
+        ethertype = rule.get('ethertype')
+        if remote_ip:
+            remote_net = netaddr.IPNetwork(remote_ip)
+            if str(remote_net.version) not in ethertype:
+                remote_ip = None
+            else:
+                remote_ip = str(remote_net.ip)
+        if protocol in ('icmp', 'icmpv6'):
+            # the ICMP rules of IPv6 security groups match ICMPv6
+            protocol = 'icmpv6' if '6' in ethertype else 'icmp'
+        for zone_id, net in self._get_device_ips(device_info_list, ethertype):
+            if rule.get('direction') == 'ingress':
+                src, dst = remote_ip, str(net.ip)
+            else:
+                src, dst = str(net.ip), remote_ip
+            conntrack_filters.add(
+                (int(zone_id), net.version, protocol, src, dst))
+        return conntrack_filters
+
     def _delete_conntrack_state(self, device_info_list, rule, remote_ip=None):
         conntrack_cmds = self._get_conntrack_cmds(device_info_list,
                                                   rule, remote_ip)
+        self._execute_conntrack_cmds(conntrack_cmds)
+
+    def _execute_conntrack_cmds(self, conntrack_cmds):
         for cmd in conntrack_cmds:
             try:
                 self.execute(list(cmd), run_as_root=True,
@@ -166,6 +240,49 @@ class IpConntrackManager(object):
             except RuntimeError:
                 LOG.exception("Failed execute conntrack command %s", cmd)
 
+    def _get_updates_conntrack_cmds(self, updates):
+        """Return the commands of the updates, deduplicated in order."""
+        conntrack_cmds = []
+        seen = set()
+        for update in updates:
+            for remote_ip in update.remote_ips or [None]:
+                cmds = self._get_conntrack_cmds(update.device_info_list,
+                                                update.rule, remote_ip)
+                conntrack_cmds.extend(sorted(cmds - seen))
+                seen |= cmds
+        return conntrack_cmds
+
+    def _delete_conntrack_entries(self, updates):
+        """Delete the conntrack state of the updates in a single batch.
+
+        netlink_lib only parses the entries of the protocols in
+        NETLINK_PROTOCOLS, so the entries of the other rules, including the
+        ones without a protocol which match the entries of any protocol,
+        are deleted with the conntrack command.
+        """
+        conntrack_filters = set()
+        cli_updates = []
+        for update in updates:
+            protocol = NETLINK_PROTOCOLS.get(
+                str(update.rule.get('protocol')).lower())
+            if protocol is None:
+                cli_updates.append(update)
+                continue
+            for remote_ip in update.remote_ips or [None]:
+                conntrack_filters |= self._get_conntrack_filters(
+                    update.device_info_list, update.rule, protocol,
+                    remote_ip)
+
+        if conntrack_filters:
+            deleted = netlink_lib.delete_entries_by_filters(
+                sorted(conntrack_filters, key=str))
+            LOG.debug("Deleted %(deleted)d conntrack entries matching "
+                      "%(filters)d filters",
+                      {'deleted': deleted, 'filters': len(conntrack_filters)})
+        if cli_updates:
+            self._execute_conntrack_cmds(
+                self._get_updates_conntrack_cmds(cli_updates))
+
     def delete_conntrack_state_by_rule(self, device_info_list, rule):
         self._process(device_info_list, rule)
 
@@ -13,9 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import errno
 import os
 import re
+import threading
 import time
 
 import eventlet
@@ -25,6 +27,8 @@ from neutron_lib import exceptions
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
+from pyroute2.netlink import rtnl
+from pyroute2.netlink.rtnl import ifaddrmsg
 from pyroute2.netlink.rtnl import ifinfmsg
 from pyroute2 import NetlinkError
 from pyroute2 import netns
@@ -46,9 +50,28 @@ LOOPBACK_DEVNAME = 'lo'
 GRE_TUNNEL_DEVICE_NAMES = ['gre0', 'gretap0']
 
 SYS_NET_PATH = '/sys/class/net'
-DEFAULT_GW_PATTERN = re.compile(r"via (\S+)")
-METRIC_PATTERN = re.compile(r"metric (\S+)")
-DEVICE_NAME_PATTERN = re.compile(r"(\d+?): (\S+?):.*")
+# ids of the routing tables with a name
+IP_ROUTE_TABLES = {'default': 253, 'main': 254, 'local': 255}
+IP_ROUTE_TABLE_NAMES = {v: k for k, v in IP_ROUTE_TABLES.items()}
+
+# FR_ACT_* actions of the policy routing rule types
+IP_RULE_TYPES = {'unicast': 1, 'nop': 3, 'blackhole': 6, 'unreachable': 7,
+                 'prohibit': 8}
+IP_RULE_TYPE_NAMES = {v: k for k, v in IP_RULE_TYPES.items()}
+
+# address flags accepted as address list filters, and if they must be set
+IP_ADDRESS_FILTERS = {
+    'permanent': (ifaddrmsg.IFA_F_PERMANENT, True),
+    'dynamic': (ifaddrmsg.IFA_F_PERMANENT, False),
+    'secondary': (ifaddrmsg.IFA_F_SECONDARY, True),
+    'primary': (ifaddrmsg.IFA_F_SECONDARY, False),
+    'tentative': (ifaddrmsg.IFA_F_TENTATIVE, True),
+    '-tentative': (ifaddrmsg.IFA_F_TENTATIVE, False),
+    'dadfailed': (ifaddrmsg.IFA_F_DADFAILED, True),
+    '-dadfailed': (ifaddrmsg.IFA_F_DADFAILED, False)}
+
+# batches of privileged operations of the current thread, per namespace
+_batches = threading.local()
 
 
 def remove_interface_suffix(interface):
@@ -62,6 +85,37 @@ def remove_interface_suffix(interface):
     return interface.partition("@")[0]
 
 
+def _get_cidr(address, prefixlen):
+    """Return the cidr of a netlink prefix, printed as by "ip".
+
+    A host prefix is printed as an address, without its length.
+    """
+    net = netaddr.IPNetwork('%s/%s' % (address, prefixlen))
+    if net.size == 1:
+        return str(net.ip)
+    return str(net)
+
+
+def _get_table_id(table):
+    if table is None:
+        return IP_ROUTE_TABLES['main']
+    return IP_ROUTE_TABLES.get(table) or int(table)
+
+
+def _get_scope_name(scope):
+    """Return the name of a scope number, "global" for the universe scope."""
+    if scope == rtnl.rt_scope['universe']:
+        return 'global'
+    return rtnl.rt_scope.get(scope, str(scope))
+
+
+def _get_scope(scope_name):
+    if scope_name == 'global':
+        scope_name = 'universe'
+    scope = rtnl.rt_scope.get(scope_name)
+    return int(scope_name) if scope is None else scope
+
+
 class AddressNotReady(exceptions.NeutronException):
     message = _("Failure waiting for address %(address)s to "
                 "become ready: %(reason)s")
@@ -123,24 +177,7 @@ class IPWrapper(SubProcessBase):
     def device(self, name):
         return IPDevice(name, namespace=self.namespace)
 
-<<<<<<< HEAD
     def get_devices(self, exclude_loopback=True, exclude_gre_devices=True):
-=======
-    def get_devices_info(self, exclude_loopback=True,
-                         exclude_fb_tun_devices=True):
-        devices = get_devices_info(self.namespace)
-
-        retval = []
-        for device in devices:
-            if (exclude_loopback and device['name'] == LOOPBACK_DEVNAME or
-                    exclude_fb_tun_devices and
-                    device['name'] in FB_TUNNEL_DEVICE_NAMES):
-                continue
-            retval.append(device)
-        return retval
-
-    def get_devices(self, exclude_loopback=True, exclude_fb_tun_devices=True):
->>>>>>> e7a2b6d179... Add IPWrapper.get_devices_info using PyRoute2
         retval = []
         if self.namespace:
             # we call out manually because in order to avoid screen scraping
@@ -323,7 +360,8 @@ class IPDevice(SubProcessBase):
             can also be passed.
         """
         self.addr.delete(cidr)
-        self.delete_conntrack_state(cidr)
+        # in a batch, the state is deleted once the address is
+        _run_after_batch(self.namespace, self.delete_conntrack_state, cidr)
 
     def delete_conntrack_state(self, cidr):
         """Delete conntrack state rules
@@ -472,36 +510,73 @@ class IpRuleCommand(IpCommandBase):
 
         return {k: str(v) for k, v in map(canonicalize, settings.items())}
 
-    def _parse_line(self, ip_version, line):
-        # Typical rules from 'ip rule show':
-        # 4030201:  from 1.2.3.4/24 lookup 10203040
-        # 1024:     from all iif qg-c43b1928-48 lookup noscope
-
-        parts = line.split()
-        if not parts:
-            return {}
-
-        # Format of line is: "priority: <key> <value> ... [<type>]"
-        settings = {k: v for k, v in zip(parts[1::2], parts[2::2])}
-        settings['priority'] = parts[0][:-1]
-        if len(parts) % 2 == 0:
-            # When line has an even number of columns, last one is the type.
-            settings['type'] = parts[-1]
+    def _parse_rule(self, ip_version, rule):
+        """Return the settings of a rule of privileged.list_ip_rules as
+        they are printed by "ip rule show".
+        """
+        settings = {'priority': rule['priority'], 'from': 'all'}
+        if rule['src']:
+            settings['from'] = _get_cidr(rule['src'], rule['src_len'])
+        if rule['dst']:
+            settings['to'] = _get_cidr(rule['dst'], rule['dst_len'])
+        if rule['iifname']:
+            settings['iif'] = rule['iifname']
+        if rule['oifname']:
+            settings['oif'] = rule['oifname']
+        if rule['fwmark'] is not None or rule['fwmask'] is not None:
+            fwmask = rule['fwmask']
+            settings['fwmark'] = (rule['fwmark'] or 0,
+                                  0xffffffff if fwmask is None else fwmask)
+        if rule['action'] == IP_RULE_TYPES['unicast']:
+            settings['table'] = IP_ROUTE_TABLE_NAMES.get(rule['table'],
+                                                         rule['table'])
+        else:
+            settings['type'] = IP_RULE_TYPE_NAMES.get(rule['action'],
+                                                      rule['action'])
 
         return self._make_canonical(ip_version, settings)
 
+    @staticmethod
+    def _make_pyroute2_args(settings):
+        """Convert canonical settings to privileged ip rule arguments"""
+        # without a priority, pyroute2 would use 32000 instead of letting the
+        # kernel choose it when adding a rule, or match any when deleting it
+        kwargs = {'priority': None}
+        for key, value in settings.items():
+            if key in ('from', 'to'):
+                net = netaddr.IPNetwork(value)
+                if net.prefixlen:
+                    prefix = 'src' if key == 'from' else 'dst'
+                    kwargs[prefix] = str(net.ip)
+                    kwargs[prefix + '_len'] = net.prefixlen
+            elif key == 'iif':
+                kwargs['iifname'] = value
+            elif key == 'oif':
+                kwargs['oifname'] = value
+            elif key == 'priority':
+                kwargs['priority'] = int(value)
+            elif key == 'table':
+                kwargs['table'] = _get_table_id(value)
+            elif key == 'fwmark':
+                fwmark, fwmask = value.split('/')
+                kwargs['fwmark'] = int(fwmark, 0)
+                kwargs['fwmask'] = int(fwmask, 0)
+            elif key == 'type' and value in IP_RULE_TYPES:
+                kwargs['action'] = IP_RULE_TYPES[value]
+            else:
+                raise InvalidArgument(parameter=key, value=value)
+        if (kwargs.get('action') == IP_RULE_TYPES['unicast'] and
+                'table' not in kwargs):
+            kwargs['table'] = IP_ROUTE_TABLES['main']
+        return kwargs
+
     def list_rules(self, ip_version):
-        lines = self._as_root([ip_version], ['show']).splitlines()
-        return [self._parse_line(ip_version, line) for line in lines]
+        rules = privileged.list_ip_rules(self._parent.namespace, ip_version)
+        return [self._parse_rule(ip_version, rule) for rule in rules]
 
     def _exists(self, ip_version, **kwargs):
         return kwargs in self.list_rules(ip_version)
 
-    def _make__flat_args_tuple(self, *args, **kwargs):
-        for kwargs_item in sorted(kwargs.items(), key=lambda i: i[0]):
-            args += kwargs_item
-        return tuple(args)
-
     def add(self, ip, **kwargs):
         ip_version = common_utils.get_ip_version(ip)
 
@@ -515,8 +590,9 @@ class IpRuleCommand(IpCommandBase):
         canonical_kwargs = self._make_canonical(ip_version, kwargs)
 
         if not self._exists(ip_version, **canonical_kwargs):
-            args_tuple = self._make__flat_args_tuple('add', **canonical_kwargs)
-            self._as_root([ip_version], args_tuple)
+            privileged.add_ip_rule(self._parent.namespace, ip_version,
+                                   **self._make_pyroute2_args(
+                                       canonical_kwargs))
 
     def delete(self, ip, **kwargs):
         ip_version = common_utils.get_ip_version(ip)
@@ -530,8 +606,9 @@ class IpRuleCommand(IpCommandBase):
             kwargs.update({'from': ip})
         canonical_kwargs = self._make_canonical(ip_version, kwargs)
 
-        args_tuple = self._make__flat_args_tuple('del', **canonical_kwargs)
-        self._as_root([ip_version], args_tuple)
+        privileged.delete_ip_rule(self._parent.namespace, ip_version,
+                                  **self._make_pyroute2_args(
+                                      canonical_kwargs))
 
 
 class IpDeviceCommandBase(IpCommandBase):
@@ -544,7 +621,8 @@ class IpLinkCommand(IpDeviceCommandBase):
     COMMAND = 'link'
 
     def set_address(self, mac_address):
-        privileged.set_link_attribute(
+        _run_privileged(
+            self._parent.namespace, 'set_link_attribute',
             self.name, self._parent.namespace, address=mac_address)
 
     def set_allmulticast_on(self):
@@ -561,11 +639,13 @@ class IpLinkCommand(IpDeviceCommandBase):
             raise
 
     def set_up(self):
-        privileged.set_link_attribute(
+        _run_privileged(
+            self._parent.namespace, 'set_link_attribute',
             self.name, self._parent.namespace, state='up')
 
     def set_down(self):
-        privileged.set_link_attribute(
+        _run_privileged(
+            self._parent.namespace, 'set_link_attribute',
             self.name, self._parent.namespace, state='down')
 
     def set_netns(self, namespace):
@@ -579,7 +659,8 @@ class IpLinkCommand(IpDeviceCommandBase):
         self._parent.name = name
 
     def set_alias(self, alias_name):
-        privileged.set_link_attribute(
+        _run_privileged(
+            self._parent.namespace, 'set_link_attribute',
             self.name, self._parent.namespace, ifalias=alias_name)
 
     def delete(self):
@@ -641,53 +722,38 @@ class IpAddrCommand(IpDeviceCommandBase):
         :param scope: address scope, for example, global, link, or host
         :param to: IP address or cidr to match. If cidr then it will match
                    any IP within the specified subnet
-        :param filters: list of any other filters supported by /sbin/ip
+        :param filters: list of address flags filters supported by /sbin/ip,
+                        see IP_ADDRESS_FILTERS
         :param ip_version: 4 or 6
         """
-        options = [ip_version] if ip_version else []
-
-        args = ['show']
-        if name:
-            args += [name]
-        if filters:
-            args += filters
-        if scope:
-            args += ['scope', scope]
-        if to:
-            args += ['to', to]
+        flag_filters = []
+        for address_filter in filters or []:
+            if address_filter not in IP_ADDRESS_FILTERS:
+                raise InvalidArgument(parameter='filters',
+                                      value=address_filter)
+            flag_filters.append(IP_ADDRESS_FILTERS[address_filter])
+        to_net = netaddr.IPNetwork(to) if to else None
 
         retval = []
-
-        for line in self._run(options, tuple(args)).split('\n'):
-            line = line.strip()
-
-            match = DEVICE_NAME_PATTERN.search(line)
-            if match:
-                # Found a match for a device name, but its' addresses will
-                # only appear in following lines, so we may as well continue.
-                device_name = remove_interface_suffix(match.group(2))
+        for address in privileged.get_ip_addresses(
+                self._parent.namespace, ip_version=ip_version, device=name):
+            address_scope = _get_scope_name(address['scope'])
+            flags = address['flags']
+            if scope and address_scope != scope:
                 continue
-            elif not line.startswith('inet'):
+            if to_net and netaddr.IPAddress(address['address']) not in to_net:
                 continue
-
-            parts = line.split(" ")
-            broadcast = None
-            if parts[0] == 'inet6':
-                scope = parts[3]
-            else:
-                if parts[2] == 'brd':
-                    broadcast = parts[3]
-                    scope = parts[5]
-                else:
-                    scope = parts[3]
-
-            retval.append(dict(name=device_name,
-                               cidr=parts[1],
-                               scope=scope,
-                               broadcast=broadcast,
-                               dynamic=('dynamic' == parts[-1]),
-                               tentative=('tentative' in line),
-                               dadfailed=('dadfailed' == parts[-1])))
+            if any(bool(flags & flag) != is_set
+                   for flag, is_set in flag_filters):
+                continue
+            retval.append(dict(
+                name=address['device'],
+                cidr='%s/%s' % (address['address'], address['prefixlen']),
+                scope=address_scope,
+                broadcast=address['broadcast'],
+                dynamic=not (flags & ifaddrmsg.IFA_F_PERMANENT),
+                tentative=bool(flags & ifaddrmsg.IFA_F_TENTATIVE),
+                dadfailed=bool(flags & ifaddrmsg.IFA_F_DADFAILED)))
         return retval
 
     def list(self, scope=None, to=None, filters=None, ip_version=None):
@@ -731,71 +797,138 @@ class IpRouteCommand(IpDeviceCommandBase):
         """Return an instance of IpRouteCommand which works on given table"""
         return IpRouteCommand(self._parent, table)
 
-    def _table_args(self, override=None):
-        if override:
-            return ['table', override]
-        return ['table', self._table] if self._table else []
+    def _table_id(self, override=None):
+        return _get_table_id(override or self._table)
 
-    def _dev_args(self):
-        return ['dev', self.name] if self.name else []
+    def _make_route_args(self, ip_version, cidr, via=None, table=None,
+                         delete=False, **kwargs):
+        """Return the privileged ip route arguments of a route.
+
+        The defaults are the ones of "ip route": a route added without a
+        gateway has the link scope, and the scope of a deleted route isn't
+        matched unless it is given.
+        """
+        net = netaddr.IPNetwork(cidr)
+        route = {'dst_len': net.prefixlen, 'table': self._table_id(table)}
+        if net.prefixlen:
+            route['dst'] = str(net.ip)
+        if via:
+            route['gateway'] = via
+        if not delete:
+            route['proto'] = rtnl.rt_proto['boot']
+        for key, value in kwargs.items():
+            if key == 'scope':
+                route['scope'] = _get_scope(value)
+            elif key == 'metric':
+                route['priority'] = int(value)
+            elif key == 'proto':
+                route['proto'] = rtnl.rt_proto.get(value) or int(value)
+            elif key == 'src':
+                route['prefsrc'] = value
+            else:
+                raise InvalidArgument(parameter=key, value=value)
+        if 'scope' not in route:
+            if delete:
+                route['scope'] = rtnl.rt_scope['nowhere']
+            elif ip_version == constants.IP_VERSION_4 and not via:
+                route['scope'] = rtnl.rt_scope['link']
+        return route
+
+    def _add_route(self, ip_version, cidr, via=None, table=None, **kwargs):
+        try:
+            privileged.add_ip_route(
+                self._parent.namespace, ip_version, device=self.name,
+                **self._make_route_args(ip_version, cidr, via, table,
+                                        **kwargs))
+        except privileged.NetworkInterfaceNotFound:
+            raise exceptions.DeviceNotFoundError(device_name=self.name)
+
+    def _delete_route(self, ip_version, cidr, via=None, table=None,
+                      **kwargs):
+        try:
+            privileged.delete_ip_route(
+                self._parent.namespace, ip_version, device=self.name,
+                **self._make_route_args(ip_version, cidr, via, table,
+                                        delete=True, **kwargs))
+        except privileged.NetworkInterfaceNotFound:
+            raise exceptions.DeviceNotFoundError(device_name=self.name)
 
     def add_gateway(self, gateway, metric=None, table=None):
         ip_version = common_utils.get_ip_version(gateway)
-        args = ['replace', 'default', 'via', gateway]
-        if metric:
-            args += ['metric', metric]
-        args += self._dev_args()
-        args += self._table_args(table)
-        self._as_root([ip_version], tuple(args))
-
-    def _run_as_root_detect_device_not_found(self, options, args):
-        try:
-            return self._as_root(options, tuple(args))
-        except RuntimeError as rte:
-            with excutils.save_and_reraise_exception() as ctx:
-                if "Cannot find device" in str(rte):
-                    ctx.reraise = False
-                    raise exceptions.DeviceNotFoundError(device_name=self.name)
+        kwargs = {'metric': metric} if metric else {}
+        self._add_route(ip_version, constants.IP_ANY[ip_version],
+                        via=gateway, table=table, **kwargs)
 
     def delete_gateway(self, gateway, table=None):
         ip_version = common_utils.get_ip_version(gateway)
-        args = ['del', 'default',
-                'via', gateway]
-        args += self._dev_args()
-        args += self._table_args(table)
-        self._run_as_root_detect_device_not_found([ip_version], args)
-
-    def _parse_routes(self, ip_version, output, **kwargs):
-        for line in output.splitlines():
-            parts = line.split()
-
-            # Format of line is: "<cidr>|default [<key> <value>] ..."
-            route = {k: v for k, v in zip(parts[1::2], parts[2::2])}
-            route['cidr'] = parts[0]
-            # Avoids having to explicitly pass around the IP version
-            if route['cidr'] == 'default':
-                route['cidr'] = constants.IP_ANY[ip_version]
+        self._delete_route(ip_version, constants.IP_ANY[ip_version],
+                           via=gateway, table=table)
 
+    @staticmethod
+    def _parse_route(ip_version, route):
+        """Return a route of privileged.list_ip_routes as it is printed by
+        "ip route list".
+        """
+        if route['dst']:
+            parsed = {'cidr': _get_cidr(route['dst'], route['dst_len'])}
+        else:
+            parsed = {'cidr': constants.IP_ANY[ip_version]}
+        if route['gateway']:
+            parsed['via'] = route['gateway']
+        if route['device']:
+            parsed['dev'] = route['device']
+        if route['proto'] != rtnl.rt_proto['boot']:
+            parsed['proto'] = rtnl.rt_proto.get(route['proto'],
+                                                str(route['proto']))
+        if route['scope'] != rtnl.rt_scope['universe']:
+            parsed['scope'] = _get_scope_name(route['scope'])
+        if route['prefsrc']:
+            parsed['src'] = route['prefsrc']
+        if route['priority']:
+            parsed['metric'] = str(route['priority'])
+        return parsed
+
+    @staticmethod
+    def _route_matches(route, **kwargs):
+        for key, value in kwargs.items():
+            if key == 'scope':
+                matches = route['scope'] == _get_scope(value)
+            elif key == 'via':
+                matches = bool(route['gateway']) and (
+                    netaddr.IPAddress(route['gateway']) ==
+                    netaddr.IPAddress(value))
+            elif key == 'proto':
+                matches = route['proto'] == (rtnl.rt_proto.get(value) or
+                                             int(value))
+            elif key == 'src':
+                matches = route['prefsrc'] == value
+            else:
+                raise InvalidArgument(parameter=key, value=value)
+            if not matches:
+                return False
+        return True
+
+    def list_routes(self, ip_version, **kwargs):
+        filters = dict(kwargs)
+        table = filters.pop('table', None)
+        routes = privileged.list_ip_routes(
+            self._parent.namespace, ip_version, device=self.name,
+            table=self._table_id(table))
+        retval = []
+        for route in routes:
+            if not self._route_matches(route, **filters):
+                continue
+            parsed = self._parse_route(ip_version, route)
             # ip route drops things like scope and dev from the output if it
             # was specified as a filter.  This allows us to add them back.
             if self.name:
-                route['dev'] = self.name
+                parsed['dev'] = self.name
             if self._table:
-                route['table'] = self._table
+                parsed['table'] = self._table
             # Callers add any filters they use as kwargs
-            route.update(kwargs)
-
-            yield route
-
-    def list_routes(self, ip_version, **kwargs):
-        args = ['list']
-        args += self._dev_args()
-        args += self._table_args()
-        for k, v in kwargs.items():
-            args += [k, v]
-
-        output = self._run([ip_version], tuple(args))
-        return [r for r in self._parse_routes(ip_version, output, **kwargs)]
+            parsed.update(kwargs)
+            retval.append(parsed)
+        return retval
 
     def list_onlink_routes(self, ip_version):
         routes = self.list_routes(ip_version, scope='link')
@@ -808,62 +941,47 @@ class IpRouteCommand(IpDeviceCommandBase):
         self.delete_route(cidr, scope='link')
 
     def get_gateway(self, scope=None, filters=None, ip_version=None):
-        options = [ip_version] if ip_version else []
-
-        args = ['list']
-        args += self._dev_args()
-        args += self._table_args()
-        if filters:
-            args += filters
-
-        retval = None
-
+        """Get the default route of the device.
+
+        :param scope: scope of the route, for example, global or link
+        :param filters: list of other route filters supported by /sbin/ip,
+                        as name and value pairs, for example ['proto', 'ra']
+        :param ip_version: 4 (default) or 6
+        :return: None if there is no default route, else a dictionary with
+                 its 'gateway' and 'metric' if they are set
+        """
+        ip_version = ip_version or constants.IP_VERSION_4
+        kwargs = dict(zip(filters[::2], filters[1::2])) if filters else {}
         if scope:
-            args += ['scope', scope]
+            kwargs['scope'] = scope
 
-        route_list_lines = self._run(options, tuple(args)).split('\n')
-        default_route_line = next((x.strip() for x in
-                                   route_list_lines if
-                                   x.strip().startswith('default')), None)
-        if default_route_line:
+        for route in self.list_routes(ip_version, **kwargs):
+            if route['cidr'] != constants.IP_ANY[ip_version]:
+                continue
             retval = dict()
-            gateway = DEFAULT_GW_PATTERN.search(default_route_line)
-            if gateway:
-                retval.update(gateway=gateway.group(1))
-            metric = METRIC_PATTERN.search(default_route_line)
-            if metric:
-                retval.update(metric=int(metric.group(1)))
-
-        return retval
+            if 'via' in route:
+                retval.update(gateway=route['via'])
+            if 'metric' in route:
+                retval.update(metric=int(route['metric']))
+            return retval
+        return None
 
     def flush(self, ip_version, table=None, **kwargs):
-        args = ['flush']
-        args += self._table_args(table)
-        for k, v in kwargs.items():
-            args += [k, v]
-        self._as_root([ip_version], tuple(args))
+        if kwargs:
+            raise InvalidArgument(parameter='kwargs', value=kwargs)
+        # as with "ip route flush", the routes to flush must be selected
+        if not (table or self._table):
+            raise InvalidArgument(parameter='table', value=table)
+        privileged.flush_ip_routes(self._parent.namespace, ip_version,
+                                   table=self._table_id(table))
 
     def add_route(self, cidr, via=None, table=None, **kwargs):
         ip_version = common_utils.get_ip_version(cidr)
-        args = ['replace', cidr]
-        if via:
-            args += ['via', via]
-        args += self._dev_args()
-        args += self._table_args(table)
-        for k, v in kwargs.items():
-            args += [k, v]
-        self._run_as_root_detect_device_not_found([ip_version], args)
+        self._add_route(ip_version, cidr, via, table, **kwargs)
 
     def delete_route(self, cidr, via=None, table=None, **kwargs):
         ip_version = common_utils.get_ip_version(cidr)
-        args = ['del', cidr]
-        if via:
-            args += ['via', via]
-        args += self._dev_args()
-        args += self._table_args(table)
-        for k, v in kwargs.items():
-            args += [k, v]
-        self._run_as_root_detect_device_not_found([ip_version], args)
+        self._delete_route(ip_version, cidr, via, table, **kwargs)
 
 
 class IPRoute(SubProcessBase):
@@ -998,6 +1116,75 @@ NetworkInterfaceNotFound = privileged.NetworkInterfaceNotFound
 IpAddressAlreadyExists = privileged.IpAddressAlreadyExists
 
 
+class _Batch(object):
+    def __init__(self):
+        self.operations = []
+        self.callbacks = []
+
+
+def _get_batch(namespace):
+    return getattr(_batches, 'batches', {}).get(namespace)
+
+
+@contextlib.contextmanager
+def batch_operations(namespace=None):
+    """Run the privileged operations of a namespace in a single call.
+
+    The address, neighbour and link attribute changes of the namespace made
+    in the context are queued and run when it exits, with a single privsep
+    call using one netlink socket. Their failures are raised then, the
+    first one after all the operations ran, so the callers must not depend
+    on the result of an operation within the context. Other privileged
+    calls made in the context are run immediately.
+    """
+    if not hasattr(_batches, 'batches'):
+        _batches.batches = {}
+    if namespace in _batches.batches:
+        # already in a batch of the namespace
+        yield
+        return
+    batch = _batches.batches[namespace] = _Batch()
+    try:
+        yield
+    finally:
+        del _batches.batches[namespace]
+        _run_batch(namespace, batch)
+
+
+def _run_batch(namespace, batch):
+    errors = []
+    if batch.operations:
+        results = privileged.run_batch(namespace, batch.operations)
+        for (name, args, kwargs), error in zip(batch.operations, results):
+            if error:
+                exception = privileged.get_batch_exception(error)
+                LOG.debug("Batched %(name)s%(args)s failed: %(error)s",
+                          {'name': name, 'args': tuple(args),
+                           'error': exception})
+                errors.append(exception)
+    for callback, args in batch.callbacks:
+        callback(*args)
+    if errors:
+        raise errors[0]
+
+
+def _run_privileged(namespace, name, *args, **kwargs):
+    """Call a privileged function, or queue it in the namespace batch."""
+    batch = _get_batch(namespace)
+    if batch is None:
+        return getattr(privileged, name)(*args, **kwargs)
+    batch.operations.append((name, args, kwargs))
+
+
+def _run_after_batch(namespace, callback, *args):
+    """Call callback now, or after the operations of the namespace batch."""
+    batch = _get_batch(namespace)
+    if batch is None:
+        callback(*args)
+    else:
+        batch.callbacks.append((callback, args))
+
+
 def add_ip_address(cidr, device, namespace=None, scope='global',
                    add_broadcast=True):
     """Add an IP address.
@@ -1014,9 +1201,9 @@ def add_ip_address(cidr, device, namespace=None, scope='global',
         # NOTE(slaweq): in case if cidr is /32 net.broadcast is None so
         # same IP address as cidr should be set as broadcast
         broadcast = str(net.broadcast or net.ip)
-    privileged.add_ip_address(
-        net.version, str(net.ip), net.prefixlen,
-        device, namespace, scope, broadcast)
+    _run_privileged(namespace, 'add_ip_address',
+                    net.version, str(net.ip), net.prefixlen,
+                    device, namespace, scope, broadcast)
 
 
 def delete_ip_address(cidr, device, namespace=None):
@@ -1027,8 +1214,8 @@ def delete_ip_address(cidr, device, namespace=None):
     :param namespace: The name of the namespace in which to delete the address
     """
     net = netaddr.IPNetwork(cidr)
-    privileged.delete_ip_address(
-        net.version, str(net.ip), net.prefixlen, device, namespace)
+    _run_privileged(namespace, 'delete_ip_address',
+                    net.version, str(net.ip), net.prefixlen, device, namespace)
 
 
 def flush_ip_addresses(ip_version, device, namespace=None):
@@ -1067,12 +1254,13 @@ def add_neigh_entry(ip_address, mac_address, device, namespace=None, **kwargs):
     :param namespace: The name of the namespace in which to add the entry
     """
     ip_version = common_utils.get_ip_version(ip_address)
-    privileged.add_neigh_entry(ip_version,
-                               ip_address,
-                               mac_address,
-                               device,
-                               namespace,
-                               **kwargs)
+    _run_privileged(namespace, 'add_neigh_entry',
+                    ip_version,
+                    ip_address,
+                    mac_address,
+                    device,
+                    namespace,
+                    **kwargs)
 
 
 def delete_neigh_entry(ip_address, mac_address, device, namespace=None,
@@ -1085,12 +1273,13 @@ def delete_neigh_entry(ip_address, mac_address, device, namespace=None,
     :param namespace: The name of the namespace in which to delete the entry
     """
     ip_version = common_utils.get_ip_version(ip_address)
-    privileged.delete_neigh_entry(ip_version,
-                                  ip_address,
-                                  mac_address,
-                                  device,
-                                  namespace,
-                                  **kwargs)
+    _run_privileged(namespace, 'delete_neigh_entry',
+                    ip_version,
+                    ip_address,
+                    mac_address,
+                    device,
+                    namespace,
+                    **kwargs)
 
 
 def dump_neigh_entries(ip_version, device=None, namespace=None, **kwargs):
@@ -1364,230 +1553,3 @@ def get_ipv6_forwarding(device, namespace=None):
     cmd = ['sysctl', '-b', "net.ipv6.conf.%s.forwarding" % device]
     ip_wrapper = IPWrapper(namespace)
     return int(ip_wrapper.netns.execute(cmd, run_as_root=True))
-<<<<<<< HEAD
-=======
-
-
-def _parse_ip_rule(rule, ip_version):
-    """Parse a pyroute2 rule and returns a dictionary
-
-    Parameters contained in the returned dictionary:
-    - priority: rule priority
-    - from: source IP address
-    - to: (optional) destination IP address
-    - type: rule type (see RULE_TYPES)
-    - table: table name or number (see RULE_TABLES)
-    - fwmark: (optional) FW mark
-    - iif: (optional) input interface name
-    - oif: (optional) output interface name
-
-     :param rule: pyroute2 rule dictionary
-     :param ip_version: IP version (4, 6)
-     :return: dictionary with IP rule information
-    """
-    parsed_rule = {'priority': str(rule['attrs'].get('FRA_PRIORITY', 0))}
-    from_ip = rule['attrs'].get('FRA_SRC')
-    if from_ip:
-        parsed_rule['from'] = common_utils.ip_to_cidr(
-            from_ip, prefix=rule['src_len'])
-        if common_utils.is_cidr_host(parsed_rule['from']):
-            parsed_rule['from'] = common_utils.cidr_to_ip(parsed_rule['from'])
-    else:
-        parsed_rule['from'] = constants.IP_ANY[ip_version]
-    to_ip = rule['attrs'].get('FRA_DST')
-    if to_ip:
-        parsed_rule['to'] = common_utils.ip_to_cidr(
-            to_ip, prefix=rule['dst_len'])
-        if common_utils.is_cidr_host(parsed_rule['to']):
-            parsed_rule['to'] = common_utils.cidr_to_ip(parsed_rule['to'])
-    parsed_rule['type'] = IP_RULE_TYPES[rule['action']]
-    table_num = rule['attrs']['FRA_TABLE']
-    for table_name in (name for (name, index) in
-                       IP_RULE_TABLES.items() if index == table_num):
-        parsed_rule['table'] = table_name
-        break
-    else:
-        parsed_rule['table'] = str(table_num)
-    fwmark = rule['attrs'].get('FRA_FWMARK')
-    if fwmark:
-        fwmask = rule['attrs'].get('FRA_FWMASK')
-        parsed_rule['fwmark'] = '{0:#x}/{1:#x}'.format(fwmark, fwmask)
-    iifname = rule['attrs'].get('FRA_IIFNAME')
-    if iifname:
-        parsed_rule['iif'] = iifname
-    oifname = rule['attrs'].get('FRA_OIFNAME')
-    if oifname:
-        parsed_rule['oif'] = oifname
-
-    return parsed_rule
-
-
-def list_ip_rules(namespace, ip_version):
-    """List all IP rules in a namespace
-
-    :param namespace: namespace name
-    :param ip_version: IP version (4, 6)
-    :return: list of dictionaries with the rules information
-    """
-    rules = privileged.list_ip_rules(namespace, ip_version)
-    return [_parse_ip_rule(rule, ip_version) for rule in rules]
-
-
-def _make_pyroute2_args(ip, iif, table, priority, to):
-    """Returns a dictionary of arguments to be used in pyroute rule commands
-
-    :param ip: (string) source IP or CIDR address (IPv4, IPv6)
-    :param iif: (string) input interface name
-    :param table: (string, int) table number (as an int or a string) or table
-                  name ('default', 'main', 'local')
-    :param priority: (string, int) rule priority
-    :param to: (string) destination IP or CIDR address (IPv4, IPv6)
-    :return: a dictionary with the kwargs needed in pyroute rule commands
-    """
-    ip_version = common_utils.get_ip_version(ip)
-    # In case we need to add a rule based on an incoming interface, no
-    # IP address is given; the rule default source ("from") address is
-    # "all".
-    cmd_args = {'family': common_utils.get_socket_address_family(ip_version)}
-    if iif:
-        cmd_args['iifname'] = iif
-    else:
-        cmd_args['src'] = common_utils.cidr_to_ip(ip)
-        cmd_args['src_len'] = common_utils.cidr_mask(ip)
-    if to:
-        cmd_args['dst'] = common_utils.cidr_to_ip(to)
-        cmd_args['dst_len'] = common_utils.cidr_mask(to)
-    if table:
-        cmd_args['table'] = IP_RULE_TABLES.get(table) or int(table)
-    if priority:
-        cmd_args['priority'] = int(priority)
-    return cmd_args
-
-
-def _exist_ip_rule(rules, ip, iif, table, priority, to):
-    """Check if any rule matches the conditions"""
-    for rule in rules:
-        if iif and rule.get('iif') != iif:
-            continue
-        if not iif and rule['from'] != ip:
-            continue
-        if table and rule.get('table') != str(table):
-            continue
-        if priority and rule['priority'] != str(priority):
-            continue
-        if to and rule.get('to') != to:
-            continue
-        break
-    else:
-        return False
-    return True
-
-
-def add_ip_rule(namespace, ip, iif=None, table=None, priority=None, to=None):
-    """Create an IP rule in a namespace
-
-    :param namespace: (string) namespace name
-    :param ip: (string) source IP or CIDR address (IPv4, IPv6)
-    :param iif: (Optional) (string) input interface name
-    :param table: (Optional) (string, int) table number
-    :param priority: (Optional) (string, int) rule priority
-    :param to: (Optional) (string) destination IP or CIDR address (IPv4, IPv6)
-    """
-    ip_version = common_utils.get_ip_version(ip)
-    rules = list_ip_rules(namespace, ip_version)
-    if _exist_ip_rule(rules, ip, iif, table, priority, to):
-        return
-    cmd_args = _make_pyroute2_args(ip, iif, table, priority, to)
-    privileged.add_ip_rule(namespace, **cmd_args)
-
-
-def delete_ip_rule(namespace, ip, iif=None, table=None, priority=None,
-                   to=None):
-    """Delete an IP rule in a namespace
-
-    :param namespace: (string) namespace name
-    :param ip: (string) source IP or CIDR address (IPv4, IPv6)
-    :param iif: (Optional) (string) input interface name
-    :param table: (Optional) (string, int) table number
-    :param priority: (Optional) (string, int) rule priority
-    :param to: (Optional) (string) destination IP or CIDR address (IPv4, IPv6)
-    """
-    cmd_args = _make_pyroute2_args(ip, iif, table, priority, to)
-    privileged.delete_ip_rule(namespace, **cmd_args)
-
-
-def get_attr(pyroute2_obj, attr_name):
-    """Get an attribute from a PyRoute2 object"""
-    rule_attrs = pyroute2_obj.get('attrs', [])
-    for attr in (attr for attr in rule_attrs if attr[0] == attr_name):
-        return attr[1]
-
-
-def _parse_link_device(namespace, device, **kwargs):
-    """Parse pytoute2 link device information
-
-    For each link device, the IP address information is retrieved and returned
-    in a dictionary.
-    IP address scope: http://linux-ip.net/html/tools-ip-address.html
-    """
-    retval = []
-    name = get_attr(device, 'IFLA_IFNAME')
-    ip_addresses = privileged.get_ip_addresses(namespace,
-                                               index=device['index'],
-                                               **kwargs)
-    for ip_address in ip_addresses:
-        ip = get_attr(ip_address, 'IFA_ADDRESS')
-        ip_length = ip_address['prefixlen']
-        cidr = common_utils.ip_to_cidr(ip, prefix=ip_length)
-        flags = get_attr(ip_address, 'IFA_FLAGS')
-        dynamic = not bool(flags & ifaddrmsg.IFA_F_PERMANENT)
-        tentative = bool(flags & ifaddrmsg.IFA_F_TENTATIVE)
-        dadfailed = bool(flags & ifaddrmsg.IFA_F_DADFAILED)
-        scope = IP_ADDRESS_SCOPE[ip_address['scope']]
-        retval.append({'name': name,
-                       'cidr': cidr,
-                       'scope': scope,
-                       'broadcast': get_attr(ip_address, 'IFA_BROADCAST'),
-                       'dynamic': dynamic,
-                       'tentative': tentative,
-                       'dadfailed': dadfailed})
-    return retval
-
-
-def get_devices_with_ip(namespace, name=None, **kwargs):
-    link_args = {}
-    if name:
-        link_args['ifname'] = name
-    devices = privileged.get_link_devices(namespace, **link_args)
-    retval = []
-    for parsed_ips in (_parse_link_device(namespace, device, **kwargs)
-                       for device in devices):
-        retval += parsed_ips
-    return retval
-
-
-def get_devices_info(namespace, **kwargs):
-    devices = privileged.get_link_devices(namespace, **kwargs)
-    retval = []
-    for device in devices:
-        ret = {'index': device['index'],
-               'name': get_attr(device, 'IFLA_IFNAME'),
-               'operstate': get_attr(device, 'IFLA_OPERSTATE'),
-               'linkmode': get_attr(device, 'IFLA_LINKMODE'),
-               'mtu': get_attr(device, 'IFLA_MTU'),
-               'promiscuity': get_attr(device, 'IFLA_PROMISCUITY'),
-               'mac': get_attr(device, 'IFLA_ADDRESS'),
-               'broadcast': get_attr(device, 'IFLA_BROADCAST')}
-        ifla_linkinfo = get_attr(device, 'IFLA_LINKINFO')
-        if ifla_linkinfo:
-            ret['kind'] = get_attr(ifla_linkinfo, 'IFLA_INFO_KIND')
-            ifla_data = get_attr(ifla_linkinfo, 'IFLA_INFO_DATA')
-            if ret['kind'] == 'vxlan':
-                ret['vxlan_id'] = get_attr(ifla_data, 'IFLA_VXLAN_ID')
-                ret['vxlan_group'] = get_attr(ifla_data, 'IFLA_VXLAN_GROUP')
-            elif ret['kind'] == 'vlan':
-                ret['vlan_id'] = get_attr(ifla_data, 'IFLA_VLAN_ID')
-        retval.append(ret)
-
-    return retval
->>>>>>> e7a2b6d179... Add IPWrapper.get_devices_info using PyRoute2
@@ -13,14 +13,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import socket
+
 from oslo_log import log as logging
 from oslo_utils import excutils
+import pyroute2
+from pyroute2.netlink import rtnl
+from pyroute2 import netns
 
 from neutron.agent.linux import async_process
 from neutron.agent.linux import ip_lib
 
 LOG = logging.getLogger(__name__)
 
+# network namespace of the current process, restored after opening the
+# netlink socket of a namespace
+NETNS_SELF_PATH = '/proc/self/ns/net'
+
 
 class IPMonitorEvent(object):
     def __init__(self, line, added, interface, cidr):
@@ -55,6 +65,22 @@ class IPMonitorEvent(object):
 
         return cls(line, added, interface, cidr)
 
+    @classmethod
+    def from_netlink(cls, msg, interface):
+        """Return the event of a RTM_NEWADDR or RTM_DELADDR message.
+
+        The line of the event is formatted as by `ip -o monitor address`.
+        """
+        added = (msg['event'] == 'RTM_NEWADDR')
+        # IFA_ADDRESS is the address of the peer of point to point IPv4
+        # interfaces, IFA_LOCAL is the one of the interface
+        address = msg.get_attr('IFA_LOCAL') or msg.get_attr('IFA_ADDRESS')
+        cidr = '%s/%s' % (address, msg['prefixlen'])
+        family = 'inet' if msg['family'] == socket.AF_INET else 'inet6'
+        line = '%s%d: %s    %s %s' % ('' if added else 'Deleted ',
+                                      msg['index'], interface, family, cidr)
+        return cls(line, added, interface, cidr)
+
 
 class IPMonitor(async_process.AsyncProcess):
     """Wrapper over `ip monitor address`.
@@ -79,8 +105,122 @@ class IPMonitor(async_process.AsyncProcess):
     def __iter__(self):
         return self.iter_stdout(block=True)
 
+    def iter_events(self):
+        for line in self:
+            try:
+                yield IPMonitorEvent.from_text(line)
+            except IndexError:
+                # the line was logged when failing to parse it
+                continue
+
     def start(self):
         super(IPMonitor, self).start(block=True)
 
     def stop(self):
         super(IPMonitor, self).stop(block=True)
+
+
+class NetlinkIPMonitor(object):
+    """Monitor of the IP addresses of a namespace, through netlink.
+
+    The address changes are read in the current process from a netlink
+    socket subscribed to the link and address groups of the namespace,
+    rather than from the output of an `ip monitor address` process. Opening
+    the socket of a namespace requires the CAP_SYS_ADMIN capability, the
+    monitor must be started before dropping the privileges.
+
+    When the socket buffer overflows, the events lost are not replayed: the
+    links are dumped again and resync_callback, if any, is called for the
+    caller to read the current state of the addresses.
+
+    To monitor and react indefinitely:
+        m = NetlinkIPMonitor(namespace='tmp')
+        m.start()
+        for event in m:
+            print(event, event.added, event.interface, event.cidr)
+    """
+
+    GROUPS = (rtnl.RTMGRP_LINK | rtnl.RTMGRP_IPV4_IFADDR |
+              rtnl.RTMGRP_IPV6_IFADDR)
+
+    def __init__(self, namespace=None, resync_callback=None):
+        self.namespace = namespace
+        self.resync_callback = resync_callback
+        self._ip = None
+        self._links = {}
+
+    def _open_socket(self):
+        if not self.namespace:
+            return pyroute2.IPRoute()
+        # a socket stays in the namespace of the thread which created it,
+        # so the namespace is only entered for the time of creating it
+        with open(NETNS_SELF_PATH) as current_netns:
+            netns.setns(self.namespace, flags=0)
+            try:
+                return pyroute2.IPRoute()
+            finally:
+                netns.setns(current_netns)
+
+    def is_active(self):
+        return self._ip is not None
+
+    def start(self):
+        ip = self._open_socket()
+        try:
+            ip.bind(groups=self.GROUPS)
+            # the links are dumped once subscribed, the changes received in
+            # the meantime are kept in the socket backlog
+            self._links = self._get_links(ip)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                ip.close()
+        self._ip = ip
+
+    def stop(self):
+        ip, self._ip = self._ip, None
+        if ip:
+            ip.close()
+
+    @staticmethod
+    def _get_links(ip):
+        return {link['index']: link.get_attr('IFLA_IFNAME')
+                for link in ip.get_links()}
+
+    def _resync(self):
+        LOG.warning("The netlink socket of the IP monitor of namespace %s "
+                    "overflowed, some events were lost, resynchronizing",
+                    self.namespace)
+        self._links = self._get_links(self._ip)
+        if self.resync_callback:
+            self.resync_callback()
+
+    def _get_event(self, msg):
+        index = msg['index']
+        if msg['event'] == 'RTM_NEWLINK':
+            self._links[index] = msg.get_attr('IFLA_IFNAME')
+        elif msg['event'] == 'RTM_DELLINK':
+            self._links.pop(index, None)
+        elif msg['event'] in ('RTM_NEWADDR', 'RTM_DELADDR'):
+            interface = (self._links.get(index) or
+                         msg.get_attr('IFA_LABEL') or str(index))
+            return IPMonitorEvent.from_netlink(msg, interface)
+
+    def iter_events(self):
+        while self._ip:
+            try:
+                messages = self._ip.get()
+            except (OSError, socket.error) as e:
+                if not self._ip:
+                    # the socket was closed by stop()
+                    return
+                if e.errno != errno.ENOBUFS:
+                    raise
+                self._resync()
+                continue
+            for msg in messages:
+                event = self._get_event(msg)
+                if event:
+                    yield event
+
+    def __iter__(self):
+        return self.iter_events()
@@ -11,13 +11,18 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import contextlib
 import copy
+import re
 
 import netaddr
 from neutron_lib.utils import runtime
+from oslo_log import log as logging
 
 from neutron.agent.linux import utils as linux_utils
 
+LOG = logging.getLogger(__name__)
+
 IPSET_ADD_BULK_THRESHOLD = 5
 NET_PREFIX = 'N'
 SWAP_SUFFIX = '-n'
@@ -29,12 +34,35 @@ class IpsetManager(object):
 
        Keeps track of ip addresses per set, using bulk
        or single ip add/remove for smaller changes.
+
+       Within a defer_apply window the changes of all the sets are
+       accumulated and applied with a single ipset restore.
     """
 
     def __init__(self, execute=None, namespace=None):
         self.execute = execute or linux_utils.execute
         self.namespace = namespace
         self.ipset_sets = {}
+        self.ipset_apply_deferred = False
+        # (restore line, fail_on_errors) pairs of the deferred changes
+        self._deferred_commands = []
+
+    @contextlib.contextmanager
+    def defer_apply(self):
+        """Defer apply context."""
+        self.defer_apply_on()
+        try:
+            yield
+        finally:
+            self.defer_apply_off()
+
+    def defer_apply_on(self):
+        self.ipset_apply_deferred = True
+
+    def defer_apply_off(self):
+        self.ipset_apply_deferred = False
+        if self._deferred_commands:
+            self._apply_deferred()
 
     def _sanitize_addresses(self, addresses):
         """This method converts any address to ipset format.
@@ -140,6 +168,9 @@ class IpsetManager(object):
         self.ipset_sets[set_name] = []
 
     def _apply(self, cmd, input=None, fail_on_errors=True):
+        if self.ipset_apply_deferred:
+            self._defer_command(cmd, input, fail_on_errors)
+            return
         input = '\n'.join(input) if input else None
         cmd_ns = []
         if self.namespace:
@@ -148,6 +179,68 @@ class IpsetManager(object):
         self.execute(cmd_ns, run_as_root=True, process_input=input,
                      check_exit_code=fail_on_errors)
 
+    def _defer_command(self, cmd, input, fail_on_errors):
+        """Queue a command as ipset restore lines.
+
+        The restore lines use the syntax of the ipset commands, and the
+        whole restore is run with -exist.
+        """
+        if cmd[1] == 'restore':
+            lines = input
+        else:
+            lines = [' '.join(arg for arg in cmd[1:] if arg != '-exist')]
+        self._deferred_commands.extend(
+            (line, fail_on_errors) for line in lines)
+
+    @runtime.synchronized('ipset', external=True)
+    def _apply_deferred(self):
+        """Apply the deferred commands with a single ipset restore.
+
+        ipset restore stops at the first failing line, the lines before it
+        being applied. Only the failing line is dropped and the lines after
+        it are applied again with a single restore, so a failure doesn't
+        prevent the changes of the other sets. If the failing line can't be
+        determined, none of the lines are considered applied. The sets of
+        the failed lines are forgotten to be created again by the next
+        set_members, and the first error is raised at the end.
+        """
+        cmd = ['ipset', 'restore', '-exist']
+        commands, self._deferred_commands = self._deferred_commands, []
+        errors = []
+        while commands:
+            try:
+                self._apply(cmd, [line for line, _ in commands])
+                break
+            except RuntimeError as e:
+                line_no = self._get_failed_line(e, len(commands))
+                if line_no is None:
+                    errors.extend((line, e) for line, fail_on_errors
+                                  in commands if fail_on_errors)
+                    break
+                line, fail_on_errors = commands[line_no - 1]
+                if fail_on_errors:
+                    errors.append((line, e))
+                else:
+                    LOG.debug("Ignoring ipset restore failure of '%s'", line)
+                commands = commands[line_no:]
+
+        for line, e in errors:
+            LOG.error("Failed to apply ipset command '%s': %s", line, e)
+            words = line.split()
+            set_names = words[1:3] if words[0] == 'swap' else words[1:2]
+            for set_name in set_names:
+                if set_name.endswith(SWAP_SUFFIX):
+                    set_name = set_name[:-len(SWAP_SUFFIX)]
+                self.ipset_sets.pop(set_name, None)
+        if errors:
+            raise errors[0][1]
+
+    @staticmethod
+    def _get_failed_line(error, num_lines):
+        match = re.search(r'Error in line (\d+)', str(error))
+        if match and 0 < int(match.group(1)) <= num_lines:
+            return int(match.group(1))
+
     def _get_new_set_ips(self, set_name, expected_ips):
         new_member_ips = (set(expected_ips) -
                           set(self.ipset_sets.get(set_name, [])))
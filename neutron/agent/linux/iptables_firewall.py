@@ -72,12 +72,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     CONNTRACK_ZONE_PER_PORT = False
 
     def __init__(self, namespace=None):
-        self.iptables = iptables_manager.IptablesManager(state_less=True,
-            use_ipv6=ipv6_utils.is_enabled_and_bind_by_default(),
-            namespace=namespace)
+        self.iptables = self._get_iptables_manager(namespace)
         # TODO(majopela, shihanzhang): refactor out ipset to a separate
         # driver composed over this one
-        self.ipset = ipset_manager.IpsetManager(namespace=namespace)
+        self.ipset = self._get_ipset_manager(namespace)
         # list of port which has security group
         self.filtered_ports = {}
         self.unfiltered_ports = {}
@@ -103,6 +101,14 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.devices_with_updated_sg_members = collections.defaultdict(list)
         self._iptables_protocol_name_map = {}
 
+    def _get_iptables_manager(self, namespace):
+        return iptables_manager.IptablesManager(state_less=True,
+            use_ipv6=ipv6_utils.is_enabled_and_bind_by_default(),
+            namespace=namespace)
+
+    def _get_ipset_manager(self, namespace):
+        return ipset_manager.IpsetManager(namespace=namespace)
+
     @property
     def ports(self):
         return dict(self.filtered_ports, **self.unfiltered_ports)
@@ -769,6 +775,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_on(self):
         if not self._defer_apply:
             self.iptables.defer_apply_on()
+            self.ipset.defer_apply_on()
             self._pre_defer_filtered_ports = dict(self.filtered_ports)
             self._pre_defer_unfiltered_ports = dict(self.unfiltered_ports)
             self.pre_sg_members = dict(self.sg_members)
@@ -932,9 +939,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                       self._pre_defer_unfiltered_ports)
             self._setup_chains_apply(self.filtered_ports,
                                      self.unfiltered_ports)
-            self.iptables.defer_apply_off()
+            # the ipsets have to exist before the rules referencing them
+            try:
+                self.ipset.defer_apply_off()
+            finally:
+                self.iptables.defer_apply_off()
             self._remove_conntrack_entries_from_sg_updates()
-            self._remove_unused_security_group_info()
+            # and are destroyed with a single restore once unreferenced
+            self.ipset.defer_apply_on()
+            try:
+                self._remove_unused_security_group_info()
+            finally:
+                self.ipset.defer_apply_off()
             self._pre_defer_filtered_ports = None
             self._pre_defer_unfiltered_ports = None
 
@@ -24,6 +24,7 @@ import difflib
 import os
 import re
 import sys
+import time
 
 from neutron_lib.utils import runtime
 from oslo_concurrency import lockutils
@@ -317,6 +318,12 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
 
+        # With iptables_incremental_apply, the tables applied by the last
+        # run, per command and table name, and the time of the last run
+        # that read them back with iptables-save.
+        self._applied_tables = {}
+        self._last_full_sync = {}
+
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
 
@@ -461,6 +468,9 @@ class IptablesManager(object):
             first = self._apply_synchronized()
             if not cfg.CONF.AGENT.debug_iptables_rules:
                 return first
+            # the second run must compare with the actual iptables-save
+            # output, not with what the first run expects it to be
+            self._applied_tables.clear()
             second = self._apply_synchronized()
             if second:
                 msg = (_("IPTables Rules did not converge. Diff: %s") %
@@ -556,6 +566,10 @@ class IptablesManager(object):
         and replace them with the current set of rules.
         This happens atomically, thanks to iptables-restore.
 
+        With iptables_incremental_apply, the previous rules are the ones
+        applied by the last run rather than the output of iptables-save,
+        which is only run for the periodic full resyncs.
+
         Returns a list of the changes that were sent to iptables-save.
         """
         s = [('iptables', self.ipv4)]
@@ -563,33 +577,42 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
         all_commands = []  # variable to keep track all commands for return val
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,)]
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                save_output = self.execute(args, run_as_root=True)
-            except RuntimeError:
-                # We could be racing with a cron job deleting namespaces.
-                # It is useless to try to apply iptables rules over and
-                # over again in a endless loop if the namespace does not
-                # exist.
-                with excutils.save_and_reraise_exception() as ctx:
-                    if (self.namespace and not
-                            ip_lib.network_namespace_exists(self.namespace)):
-                        ctx.reraise = False
-                        LOG.error("Namespace %s was deleted during IPTables "
-                                  "operations.", self.namespace)
-                        return []
-            all_lines = save_output.split('\n')
+            full_sync = self._needs_full_sync(cmd, tables)
+            if full_sync:
+                args = ['%s-save' % (cmd,)]
+                if self.namespace:
+                    args = ['ip', 'netns', 'exec', self.namespace] + args
+                try:
+                    save_output = self.execute(args, run_as_root=True)
+                except RuntimeError:
+                    # We could be racing with a cron job deleting
+                    # namespaces. It is useless to try to apply iptables
+                    # rules over and over again in a endless loop if the
+                    # namespace does not exist.
+                    with excutils.save_and_reraise_exception() as ctx:
+                        if (self.namespace and not
+                                ip_lib.network_namespace_exists(
+                                    self.namespace)):
+                            ctx.reraise = False
+                            LOG.error("Namespace %s was deleted during "
+                                      "IPTables operations.", self.namespace)
+                            return []
+                all_lines = save_output.split('\n')
             commands = []
+            applied_tables = {}
             # Traverse tables in sorted order for predictable dump output
             for table_name in sorted(tables):
                 table = tables[table_name]
-                # isolate the lines of the table we are modifying
-                start, end = self._find_table(all_lines, table_name)
-                old_rules = all_lines[start:end]
+                if full_sync:
+                    # isolate the lines of the table we are modifying
+                    start, end = self._find_table(all_lines, table_name)
+                    old_rules = all_lines[start:end]
+                    self._check_applied_table(cmd, table_name, old_rules)
+                else:
+                    old_rules = self._applied_tables[cmd][table_name]
                 # generate the new table state we want
                 new_rules = self._modify_rules(old_rules, table, table_name)
+                applied_tables[table_name] = new_rules
                 # generate the iptables commands to get between the old state
                 # and the new state
                 changes = _generate_path_between_rules(old_rules, new_rules)
@@ -600,6 +623,7 @@ class IptablesManager(object):
                                  ['*%s' % table_name] + changes +
                                  ['COMMIT', '# Completed by iptables_manager'])
             if not commands:
+                self._set_applied_tables(cmd, applied_tables, full_sync)
                 continue
             all_commands += commands
 
@@ -612,13 +636,46 @@ class IptablesManager(object):
 
             err = self._run_restore(args, commands)
             if err:
+                # the state of the tables is unknown, read it back next time
+                self._applied_tables.pop(cmd, None)
                 self._log_restore_err(err, commands)
                 raise err
+            self._set_applied_tables(cmd, applied_tables, full_sync)
 
         LOG.debug("IPTablesManager.apply completed with success. %d iptables "
                   "commands were issued", len(all_commands))
         return all_commands
 
+    def _needs_full_sync(self, cmd, tables):
+        if not cfg.CONF.AGENT.iptables_incremental_apply:
+            return True
+        applied_tables = self._applied_tables.get(cmd)
+        # the tables initialized since the last run, like the mangle table
+        # of initialize_mangle_table(), were never read from iptables-save
+        if applied_tables is None or not set(tables) <= set(applied_tables):
+            return True
+        interval = cfg.CONF.AGENT.iptables_full_resync_interval
+        return bool(interval and
+                    time.time() - self._last_full_sync[cmd] >= interval)
+
+    def _set_applied_tables(self, cmd, applied_tables, full_sync):
+        if not cfg.CONF.AGENT.iptables_incremental_apply:
+            return
+        self._applied_tables[cmd] = applied_tables
+        if full_sync:
+            self._last_full_sync[cmd] = time.time()
+
+    def _check_applied_table(self, cmd, table_name, current_rules):
+        applied_rules = self._applied_tables.get(cmd, {}).get(table_name)
+        if applied_rules is None:
+            return
+        if (_get_rules_by_chain(applied_rules) !=
+                _get_rules_by_chain(current_rules)):
+            LOG.warning("%(cmd)s %(table)s table was modified since the "
+                        "previous full resync, applying the changes from "
+                        "its current state",
+                        {'cmd': cmd, 'table': table_name})
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -0,0 +1,67 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron_lib import constants
+
+from neutron.agent.linux import ipset_manager
+from neutron.agent.linux import iptables_firewall
+from neutron.agent.linux import nftables_manager
+from neutron.common import ipv6_utils
+
+
+def _get_ip_version(ethertype):
+    return 6 if ethertype == constants.IPv6 else 4
+
+
+class NftSetManager(ipset_manager.IpsetManager):
+    """IpsetManager API for the sets of a NftablesManager.
+
+    The sets are nftables sets of the filter tables of the manager, so the
+    rules generated for the ipsets reference them once translated.
+    """
+
+    def __init__(self, nft_manager):
+        super(NftSetManager, self).__init__(execute=nft_manager.execute,
+                                            namespace=nft_manager.namespace)
+        self.nft_manager = nft_manager
+
+    def set_members_mutate(self, set_name, ethertype, member_ips):
+        # replacing the whole set is a single transaction, there is no
+        # need to add and delete the members one by one
+        self.nft_manager.set_members(set_name, _get_ip_version(ethertype),
+                                     member_ips)
+        self.ipset_sets[set_name] = list(member_ips)
+
+    def destroy(self, id, ethertype, forced=False):
+        set_name = self.get_name(id, ethertype)
+        if set_name in self.ipset_sets or forced:
+            self.nft_manager.remove_set(set_name, _get_ip_version(ethertype))
+            self.ipset_sets.pop(set_name, None)
+
+
+class NftablesFirewallDriver(iptables_firewall.IptablesFirewallDriver):
+    """Driver generating the iptables driver rules, applied with nftables.
+
+    The rules are applied in tables of the bridge family, where the input and
+    output interfaces are the bridge ports matched by the iptables driver
+    with physdev, and the remote groups are nftables sets. The IPv4 and IPv6
+    rules are applied in a single transaction.
+    """
+
+    def _get_iptables_manager(self, namespace):
+        return nftables_manager.NftablesManager(
+            state_less=True,
+            use_ipv6=ipv6_utils.is_enabled_and_bind_by_default(),
+            namespace=namespace, bridge=True)
+
+    def _get_ipset_manager(self, namespace):
+        return NftSetManager(self.iptables)
@@ -0,0 +1,369 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Implements the iptables manager API on top of nftables."""
+
+import collections
+import re
+
+from oslo_log import log as logging
+
+from neutron._i18n import _
+from neutron.agent.linux import iptables_manager
+from neutron.common import constants
+from neutron.common import exceptions as n_exc
+
+LOG = logging.getLogger(__name__)
+
+NFT_FAMILIES = {4: 'ip', 6: 'ip6'}
+NFT_SET_TYPES = {4: 'ipv4_addr', 6: 'ipv6_addr'}
+NFT_BRIDGE_FAMILY = 'bridge'
+
+# Type, hook and priority of the nftables base chains replacing the
+# iptables built-in chains, using the priorities of the iptables tables so
+# the rules are evaluated in the same order.
+BASE_CHAINS = {
+    'raw': {'PREROUTING': ('filter', 'prerouting', -300),
+            'OUTPUT': ('filter', 'output', -300)},
+    'mangle': {'PREROUTING': ('filter', 'prerouting', -150),
+               'INPUT': ('filter', 'input', -150),
+               'FORWARD': ('filter', 'forward', -150),
+               'OUTPUT': ('route', 'output', -150),
+               'POSTROUTING': ('filter', 'postrouting', -150)},
+    'nat': {'PREROUTING': ('nat', 'prerouting', -100),
+            'INPUT': ('nat', 'input', 100),
+            'OUTPUT': ('nat', 'output', -100),
+            'POSTROUTING': ('nat', 'postrouting', 100)},
+    'filter': {'INPUT': ('filter', 'input', 0),
+               'FORWARD': ('filter', 'forward', 0),
+               'OUTPUT': ('filter', 'output', 0)},
+}
+
+# In the bridge family, the input and output interfaces of a packet are the
+# bridge ports, which is what the physdev match checks in iptables.
+PHYSDEV_RE = re.compile(
+    r'-m physdev --physdev-(in|out) (\S+)(?: --physdev-is-bridged)?')
+PHYSDEV_REPL = {'in': '-i', 'out': '-o'}
+
+NFT_COUNTER_RE = re.compile(r'counter packets (\d+) bytes (\d+)')
+NFT_CT_ZONE_RE = re.compile(r'iifname "?([\w\-]+)"? .*ct zone set (\d+)')
+
+
+def get_iptables_manager(backend=constants.PACKET_FILTER_BACKEND_IPTABLES,
+                         **kwargs):
+    """Return the iptables manager implementation of a backend."""
+    if backend == constants.PACKET_FILTER_BACKEND_NFTABLES:
+        return NftablesManager(**kwargs)
+    return iptables_manager.IptablesManager(**kwargs)
+
+
+class NftablesManager(iptables_manager.IptablesManager):
+    """Wrapper for nftables with the API of IptablesManager.
+
+    The rules are still added and removed with the iptables syntax through
+    IptablesTable, but every table is applied as an nftables table owned by
+    the manager. The built-in chains are base chains of that table, hooked
+    with the priority of the matching iptables table.
+
+    The rules of the chains changed since the previous run are converted by
+    iptables-restore-translate, then the changes of the IPv4 and IPv6 tables
+    are applied in a single atomic nft transaction. Unlike with iptables,
+    nothing has to be read back from the kernel, as no other component
+    writes to these tables.
+
+    With bridge=True the tables are created in the bridge family, so the
+    physdev matches of the rules, translated to input and output interface
+    matches, apply to the bridge ports. Each base chain then starts by
+    accepting the packets of the other IP version.
+
+    The manager also holds the nftables sets of the filter tables, see
+    set_members().
+    """
+
+    def __init__(self, _execute=None, state_less=False, use_ipv6=False,
+                 namespace=None, binary_name=iptables_manager.binary_name,
+                 bridge=False):
+        super(NftablesManager, self).__init__(
+            _execute=_execute, state_less=state_less, use_ipv6=use_ipv6,
+            namespace=namespace, binary_name=binary_name)
+        self.bridge = bridge
+        # The chains and rules applied by the last run, per ip version and
+        # table name. A table missing here is (re)created from scratch.
+        self._applied_chains = {}
+        self._sets = {4: {}, 6: {}}
+        self._counters_offset = {}
+
+    def _get_nft_table(self, ip_version, table_name):
+        family = NFT_BRIDGE_FAMILY if self.bridge else NFT_FAMILIES[ip_version]
+        name = '%s-%s%d' % (self.wrap_name or 'neutron', table_name,
+                            ip_version)
+        return family, name
+
+    def _get_versions_and_tables(self):
+        versions = [(4, self.ipv4)]
+        if self.use_ipv6:
+            versions.append((6, self.ipv6))
+        return versions
+
+    def _run_nft(self, commands, check_exit_code=True):
+        args = ['nft', '-f', '-']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return self.execute(args, process_input='\n'.join(commands) + '\n',
+                            run_as_root=True,
+                            check_exit_code=check_exit_code)
+
+    def get_rules_for_table(self, table):
+        """Return the rules of a table in the iptables-save format.
+
+        The rules come from the manager, which is the only one writing to
+        its tables. Before the first apply, the conntrack zone rules of the
+        table left by a previous run are read back, so IpConntrackManager
+        keeps the zones of the existing connections.
+        """
+        if (4, table) in self._applied_chains:
+            return [str(rule) for rule in self.ipv4[table].rules]
+        family, name = self._get_nft_table(4, table)
+        args = ['nft', 'list', 'table', family, name]
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        current_table = self.execute(args, run_as_root=True,
+                                     check_exit_code=False,
+                                     log_fail_as_error=False)
+        return ['-A PREROUTING -m physdev --physdev-in %s -j CT --zone %s' %
+                match.groups()
+                for match in NFT_CT_ZONE_RE.finditer(current_table or '')]
+
+    def _get_table_chains(self, table, table_name):
+        chains = collections.OrderedDict()
+        for name in sorted(table.unwrapped_chains):
+            chains[name] = []
+        for name in sorted(table.chains):
+            chains['%s-%s' % (self.wrap_name, name)] = []
+        rules = ([rule for rule in table.rules if rule.top] +
+                 [rule for rule in table.rules if not rule.top])
+        # the rules already added to each chain, to skip the duplicates
+        # without scanning the ordered rules of the chain
+        seen = collections.defaultdict(set)
+        for rule in rules:
+            rule_str = str(rule)
+            chain = rule_str[3:].split(' ', 1)[0]
+            chain_rules = chains.setdefault(chain, [])
+            if rule_str not in seen[chain]:
+                seen[chain].add(rule_str)
+                chain_rules.append(rule_str)
+        # the removed rules and chains are not in the chains rebuilt from
+        # the table, there is nothing else to clean up
+        table.remove_chains.clear()
+        table.remove_rules = []
+        return chains
+
+    def _get_chain_commands(self, ip_version, table_name, chain, new):
+        family, name = self._get_nft_table(ip_version, table_name)
+        base_chain = BASE_CHAINS.get(table_name, {}).get(chain)
+        commands = []
+        if new and base_chain:
+            chain_type, hook, priority = base_chain
+            if self.bridge:
+                chain_type = 'filter'
+            commands.append(
+                'add chain %s %s %s { type %s hook %s priority %d; '
+                'policy accept; }' % (family, name, chain, chain_type, hook,
+                                      priority))
+        elif new:
+            commands.append('add chain %s %s %s' % (family, name, chain))
+        else:
+            commands.append('flush chain %s %s %s' % (family, name, chain))
+        if base_chain and self.bridge:
+            commands.append('add rule %s %s %s meta protocol != %s accept' %
+                            (family, name, chain, NFT_FAMILIES[ip_version]))
+        return commands
+
+    def _get_set_commands(self, ip_version, set_name):
+        family, name = self._get_nft_table(ip_version, 'filter')
+        members = self._sets[ip_version][set_name]
+        commands = [
+            'add set %s %s %s { type %s; flags interval; auto-merge; }' % (
+                family, name, set_name, NFT_SET_TYPES[ip_version]),
+            'flush set %s %s %s' % (family, name, set_name)]
+        if members:
+            commands.append('add element %s %s %s { %s }' % (
+                family, name, set_name, ', '.join(members)))
+        return commands
+
+    def _translate_rules(self, ip_version, rules_by_table):
+        """Translate iptables rules to nft add rule commands.
+
+        :param rules_by_table: list of (table name, rules) tuples, the rules
+                               being in the iptables-save format.
+        """
+        lines = []
+        for table_name, rules in rules_by_table:
+            if self.bridge:
+                rules = [PHYSDEV_RE.sub(
+                    lambda m: '%s %s' % (PHYSDEV_REPL[m.group(1)],
+                                         m.group(2)), rule)
+                    for rule in rules]
+            chains = sorted({rule[3:].split(' ', 1)[0] for rule in rules})
+            lines += (['*%s' % table_name] +
+                      [':%s - [0:0]' % chain for chain in chains] +
+                      rules + ['COMMIT'])
+        if not lines:
+            return []
+        cmd = 'iptables' if ip_version == 4 else 'ip6tables'
+        output = self.execute(['%s-restore-translate' % cmd, '-f',
+                               '/dev/stdin'],
+                              process_input='\n'.join(lines) + '\n')
+
+        commands = []
+        translated_re = re.compile(r'^add rule %s (\S+) ' %
+                                   NFT_FAMILIES[ip_version])
+        for line in output.split('\n'):
+            if line.startswith('#') and ' -A ' in line:
+                msg = (_("iptables rule can not be translated to nftables: "
+                         "%s") % line[1:].strip())
+                raise n_exc.IpTablesApplyException(msg)
+            match = translated_re.match(line)
+            if not match:
+                # add table and add chain statements, the tables and chains
+                # are created by the manager
+                continue
+            family, name = self._get_nft_table(ip_version, match.group(1))
+            commands.append('add rule %s %s %s' % (
+                family, name, line[match.end():]))
+        return commands
+
+    def _apply_synchronized(self):
+        """Apply the current in-memory set of iptables rules.
+
+        Only the chains changed since the previous run are flushed and
+        filled again, so the counters of the other rules are kept.
+
+        Returns a list of the nft commands that were run.
+        """
+        commands = []
+        delete_commands = []
+        translations = []
+        applied_chains = {}
+        for ip_version, tables in self._get_versions_and_tables():
+            changed_rules = []
+            for table_name in sorted(tables):
+                family, name = self._get_nft_table(ip_version, table_name)
+                chains = self._get_table_chains(tables[table_name],
+                                                table_name)
+                applied_chains[(ip_version, table_name)] = chains
+                old_chains = self._applied_chains.get(
+                    (ip_version, table_name))
+                if old_chains is None:
+                    # the table could remain from a previous agent run
+                    commands += ['add table %s %s' % (family, name),
+                                 'delete table %s %s' % (family, name),
+                                 'add table %s %s' % (family, name)]
+                    if table_name == 'filter':
+                        for set_name in sorted(self._sets[ip_version]):
+                            commands += self._get_set_commands(ip_version,
+                                                               set_name)
+                    old_chains = {}
+                rules = []
+                for chain, chain_rules in chains.items():
+                    if chain_rules == old_chains.get(chain):
+                        continue
+                    commands += self._get_chain_commands(
+                        ip_version, table_name, chain,
+                        new=chain not in old_chains)
+                    rules += chain_rules
+                if rules:
+                    changed_rules.append((table_name, rules))
+                for chain in sorted(set(old_chains) - set(chains)):
+                    delete_commands += [
+                        'flush chain %s %s %s' % (family, name, chain),
+                        'delete chain %s %s %s' % (family, name, chain)]
+            translations += self._translate_rules(ip_version, changed_rules)
+
+        # the chains are created before the rules jumping to them, and
+        # deleted once the rules jumping to them are gone
+        commands += translations + delete_commands
+        if not commands:
+            return []
+        try:
+            self._run_nft(commands)
+        except RuntimeError as error:
+            # the state of the tables is unknown, rebuild them next time
+            self._applied_chains.clear()
+            self._log_restore_err(error, commands)
+            raise
+        self._applied_chains.update(applied_chains)
+        LOG.debug("NftablesManager.apply completed with success. %d nft "
+                  "commands were issued", len(commands))
+        return commands
+
+    def set_members(self, set_name, ip_version, members):
+        """Create or replace the members of a set of the filter tables.
+
+        Once the filter table exists, the set is replaced right away in a
+        single transaction, so the rules referencing it never see a partial
+        set. Otherwise it is created with the table by the next apply.
+        """
+        self._sets[ip_version][set_name] = list(members)
+        if (ip_version, 'filter') in self._applied_chains:
+            self._run_nft(self._get_set_commands(ip_version, set_name))
+
+    def remove_set(self, set_name, ip_version):
+        """Remove a set, which must not be referenced by any rule anymore."""
+        if self._sets[ip_version].pop(set_name, None) is None:
+            return
+        if (ip_version, 'filter') in self._applied_chains:
+            family, name = self._get_nft_table(ip_version, 'filter')
+            self._run_nft(['delete set %s %s %s' % (family, name, set_name)],
+                          check_exit_code=False)
+
+    def get_traffic_counters(self, chain, wrap=True, zero=False):
+        """Return the sum of the traffic counters of all rules of a chain.
+
+        nft can't reset the counters of a single chain, so zeroing them
+        records their current value, which is subtracted from the next
+        reads.
+        """
+        cmd_tables = self._get_traffic_counters_cmd_tables(chain, wrap)
+        if not cmd_tables:
+            LOG.warning('Attempted to get traffic counters of chain %s '
+                        'which does not exist', chain)
+            return
+
+        name = iptables_manager.get_chain_name(chain, wrap)
+        if wrap:
+            name = '%s-%s' % (self.wrap_name, name)
+        acc = {'pkts': 0, 'bytes': 0}
+
+        for cmd, table in cmd_tables:
+            ip_version = 4 if cmd == 'iptables' else 6
+            family, table_name = self._get_nft_table(ip_version, table)
+            args = ['nft', 'list', 'chain', family, table_name, name]
+            if self.namespace:
+                args = ['ip', 'netns', 'exec', self.namespace] + args
+            current_chain = self.execute(args, run_as_root=True)
+            pkts, bytes_ = 0, 0
+            for match in NFT_COUNTER_RE.finditer(current_chain):
+                pkts += int(match.group(1))
+                bytes_ += int(match.group(2))
+
+            key = (ip_version, table, name)
+            offset_pkts, offset_bytes = self._counters_offset.get(key, (0, 0))
+            if pkts < offset_pkts or bytes_ < offset_bytes:
+                # the chain was flushed since the counters were zeroed
+                offset_pkts, offset_bytes = 0, 0
+            acc['pkts'] += pkts - offset_pkts
+            acc['bytes'] += bytes_ - offset_bytes
+            if zero:
+                self._counters_offset[key] = (pkts, bytes_)
+
+        return acc
@@ -131,6 +131,9 @@ class OFPort(object):
         self.neutron_port_dict = port_dict.copy()
         self.allowed_pairs_v4 = self._get_allowed_pairs(port_dict, version=4)
         self.allowed_pairs_v6 = self._get_allowed_pairs(port_dict, version=6)
+        # Flows installed from the security group rules, indexed by their
+        # match, see OVSFirewallDriver.add_flows_from_rules
+        self.rules_flows = None
 
     @staticmethod
     def _get_allowed_pairs(port_dict, version):
@@ -145,6 +148,18 @@ class OFPort(object):
         macs.add(self.mac)
         return macs
 
+    @property
+    def base_flows_key(self):
+        """Return the port attributes the non rule based flows depend on.
+
+        When it doesn't change on a port update, only the flows built from
+        the security group rules need to be updated.
+        """
+        return (self.ofport, self.vlan_tag, self.mac,
+                frozenset(self.allowed_pairs_v4),
+                frozenset(self.allowed_pairs_v6),
+                tuple(self.fixed_ips))
+
     @property
     def ipv4_addresses(self):
         return [ip_addr for ip_addr in self.fixed_ips
@@ -265,6 +280,46 @@ class ConjIdMap(object):
         return result
 
 
+class AddressAggregate(object):
+    """Minimal set of prefixes covering a set of member addresses.
+
+    The prefixes are updated incrementally when members are added or
+    removed, so a member change doesn't merge all the addresses again.
+    """
+
+    def __init__(self):
+        self.members = set()
+        # Members given with a prefix length, they might overlap other
+        # members and have to be added again when a member is removed.
+        self._networks = set()
+        self._ip_set = netaddr.IPSet()
+
+    @staticmethod
+    def _is_network(addr):
+        return '/' in addr
+
+    def update(self, members):
+        removed = self.members - members
+        added = members - self.members
+        self._networks -= removed
+        if any(self._is_network(addr) for addr in removed):
+            self._ip_set = netaddr.IPSet(members)
+        else:
+            for addr in removed:
+                self._ip_set.remove(addr)
+            if removed:
+                for network in self._networks:
+                    self._ip_set.add(network)
+            for addr in added:
+                self._ip_set.add(addr)
+        self._networks |= {addr for addr in added if self._is_network(addr)}
+        self.members = set(members)
+
+    @property
+    def prefixes(self):
+        return [str(cidr) for cidr in self._ip_set.iter_cidrs()]
+
+
 class ConjIPFlowManager(object):
     """Manage conj_id allocation and remote securitygroups derived
     conjunction flows.
@@ -277,6 +332,10 @@ class ConjIPFlowManager(object):
     but flows from different remote_group need to be merged on shared networks,
     where the complexity arises and this manager is needed.
 
+    The addresses sharing the same conj_ids are aggregated into the minimal
+    set of prefixes covering them, and flows are installed per prefix
+    instead of per address.
+
     """
 
     def __init__(self, driver):
@@ -287,6 +346,9 @@ class ConjIPFlowManager(object):
         self.conj_ids = collections.defaultdict(dict)
         self.flow_state = collections.defaultdict(
             lambda: collections.defaultdict(dict))
+        # Indexed like self.x[vlan_tag][(direction, ethertype)][conj_ids]
+        self.aggregates = collections.defaultdict(
+            lambda: collections.defaultdict(dict))
 
     def _build_addr_conj_id_map(self, ethertype, sg_conj_id_map):
         """Build a map of addr -> list of conj_ids."""
@@ -302,6 +364,30 @@ class ConjIPFlowManager(object):
 
         return addr_to_conj
 
+    @staticmethod
+    def _build_prefix_conj_id_map(aggregates, addr_to_conj):
+        """Build a map of prefix -> list of conj_ids.
+
+        The addresses with the same conj_ids are merged in the minimal set
+        of prefixes covering them, updating the given aggregates.
+        """
+        conj_to_addrs = collections.defaultdict(set)
+        for addr, conj_ids in addr_to_conj.items():
+            conj_to_addrs[tuple(sorted(conj_ids))].add(addr)
+
+        for conj_ids in set(aggregates) - set(conj_to_addrs):
+            del aggregates[conj_ids]
+
+        prefix_to_conj = {}
+        for conj_ids, addrs in conj_to_addrs.items():
+            if conj_ids not in aggregates:
+                aggregates[conj_ids] = AddressAggregate()
+            aggregates[conj_ids].update(addrs)
+            for prefix in aggregates[conj_ids].prefixes:
+                prefix_to_conj[prefix] = list(conj_ids)
+
+        return prefix_to_conj
+
     def _update_flows_for_vlan_subr(self, direction, ethertype, vlan_tag,
                                     flow_state, addr_to_conj):
         """Do the actual flow updates for given direction and ethertype."""
@@ -327,10 +413,21 @@ class ConjIPFlowManager(object):
             # no address overlaps.
             addr_to_conj = self._build_addr_conj_id_map(
                 ethertype, sg_conj_id_map)
+            prefix_to_conj = self._build_prefix_conj_id_map(
+                self.aggregates[vlan_tag][(direction, ethertype)],
+                addr_to_conj)
+            if len(prefix_to_conj) < len(addr_to_conj):
+                LOG.debug("Aggregated %(addrs)d remote group addresses in "
+                          "%(prefixes)d prefixes for %(direction)s %(eth)s "
+                          "traffic on vlan %(vlan)s",
+                          {'addrs': len(addr_to_conj),
+                           'prefixes': len(prefix_to_conj),
+                           'direction': direction, 'eth': ethertype,
+                           'vlan': vlan_tag})
             self._update_flows_for_vlan_subr(direction, ethertype, vlan_tag,
                 self.flow_state[vlan_tag][(direction, ethertype)],
-                addr_to_conj)
-            self.flow_state[vlan_tag][(direction, ethertype)] = addr_to_conj
+                prefix_to_conj)
+            self.flow_state[vlan_tag][(direction, ethertype)] = prefix_to_conj
 
     def add(self, vlan_tag, sg_id, remote_sg_id, direction, ethertype,
             priority_offset):
@@ -403,6 +500,8 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         self.sg_to_delete = set()
         self._update_cookie = None
         self._deferred = False
+        self._collected_flows = None
+        self._deferred_strict_deletes = []
         self.iptables_helper = iptables.Helper(self.int_br.br)
         self.iptables_helper.load_driver_if_needed()
         self._initialize_firewall()
@@ -443,6 +542,9 @@ class OVSFirewallDriver(firewall.FirewallDriver):
             self._add_flow(**f)
 
     def _add_flow(self, **kwargs):
+        if self._collected_flows is not None:
+            self._collected_flows.append(kwargs)
+            return
         dl_type = kwargs.get('dl_type')
         create_reg_numbers(kwargs)
         if isinstance(dl_type, int):
@@ -469,6 +571,36 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         create_reg_numbers(kwargs)
         self.int_br.br.delete_flows(strict=True, **kwargs)
 
+    def _strict_delete_flows_after_apply(self, flows):
+        """Strictly delete given flows once the deferred flows are applied.
+
+        The flows are deleted in a single call, after the flows replacing
+        them have been installed.
+        """
+        for flow in flows:
+            flow = flow.copy()
+            flow.pop('actions', None)
+            flow['strict'] = True
+            create_reg_numbers(flow)
+            self._deferred_strict_deletes.append(flow)
+        if not self._deferred:
+            self._apply_strict_deletes()
+
+    def _apply_strict_deletes(self):
+        flows = self._deferred_strict_deletes
+        self._deferred_strict_deletes = []
+        if flows:
+            self.int_br.br.do_action_flows('del', flows)
+
+    @contextlib.contextmanager
+    def _collect_flows(self):
+        """Collect flows given to _add_flow instead of installing them."""
+        self._collected_flows = []
+        try:
+            yield self._collected_flows
+        finally:
+            self._collected_flows = None
+
     @staticmethod
     def initialize_bridge(int_br):
         int_br.add_protocols(*OVSFirewallDriver.REQUIRED_PROTOCOLS)
@@ -591,11 +723,16 @@ class OVSFirewallDriver(firewall.FirewallDriver):
             # allowed_address_pair MACs will be updated in
             # self.get_or_create_ofport(port)
             old_of_port = self.get_ofport(port)
+            old_base_flows_key = old_of_port and old_of_port.base_flows_key
             of_port = self.get_or_create_ofport(port)
-            if old_of_port:
-                self._update_flows_for_port(of_port, old_of_port)
-            else:
+            if not old_of_port:
                 self._set_port_filters(of_port)
+            elif (of_port is old_of_port and
+                    of_port.rules_flows is not None and
+                    of_port.base_flows_key == old_base_flows_key):
+                self._update_rules_flows_for_port(of_port)
+            else:
+                self._update_flows_for_port(of_port, old_of_port)
 
         except exceptions.OVSFWPortNotFound as not_found_error:
             LOG.info("port %(port_id)s does not exist in ovsdb: %(err)s.",
@@ -620,6 +757,24 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         # Rewrite update cookie with default cookie
         self._set_port_filters(of_port)
 
+    def _update_rules_flows_for_port(self, of_port):
+        """Update only the flows built from the security group rules.
+
+        The flows generated from the current rules are compared with the
+        ones installed the last time: only the new or changed flows are
+        added and only the flows not generated anymore are deleted.
+        """
+        old_flows = of_port.rules_flows
+        new_flows = self._get_rules_flows(of_port)
+        for match, flow in new_flows.items():
+            if old_flows.get(match) != flow:
+                self._add_flow(**flow)
+        self._strict_delete_flows_after_apply(
+            [flow for match, flow in old_flows.items()
+             if match not in new_flows])
+        of_port.rules_flows = new_flows
+        self.conj_ip_manager.update_flows_for_vlan(of_port.vlan_tag)
+
     def remove_port_filter(self, port):
         """Remove port from firewall
 
@@ -687,6 +842,7 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         if self._deferred:
             self._cleanup_stale_sg()
             self.int_br.apply_flows()
+            self._apply_strict_deletes()
             self._deferred = False
 
     @property
@@ -1179,7 +1335,26 @@ class OVSFirewallDriver(firewall.FirewallDriver):
                     )
                     self._add_flow(**flow)
 
+    @staticmethod
+    def _flow_match(flow):
+        return tuple(sorted((key, value) for key, value in flow.items()
+                            if key != 'actions'))
+
+    def _get_rules_flows(self, port):
+        """Return the flows built from the rules, indexed by their match."""
+        with self._collect_flows() as flows:
+            self._add_rules_flows(port)
+        return collections.OrderedDict(
+            (self._flow_match(flow), flow) for flow in flows)
+
     def add_flows_from_rules(self, port):
+        port.rules_flows = self._get_rules_flows(port)
+        for flow in port.rules_flows.values():
+            self._add_flow(**flow)
+
+        self.conj_ip_manager.update_flows_for_vlan(port.vlan_tag)
+
+    def _add_rules_flows(self, port):
         self._initialize_tracked_ingress(port)
         self._initialize_tracked_egress(port)
         LOG.debug('Creating flow rules for port %s that is port %d in OVS',
@@ -1196,8 +1371,6 @@ class OVSFirewallDriver(firewall.FirewallDriver):
 
         self._add_non_ip_conj_flows(port)
 
-        self.conj_ip_manager.update_flows_for_vlan(port.vlan_tag)
-
     def _create_rules_generator_for_port(self, port):
         for sec_group in port.sec_groups:
             for rule in sec_group.raw_rules:
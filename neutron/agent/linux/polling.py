@@ -21,6 +21,7 @@ from oslo_log import log as logging
 from neutron.agent.common import base_polling
 from neutron.agent.linux import async_process
 from neutron.agent.linux import ovsdb_monitor
+from neutron.agent.ovsdb.native import port_tracker
 from neutron.plugins.ml2.drivers.openvswitch.agent.common import constants
 
 LOG = logging.getLogger(__name__)
@@ -29,10 +30,15 @@ LOG = logging.getLogger(__name__)
 @contextlib.contextmanager
 def get_polling_manager(minimize_polling=False,
                         ovsdb_monitor_respawn_interval=(
-                            constants.DEFAULT_OVSDBMON_RESPAWN)):
+                            constants.DEFAULT_OVSDBMON_RESPAWN),
+                        ovsdb_port_monitor=constants.OVSDB_MONITOR_CLIENT):
     if minimize_polling:
-        pm = InterfacePollingMinimizer(
-            ovsdb_monitor_respawn_interval=ovsdb_monitor_respawn_interval)
+        if ovsdb_port_monitor == constants.OVSDB_MONITOR_NATIVE:
+            pm = PortTrackerPollingMinimizer()
+        else:
+            pm = InterfacePollingMinimizer(
+                ovsdb_monitor_respawn_interval=(
+                    ovsdb_monitor_respawn_interval))
         pm.start()
     else:
         pm = base_polling.AlwaysPoll()
@@ -72,3 +78,28 @@ class InterfacePollingMinimizer(base_polling.BasePollingManager):
 
     def get_events(self):
         return self._monitor.get_events()
+
+
+class PortTrackerPollingMinimizer(base_polling.BasePollingManager):
+    """Uses an in-process OVSDB IDL to determine when polling is required.
+
+    The port tracker is also exposed to the agent, which can read the VIF
+    ports and their tags from it instead of querying ovsdb-server.
+    """
+
+    def __init__(self):
+        super(PortTrackerPollingMinimizer, self).__init__()
+        self.port_tracker = port_tracker.PortTracker()
+
+    def start(self):
+        self.port_tracker.start()
+
+    def stop(self):
+        self.port_tracker.stop()
+
+    def _is_polling_required(self):
+        eventlet.sleep()
+        return self.port_tracker.has_updates
+
+    def get_events(self):
+        return self.port_tracker.get_events()
@@ -50,7 +50,15 @@ def configure_ssl_conn():
     Stream.ssl_set_ca_cert_file(req_ssl_opts['ssl_ca_cert_file'])
 
 
-def idl_factory():
+def idl_factory(idl_class=None, tables=None, **kwargs):
+    """Return an Open_vSwitch IDL of the given class.
+
+    :param idl_class: the ovs.db.idl.Idl subclass to instantiate, defaults
+                      to ovs.db.idl.Idl
+    :param tables: optional dict of table name to the list of columns to
+                   monitor; all the tables and columns are monitored if None
+    :param kwargs: extra arguments passed to the idl_class constructor
+    """
     conn = cfg.CONF.OVS.ovsdb_connection
     schema_name = 'Open_vSwitch'
     if conn.startswith('ssl:'):
@@ -68,6 +76,11 @@ def idl_factory():
 
         helper = do_get_schema_helper()
 
-    # TODO(twilson) We should still select only the tables/columns we use
-    helper.register_all()
-    return idl.Idl(conn, helper)
+    if tables:
+        for table, columns in tables.items():
+            helper.register_columns(table, columns)
+    else:
+        # TODO(twilson) We should still select only the tables/columns we use
+        helper.register_all()
+    idl_class = idl_class or idl.Idl
+    return idl_class(conn, helper, **kwargs)
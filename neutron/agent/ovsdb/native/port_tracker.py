@@ -0,0 +1,252 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from ovs.db import idl
+from ovsdbapp.backend.ovs_idl import connection
+
+from neutron.agent.common import ovs_lib
+from neutron.agent.ovsdb.native import connection as n_connection
+
+LOG = logging.getLogger(__name__)
+
+# Only the columns needed to track the ports plugged into the bridges are
+# monitored, so the replica stays small on hosts with many ports.
+MONITORED_TABLES = {
+    'Bridge': ['name', 'ports'],
+    'Port': ['name', 'tag', 'interfaces'],
+    'Interface': ['name', 'ofport', 'external_ids'],
+}
+
+
+def _optional(value):
+    # Optional columns are exposed by the IDL as a list with zero or one
+    # element, the way ovs-vsctl returns them.
+    return value[0] if value else []
+
+
+class PortTrackerIdl(idl.Idl):
+    """Open_vSwitch IDL that forwards its row changes to a PortTracker."""
+
+    def __init__(self, remote, schema_helper, tracker):
+        super(PortTrackerIdl, self).__init__(remote, schema_helper)
+        self.tracker = tracker
+        self._session_seqno = self._session.get_seqno()
+        self._reconnected = False
+
+    def run(self):
+        change_seqno = self.change_seqno
+        changed = super(PortTrackerIdl, self).run()
+        if self._reconnected and self.change_seqno != change_seqno:
+            # Nothing changes the replica after a reconnect until it is
+            # reloaded, so this is the reload.
+            self._reconnected = False
+            self.tracker.resync(self.tables)
+        seqno = self._session.get_seqno()
+        if seqno != self._session_seqno:
+            # When the session reconnects, python-ovs reloads the whole
+            # replica without notifying the deletion of the rows removed
+            # while it was disconnected.
+            self._session_seqno = seqno
+            self._reconnected = True
+        return changed
+
+    def notify(self, event, row, updates=None):
+        self.tracker.notify(event, row)
+
+
+class PortTracker(object):
+    """Tracks the ports of the local Open vSwitch from IDL notifications.
+
+    The tracker keeps a replica of the Bridge, Port and Interface rows the
+    agent cares about and updates it row by row when ovsdb-server notifies
+    a change, instead of querying the whole tables on every rpc_loop
+    iteration. It also records the Interface events in the same format as
+    SimpleInterfaceMonitor, so it can be used as a polling manager backend.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bridges = {}
+        self._ports = {}
+        self._interfaces = {}
+        self._interfaces_by_name = {}
+        self._new_events = {'added': [], 'removed': []}
+        # The results of the queries are cached per bridge and dropped on
+        # any change, so an iteration without changes does not walk the
+        # replica at all.
+        self._cache = {}
+        self._conn = None
+
+    def start(self):
+        self._conn = connection.Connection(
+            idl=n_connection.idl_factory(PortTrackerIdl,
+                                         tables=MONITORED_TABLES,
+                                         tracker=self),
+            timeout=cfg.CONF.OVS.ovsdb_timeout)
+        # Connection.start() waits for the initial dump of the tables, so
+        # the replica is complete when it returns.
+        self._conn.start()
+
+    def stop(self):
+        if self._conn:
+            self._conn.stop()
+            self._conn = None
+        with self._lock:
+            self._bridges.clear()
+            self._ports.clear()
+            self._interfaces.clear()
+            self._interfaces_by_name.clear()
+            self._cache.clear()
+            self._new_events = {'added': [], 'removed': []}
+
+    @property
+    def is_active(self):
+        return self._conn is not None
+
+    def notify(self, event, row):
+        table = row._table.name
+        handler = getattr(self, '_process_%s' % table.lower(), None)
+        if not handler:
+            return
+        with self._lock:
+            self._cache.clear()
+            handler(event, row)
+
+    def resync(self, tables):
+        """Drop the rows which are not in the reloaded IDL replica.
+
+        The rows still in the replica are notified as created when it is
+        reloaded, so only the deleted ones are left to remove.
+        """
+        with self._lock:
+            self._cache.clear()
+            for uuid in set(self._bridges) - set(tables['Bridge'].rows):
+                del self._bridges[uuid]
+            for uuid in set(self._ports) - set(tables['Port'].rows):
+                del self._ports[uuid]
+            for uuid in (set(self._interfaces) -
+                         set(tables['Interface'].rows)):
+                self._remove_interface(uuid)
+
+    def _process_bridge(self, event, row):
+        if event == idl.ROW_DELETE:
+            self._bridges.pop(row.uuid, None)
+        else:
+            self._bridges[row.uuid] = {
+                'name': row.name,
+                'ports': {port.uuid for port in row.ports}}
+
+    def _process_port(self, event, row):
+        if event == idl.ROW_DELETE:
+            self._ports.pop(row.uuid, None)
+        else:
+            self._ports[row.uuid] = {'name': row.name,
+                                     'tag': _optional(row.tag)}
+
+    def _process_interface(self, event, row):
+        if event == idl.ROW_DELETE:
+            self._remove_interface(row.uuid)
+            return
+
+        device = {'name': row.name,
+                  'ofport': _optional(row.ofport),
+                  'external_ids': dict(row.external_ids)}
+        old_device = self._interfaces.get(row.uuid)
+        self._interfaces[row.uuid] = device
+        self._interfaces_by_name[device['name']] = device
+        if event == idl.ROW_CREATE and old_device is None:
+            self._new_events['added'].append(dict(device))
+        elif old_device and old_device['ofport'] != device['ofport']:
+            # Like the 'new' rows of ovsdb-client monitor, an update only
+            # refreshes the ofport of the devices not yet reported.
+            for added in self._new_events['added']:
+                if added['name'] == device['name']:
+                    added['ofport'] = device['ofport']
+
+    def _remove_interface(self, uuid):
+        device = self._interfaces.pop(uuid, None)
+        if device:
+            if self._interfaces_by_name.get(device['name']) is device:
+                del self._interfaces_by_name[device['name']]
+            self._new_events['removed'].append(dict(device))
+
+    @property
+    def has_updates(self):
+        with self._lock:
+            return bool(self._new_events['added'] or
+                        self._new_events['removed'])
+
+    def get_events(self):
+        with self._lock:
+            events = self._new_events
+            self._new_events = {'added': [], 'removed': []}
+        return events
+
+    def port_exists(self, port_name):
+        with self._lock:
+            return any(port['name'] == port_name
+                       for port in self._ports.values())
+
+    def _get_bridge_ports(self, bridge_name):
+        for bridge in self._bridges.values():
+            if bridge['name'] == bridge_name:
+                return [self._ports[port_uuid]
+                        for port_uuid in bridge['ports']
+                        if port_uuid in self._ports]
+        return []
+
+    def _cached(self, key, func):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = func()
+            return self._cache[key]
+
+    def get_vif_port_set(self, bridge_name):
+        """Return the iface-id of the VIF ports of a bridge.
+
+        This is the tracker equivalent of OVSBridge.get_vif_port_set().
+        """
+        def _get_vif_port_set():
+            edge_ports = set()
+            for port in self._get_bridge_ports(bridge_name):
+                iface = self._interfaces_by_name.get(port['name'])
+                if not iface:
+                    continue
+                if iface['ofport'] == ovs_lib.UNASSIGNED_OFPORT:
+                    LOG.warning("Found not yet ready openvswitch port: %s",
+                                iface['name'])
+                elif iface['ofport'] == ovs_lib.INVALID_OFPORT:
+                    LOG.warning("Found failed openvswitch port: %s",
+                                iface['name'])
+                elif ('attached-mac' in iface['external_ids'] and
+                        iface['external_ids'].get('iface-id')):
+                    edge_ports.add(iface['external_ids']['iface-id'])
+            return edge_ports
+
+        return set(self._cached(('vif_ports', bridge_name),
+                                _get_vif_port_set))
+
+    def get_port_tag_dict(self, bridge_name):
+        """Return the port names of a bridge and their vlan tags.
+
+        This is the tracker equivalent of OVSBridge.get_port_tag_dict().
+        """
+        def _get_port_tag_dict():
+            return {port['name']: port['tag']
+                    for port in self._get_bridge_ports(bridge_name)}
+
+        return dict(self._cached(('port_tags', bridge_name),
+                                 _get_port_tag_dict))
@@ -12,33 +12,139 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import os
+import time
+
 from neutron_lib.callbacks import events
 from neutron_lib.callbacks import registry
 from neutron_lib import context as n_ctx
+from neutron_lib.utils import file as file_utils
+from oslo_config import cfg
 from oslo_log import log as logging
+import oslo_messaging
+from oslo_serialization import jsonutils
+from oslo_service import loopingcall
+from oslo_utils import fileutils
 
 from neutron.api.rpc.callbacks.consumer import registry as registry_rpc
 from neutron.api.rpc.callbacks import events as events_rpc
+from neutron.api.rpc.callbacks import resources as rpc_resources
 from neutron.api.rpc.handlers import resources_rpc
 from neutron.common import rpc as n_rpc
+from neutron.conf.agent import common as agent_config
 from neutron import objects
+from neutron.objects import base as obj_base
 
 LOG = logging.getLogger(__name__)
 objects.register_objects()
+agent_config.register_resource_cache_opts(cfg.CONF)
+
+SNAPSHOT_VERSION = 1
+
+
+class TombstoneStore(object):
+    """Set of deleted resource IDs with TTL and size based eviction.
+
+    IDs are stored in time-bucketed generations. A new generation is started
+    once the newest one spans more than a fraction of the TTL or holds more
+    than a fraction of max_size, so expiring entries only requires dropping
+    whole generations from the old end. An ID is remembered for at least ttl
+    seconds unless max_size forces the eviction of the oldest generation.
+    A ttl or max_size of 0 disables the corresponding eviction.
+    """
+
+    GENERATIONS = 4
+
+    def __init__(self, ttl, max_size=0):
+        self.ttl = ttl
+        self.max_size = max_size
+        # each generation is [creation time, last addition time, set of IDs]
+        self._generations = collections.deque()
+        self._size = 0
+        self.evicted = 0
+
+    def __contains__(self, obj_id):
+        self._expire()
+        return any(obj_id in gen[2] for gen in self._generations)
+
+    def __len__(self):
+        self._expire()
+        return self._size
+
+    def add(self, obj_id):
+        if obj_id in self:
+            return
+        now = time.time()
+        if self._needs_new_generation(now):
+            self._generations.append([now, now, set()])
+        newest = self._generations[-1]
+        newest[1] = now
+        newest[2].add(obj_id)
+        self._size += 1
+        while (self.max_size and self._size > self.max_size and
+               len(self._generations) > 1):
+            self._evict_oldest()
+
+    def _needs_new_generation(self, now):
+        if not self._generations:
+            return True
+        created, _last, ids = self._generations[-1]
+        if self.ttl and now - created >= float(self.ttl) / self.GENERATIONS:
+            return True
+        return bool(self.max_size and
+                    len(ids) >= max(1, self.max_size // self.GENERATIONS))
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        now = time.time()
+        while self._generations and now - self._generations[0][1] >= self.ttl:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        ids = self._generations.popleft()[2]
+        self._size -= len(ids)
+        self.evicted += len(ids)
+        LOG.debug("Evicted %s deleted resource IDs", len(ids))
 
 
 class RemoteResourceCache(object):
     """Retrieves and stashes logical resources in their OVO format.
 
     This is currently only compatible with OVO objects that have an ID.
+
+    Secondary indexes can be declared per resource type with the indexes
+    argument, a dictionary mapping a resource type to the attributes that
+    should be indexed, e.g. {'Port': ('network_id', 'security_group_ids')}.
+    Attributes that are lists, tuples or sets are indexed by each of their
+    members. Indexes are used by get_resources whenever a filter key is
+    indexed so that lookups don't require a scan of the whole type cache.
+
+    If snapshot_path is given, the cache content can be persisted with
+    save_snapshot and restored with load_snapshot. A restored cache only
+    fetches from the server the objects whose revision number changed.
     """
-    def __init__(self, resource_types):
+    def __init__(self, resource_types, indexes=None, snapshot_path=None):
         self.resource_types = resource_types
         self._cache_by_type_and_id = {rt: {} for rt in self.resource_types}
-        self._deleted_ids_by_type = {rt: set() for rt in self.resource_types}
+        self._deleted_ids_by_type = {
+            rt: TombstoneStore(cfg.CONF.AGENT.resource_cache_tombstone_ttl,
+                               cfg.CONF.AGENT.resource_cache_max_tombstones)
+            for rt in self.resource_types}
+        # rtype -> indexed attribute -> attribute value -> set of object IDs
+        indexes = indexes or {}
+        self._indexes_by_type = {
+            rt: {attr: collections.defaultdict(set)
+                 for attr in indexes.get(rt, ())}
+            for rt in self.resource_types}
         # track everything we've asked the server so we don't ask again
         self._satisfied_server_queries = set()
         self._puller = resources_rpc.ResourcesPullRpcApi()
+        self._snapshot_path = snapshot_path
+        # set once the cache is loaded from a snapshot, queries then only
+        # pull the objects that are missing or outdated
+        self._warm = False
 
     def _type_cache(self, rtype):
         if rtype not in self.resource_types:
@@ -48,6 +154,123 @@ class RemoteResourceCache(object):
     def start_watcher(self):
         self._watcher = RemoteResourceWatcher(self)
 
+    def start_snapshot_saver(self, interval):
+        """Periodically saves the cache snapshot every interval seconds."""
+        if not self._snapshot_path or not interval:
+            return
+        self._snapshot_saver = loopingcall.FixedIntervalLoopingCall(
+            self.save_snapshot)
+        self._snapshot_saver.start(interval=interval, initial_delay=interval)
+
+    def save_snapshot(self):
+        """Writes the OVO primitives of all cached resources to disk."""
+        if not self._snapshot_path:
+            return
+        snapshot = {'version': SNAPSHOT_VERSION, 'resources': {}}
+        for rtype in self.resource_types:
+            snapshot['resources'][rtype] = {
+                'version': rpc_resources.get_resource_cls(rtype).VERSION,
+                'objects': [r.obj_to_primitive()
+                            for r in list(self._type_cache(rtype).values())]}
+        try:
+            fileutils.ensure_tree(os.path.dirname(self._snapshot_path),
+                                  mode=0o755)
+            file_utils.replace_file(self._snapshot_path,
+                                    jsonutils.dumps(snapshot))
+        except (IOError, OSError):
+            LOG.exception("Failed to save resource cache snapshot to %s",
+                          self._snapshot_path)
+            return
+        LOG.debug("Saved resource cache snapshot to %s", self._snapshot_path)
+
+    def load_snapshot(self):
+        """Loads the cache from the snapshot and reconciles it.
+
+        The revision numbers of the restored objects are checked against the
+        server, objects that were deleted are dropped and objects that were
+        updated are fetched again. Resource types whose object version
+        changed since the snapshot was written are ignored.
+        """
+        if not self._snapshot_path:
+            return
+        try:
+            with open(self._snapshot_path) as f:
+                snapshot = jsonutils.loads(f.read())
+        except (IOError, OSError):
+            LOG.info("No resource cache snapshot found at %s",
+                     self._snapshot_path)
+            return
+        except ValueError:
+            LOG.warning("Ignoring corrupted resource cache snapshot %s",
+                        self._snapshot_path)
+            return
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            LOG.info("Ignoring resource cache snapshot with version %s",
+                     snapshot.get('version'))
+            return
+        context = n_ctx.get_admin_context()
+        restored = {}
+        try:
+            for rtype, data in snapshot['resources'].items():
+                if (rtype not in self.resource_types or data['version'] !=
+                        rpc_resources.get_resource_cls(rtype).VERSION):
+                    continue
+                objs = [obj_base.NeutronObject.clean_obj_from_primitive(p)
+                        for p in data['objects']]
+                restored[rtype] = self._reconcile_snapshot(
+                    context, rtype, objs)
+        except oslo_messaging.UnsupportedVersion:
+            LOG.info("The server does not support revision queries, "
+                     "ignoring the resource cache snapshot")
+            for rtype, obj_ids in restored.items():
+                for obj_id in obj_ids:
+                    self._remove_resource(rtype, obj_id)
+            return
+        self._warm = True
+        LOG.info("Loaded resource cache snapshot from %s",
+                 self._snapshot_path)
+
+    def _reconcile_snapshot(self, context, rtype, snapshot_objs):
+        """Restores the up to date snapshot objects of rtype.
+
+        The watcher is already running, objects pushed or deleted by the
+        server while the snapshot is reconciled are more recent than their
+        snapshot copy and are kept as they are.
+
+        Returns the IDs of the objects restored from the snapshot.
+        """
+        by_id = {obj.id: obj for obj in snapshot_objs}
+        if not by_id:
+            return []
+        revisions = self._puller.bulk_pull_revisions(
+            context, rtype, filter_kwargs={'id': tuple(by_id)})
+        type_cache = self._type_cache(rtype)
+        deleted_ids = self._deleted_ids_by_type[rtype]
+        restored = []
+        changed = []
+        for obj_id, revision_number in revisions.items():
+            obj = by_id.get(obj_id)
+            if obj_id in type_cache or obj_id in deleted_ids:
+                continue
+            if obj and obj.revision_number == revision_number:
+                # restored silently, agent internals only get notified
+                # about changes
+                type_cache[obj_id] = obj
+                self._update_indexes(rtype, None, obj)
+                restored.append(obj_id)
+            else:
+                changed.append(obj_id)
+        LOG.debug("Restored %(restored)s %(rtype)s resources from snapshot, "
+                  "%(changed)s changed and %(deleted)s deleted",
+                  {'rtype': rtype, 'restored': len(restored),
+                   'changed': len(changed),
+                   'deleted': len(by_id) - len(revisions)})
+        if changed:
+            for resource in self._bulk_pull(context, rtype,
+                                            {'id': tuple(changed)}):
+                self.record_resource_update(context, rtype, resource)
+        return restored
+
     def get_resource_by_id(self, rtype, obj_id, agent_restarted=False):
         """Returns None if it doesn't exist."""
         if obj_id in self._deleted_ids_by_type[rtype]:
@@ -74,8 +297,11 @@ class RemoteResourceCache(object):
             # pushed to us
             return
         context = n_ctx.get_admin_context()
-        resources = self._puller.bulk_pull(context, rtype,
-                                           filter_kwargs=filter_kwargs)
+        if self._warm:
+            resources = self._pull_outdated_resources(context, rtype,
+                                                      filter_kwargs)
+        else:
+            resources = self._bulk_pull(context, rtype, filter_kwargs)
         for resource in resources:
             if self._is_stale(rtype, resource):
                 # if the server was slow enough to respond the object may have
@@ -88,6 +314,28 @@ class RemoteResourceCache(object):
                   query_ids)
         self._satisfied_server_queries.update(query_ids)
 
+    def _bulk_pull(self, context, rtype, filter_kwargs):
+        return self._puller.bulk_pull(
+            context, rtype, filter_kwargs=filter_kwargs,
+            page_size=cfg.CONF.AGENT.resource_cache_pull_page_size)
+
+    def _pull_outdated_resources(self, context, rtype, filter_kwargs):
+        """Pulls the objects matching a query that are missing or outdated.
+
+        Only the IDs and revision numbers of all matching objects are
+        retrieved, full objects are pulled for those not up to date in the
+        cache.
+        """
+        revisions = self._puller.bulk_pull_revisions(
+            context, rtype, filter_kwargs=filter_kwargs)
+        type_cache = self._type_cache(rtype)
+        outdated = [obj_id for obj_id, revision_number in revisions.items()
+                    if obj_id not in type_cache or
+                    type_cache[obj_id].revision_number < revision_number]
+        if not outdated:
+            return []
+        return self._bulk_pull(context, rtype, {'id': tuple(outdated)})
+
     def _get_query_ids(self, rtype, filters):
         """Turns filters for a given rypte into a set of query IDs.
 
@@ -119,6 +367,9 @@ class RemoteResourceCache(object):
 
         The values in the dicionary for a single key are matched in an OR
         fashion.
+
+        If any of the filter keys is indexed for rtype, only the objects
+        found through the index are checked against the remaining filters.
         """
         self._flood_cache_for_query(rtype, **filters)
 
@@ -137,14 +388,70 @@ class RemoteResourceCache(object):
                     # no match found for this key
                     return False
             return True
-        return self.match_resources_with_func(rtype, match)
+
+        candidate_ids = self._get_indexed_ids(rtype, filters)
+        if candidate_ids is None:
+            return self.match_resources_with_func(rtype, match)
+        type_cache = self._type_cache(rtype)
+        return [type_cache[obj_id] for obj_id in candidate_ids
+                if match(type_cache[obj_id])]
 
     def match_resources_with_func(self, rtype, matcher):
-        """Returns a list of all resources satisfying func matcher."""
-        # TODO(kevinbenton): this is O(N), offer better lookup functions
+        """Returns a list of all resources satisfying func matcher.
+
+        This is O(N) in the number of cached resources of type rtype, use
+        get_resources with indexed filters for hot lookups.
+        """
         return [r for r in self._type_cache(rtype).values()
                 if matcher(r)]
 
+    def _get_indexed_ids(self, rtype, filters):
+        """Returns the IDs of objects matching the indexed filters.
+
+        Values for a single key are combined with a union and the results
+        for different keys with an intersection. Returns None if none of the
+        filter keys are indexed for rtype.
+        """
+        indexes = self._indexes_by_type.get(rtype, {})
+        candidate_ids = None
+        for key, values in filters.items():
+            index = indexes.get(key)
+            if index is None:
+                continue
+            ids = set()
+            for value in values:
+                ids.update(index.get(value, ()))
+            candidate_ids = (ids if candidate_ids is None
+                             else candidate_ids & ids)
+            if not candidate_ids:
+                break
+        return candidate_ids
+
+    @staticmethod
+    def _get_index_values(resource, attr):
+        if resource is None:
+            return set()
+        value = getattr(resource, attr)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return set(value)
+        return {value}
+
+    def _update_indexes(self, rtype, old, new):
+        """Moves the object ID between index buckets for changed values."""
+        for attr, index in self._indexes_by_type[rtype].items():
+            old_values = self._get_index_values(old, attr)
+            new_values = self._get_index_values(new, attr)
+            obj_id = (new or old).id
+            for value in old_values - new_values:
+                ids = index.get(value)
+                if ids is None:
+                    continue
+                ids.discard(obj_id)
+                if not ids:
+                    del index[value]
+            for value in new_values - old_values:
+                index[value].add(obj_id)
+
     def _is_stale(self, rtype, resource):
         """Determines if a given resource update is safe to ignore.
 
@@ -175,6 +482,7 @@ class RemoteResourceCache(object):
             return
         existing = self._type_cache(rtype).get(resource.id)
         self._type_cache(rtype)[resource.id] = resource
+        self._update_indexes(rtype, existing, resource)
         changed_fields = self._get_changed_fields(existing, resource)
         if not changed_fields:
             LOG.debug("Received resource %s update without any changes: %s",
@@ -197,32 +505,92 @@ class RemoteResourceCache(object):
                         agent_restarted=agent_restarted)
 
     def record_resource_delete(self, context, rtype, resource_id):
-        # deletions are final, record them so we never
-        # accept new data for the same ID.
+        # deletions are final, record them so we never accept new data for
+        # the same ID while it is remembered by the tombstone store.
         LOG.debug("Resource %s deleted: %s", rtype, resource_id)
-        # TODO(kevinbenton): we need a way to expire items from the set at
-        # some TTL so it doesn't grow indefinitely with churn
         if resource_id in self._deleted_ids_by_type[rtype]:
             LOG.debug("Skipped duplicate delete event for %s", resource_id)
             return
         self._deleted_ids_by_type[rtype].add(resource_id)
-        existing = self._type_cache(rtype).pop(resource_id, None)
+        existing = self._remove_resource(rtype, resource_id)
         # local notification for agent internals to subscribe to
         registry.notify(rtype, events.AFTER_DELETE, self, context=context,
                         existing=existing, resource_id=resource_id)
 
-    def _get_changed_fields(self, old, new):
-        """Returns changed fields excluding update time and revision."""
-        new = new.to_dict()
-        changed = set(new)
+    def _remove_resource(self, rtype, resource_id):
+        existing = self._type_cache(rtype).pop(resource_id, None)
+        if existing:
+            self._update_indexes(rtype, existing, None)
+        return existing
+
+    def get_tombstone_stats(self):
+        """Returns the number of held and evicted tombstones per type."""
+        return {rtype: {'held': len(store), 'evicted': store.evicted}
+                for rtype, store in self._deleted_ids_by_type.items()}
+
+    @classmethod
+    def _get_changed_fields(cls, old, new):
+        """Returns changed fields excluding update time and revision.
+
+        Fields are compared on the objects themselves rather than on their
+        to_dict() representation, which is expensive to build for resources
+        with nested objects like ports. An update carrying the revision
+        number of the cached copy is the same version of the resource and
+        is not compared at all.
+        """
+        if old and old.revision_number == new.revision_number:
+            return set()
+        changed = cls._get_set_fields(new)
         if old:
-            for k, v in old.to_dict().items():
-                if v == new.get(k):
-                    changed.discard(k)
+            old_fields = cls._get_set_fields(old)
+            changed = {f for f in changed
+                       if f not in old_fields or
+                       not cls._values_equal(getattr(old, f),
+                                             getattr(new, f))}
         for ignore in ('revision_number', 'updated_at'):
             changed.discard(ignore)
         return changed
 
+    @staticmethod
+    def _get_set_fields(obj):
+        # same keys as returned by to_dict()
+        fields = set(obj)
+        if ('tenant_id' in fields and 'project_id' in obj.fields and
+                not obj.obj_attr_is_set('project_id')):
+            fields.discard('tenant_id')
+        return fields
+
+    @classmethod
+    def _values_equal(cls, old, new):
+        if old is new:
+            return True
+        if isinstance(old, obj_base.NeutronObject):
+            return cls._objects_equal(old, new)
+        if isinstance(old, (list, tuple)):
+            return (isinstance(new, (list, tuple)) and
+                    len(old) == len(new) and
+                    all(cls._values_equal(o, n) for o, n in zip(old, new)))
+        return old == new
+
+    @classmethod
+    def _objects_equal(cls, old, new):
+        # NOTE: NeutronObject.__eq__ serializes both objects with
+        # obj_to_primitive, which also includes the object version and the
+        # list of changed fields. Instead, objects of the same class are
+        # equal if the same fields are set and all set fields have equal
+        # values; nested objects, lists and tuples are compared recursively,
+        # other values with ==, stopping at the first difference.
+        if type(old) is not type(new):
+            return False
+        for field in old.fields:
+            is_set = old.obj_attr_is_set(field)
+            if is_set != new.obj_attr_is_set(field):
+                return False
+            if is_set and not cls._values_equal(getattr(old, field),
+                                                getattr(new, field)):
+                return False
+        return True
+
 
 class RemoteResourceWatcher(object):
     """Converts RPC callback notifications to local registry notifications.
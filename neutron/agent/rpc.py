@@ -24,6 +24,7 @@ from neutron_lib.callbacks import registry
 from neutron_lib.callbacks import resources as callback_resources
 from neutron_lib import constants
 from neutron_lib.plugins import utils
+from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
 from oslo_utils import uuidutils
@@ -195,8 +196,21 @@ def create_cache_for_l2_agent():
         resources.NETWORK,
         resources.SUBNET
     ]
-    rcache = resource_cache.RemoteResourceCache(resource_types)
+    # attributes used in get_resources filters by the agent side handlers
+    indexes = {
+        resources.PORT: ('network_id', 'security_group_ids', 'device_owner'),
+        resources.SECURITYGROUPRULE: ('security_group_id', ),
+        resources.SUBNET: ('network_id', ),
+    }
+    rcache = resource_cache.RemoteResourceCache(
+        resource_types, indexes=indexes,
+        snapshot_path=cfg.CONF.AGENT.resource_cache_snapshot_path)
+    # the watcher is started first so that no update pushed by the server
+    # while the snapshot is reconciled is missed
     rcache.start_watcher()
+    rcache.load_snapshot()
+    rcache.start_snapshot_saver(
+        cfg.CONF.AGENT.resource_cache_snapshot_interval)
     return rcache
 
 
@@ -19,7 +19,8 @@ from neutron.agent.common import base_polling
 
 
 @contextlib.contextmanager
-def get_polling_manager(minimize_polling, ovsdb_monitor_respawn_interval):
+def get_polling_manager(minimize_polling, ovsdb_monitor_respawn_interval,
+                        ovsdb_port_monitor=None):
     pm = base_polling.AlwaysPoll()
     yield pm
 
@@ -28,3 +29,7 @@ def get_polling_manager(minimize_polling, ovsdb_monitor_respawn_interval):
 # that fully fledged polling manager interface
 class InterfacePollingMinimizer(object):
     pass
+
+
+class PortTrackerPollingMinimizer(object):
+    pass
@@ -88,6 +88,8 @@ class ResourcesPullRpcApi(object):
                 topic=topics.PLUGIN, version='1.1',
                 namespace=constants.RPC_NAMESPACE_RESOURCES)
             cls._instance.client = n_rpc.get_client(target)
+            # cleared once the server is found not to support pagination
+            cls._instance.pagination_supported = True
         return cls._instance
 
     @log_helpers.log_method_call
@@ -104,8 +106,24 @@ class ResourcesPullRpcApi(object):
         return resource_type_cls.clean_obj_from_primitive(primitive)
 
     @log_helpers.log_method_call
-    def bulk_pull(self, context, resource_type, filter_kwargs=None):
+    def bulk_pull(self, context, resource_type, filter_kwargs=None,
+                  page_size=None):
+        """Pulls all the objects matching filter_kwargs.
+
+        If page_size is set, the objects are retrieved with several calls
+        returning up to page_size objects each, to keep RPC replies small.
+        The whole result set is retrieved at once if the server doesn't
+        support pagination.
+        """
         resource_type_cls = _resource_to_class(resource_type)
+        if page_size and self.pagination_supported:
+            try:
+                return self._bulk_pull_pages(context, resource_type,
+                                             filter_kwargs, page_size)
+            except oslo_messaging.UnsupportedVersion:
+                LOG.info("Paginated bulk_pull is not supported by the "
+                         "server, falling back to a single bulk_pull")
+                self.pagination_supported = False
         cctxt = self.client.prepare()
         primitives = cctxt.call(context, 'bulk_pull',
             resource_type=resource_type,
@@ -113,6 +131,35 @@ class ResourcesPullRpcApi(object):
         return [resource_type_cls.clean_obj_from_primitive(primitive)
                 for primitive in primitives]
 
+    def _bulk_pull_pages(self, context, resource_type, filter_kwargs,
+                         page_size):
+        resource_type_cls = _resource_to_class(resource_type)
+        cctxt = self.client.prepare(version='1.3')
+        result = []
+        marker = None
+        while True:
+            primitives = cctxt.call(context, 'bulk_pull',
+                resource_type=resource_type,
+                version=resource_type_cls.VERSION,
+                filter_kwargs=filter_kwargs, marker=marker, limit=page_size)
+            result.extend(resource_type_cls.clean_obj_from_primitive(p)
+                          for p in primitives)
+            if len(primitives) < page_size:
+                return result
+            marker = result[-1].id
+
+    @log_helpers.log_method_call
+    def bulk_pull_revisions(self, context, resource_type, filter_kwargs=None):
+        """Returns a dictionary of revision numbers keyed by object ID.
+
+        Raises oslo_messaging.UnsupportedVersion if the server is too old.
+        """
+        _validate_resource_type(resource_type)
+        cctxt = self.client.prepare(version='1.2')
+        revisions = cctxt.call(context, 'bulk_pull_revisions',
+            resource_type=resource_type, filter_kwargs=filter_kwargs)
+        return dict(revisions)
+
 
 class ResourcesPullRpcCallback(object):
     """Plugin-side RPC (implementation) for agent-to-plugin interaction.
@@ -125,9 +172,11 @@ class ResourcesPullRpcCallback(object):
     # History
     #   1.0 Initial version
     #   1.1 Added bulk_pull
+    #   1.2 Added bulk_pull_revisions
+    #   1.3 Added marker and limit to bulk_pull
 
     target = oslo_messaging.Target(
-        version='1.1', namespace=constants.RPC_NAMESPACE_RESOURCES)
+        version='1.3', namespace=constants.RPC_NAMESPACE_RESOURCES)
 
     @oslo_messaging.expected_exceptions(rpc_exc.CallbackNotFound)
     def pull(self, context, resource_type, version, resource_id):
@@ -136,14 +185,27 @@ class ResourcesPullRpcCallback(object):
             return obj.obj_to_primitive(target_version=version)
 
     @oslo_messaging.expected_exceptions(rpc_exc.CallbackNotFound)
-    def bulk_pull(self, context, resource_type, version, filter_kwargs=None):
+    def bulk_pull(self, context, resource_type, version, filter_kwargs=None,
+                  marker=None, limit=None):
         filter_kwargs = filter_kwargs or {}
         resource_type_cls = _resource_to_class(resource_type)
         # TODO(kevinbenton): add in producer registry so producers can add
         # hooks to mangle these things like they can with 'pull'.
-        return [obj.obj_to_primitive(target_version=version)
-                for obj in resource_type_cls.get_objects(context, _pager=None,
-                                                         **filter_kwargs)]
+        if limit:
+            objs = resource_type_cls.get_objects_page(
+                context, marker=marker, limit=limit, **filter_kwargs)
+        else:
+            objs = resource_type_cls.get_objects(context, _pager=None,
+                                                 **filter_kwargs)
+        return [obj.obj_to_primitive(target_version=version) for obj in objs]
+
+    @oslo_messaging.expected_exceptions(rpc_exc.CallbackNotFound)
+    def bulk_pull_revisions(self, context, resource_type, filter_kwargs=None):
+        filter_kwargs = filter_kwargs or {}
+        resource_type_cls = _resource_to_class(resource_type)
+        return [[obj_id, revision_number] for obj_id, revision_number in
+                resource_type_cls.get_revision_numbers(context,
+                                                       **filter_kwargs)]
 
 
 class ResourcesPushToServersRpcApi(object):
@@ -11,8 +11,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import functools
+import threading
+import time
 
+from neutron_lib.callbacks import registry
 from neutron_lib.utils import helpers
 from oslo_cache import core as cache
 from oslo_config import cfg
@@ -56,6 +60,170 @@ def _get_memory_cache_region(expiration_time=5):
     return _get_cache_region(conf)
 
 
+class LRUCache(object):
+    """In-process least recently used cache.
+
+    Unlike the oslo.cache regions, entries do not need to expire after a
+    fixed time to be kept up to date: the cache can be bound to callback
+    registry events with subscribe() to invalidate an entry as soon as the
+    resource it was computed from changes, e.g.::
+
+        self._cache = cache_utils.LRUCache(max_size=1000)
+        self._cache.subscribe(resources.PORT,
+                              [events.AFTER_UPDATE, events.AFTER_DELETE])
+        port = self._cache.get_or_load(port_id, self._get_port,
+                                       context, port_id)
+
+    A None value is cached as a negative entry, which can be given a
+    shorter lifetime than the other entries with negative_ttl.
+
+    The cache provides the get() and set() methods of a cache region and
+    can be used as the _cache of the cache_method_results decorator.
+    """
+
+    def __init__(self, max_size, ttl=0, negative_ttl=None):
+        """
+        :param max_size: maximum number of entries, the least recently used
+                         entry is evicted to make room for a new one.
+        :param ttl: number of seconds an entry is valid, 0 means forever.
+        :param negative_ttl: number of seconds a None value is valid,
+                             defaults to ttl.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # number of get_or_load calls loading each key and number of
+        # invalidations of these keys since the loads started
+        self._loading = collections.Counter()
+        self._load_invalidations = collections.Counter()
+        self._clear_count = 0
+        self._stats = {'hits': 0,
+                       'negative_hits': 0,
+                       'misses': 0,
+                       'evictions': 0,
+                       'expirations': 0,
+                       'invalidations': 0}
+
+    def get(self, key):
+        """Returns the cached value of key or NO_VALUE."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[1] and entry[1] <= time.time():
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return cache.NO_VALUE
+            # re-inserted as the most recently used entry
+            self._entries[key] = entry
+            value = entry[0]
+            if value is None:
+                self._stats['negative_hits'] += 1
+            else:
+                self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+
+    def _set(self, key, value):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        expires = time.time() + ttl if ttl else 0
+        self._entries.pop(key, None)
+        self._entries[key] = (value, expires)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get_or_load(self, key, load_func, *args, **kwargs):
+        """Returns the cached value of key, loading it on a miss.
+
+        load_func is called with args and kwargs and its result is cached,
+        a None result as a negative entry. The result is returned but not
+        cached if the key is invalidated while load_func runs, as it may
+        have been computed from outdated data.
+        """
+        value = self.get(key)
+        if value is not cache.NO_VALUE:
+            return value
+        with self._lock:
+            self._loading[key] += 1
+            generation = (self._clear_count, self._load_invalidations[key])
+        try:
+            value = load_func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._end_load(key)
+            raise
+        with self._lock:
+            if generation == (self._clear_count,
+                              self._load_invalidations[key]):
+                self._set(key, value)
+            self._end_load(key)
+        return value
+
+    def _end_load(self, key):
+        self._loading[key] -= 1
+        if not self._loading[key]:
+            del self._loading[key]
+            self._load_invalidations.pop(key, None)
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._loading:
+                self._load_invalidations[key] += 1
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._clear_count += 1
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def subscribe(self, resource, event_types, key_func=None):
+        """Invalidates cached entries on callback registry events.
+
+        :param resource: the resource type of the events.
+        :param event_types: the events invalidating an entry.
+        :param key_func: called with the arguments of the event, returns
+                         the key of the entry to invalidate or None to
+                         invalidate all entries. By default the key is the
+                         ID of the resource of the event.
+        """
+        key_func = key_func or _get_event_resource_id
+
+        def _invalidate(resource, event, trigger, **kwargs):
+            key = key_func(resource, event, trigger, **kwargs)
+            if key is None:
+                self.clear()
+            else:
+                self.invalidate(key)
+
+        for event_type in event_types:
+            registry.subscribe(_invalidate, resource, event_type)
+
+    def get_stats(self):
+        """Returns the number of entries and the lookup counters."""
+        stats = dict(self._stats)
+        stats['size'] = len(self._entries)
+        return stats
+
+
+def _get_event_resource_id(resource, event, trigger, payload=None,
+                           **kwargs):
+    if payload is not None:
+        return payload.resource_id
+    # events without payload pass the resource with its type as keyword
+    resource_dict = kwargs.get(resource)
+    if resource_dict is not None:
+        return resource_dict['id']
+    return kwargs.get('%s_id' % resource)
+
+
 class cache_method_results(object):
     """This decorator is intended for object methods only."""
 
@@ -271,3 +271,7 @@ RPC_RES_PROCESSING_STEP = 20
 # IPtables version to support --random-fully option.
 # Do not move this constant to neutron-lib, since it is temporary
 IPTABLES_RANDOM_FULLY_VERSION = '1.6.2'
+
+# Backends of the iptables manager API
+PACKET_FILTER_BACKEND_IPTABLES = 'iptables'
+PACKET_FILTER_BACKEND_NFTABLES = 'nftables'
@@ -136,6 +136,28 @@ IPTABLES_OPTS = [
                        "of iptables-save. This option should not be turned "
                        "on for production systems because it imposes a "
                        "performance penalty.")),
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_("Compute the iptables changes to apply from the rules "
+                       "applied by the previous run instead of running "
+                       "iptables-save every time. The rules are only read "
+                       "back from iptables every "
+                       "iptables_full_resync_interval seconds and after a "
+                       "failure, so changes made by other tools in between "
+                       "are not detected until then.")),
+    cfg.IntOpt('iptables_full_resync_interval', default=300, min=0,
+               help=_("Interval in seconds between two full resyncs of the "
+                      "iptables rules when iptables_incremental_apply is "
+                      "enabled. 0 disables the periodic resync.")),
+    cfg.BoolOpt('conntrack_netlink_delete', default=False,
+                help=_("Delete the conntrack entries of the removed security "
+                       "group rules and members through netlink, batching "
+                       "the deletions queued meanwhile, instead of running "
+                       "a conntrack command per device, rule and remote "
+                       "IP. Only the TCP, UDP and ICMP entries can be "
+                       "deleted through netlink, the deletions of rules "
+                       "of other protocols or without a protocol, of "
+                       "removed members and in namespaces still use the "
+                       "conntrack command.")),
 ]
 
 PROCESS_MONITOR_OPTS = [
@@ -147,6 +169,34 @@ PROCESS_MONITOR_OPTS = [
                       '(seconds), use 0 to disable')),
 ]
 
+RESOURCE_CACHE_OPTS = [
+    cfg.IntOpt('resource_cache_tombstone_ttl', default=3600, min=0,
+               help=_("Number of seconds the IDs of deleted resources are "
+                      "remembered by the agent resource cache in order to "
+                      "discard stale updates received out of order. Use 0 "
+                      "to only expire them based on "
+                      "resource_cache_max_tombstones.")),
+    cfg.IntOpt('resource_cache_max_tombstones', default=100000, min=0,
+               help=_("Maximum number of deleted resource IDs remembered by "
+                      "the agent resource cache for each resource type. The "
+                      "oldest IDs are evicted first when the limit is "
+                      "reached. Use 0 for no limit.")),
+    cfg.IntOpt('resource_cache_pull_page_size', default=500, min=0,
+               help=_("Maximum number of resources returned by each RPC "
+                      "reply when the agent resource cache pulls resources "
+                      "from the server. Use 0 to pull all the resources "
+                      "matching a query in a single reply.")),
+    cfg.StrOpt('resource_cache_snapshot_path',
+               help=_("File where the agent resource cache is persisted "
+                      "periodically and on shutdown. When set, the snapshot "
+                      "is loaded on start and only the resources whose "
+                      "revision number changed on the server are fetched "
+                      "again. Disabled by default.")),
+    cfg.IntOpt('resource_cache_snapshot_interval', default=300, min=0,
+               help=_("Seconds between resource cache snapshots. Use 0 to "
+                      "only write the snapshot on shutdown.")),
+]
+
 AVAILABILITY_ZONE_OPTS = [
     # The default AZ name "nova" is selected to match the default
     # AZ name in Nova and Cinder.
@@ -231,6 +281,10 @@ def register_process_monitor_opts(conf):
     conf.register_opts(PROCESS_MONITOR_OPTS, 'AGENT')
 
 
+def register_resource_cache_opts(conf):
+    conf.register_opts(RESOURCE_CACHE_OPTS, 'AGENT')
+
+
 def register_availability_zone_opts_helper(conf):
     conf.register_opts(AVAILABILITY_ZONE_OPTS, 'AGENT')
 
@@ -18,6 +18,7 @@ from neutron_lib import constants
 from oslo_config import cfg
 
 from neutron._i18n import _
+from neutron.common import constants as n_const
 from neutron.conf.agent import common as config
 
 
@@ -109,6 +110,15 @@ OPTS = [
                       '(by default), the user executing the L3 agent will be '
                       'passed. If "root" specified, because radvd is spawned '
                       'as root, no "username" parameter will be passed.')),
+    cfg.StrOpt('packet_filter_backend',
+               default=n_const.PACKET_FILTER_BACKEND_IPTABLES,
+               choices=(n_const.PACKET_FILTER_BACKEND_IPTABLES,
+                        n_const.PACKET_FILTER_BACKEND_NFTABLES),
+               help=_("Backend applying the NAT, mangle and filter rules of "
+                      "the routers. 'nftables' applies the IPv4 and IPv6 "
+                      "rules of a namespace in a single nftables "
+                      "transaction and requires the nft tool and the "
+                      "iptables-restore-translate tool of iptables-nft.")),
 ]
 
 OPTS += config.EXT_NET_BRIDGE_OPTS
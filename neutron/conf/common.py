@@ -110,6 +110,10 @@ core_opts = [
     cfg.IntOpt('send_events_interval', default=2,
                help=_('Number of seconds between sending events to nova if '
                       'there are any events to send.')),
+    cfg.IntOpt('send_events_max_batch_size', default=0, min=0,
+               help=_('Maximum number of events sent to nova in a single '
+                      'request. Larger batches are split in several '
+                      'requests. 0 means unlimited.')),
     cfg.StrOpt('ipam_driver', default='internal',
                help=_("Neutron IPAM (IP address management) driver to use. "
                       "By default, the reference implementation of the "
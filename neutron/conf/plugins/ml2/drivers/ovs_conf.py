@@ -109,6 +109,17 @@ agent_opts = [
                default=constants.DEFAULT_OVSDBMON_RESPAWN,
                help=_("The number of seconds to wait before respawning the "
                       "ovsdb monitor after losing communication with it.")),
+    cfg.StrOpt('ovsdb_port_monitor',
+               default=constants.OVSDB_MONITOR_CLIENT,
+               choices=[constants.OVSDB_MONITOR_CLIENT,
+                        constants.OVSDB_MONITOR_NATIVE],
+               help=_("How ovsdb is monitored for port changes when "
+                      "minimize_polling is enabled. 'ovsdb-client' parses "
+                      "the output of an 'ovsdb-client monitor' process. "
+                      "'native' tracks the bridges, ports and interfaces "
+                      "in an in-process OVSDB IDL, which is also used "
+                      "instead of full OVSDB queries to find the VIF ports "
+                      "and their VLAN tags.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre, vxlan and/or geneve).")),
@@ -138,7 +149,41 @@ agent_opts = [
                        "outgoing IP packet carrying GRE/VXLAN tunnel.")),
     cfg.StrOpt('agent_type', default=n_const.AGENT_TYPE_OVS,
                deprecated_for_removal=True,
-               help=_("Selects the Agent Type reported"))
+               help=_("Selects the Agent Type reported")),
+    cfg.IntOpt('device_details_chunk_size', default=0, min=0,
+               help=_("Number of devices whose details are fetched from the "
+                      "server in a single request when wiring added or "
+                      "updated ports. The details of the next chunk of "
+                      "devices are fetched while the ports of the current "
+                      "chunk are wired. 0 fetches the details of all the "
+                      "devices at once before wiring them.")),
+    cfg.IntOpt('stale_flows_cleanup_batch_size', default=0, min=0,
+               help=_("Number of OpenFlow tables whose stale flows are "
+                      "deleted in each iteration of the agent loop, after "
+                      "the agent restarted. The agent keeps processing port "
+                      "events until the stale flows of all the tables are "
+                      "deleted. 0 deletes the stale flows of all the bridges "
+                      "in a single iteration.")),
+    cfg.BoolOpt('skip_unchanged_port_flows', default=False,
+                help=_("Install the ARP spoofing protection flows of each "
+                       "port with their own cookie, and store the cookie and "
+                       "a fingerprint of the port configuration they depend "
+                       "on in the other_config column of the port in OVSDB. "
+                       "The flows of the ports whose fingerprint did not "
+                       "change and whose flows are still installed are not "
+                       "reinstalled when the agent restarts or when the "
+                       "ports are updated.")),
+    cfg.StrOpt('rpc_loop_stats_file',
+               help=_("File where the agent writes, as JSON, histograms of "
+                      "the time spent in each phase of its main loop "
+                      "iterations. The file is rewritten after every "
+                      "iteration. By default the statistics aren't "
+                      "written.")),
+    cfg.IntOpt('rpc_loop_slow_threshold', default=30, min=0,
+               help=_("Number of seconds above which an iteration of the "
+                      "agent main loop is logged as slow, with the time "
+                      "spent in each of its phases. 0 disables the "
+                      "logging.")),
 ]
 
 
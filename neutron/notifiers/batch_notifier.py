@@ -10,31 +10,62 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import itertools
+import threading
+import time
+
 import eventlet
-from neutron_lib.utils import runtime
-from oslo_utils import uuidutils
 
 
 class BatchNotifier(object):
-    def __init__(self, batch_interval, callback):
-        self.pending_events = []
+    def __init__(self, batch_interval, callback, max_batch_size=0,
+                 key_func=None):
+        """Batches queued events and sends them with callback.
+
+        :param batch_interval: minimum number of seconds between two sends.
+        :param callback: called with the list of events to send.
+        :param max_batch_size: maximum number of events passed to a single
+                               callback call, 0 means unlimited. Larger
+                               backlogs are sent in several consecutive
+                               calls.
+        :param key_func: optional function returning a key for an event.
+                         A queued event replaces any pending event with the
+                         same key, so only the last event per key is sent.
+        """
+        self._pending = collections.OrderedDict()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._flusher_running = False
         self.callback = callback
         self.batch_interval = batch_interval
-        self._lock_identifier = 'notifier-%s' % uuidutils.generate_uuid()
+        self.max_batch_size = max_batch_size
+        self.key_func = key_func
+        self._stats = {'events_queued': 0,
+                       'events_coalesced': 0,
+                       'events_sent': 0,
+                       'batches_sent': 0,
+                       'last_batch_size': 0,
+                       'largest_batch_size': 0,
+                       'last_flush_latency': 0.0,
+                       'max_flush_latency': 0.0}
+
+    @property
+    def pending_events(self):
+        return list(self._pending.values())
 
     def queue_event(self, event):
         """Called to queue sending an event with the next batch of events.
 
         Sending events individually, as they occur, has been problematic as it
         can result in a flood of sends.  Previously, there was a loopingcall
-        thread that would send batched events on a periodic interval.  However,
-        maintaining a persistent thread in the loopingcall was also
-        problematic.
+        thread that would send batched events on a periodic interval, and
+        after that a short-lived thread was spawned for every queued event.
 
-        This replaces the loopingcall with a mechanism that creates a
-        short-lived thread on demand whenever an event is queued. That thread
-        will wait for a lock, send all queued events and then sleep for
-        'batch_interval' seconds to allow other events to queue up.
+        A single flusher thread is now started when an event is queued and
+        none is running. It sends all queued events and then sleeps for
+        'batch_interval' seconds to allow other events to queue up, and exits
+        once no event was queued while it was sleeping.
 
         This effectively acts as a rate limiter to only allow 1 batch per
         'batch_interval' seconds.
@@ -44,21 +75,62 @@ class BatchNotifier(object):
         if not event:
             return
 
-        self.pending_events.append(event)
+        key = self.key_func(event) if self.key_func else next(self._sequence)
+        with self._lock:
+            self._stats['events_queued'] += 1
+            # the replaced event is dropped and the new one goes to the end
+            # of the queue, preserving the order of the last events per key
+            if self._pending.pop(key, None) is not None:
+                self._stats['events_coalesced'] += 1
+            self._pending[key] = event
+            if self._flusher_running:
+                return
+            self._flusher_running = True
+        eventlet.spawn_n(self._run_flusher)
 
-        @runtime.synchronized(self._lock_identifier)
-        def synced_send():
-            self._notify()
-            # sleeping after send while holding the lock allows subsequent
-            # events to batch up
-            eventlet.sleep(self.batch_interval)
-
-        eventlet.spawn_n(synced_send)
+    def _run_flusher(self):
+        try:
+            while True:
+                queued = self._stats['events_queued']
+                self._notify()
+                # sleeping after send allows subsequent events to batch up
+                eventlet.sleep(self.batch_interval)
+                with self._lock:
+                    if self._stats['events_queued'] == queued:
+                        self._flusher_running = False
+                        return
+        except Exception:
+            with self._lock:
+                self._flusher_running = False
+            raise
 
     def _notify(self):
-        if not self.pending_events:
-            return
+        while self._pending:
+            with self._lock:
+                if self.max_batch_size:
+                    keys = list(itertools.islice(self._pending,
+                                                 self.max_batch_size))
+                    batched_events = [self._pending.pop(key) for key in keys]
+                else:
+                    batched_events = list(self._pending.values())
+                    self._pending.clear()
+            start = time.time()
+            try:
+                self.callback(batched_events)
+            finally:
+                self._record_batch(len(batched_events), time.time() - start)
+
+    def _record_batch(self, size, latency):
+        stats = self._stats
+        stats['events_sent'] += size
+        stats['batches_sent'] += 1
+        stats['last_batch_size'] = size
+        stats['largest_batch_size'] = max(stats['largest_batch_size'], size)
+        stats['last_flush_latency'] = latency
+        stats['max_flush_latency'] = max(stats['max_flush_latency'], latency)
 
-        batched_events = self.pending_events
-        self.pending_events = []
-        self.callback(batched_events)
+    def get_stats(self):
+        """Returns the queue depth and the counters of sent batches."""
+        stats = dict(self._stats)
+        stats['queue_depth'] = len(self._pending)
+        return stats
@@ -72,7 +72,14 @@ class Notifier(object):
             endpoint_type=cfg.CONF.nova.endpoint_type,
             extensions=extensions)
         self.batch_notifier = batch_notifier.BatchNotifier(
-            cfg.CONF.send_events_interval, self.send_events)
+            cfg.CONF.send_events_interval, self.send_events,
+            max_batch_size=cfg.CONF.send_events_max_batch_size,
+            key_func=self._get_event_key)
+
+    @staticmethod
+    def _get_event_key(event):
+        # only the last status of an event is relevant to nova
+        return event['server_uuid'], event['name'], event.get('tag')
 
     def _is_compute_port(self, port):
         try:
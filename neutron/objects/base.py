@@ -110,10 +110,18 @@ class Pager(object):
             if getattr(self, attr) is not None
         }
         if self.marker and self.limit:
-            res['marker_obj'] = obj_db_api.get_object(
-                obj_cls, context, id=self.marker)
+            res['marker_obj'] = self._get_marker_obj(context, obj_cls)
         return res
 
+    def _get_marker_obj(self, context, obj_cls):
+        marker_obj = obj_db_api.get_object(obj_cls, context, id=self.marker)
+        if marker_obj is None and self.sorts == [('id', True)]:
+            # NOTE: the marker object was deleted since the previous page was
+            # fetched; when sorting by ID only, its ID is enough to continue
+            # with the objects after it
+            marker_obj = obj_cls.db_model(id=self.marker)
+        return marker_obj
+
     def __str__(self):
         return str(self.__dict__)
 
@@ -334,6 +342,25 @@ class NeutronObject(obj_base.VersionedObject,
             cls.get_objects(
                 context, validate_filters=validate_filters, **kwargs))
 
+    @classmethod
+    def get_objects_page(cls, context, marker=None, limit=None,
+                         validate_filters=True, **kwargs):
+        '''Return up to limit matching objects with an ID after marker.'''
+        objs = sorted(cls.get_objects(context,
+                                      validate_filters=validate_filters,
+                                      **kwargs),
+                      key=lambda obj: obj.id)
+        if marker:
+            objs = [obj for obj in objs if obj.id > marker]
+        return objs[:limit] if limit else objs
+
+    @classmethod
+    def get_revision_numbers(cls, context, validate_filters=True, **kwargs):
+        '''Return (id, revision_number) tuples of matching objects.'''
+        return [(obj.id, obj.revision_number)
+                for obj in cls.get_objects(
+                    context, validate_filters=validate_filters, **kwargs)]
+
 
 def _guarantee_rw_subtransaction(func):
     @functools.wraps(func)
@@ -899,6 +926,52 @@ class NeutronDbObject(NeutronObject):
             cls, context, **cls.modify_fields_to_db(kwargs)
         )
 
+    @classmethod
+    def get_objects_page(cls, context, marker=None, limit=None,
+                         validate_filters=True, **kwargs):
+        """
+        Fetch a page of objects ordered by ID.
+
+        The page is fetched with get_objects so that filters translated by
+        the object class, like Port security_group_ids, are applied.
+
+        :param context:
+        :param marker: ID of the last object of the previous page, the page
+                       starts with the first object with a greater ID. The
+                       marker object doesn't need to exist anymore. The
+                       marker is only used together with a limit.
+        :param limit: maximum number of objects to return
+        :param validate_filters: Raises an error in case of passing an unknown
+                                 filter
+        :param kwargs: multiple keys defined by key=value pairs
+        :return: list of objects of NeutronDbObject class or empty list
+        """
+        pager = Pager(sorts=[('id', True)], limit=limit, marker=marker)
+        return cls.get_objects(context, _pager=pager,
+                               validate_filters=validate_filters, **kwargs)
+
+    @classmethod
+    def get_revision_numbers(cls, context, validate_filters=True, **kwargs):
+        """
+        Fetch the revision numbers of objects matching filtering criteria.
+
+        For objects with standard attributes only the IDs and revision
+        numbers are read from the DB, without loading the objects.
+
+        :param context:
+        :param validate_filters: Raises an error in case of passing an unknown
+                                 filter
+        :param kwargs: multiple keys defined by key=value pairs
+        :return: list of (id, revision_number) tuples
+        """
+        if not cls.has_standard_attributes():
+            return super(NeutronDbObject, cls).get_revision_numbers(
+                context, validate_filters=validate_filters, **kwargs)
+        if validate_filters:
+            cls.validate_filters(**kwargs)
+        return obj_db_api.get_revision_numbers(
+            cls, context, **cls.modify_fields_to_db(kwargs))
+
     @classmethod
     def objects_exist(cls, context, validate_filters=True, **kwargs):
         """
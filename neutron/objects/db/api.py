@@ -18,6 +18,7 @@ from neutron_lib.objects import utils as obj_utils
 from oslo_utils import uuidutils
 
 from neutron.db import _model_query as model_query
+from neutron.db import standard_attr
 
 
 # Common database operation implementations
@@ -37,6 +38,15 @@ def count(obj_cls, context, **kwargs):
     return _get_filter_query(obj_cls, context, **kwargs).count()
 
 
+def get_revision_numbers(obj_cls, context, **kwargs):
+    with obj_cls.db_context_reader(context):
+        model = obj_cls.db_model
+        query = _get_filter_query(obj_cls, context, **kwargs)
+        query = query.join(model.standard_attr).with_entities(
+            model.id, standard_attr.StandardAttribute.revision_number)
+        return [tuple(row) for row in query]
+
+
 def _kwargs_to_filters(**kwargs):
     retain_classes = (list, set, obj_utils.StringMatchingFilterObj)
     return {k: v if isinstance(v, retain_classes) else [v]
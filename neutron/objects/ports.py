@@ -397,8 +397,7 @@ class Port(base.NeutronDbObject):
         )
 
     @classmethod
-    def get_objects(cls, context, _pager=None, validate_filters=True,
-                    security_group_ids=None, **kwargs):
+    def _filter_by_security_groups(cls, context, security_group_ids, kwargs):
         if security_group_ids:
             ports_with_sg = cls.get_ports_ids_by_security_groups(
                 context, security_group_ids)
@@ -407,9 +406,24 @@ class Port(base.NeutronDbObject):
                 kwargs['id'] = list(set(port_ids) & set(ports_with_sg))
             else:
                 kwargs['id'] = ports_with_sg
+        return kwargs
+
+    @classmethod
+    def get_objects(cls, context, _pager=None, validate_filters=True,
+                    security_group_ids=None, **kwargs):
+        kwargs = cls._filter_by_security_groups(
+            context, security_group_ids, kwargs)
         return super(Port, cls).get_objects(context, _pager, validate_filters,
                                             **kwargs)
 
+    @classmethod
+    def get_revision_numbers(cls, context, validate_filters=True,
+                             security_group_ids=None, **kwargs):
+        kwargs = cls._filter_by_security_groups(
+            context, security_group_ids, kwargs)
+        return super(Port, cls).get_revision_numbers(
+            context, validate_filters=validate_filters, **kwargs)
+
     @classmethod
     def modify_fields_to_db(cls, fields):
         result = super(Port, cls).modify_fields_to_db(fields)
@@ -270,7 +270,8 @@ def list_ovs_opts():
          itertools.chain(
              neutron.conf.plugins.ml2.drivers.ovs_conf.agent_opts,
              neutron.conf.agent.agent_extensions_manager.
-             AGENT_EXT_MANAGER_OPTS)
+             AGENT_EXT_MANAGER_OPTS,
+             neutron.conf.agent.common.RESOURCE_CACHE_OPTS)
          ),
         ('securitygroup',
          neutron.conf.agent.securitygroups_rpc.security_group_opts),
@@ -150,6 +150,10 @@ TUN_TABLE = {p_const.TYPE_GRE: GRE_TUN_TO_LV,
 # The default respawn interval for the ovsdb monitor
 DEFAULT_OVSDBMON_RESPAWN = 30
 
+# How the ovsdb is monitored for port changes
+OVSDB_MONITOR_CLIENT = 'ovsdb-client'
+OVSDB_MONITOR_NATIVE = 'native'
+
 # Represent invalid OF Port
 OFPORT_INVALID = -1
 
@@ -204,3 +208,8 @@ OVSDB_RESOURCE = 'ovsdb'
 # Used in ovs port 'external_ids' in order mark it for no cleanup when
 # ovs_cleanup script is used.
 SKIP_CLEANUP = 'skip_cleanup'
+
+# Used in ovs port 'other_config' to store the cookie and the fingerprint of
+# the flows installed for the port
+PORT_FLOWS_COOKIE = 'flows_cookie'
+PORT_FLOWS_FINGERPRINT = 'flows_fingerprint'
@@ -44,6 +44,9 @@ class OVSBridgeCookieMixin(object):
         self._reserved_cookies.add(uuid_stamp)
         return uuid_stamp
 
+    def reserve_cookie(self, cookie):
+        self._reserved_cookies.add(cookie)
+
     def unset_cookie(self, cookie):
         self._reserved_cookies.discard(cookie)
 
@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
 import functools
 import random
 
@@ -37,6 +39,9 @@ LOG = logging.getLogger(__name__)
 
 BUNDLE_ID_WIDTH = 1 << 32
 COOKIE_DEFAULT = object()
+# maximum number of bundle add requests in flight when committing a
+# flows transaction
+FLOWS_TRANSACTION_WINDOW = 64
 
 
 class ActiveBundleRunning(exceptions.NeutronException):
@@ -60,6 +65,8 @@ class OpenFlowSwitchMixin(object):
     def __init__(self, *args, **kwargs):
         self._app = kwargs.pop('ryu_app')
         self.active_bundles = set()
+        # flow mods queued by the active transaction of each greenthread
+        self._flows_transactions = {}
         super(OpenFlowSwitchMixin, self).__init__(*args, **kwargs)
 
     def _get_dp_by_dpid(self, dpid_int):
@@ -82,6 +89,11 @@ class OpenFlowSwitchMixin(object):
 
     def _send_msg(self, msg, reply_cls=None, reply_multi=False,
                   active_bundle=None):
+        if reply_cls is None and active_bundle is None:
+            queued_msgs = self._flows_transactions.get(eventlet.getcurrent())
+            if queued_msgs is not None:
+                queued_msgs.append(msg)
+                return
         timeout_sec = cfg.CONF.OVS.of_request_timeout
         timeout = eventlet.Timeout(seconds=timeout_sec)
         if active_bundle is not None:
@@ -165,6 +177,9 @@ class OpenFlowSwitchMixin(object):
             flows += rep.body
         return flows
 
+    def get_table_cookies(self, table_id):
+        return {f.cookie for f in self.dump_flows(table_id)}
+
     def _dump_and_clean(self, table_id=None):
         cookies = set([f.cookie for f in self.dump_flows(table_id)]) - \
                       self.reserved_cookies
@@ -180,6 +195,28 @@ class OpenFlowSwitchMixin(object):
         for table_id in self.of_tables:
             self._dump_and_clean(table_id)
 
+    def get_stale_flow_cookies(self, table_id):
+        """Returns the stale cookies of a table.
+
+        :returns: a Counter of the cookies of the flows of the table not
+                  reserved by the bridge and their number of flows.
+        """
+        reserved_cookies = self.reserved_cookies
+        return collections.Counter(f.cookie for f in self.dump_flows(table_id)
+                                   if f.cookie not in reserved_cookies)
+
+    def cleanup_table_flows(self, table_id, cookies):
+        """Delete the flows of a table with the given stale cookies.
+
+        Unlike cleanup_flows(), the stale flows are only deleted from the
+        given table.
+        """
+        for cookie in cookies:
+            LOG.warning("Deleting flows with cookie 0x%(cookie)x from table "
+                        "%(table)d", {'cookie': cookie, 'table': table_id})
+            self.uninstall_flows(table_id=table_id, cookie=cookie,
+                                 cookie_mask=ovs_lib.UINT64_BITMASK)
+
     def install_goto_next(self, table_id, active_bundle=None):
         self.install_goto(table_id=table_id, dest_table_id=table_id + 1,
                           active_bundle=active_bundle)
@@ -250,6 +287,54 @@ class OpenFlowSwitchMixin(object):
     def bundled(self, atomic=False, ordered=False):
         return BundledOpenFlowBridge(self, atomic, ordered)
 
+    @contextlib.contextmanager
+    def flows_transaction(self):
+        """Commit the flows installed and uninstalled in a single bundle.
+
+        The flow mods sent to the bridge by the calling greenthread within
+        the context are queued and committed atomically when it exits, so
+        the switch never uses a partially programmed set of flows. Nothing
+        is sent if the context exits with an exception. Nested transactions
+        are part of the outermost one.
+        """
+        current = eventlet.getcurrent()
+        if current in self._flows_transactions:
+            yield self
+            return
+        msgs = self._flows_transactions[current] = []
+        try:
+            yield self
+        finally:
+            del self._flows_transactions[current]
+        self._commit_flows(msgs)
+
+    def _commit_flows(self, msgs):
+        if len(msgs) <= 1:
+            for msg in msgs:
+                self._send_msg(msg)
+            return
+
+        with self.bundled(atomic=True, ordered=True) as bundle_br:
+            active_bundle = dict(id=bundle_br.active_bundle,
+                                 bundle_flags=bundle_br.bundle_flags)
+
+            def add(msg):
+                try:
+                    self._send_msg(msg, active_bundle=active_bundle)
+                except RuntimeError as e:
+                    return e
+
+            # NOTE: the requests are pipelined instead of waiting for the
+            # reply to each of them. The greenthreads of the pool are
+            # started in order and queue their request to the ofctl service
+            # before yielding, so the messages are added to the bundle in
+            # the order they were sent.
+            pool = eventlet.GreenPool(FLOWS_TRANSACTION_WINDOW)
+            errors = [e for e in pool.imap(add, msgs) if e is not None]
+            if errors:
+                # the bundle is discarded
+                raise errors[0]
+
 
 class BundledOpenFlowBridge(object):
     def __init__(self, br, atomic, ordered):
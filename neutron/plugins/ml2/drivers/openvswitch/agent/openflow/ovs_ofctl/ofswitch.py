@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
 import re
 
 from oslo_log import log as logging
@@ -86,6 +88,12 @@ class OpenFlowSwitchMixin(object):
         super(OpenFlowSwitchMixin, self).delete_flows(
               **self._conv_args(kwargs))
 
+    @contextlib.contextmanager
+    def flows_transaction(self):
+        # NOTE: each ovs-ofctl command is applied on its own, the flows are
+        # not grouped into a single bundle like with the native interface.
+        yield self
+
     def _filter_flows(self, flows):
         cookie_list = self.reserved_cookies
         LOG.debug("Bridge cookies used to filter flows: %s",
@@ -104,6 +112,15 @@ class OpenFlowSwitchMixin(object):
                 fl_table = fl_table.group(1)
                 yield flow, fl_cookie, fl_table
 
+    def get_table_cookies(self, table_id):
+        cookie_re = re.compile('cookie=(0x[A-Fa-f0-9]*)')
+        cookies = set()
+        for flow in (self.dump_flows(table_id) or '').splitlines():
+            fl_cookie = cookie_re.search(flow)
+            if fl_cookie:
+                cookies.add(int(fl_cookie.group(1), 16))
+        return cookies
+
     def cleanup_flows(self):
         flows = self.dump_flows_all_tables()
         for flow, cookie, table in self._filter_flows(flows):
@@ -111,3 +128,20 @@ class OpenFlowSwitchMixin(object):
             # it might deserve some attention
             LOG.warning("Deleting flow %s", flow)
             self.delete_flows(cookie=cookie + '/-1', table=table)
+
+    def get_stale_flow_cookies(self, table_id):
+        """Returns the stale cookies of a table.
+
+        :returns: a Counter of the cookies of the flows of the table not
+                  reserved by the bridge and their number of flows.
+        """
+        flows = (self.dump_flows(table_id) or '').splitlines()
+        return collections.Counter(
+            cookie for _flow, cookie, _table in self._filter_flows(flows))
+
+    def cleanup_table_flows(self, table_id, cookies):
+        """Delete the flows of a table with the given stale cookies."""
+        for cookie in cookies:
+            LOG.warning("Deleting flows with cookie %(cookie)s from table "
+                        "%(table)s", {'cookie': cookie, 'table': table_id})
+            self.delete_flows(cookie=cookie + '/-1', table=table_id)
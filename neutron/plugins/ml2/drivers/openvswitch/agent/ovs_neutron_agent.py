@@ -21,6 +21,7 @@ import signal
 import sys
 import time
 
+import eventlet
 import netaddr
 from neutron_lib.agent import constants as agent_consts
 from neutron_lib.agent import topics
@@ -35,6 +36,7 @@ from neutron_lib.utils import helpers
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_serialization import jsonutils
 from oslo_service import loopingcall
 from oslo_service import systemd
 from oslo_utils import netutils
@@ -43,6 +45,7 @@ from six import moves
 
 from neutron._i18n import _
 from neutron.agent.common import ip_lib
+from neutron.agent.common import loop_stats
 from neutron.agent.common import ovs_lib
 from neutron.agent.common import polling
 from neutron.agent.common import utils
@@ -68,6 +71,7 @@ from neutron.plugins.ml2.drivers.openvswitch.agent \
     import ovs_capabilities
 from neutron.plugins.ml2.drivers.openvswitch.agent \
     import ovs_dvr_neutron_agent
+from neutron.plugins.ml2.drivers.openvswitch.agent import stale_flows
 from neutron.plugins.ml2.drivers.openvswitch.agent import vlanmanager
 
 
@@ -184,6 +188,10 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         self.network_ports = collections.defaultdict(set)
         # keeps association between ports and ofports to detect ofport change
         self.vifname_to_ofport_map = {}
+        # cookie and fingerprint of the ARP spoofing protection flows
+        # installed for each ofport, when skip_unchanged_port_flows is set
+        self.port_flows_cookies = {}
+        self.port_flows_fingerprints = {}
         # Stores newly created bridges
         self.added_bridges = list()
         self.bridge_mappings = self._parse_bridge_mappings(
@@ -194,10 +202,17 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         self._reset_tunnel_ofports()
 
         self.polling_interval = agent_conf.polling_interval
+        self.device_details_chunk_size = agent_conf.device_details_chunk_size
+        self.stale_flows_cleanup_batch_size = (
+            agent_conf.stale_flows_cleanup_batch_size)
+        self.skip_unchanged_port_flows = agent_conf.skip_unchanged_port_flows
         self.minimize_polling = agent_conf.minimize_polling
         self.ovsdb_monitor_respawn_interval = (
             agent_conf.ovsdb_monitor_respawn_interval or
             constants.DEFAULT_OVSDBMON_RESPAWN)
+        self.ovsdb_port_monitor = agent_conf.ovsdb_port_monitor
+        # set by rpc_loop when the polling manager tracks the ovsdb ports
+        self.port_tracker = None
         self.local_ip = ovs_conf.local_ip
         self.tunnel_count = 0
         self.vxlan_udp_port = agent_conf.vxlan_udp_port
@@ -299,6 +314,10 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             heartbeat.start(interval=report_interval)
         # Initialize iteration counter
         self.iter_num = 0
+        self.loop_stats = loop_stats.LoopStats(
+            stats_file=agent_conf.rpc_loop_stats_file,
+            slow_threshold=agent_conf.rpc_loop_slow_threshold)
+        self.stale_flows_cleaner = None
         self.run_daemon_loop = True
 
         self.catch_sigterm = False
@@ -764,9 +783,8 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                 self.tun_br.delete_arp_responder(lvm.vlan, None)
                 if self.l2_pop:
                     # Try to remove tunnel ports if not used by other networks
-                    for ofport in lvm.tun_ofports:
-                        self.cleanup_tunnel_port(self.tun_br, ofport,
-                                                 lvm.network_type)
+                    self.cleanup_tunnel_ports(self.tun_br, lvm.tun_ofports,
+                                              lvm.network_type)
         elif lvm.network_type == n_const.TYPE_FLAT:
             if lvm.physical_network in self.phys_brs:
                 # outbound
@@ -845,6 +863,12 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                         'physical_network': str(physical_network)}
         if segmentation_id is not None:
             vlan_mapping['segmentation_id'] = str(segmentation_id)
+        if (self.skip_unchanged_port_flows and
+                all(port_other_config.get(key) == value
+                    for key, value in vlan_mapping.items())):
+            # the port was already bound to the network before the agent
+            # restarted
+            return True
         port_other_config.update(vlan_mapping)
         self.int_br.set_db_attribute("Port", port.port_name, "other_config",
                                      port_other_config)
@@ -890,42 +914,62 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         devices_down = []
         failed_devices = []
         port_names = [p['vif_port'].port_name for p in need_binding_ports]
+        columns = ["name", "tag"]
+        if self.skip_unchanged_port_flows:
+            columns.append("other_config")
         port_info = self.int_br.get_ports_attributes(
-            "Port", columns=["name", "tag"], ports=port_names, if_exists=True)
+            "Port", columns=columns, ports=port_names, if_exists=True)
         tags_by_name = {x['name']: x['tag'] for x in port_info}
-        for port_detail in need_binding_ports:
-            try:
-                lvm = self.vlan_manager.get(port_detail['network_id'])
-            except vlanmanager.MappingNotFound:
-                # network for port was deleted. skip this port since it
-                # will need to be handled as a DEAD port in the next scan
-                continue
-            port = port_detail['vif_port']
-            device = port_detail['device']
-            # Do not bind a port if it's already bound
-            cur_tag = tags_by_name.get(port.port_name)
-            if cur_tag is None:
-                LOG.debug("Port %s was deleted concurrently, skipping it",
-                          port.port_name)
-                continue
-            if self.prevent_arp_spoofing:
-                self.setup_arp_spoofing_protection(self.int_br,
-                                                   port, port_detail)
-            if cur_tag != lvm.vlan:
-                self.int_br.set_db_attribute(
-                    "Port", port.port_name, "tag", lvm.vlan)
-
-            # update plugin about port status
-            # FIXME(salv-orlando): Failures while updating device status
-            # must be handled appropriately. Otherwise this might prevent
-            # neutron server from sending network-vif-* events to the nova
-            # API server, thus possibly preventing instance spawn.
-            if port_detail.get('admin_state_up'):
-                LOG.debug("Setting status for %s to UP", device)
-                devices_up.append(device)
-            else:
-                LOG.debug("Setting status for %s to DOWN", device)
-                devices_down.append(device)
+        other_config_by_name = {x['name']: x.get('other_config') or {}
+                                for x in port_info}
+        installed_cookies = []
+        ports_to_tag = []
+        ports_other_config = {}
+        # the flows of all the ports are committed at once, before the ports
+        # are moved to their local VLAN
+        with self.int_br.flows_transaction():
+            for port_detail in need_binding_ports:
+                try:
+                    lvm = self.vlan_manager.get(port_detail['network_id'])
+                except vlanmanager.MappingNotFound:
+                    # network for port was deleted. skip this port since it
+                    # will need to be handled as a DEAD port in the next scan
+                    continue
+                port = port_detail['vif_port']
+                device = port_detail['device']
+                # Do not bind a port if it's already bound
+                cur_tag = tags_by_name.get(port.port_name)
+                if cur_tag is None:
+                    LOG.debug("Port %s was deleted concurrently, skipping it",
+                              port.port_name)
+                    continue
+                if self.prevent_arp_spoofing:
+                    other_config = self._setup_port_flows(
+                        port, port_detail, lvm,
+                        other_config_by_name.get(port.port_name, {}),
+                        installed_cookies)
+                    if other_config:
+                        ports_other_config[port.port_name] = other_config
+                if cur_tag != lvm.vlan:
+                    ports_to_tag.append((port.port_name, lvm.vlan))
+
+                # update plugin about port status
+                # FIXME(salv-orlando): Failures while updating device status
+                # must be handled appropriately. Otherwise this might prevent
+                # neutron server from sending network-vif-* events to the
+                # nova API server, thus possibly preventing instance spawn.
+                if port_detail.get('admin_state_up'):
+                    LOG.debug("Setting status for %s to UP", device)
+                    devices_up.append(device)
+                else:
+                    LOG.debug("Setting status for %s to DOWN", device)
+                    devices_down.append(device)
+        for port_name, tag in ports_to_tag:
+            self.int_br.set_db_attribute("Port", port_name, "tag", tag)
+        # the fingerprints are only stored once the flows are installed
+        for port_name, other_config in ports_other_config.items():
+            self.int_br.set_db_attribute(
+                "Port", port_name, "other_config", other_config)
         if devices_up or devices_down:
             # When the iter_num == 0, that indicate the ovs-agent is doing
             # the initialization work. L2 pop needs this precise knowledge
@@ -933,9 +977,10 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             # Otherwise, these flows will be cleaned as stale due to the
             # different cookie id.
             agent_restarted = self.iter_num == 0
-            devices_set = self.plugin_rpc.update_device_list(
-                self.context, devices_up, devices_down, self.agent_id,
-                self.conf.host, agent_restarted=agent_restarted)
+            with self.loop_stats.phase('status_report'):
+                devices_set = self.plugin_rpc.update_device_list(
+                    self.context, devices_up, devices_down, self.agent_id,
+                    self.conf.host, agent_restarted=agent_restarted)
             failed_devices = (devices_set.get('failed_devices_up') +
                 devices_set.get('failed_devices_down'))
             if failed_devices:
@@ -946,6 +991,98 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                  {'up': devices_up, 'down': devices_down})
         return set(failed_devices)
 
+    def _get_port_flows_fingerprint(self, port, port_detail, lvm):
+        addresses = sorted(ip['ip_address']
+                           for ip in port_detail.get('fixed_ips', []))
+        address_pairs = sorted(
+            (p['ip_address'], p.get('mac_address') or '')
+            for p in port_detail.get('allowed_address_pairs') or [])
+        flows_config = {
+            'ofport': port.ofport,
+            'mac': port.vif_mac,
+            'vlan': lvm.vlan,
+            'device_owner': port_detail.get('device_owner'),
+            'port_security_enabled': port_detail.get(
+                'port_security_enabled', True),
+            'fixed_ips': addresses,
+            'allowed_address_pairs': address_pairs}
+        return hashlib.sha1(jsonutils.dumps(
+            flows_config, sort_keys=True).encode()).hexdigest()
+
+    def _get_port_flows_bridge(self, ofport):
+        cookie = self.port_flows_cookies.get(ofport)
+        if cookie is None:
+            return self.int_br
+        bridge = self.int_br.clone()
+        bridge.set_agent_uuid_stamp(cookie)
+        return bridge
+
+    def _setup_port_flows(self, port, port_detail, lvm, other_config,
+                          installed_cookies):
+        """Installs the ARP spoofing protection flows of a port.
+
+        If skip_unchanged_port_flows is set, the flows of each port are
+        installed with their own cookie, and the flows of the ports whose
+        fingerprint didn't change since their flows were installed are left
+        untouched, as long as flows with their cookie are still installed.
+        The fingerprints stored before the agent restarted are not trusted
+        once the stale flows cleanup started, as it may have deleted some of
+        the flows of the port before its cookie was reserved.
+
+        :param installed_cookies: list caching the set of the cookies of the
+                                  installed MAC spoofing protection flows,
+                                  filled the first time it is needed.
+        :returns: the other_config of the port to store in OVSDB, or None if
+                  it doesn't need to be updated.
+        """
+        if not self.skip_unchanged_port_flows:
+            self.setup_arp_spoofing_protection(self.int_br, port, port_detail)
+            return None
+
+        fingerprint = self._get_port_flows_fingerprint(port, port_detail, lvm)
+        if port.ofport not in self.port_flows_cookies:
+            try:
+                cookie = int(other_config[constants.PORT_FLOWS_COOKIE], 16)
+            except (KeyError, ValueError):
+                cookie = self.int_br.request_cookie()
+            else:
+                # the flows were installed before the agent restarted, they
+                # must be kept by the stale flows cleanup
+                self.int_br.reserve_cookie(cookie)
+                cleanup_started = (self.stale_flows_cleaner and
+                                   self.stale_flows_cleaner.started)
+                if (not cleanup_started and
+                        other_config.get(constants.PORT_FLOWS_FINGERPRINT) ==
+                        fingerprint):
+                    if not installed_cookies:
+                        installed_cookies.append(
+                            self.int_br.get_table_cookies(
+                                constants.MAC_SPOOF_TABLE))
+                    if cookie in installed_cookies[0]:
+                        self.port_flows_fingerprints[port.ofport] = (
+                            fingerprint)
+            self.port_flows_cookies[port.ofport] = cookie
+
+        if self.port_flows_fingerprints.get(port.ofport) == fingerprint:
+            LOG.debug("Flows of port %s are unchanged, not reinstalling "
+                      "them", port.vif_id)
+            return None
+
+        self.setup_arp_spoofing_protection(
+            self._get_port_flows_bridge(port.ofport), port, port_detail)
+        self.port_flows_fingerprints[port.ofport] = fingerprint
+        other_config = dict(other_config)
+        other_config[constants.PORT_FLOWS_COOKIE] = (
+            '%x' % self.port_flows_cookies[port.ofport])
+        other_config[constants.PORT_FLOWS_FINGERPRINT] = fingerprint
+        return other_config
+
+    def _forget_port_flows(self, ofport):
+        cookie = self.port_flows_cookies.pop(ofport, None)
+        self.port_flows_fingerprints.pop(ofport, None)
+        if cookie is not None:
+            self.int_br.unset_cookie(cookie)
+
     @staticmethod
     def setup_arp_spoofing_protection(bridge, vif, port_details):
         if not port_details.get('port_security_enabled', True):
@@ -1304,6 +1441,11 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             if self.prevent_arp_spoofing:
                 self.int_br.delete_arp_spoofing_protection(port=ofport)
             self.int_br.uninstall_flows(in_port=ofport)
+            if ofport in self.port_flows_cookies:
+                port_br = self._get_port_flows_bridge(ofport)
+                port_br.delete_arp_spoofing_protection(port=ofport)
+                port_br.uninstall_flows(in_port=ofport)
+                self._forget_port_flows(ofport)
         # store map for next iteration
         self.vifname_to_ofport_map = current
         return moved_ports
@@ -1380,7 +1522,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         removed_ports = {p['name'] for p in events['removed']}
         ports_removed_and_added = added_ports & removed_ports
         for p in ports_removed_and_added:
-            if ovs_lib.BaseOVS().port_exists(p):
+            if self._port_exists(p):
                 events['removed'] = [e for e in events['removed']
                                      if e['name'] != p]
             else:
@@ -1393,7 +1535,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         # port belongs to
         cur_ancillary_ports = set()
         for bridge in self.ancillary_brs:
-            cur_ancillary_ports |= bridge.get_vif_port_set()
+            cur_ancillary_ports |= self._get_vif_port_set(bridge)
         cur_ancillary_ports |= ancillary_port_info['current']
 
         def _process_port(port, ports, ancillary_ports):
@@ -1452,8 +1594,26 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             port_info['updated'] = updated_ports
         return port_info, ancillary_port_info, ports_not_ready_yet
 
+    def _port_tracker_active(self):
+        return bool(self.port_tracker and self.port_tracker.is_active)
+
+    def _port_exists(self, port_name):
+        if self._port_tracker_active():
+            return self.port_tracker.port_exists(port_name)
+        return ovs_lib.BaseOVS().port_exists(port_name)
+
+    def _get_vif_port_set(self, bridge):
+        if self._port_tracker_active():
+            return self.port_tracker.get_vif_port_set(bridge.br_name)
+        return bridge.get_vif_port_set()
+
+    def _get_port_tag_dict(self):
+        if self._port_tracker_active():
+            return self.port_tracker.get_port_tag_dict(self.int_br.br_name)
+        return self.int_br.get_port_tag_dict()
+
     def scan_ports(self, registered_ports, sync, updated_ports=None):
-        cur_ports = self.int_br.get_vif_port_set()
+        cur_ports = self._get_vif_port_set(self.int_br)
         self.int_br_device_count = len(cur_ports)
         port_info = self._get_port_info(registered_ports, cur_ports, sync)
         if updated_ports is None:
@@ -1472,7 +1632,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
     def scan_ancillary_ports(self, registered_ports, sync):
         cur_ports = set()
         for bridge in self.ancillary_brs:
-            cur_ports |= bridge.get_vif_port_set()
+            cur_ports |= self._get_vif_port_set(bridge)
         return self._get_port_info(registered_ports, cur_ports, sync)
 
     def check_changed_vlans(self):
@@ -1481,7 +1641,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         The returned value is a set of port ids of the ports concerned by a
         vlan tag loss.
         """
-        port_tags = self.int_br.get_port_tag_dict()
+        port_tags = self._get_port_tag_dict()
         changed_ports = set()
         for lvm in self.vlan_manager:
             for port in lvm.vif_ports.values():
@@ -1541,18 +1701,23 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             LOG.debug("No VIF port for port %s defined on agent.", port_id)
         return port_needs_binding
 
-    def _setup_tunnel_port(self, br, port_name, remote_ip, tunnel_type):
+    def _is_valid_tunnel_remote_ip(self, remote_ip):
         try:
             if (netaddr.IPAddress(self.local_ip).version !=
                     netaddr.IPAddress(remote_ip).version):
                 LOG.error("IP version mismatch, cannot create tunnel: "
                           "local_ip=%(lip)s remote_ip=%(rip)s",
                           {'lip': self.local_ip, 'rip': remote_ip})
-                return 0
+                return False
         except Exception:
             LOG.error("Invalid local or remote IP, cannot create tunnel: "
                       "local_ip=%(lip)s remote_ip=%(rip)s",
                       {'lip': self.local_ip, 'rip': remote_ip})
+            return False
+        return True
+
+    def _setup_tunnel_port(self, br, port_name, remote_ip, tunnel_type):
+        if not self._is_valid_tunnel_remote_ip(remote_ip):
             return 0
         ofport = br.add_tunnel_port(port_name,
                                     remote_ip,
@@ -1573,6 +1738,37 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         br.setup_tunnel_port(tunnel_type, ofport)
         return ofport
 
+    def _setup_tunnel_ports(self, br, tunnels, tunnel_type):
+        """Set up the tunnel ports to several remote IPs at once.
+
+        The ports are created in a single OVSDB transaction, and their flows
+        and the flooding flows are installed in a single flows transaction.
+
+        :param tunnels: dict of the tunnel port name of each remote IP.
+        """
+        tunnels = {remote_ip: port_name
+                   for remote_ip, port_name in tunnels.items()
+                   if self._is_valid_tunnel_remote_ip(remote_ip)}
+        ofports = br.add_tunnel_ports(
+            {port_name: remote_ip
+             for remote_ip, port_name in tunnels.items()},
+            self.local_ip,
+            tunnel_type,
+            self.vxlan_udp_port,
+            self.dont_fragment,
+            self.tunnel_csum,
+            self.tos)
+        with br.flows_transaction():
+            for remote_ip, port_name in tunnels.items():
+                ofport = ofports.get(port_name, ovs_lib.INVALID_OFPORT)
+                if ofport == ovs_lib.INVALID_OFPORT:
+                    LOG.error("Failed to set-up %(type)s tunnel port to "
+                              "%(ip)s", {'type': tunnel_type, 'ip': remote_ip})
+                    continue
+                self.tun_br_ofports[tunnel_type][remote_ip] = ofport
+                br.setup_tunnel_port(tunnel_type, ofport)
+            self._setup_tunnel_flood_flow(br, tunnel_type)
+
     def _setup_tunnel_flood_flow(self, br, tunnel_type):
         ofports = self.tun_br_ofports[tunnel_type].values()
         if ofports and not self.l2_pop:
@@ -1611,27 +1807,42 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                     br.cleanup_tunnel_port(ofport)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
+    def cleanup_tunnel_ports(self, br, tun_ofports, tunnel_type):
+        """Remove the tunnel ports which are not used anymore.
+
+        The unused ports among tun_ofports are deleted in a single OVSDB
+        transaction, and their flows in a single flows transaction.
+        """
+        # Check if these tunnel ports are still used
+        tun_ofports = set(tun_ofports)
+        for lvm in self.vlan_manager:
+            tun_ofports.difference_update(lvm.tun_ofports)
+        # If not, remove them
+        removed = {}
+        for remote_ip, ofport in self.tun_br_ofports[tunnel_type].items():
+            if ofport in tun_ofports:
+                removed[remote_ip] = ofport
+        if not removed:
+            return
+        br.delete_ports_by_name(
+            [self.get_tunnel_name(tunnel_type, self.local_ip, remote_ip)
+             for remote_ip in removed])
+        with br.flows_transaction():
+            for ofport in removed.values():
+                br.cleanup_tunnel_port(ofport)
+        for remote_ip in removed:
+            self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
+
     def treat_devices_added_or_updated(self, devices, provisioning_needed):
         skipped_devices = []
         need_binding_devices = []
         binding_no_activated_devices = set()
         agent_restarted = self.iter_num == 0
-        devices_details_list = (
-            self.plugin_rpc.get_devices_details_list_and_failed_devices(
-                self.context,
-                devices,
-                self.agent_id,
-                self.conf.host,
-                agent_restarted))
-        failed_devices = set(devices_details_list.get('failed_devices'))
-
-        devices = devices_details_list.get('devices')
-        vif_by_id = self.int_br.get_vifs_by_ids(
-            [vif['device'] for vif in devices])
-        for details in devices:
+        failed_devices = set()
+        for details, port in self._iter_devices_details(
+                devices, agent_restarted, failed_devices):
             device = details['device']
             LOG.debug("Processing port: %s", device)
-            port = vif_by_id.get(device)
             if not port:
                 # The port disappeared and cannot be processed
                 LOG.info("Port %s was not found on the integration bridge "
@@ -1675,6 +1886,42 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         return (skipped_devices, binding_no_activated_devices,
                 need_binding_devices, failed_devices)
 
+    def _get_devices_details(self, devices, agent_restarted):
+        return self.plugin_rpc.get_devices_details_list_and_failed_devices(
+            self.context, devices, self.agent_id, self.conf.host,
+            agent_restarted)
+
+    def _iter_devices_details(self, devices, agent_restarted,
+                              failed_devices):
+        """Yields the details and the VIF port of each device.
+
+        The devices whose details couldn't be retrieved are added to
+        failed_devices. If device_details_chunk_size is set, the details are
+        fetched in chunks and the next chunk is fetched in a greenthread
+        while the caller processes the devices of the current one.
+        """
+        devices = list(devices)
+        chunk_size = self.device_details_chunk_size or len(devices) or 1
+        chunks = [devices[i:i + chunk_size]
+                  for i in range(0, len(devices), chunk_size)] or [devices]
+        fetch = None
+        for i, chunk in enumerate(chunks):
+            with self.loop_stats.phase('rpc_fetch'):
+                if fetch is not None:
+                    devices_details_list = fetch.wait()
+                else:
+                    devices_details_list = self._get_devices_details(
+                        chunk, agent_restarted)
+            if i + 1 < len(chunks):
+                fetch = eventlet.spawn(self._get_devices_details,
+                                       chunks[i + 1], agent_restarted)
+            failed_devices.update(devices_details_list.get('failed_devices'))
+            devices_details = devices_details_list.get('devices')
+            vif_by_id = self.int_br.get_vifs_by_ids(
+                [vif['device'] for vif in devices_details])
+            for details in devices_details:
+                yield details, vif_by_id.get(details['device'])
+
     def _update_port_network(self, port_id, network_id):
         self._clean_network_ports(port_id)
         self.network_ports[network_id].add(port_id)
@@ -1703,13 +1950,15 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         return failed_devices
 
     def treat_devices_removed(self, devices):
-        self.sg_agent.remove_devices_filter(devices)
+        with self.loop_stats.phase('firewall'):
+            self.sg_agent.remove_devices_filter(devices)
         LOG.info("Ports %s removed", devices)
-        devices_down = self.plugin_rpc.update_device_list(self.context,
-                                                          [],
-                                                          devices,
-                                                          self.agent_id,
-                                                          self.conf.host)
+        with self.loop_stats.phase('status_report'):
+            devices_down = self.plugin_rpc.update_device_list(self.context,
+                                                              [],
+                                                              devices,
+                                                              self.agent_id,
+                                                              self.conf.host)
         failed_devices = set(devices_down.get('failed_devices_down'))
         LOG.debug("Port removal failed for %s", failed_devices)
         for device in devices:
@@ -1738,11 +1987,12 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
 
     def treat_devices_skipped(self, devices):
         LOG.info("Ports %s skipped, changing status to down", devices)
-        devices_down = self.plugin_rpc.update_device_list(self.context,
-                                                          [],
-                                                          devices,
-                                                          self.agent_id,
-                                                          self.conf.host)
+        with self.loop_stats.phase('status_report'):
+            devices_down = self.plugin_rpc.update_device_list(self.context,
+                                                              [],
+                                                              devices,
+                                                              self.agent_id,
+                                                              self.conf.host)
         failed_devices = set(devices_down.get('failed_devices_down'))
         if failed_devices:
             LOG.debug("Port down failed for %s", failed_devices)
@@ -1767,10 +2017,11 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         binding_no_activated_devices = set()
         start = time.time()
         if devices_added_updated:
-            (skipped_devices, binding_no_activated_devices,
-             need_binding_devices, failed_devices['added']) = (
-                self.treat_devices_added_or_updated(
-                    devices_added_updated, provisioning_needed))
+            with self.loop_stats.phase('flow_install'):
+                (skipped_devices, binding_no_activated_devices,
+                 need_binding_devices, failed_devices['added']) = (
+                    self.treat_devices_added_or_updated(
+                        devices_added_updated, provisioning_needed))
             LOG.debug("process_network_ports - iteration:%(iter_num)d - "
                       "treat_devices_added_or_updated completed. "
                       "Skipped %(num_skipped)d and no activated binding "
@@ -1793,18 +2044,22 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         added_ports = (port_info.get('added', set()) - skipped_devices -
                        binding_no_activated_devices)
         self._add_port_tag_info(need_binding_devices)
-        self.sg_agent.setup_port_filters(added_ports,
-                                         port_info.get('updated', set()))
+        with self.loop_stats.phase('firewall'):
+            self.sg_agent.setup_port_filters(added_ports,
+                                             port_info.get('updated', set()))
         LOG.info("process_network_ports - iteration:%(iter_num)d - "
                  "agent port security group processed in %(elapsed).3f",
                  {'iter_num': self.iter_num,
                   'elapsed': time.time() - start})
-        failed_devices['added'] |= self._bind_devices(need_binding_devices)
+        with self.loop_stats.phase('flow_install'):
+            failed_devices['added'] |= self._bind_devices(
+                need_binding_devices)
 
         if 'removed' in port_info and port_info['removed']:
             start = time.time()
-            failed_devices['removed'] |= self.treat_devices_removed(
-                port_info['removed'])
+            with self.loop_stats.phase('flow_install'):
+                failed_devices['removed'] |= self.treat_devices_removed(
+                    port_info['removed'])
             LOG.debug("process_network_ports - iteration:%(iter_num)d - "
                       "treat_devices_removed completed in %(elapsed).3f",
                       {'iter_num': self.iter_num,
@@ -1871,19 +2126,17 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                                                       tunnel_type,
                                                       self.conf.host)
                 if not self.l2_pop:
-                    tunnels = details['tunnels']
-                    for tunnel in tunnels:
+                    tunnels = {}
+                    for tunnel in details['tunnels']:
                         if self.local_ip != tunnel['ip_address']:
                             remote_ip = tunnel['ip_address']
                             tun_name = self.get_tunnel_name(
                                 tunnel_type, self.local_ip, remote_ip)
                             if tun_name is None:
                                 continue
-                            self._setup_tunnel_port(self.tun_br,
-                                                    tun_name,
-                                                    tunnel['ip_address'],
-                                                    tunnel_type)
-                    self._setup_tunnel_flood_flow(self.tun_br, tunnel_type)
+                            tunnels[remote_ip] = tun_name
+                    self._setup_tunnel_ports(self.tun_br, tunnels,
+                                             tunnel_type)
         except Exception as e:
             LOG.debug("Unable to sync tunnel IP %(local_ip)s: %(e)s",
                       {'local_ip': self.local_ip, 'e': e})
@@ -1942,6 +2195,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                   {'iter_num': self.iter_num,
                    'port_stats': port_stats,
                    'elapsed': elapsed})
+        self.loop_stats.end_iteration(self.iter_num, elapsed)
         if elapsed < self.polling_interval:
             time.sleep(self.polling_interval - elapsed)
         else:
@@ -1964,15 +2218,33 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         return port_stats
 
     def cleanup_stale_flows(self):
-        LOG.info("Cleaning stale %s flows", self.int_br.br_name)
-        self.int_br.cleanup_flows()
-        for pby_br in self.phys_brs.values():
-            LOG.info("Cleaning stale %s flows", pby_br.br_name)
-            pby_br.cleanup_flows()
-
+        bridges = [self.int_br] + list(self.phys_brs.values())
         if self.enable_tunneling:
-            LOG.info("Cleaning stale %s flows", self.tun_br.br_name)
-            self.tun_br.cleanup_flows()
+            bridges.append(self.tun_br)
+        if self.stale_flows_cleanup_batch_size:
+            LOG.info("Cleaning stale flows of %s incrementally",
+                     ', '.join(br.br_name for br in bridges))
+            self.stale_flows_cleaner = stale_flows.StaleFlowsCleaner(
+                bridges, self.stale_flows_cleanup_batch_size)
+            return
+        for br in bridges:
+            LOG.info("Cleaning stale %s flows", br.br_name)
+            br.cleanup_flows()
+
+    def continue_stale_flows_cleanup(self):
+        if not self.stale_flows_cleaner:
+            return
+        with self.loop_stats.phase('flow_install'):
+            try:
+                done = self.stale_flows_cleaner.run_batch()
+            except Exception:
+                LOG.exception("Error while cleaning up stale flows, the "
+                              "cleanup will be retried")
+                return
+            if done:
+                LOG.info("Stale flows cleanup completed: %s",
+                         self.stale_flows_cleaner.get_stats())
+                self.stale_flows_cleaner = None
 
     def process_port_info(self, start, polling_manager, sync, ovs_restarted,
                        ports, ancillary_ports, updated_ports_copy,
@@ -2126,7 +2398,8 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         # BasePollingManager that will be implemented by AlwaysPoll as
         # no action and by InterfacePollingMinimizer as start/stop
         if isinstance(
-            polling_manager, polling.InterfacePollingMinimizer):
+            polling_manager, (polling.InterfacePollingMinimizer,
+                              polling.PortTrackerPollingMinimizer)):
             polling_manager.stop()
             polling_manager.start()
 
@@ -2134,6 +2407,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         if not polling_manager:
             polling_manager = polling.get_polling_manager(
                 minimize_polling=False)
+        self.port_tracker = getattr(polling_manager, 'port_tracker', None)
 
         sync = False
         ports = set()
@@ -2157,6 +2431,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             port_info = {}
             ancillary_port_info = {}
             start = time.time()
+            self.loop_stats.start_iteration()
             LOG.debug("Agent rpc_loop - iteration:%d started",
                       self.iter_num)
             ovs_status = self.check_ovs_status()
@@ -2203,12 +2478,13 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                     self.updated_ports = set()
                     activated_bindings_copy = self.activated_bindings
                     self.activated_bindings = set()
-                    (port_info, ancillary_port_info, consecutive_resyncs,
-                     ports_not_ready_yet) = (self.process_port_info(
-                            start, polling_manager, sync, ovs_restarted,
-                            ports, ancillary_ports, updated_ports_copy,
-                            consecutive_resyncs, ports_not_ready_yet,
-                            failed_devices, failed_ancillary_devices))
+                    with self.loop_stats.phase('scan'):
+                        (port_info, ancillary_port_info, consecutive_resyncs,
+                         ports_not_ready_yet) = (self.process_port_info(
+                                start, polling_manager, sync, ovs_restarted,
+                                ports, ancillary_ports, updated_ports_copy,
+                                consecutive_resyncs, ports_not_ready_yet,
+                                failed_devices, failed_ancillary_devices))
                     sync = False
                     self.process_deleted_ports(port_info)
                     self.process_deactivated_bindings(port_info)
@@ -2235,7 +2511,8 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                         failed_devices = self.process_network_ports(
                             port_info, provisioning_needed)
                         if need_clean_stale_flow:
-                            self.cleanup_stale_flows()
+                            with self.loop_stats.phase('flow_install'):
+                                self.cleanup_stale_flows()
                             need_clean_stale_flow = False
                         LOG.debug("Agent rpc_loop - iteration:%(iter_num)d - "
                                   "ports processed. Elapsed:%(elapsed).3f",
@@ -2270,6 +2547,8 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                     self.updated_ports |= updated_ports_copy
                     self.activated_bindings |= activated_bindings_copy
                     sync = True
+            # also run when the agent is idle so that the cleanup completes
+            self.continue_stale_flows_cleanup()
             port_stats = self.get_port_stats(port_info, ancillary_port_info)
             self.loop_count_and_wait(start, port_stats)
 
@@ -2282,13 +2561,17 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         br_names = [br.br_name for br in self.phys_brs.values()]
         with polling.get_polling_manager(
                 self.minimize_polling,
-                self.ovsdb_monitor_respawn_interval) as pm,\
+                self.ovsdb_monitor_respawn_interval,
+                self.ovsdb_port_monitor) as pm,\
             ovsdb_monitor.get_bridges_monitor(
                 br_names,
                 self.ovsdb_monitor_respawn_interval) as bm:
 
             self.rpc_loop(polling_manager=pm, bridges_monitor=bm)
 
+        # persist the resource cache so a restart doesn't pull everything
+        self.plugin_rpc.remote_resource_cache.save_snapshot()
+
     def _handle_sigterm(self, signum, frame):
         self.catch_sigterm = True
         if self.quitting_rpc_timeout:
@@ -0,0 +1,84 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class StaleFlowsCleaner(object):
+    """Removes the stale flows of bridges a few tables at a time.
+
+    Each call to run_batch() dumps the flows of at most batch_size OpenFlow
+    tables, one table at a time, and deletes by cookie from each table the
+    flows of the cookies not reserved by its bridge, so neither the dumps
+    nor the deletions of bridges holding many flows block a single
+    iteration of the agent loop. The reserved cookies are read when each
+    table is cleaned up, so the cookies reserved since the cleanup started,
+    like the ones of the ports processed meanwhile, are kept.
+    """
+
+    def __init__(self, bridges, batch_size):
+        self.batch_size = batch_size
+        # (bridge, table ID) left to clean up
+        self._tables = collections.deque(
+            (bridge, table_id)
+            for bridge in bridges for table_id in bridge.of_tables)
+        self._stats = {'tables_total': len(self._tables),
+                       'tables_cleaned': 0,
+                       'flows_deleted': 0,
+                       'batches': 0,
+                       'elapsed': 0.0}
+
+    @property
+    def done(self):
+        return not self._tables
+
+    @property
+    def started(self):
+        """Whether the stale flows of some tables may have been deleted."""
+        return self._stats['batches'] > 0
+
+    def run_batch(self):
+        """Cleans up the stale flows of the next batch of tables.
+
+        :returns: True once the stale flows of all the tables are deleted.
+        """
+        start = time.time()
+        stats = self._stats
+        try:
+            for _i in range(self.batch_size):
+                if not self._tables:
+                    break
+                bridge, table_id = self._tables[0]
+                cookies = bridge.get_stale_flow_cookies(table_id)
+                if cookies:
+                    bridge.cleanup_table_flows(table_id, list(cookies))
+                # the table is cleaned up again by the next batch if
+                # the cleanup failed
+                self._tables.popleft()
+                stats['tables_cleaned'] += 1
+                stats['flows_deleted'] += sum(cookies.values())
+        finally:
+            stats['batches'] += 1
+            stats['elapsed'] += time.time() - start
+        LOG.info("Cleaned up the stale flows of %(tables_cleaned)d of "
+                 "%(tables_total)d tables, %(flows_deleted)d flows deleted "
+                 "in %(elapsed).3f seconds", stats)
+        return self.done
+
+    def get_stats(self):
+        """Returns the progress of the cleanup."""
+        return dict(self._stats)
@@ -10,11 +10,16 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import errno
+import os
 import socket
+import threading
+import time
 
 from neutron_lib import constants
 import pyroute2
+from pyroute2 import netlink
 from pyroute2.netlink import rtnl
 from pyroute2.netlink.rtnl import ifinfmsg
 from pyroute2.netlink.rtnl import ndmsg
@@ -27,6 +32,24 @@ from neutron import privileged
 
 _IP_VERSION_FAMILY_MAP = {4: socket.AF_INET, 6: socket.AF_INET6}
 
+# functions which can be run by run_batch
+BATCH_OPERATIONS = frozenset(['add_ip_address', 'delete_ip_address',
+                              'flush_ip_addresses', 'set_link_attribute',
+                              'set_link_flags', 'add_neigh_entry',
+                              'delete_neigh_entry'])
+
+# netlink socket and link ids of the batch run by the current thread
+_batch = threading.local()
+
+# maximum number of namespace netlink handles kept open
+NETNS_POOL_SIZE = 32
+# minimum interval in seconds between two checks of the namespaces of the
+# pooled handles
+NETNS_POOL_PURGE_INTERVAL = 10
+
+# id of the routing table used when none is given
+RT_TABLE_MAIN = 254
+
 
 def _get_scope_name(scope):
     """Return the name of the scope (given as a number), or the scope number
@@ -90,6 +113,11 @@ class IpAddressAlreadyExists(RuntimeError):
         super(IpAddressAlreadyExists, self).__init__(message)
 
 
+# exceptions of the batched operations raised as is to the callers
+BATCH_EXCEPTIONS = (NetworkInterfaceNotFound, InterfaceOperationNotSupported,
+                    IpAddressAlreadyExists)
+
+
 @privileged.default.entrypoint
 def get_routing_table(ip_version, namespace=None):
     """Return a list of dictionaries, each representing a route.
@@ -120,13 +148,160 @@ def get_routing_table(ip_version, namespace=None):
     return routes
 
 
+class _BatchIPRoute(object):
+    """Context of the netlink socket shared by the operations of a batch.
+
+    The socket is closed by run_batch once all the operations ran.
+    """
+
+    def __init__(self, ip):
+        self.ip = ip
+
+    def __enter__(self):
+        return self.ip
+
+    def __exit__(self, *args):
+        pass
+
+
+def _get_netns_inode(namespace):
+    try:
+        return os.stat(os.path.join(netns.NETNS_RUN_DIR, namespace)).st_ino
+    except OSError:
+        return None
+
+
+class _NetNSHandle(object):
+    """Context of a netlink handle of the namespace pool.
+
+    The operations using the handle are serialized, and it is closed by the
+    last one once it has been removed from the pool.
+    """
+
+    def __init__(self, pool, ip, inode):
+        self.pool = pool
+        self.ip = ip
+        self.inode = inode
+        self.users = 0
+        self.removed = False
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self.ip
+
+    def __exit__(self, *args):
+        self._lock.release()
+        self.pool.release(self)
+
+
+class _NetNSPool(object):
+    """LRU pool of the netlink handles of the namespaces.
+
+    Opening a NetNS forks a helper process with some pyroute2 versions, so
+    the handles are kept open and shared by the operations of a namespace.
+    The least recently used handle is closed when there are more than size
+    namespaces in the pool, and the handle of a namespace is closed when the
+    namespace is removed or replaced. As an open handle keeps its namespace
+    and its devices alive, the namespaces of all the pooled handles are
+    also checked periodically, to close the handles of the namespaces
+    deleted by other processes. The stats count the handles opened, the
+    handles reused, the handles evicted from the pool and the handles of
+    deleted or replaced namespaces closed by these checks.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._handles = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0
+        self.stats = {'opens': 0, 'hits': 0, 'evictions': 0, 'purges': 0}
+
+    def get(self, namespace):
+        now = time.time()
+        if now - self._last_purge >= NETNS_POOL_PURGE_INTERVAL:
+            self._last_purge = now
+            self.purge()
+        inode = _get_netns_inode(namespace)
+        with self._lock:
+            handle = self._handles.pop(namespace, None)
+            if handle is not None and handle.inode == inode:
+                self._handles[namespace] = handle
+                handle.users += 1
+                self.stats['hits'] += 1
+                return handle
+            if handle is not None:
+                self._remove(handle)
+        # do not try and create the namespace
+        ip = pyroute2.NetNS(namespace, flags=0)
+        with self._lock:
+            self.stats['opens'] += 1
+            if inode is None:
+                # not a named namespace, the handle can't be invalidated
+                return ip
+            handle = _NetNSHandle(self, ip, inode)
+            previous = self._handles.pop(namespace, None)
+            if previous is not None:
+                self._remove(previous)
+            self._handles[namespace] = handle
+            handle.users += 1
+            while len(self._handles) > self.size:
+                self._remove(self._handles.popitem(last=False)[1])
+                self.stats['evictions'] += 1
+        return handle
+
+    def release(self, handle):
+        with self._lock:
+            handle.users -= 1
+            if handle.removed and not handle.users:
+                handle.ip.close()
+
+    def invalidate(self, namespace):
+        with self._lock:
+            handle = self._handles.pop(namespace, None)
+            if handle is not None:
+                self._remove(handle)
+
+    def purge(self):
+        """Close the handles of the namespaces deleted or replaced."""
+        with self._lock:
+            namespaces = list(self._handles)
+        inodes = {namespace: _get_netns_inode(namespace)
+                  for namespace in namespaces}
+        with self._lock:
+            for namespace, inode in inodes.items():
+                handle = self._handles.get(namespace)
+                if handle is not None and handle.inode != inode:
+                    del self._handles[namespace]
+                    self._remove(handle)
+                    self.stats['purges'] += 1
+
+    def get_stats(self):
+        """Return the stats of the pool and its number of handles."""
+        self.purge()
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._handles)
+        return stats
+
+    def _remove(self, handle):
+        handle.removed = True
+        if not handle.users:
+            handle.ip.close()
+
+
+_netns_pool = _NetNSPool(NETNS_POOL_SIZE)
+
+
 def _get_iproute(namespace):
     # From iproute.py:
     # `IPRoute` -- RTNL API to the current network namespace
     # `NetNS` -- RTNL API to another network namespace
+    if getattr(_batch, 'ip', None) is not None and (
+            _batch.namespace == namespace):
+        return _BatchIPRoute(_batch.ip)
     if namespace:
-        # do not try and create the namespace
-        return pyroute2.NetNS(namespace, flags=0)
+        return _netns_pool.get(namespace)
     else:
         return pyroute2.IPRoute()
 
@@ -147,11 +322,17 @@ def _translate_ip_device_exception(e, device=None, namespace=None):
 
 
 def _get_link_id(device, namespace):
+    link_ids = getattr(_batch, 'link_ids', None)
+    if link_ids is not None and device in link_ids:
+        return link_ids[device]
     try:
         with _get_iproute(namespace) as ip:
-            return ip.link_lookup(ifname=device)[0]
+            link_id = ip.link_lookup(ifname=device)[0]
     except IndexError:
         raise NetworkInterfaceNotFound(device=device, namespace=namespace)
+    if link_ids is not None:
+        link_ids[device] = link_id
+    return link_id
 
 
 def _run_iproute_link(command, device, namespace=None, **kwargs):
@@ -385,6 +566,320 @@ def dump_neigh_entries(ip_version, device, namespace, **kwargs):
     return entries
 
 
+def _get_link_names(ip):
+    return {link['index']: link.get_attr('IFLA_IFNAME')
+            for link in ip.get_links()}
+
+
+def _run_iproute_rule(command, namespace, ip_version, **kwargs):
+    family = _IP_VERSION_FAMILY_MAP[ip_version]
+    try:
+        with _get_iproute(namespace) as ip:
+            if command == 'dump':
+                return list(ip.get_rules(family=family))
+            return list(ip.rule(command, family=family, **kwargs))
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise NetworkNamespaceNotFound(netns_name=namespace)
+        raise
+
+
+@privileged.default.entrypoint
+def add_ip_rule(namespace, ip_version, **kwargs):
+    """Add a policy routing rule.
+
+    :param namespace: The name of the namespace in which to add the rule
+    :param ip_version: IP version of the rule (4 or 6)
+    :param kwargs: the pyroute2 rule arguments, for example priority, table,
+        src, src_len, iifname, fwmark or action
+    """
+    try:
+        _run_iproute_rule('add', namespace, ip_version, **kwargs)
+    except NetlinkError as e:
+        if e.code == errno.EEXIST:
+            return
+        raise
+
+
+@privileged.default.entrypoint
+def delete_ip_rule(namespace, ip_version, **kwargs):
+    """Delete a policy routing rule.
+
+    :param namespace: The name of the namespace in which to delete the rule
+    :param ip_version: IP version of the rule (4 or 6)
+    :param kwargs: the pyroute2 rule arguments, see add_ip_rule
+    """
+    try:
+        _run_iproute_rule('delete', namespace, ip_version, **kwargs)
+    except NetlinkError as e:
+        # trying to delete a non-existent rule shouldn't raise an error
+        if e.code == errno.ENOENT:
+            return
+        raise
+
+
+@privileged.default.entrypoint
+def list_ip_rules(namespace, ip_version):
+    """List the policy routing rules.
+
+    :param namespace: The name of the namespace from which to get the rules
+    :param ip_version: IP version of the rules to return (4 or 6)
+    :return: a list of dictionaries, each representing a rule.
+    The dictionary format is: {'priority': priority, 'table': table id,
+                               'action': FR_ACT_* action,
+                               'src': ip_address, 'src_len': prefix length,
+                               'dst': ip_address, 'dst_len': prefix length,
+                               'iifname': device_name,
+                               'oifname': device_name,
+                               'fwmark': mark, 'fwmask': mask}
+    """
+    rules = _run_iproute_rule('dump', namespace, ip_version)
+    return [{'priority': rule.get_attr('FRA_PRIORITY') or 0,
+             'table': rule.get_attr('FRA_TABLE') or rule['table'],
+             'action': rule['action'],
+             'src': rule.get_attr('FRA_SRC'),
+             'src_len': rule['src_len'],
+             'dst': rule.get_attr('FRA_DST'),
+             'dst_len': rule['dst_len'],
+             'iifname': rule.get_attr('FRA_IIFNAME'),
+             'oifname': rule.get_attr('FRA_OIFNAME'),
+             'fwmark': rule.get_attr('FRA_FWMARK'),
+             'fwmask': rule.get_attr('FRA_FWMASK')}
+            for rule in rules]
+
+
+def _run_iproute_route(command, namespace, device=None, **kwargs):
+    try:
+        with _get_iproute(namespace) as ip:
+            if device:
+                kwargs['oif'] = _get_link_id(device, namespace)
+            return ip.route(command, **kwargs)
+    except NetlinkError as e:
+        _translate_ip_device_exception(e, device, namespace)
+        raise
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise NetworkNamespaceNotFound(netns_name=namespace)
+        raise
+
+
+@privileged.default.entrypoint
+def add_ip_route(namespace, ip_version, device=None, **kwargs):
+    """Add or replace a route.
+
+    :param namespace: The name of the namespace in which to add the route
+    :param ip_version: IP version of the route (4 or 6)
+    :param device: Name of the output device of the route
+    :param kwargs: the pyroute2 route arguments, for example dst, dst_len,
+        gateway, table, priority, scope or proto
+    """
+    family = _IP_VERSION_FAMILY_MAP[ip_version]
+    _run_iproute_route('replace', namespace, device, family=family,
+                       **kwargs)
+
+
+@privileged.default.entrypoint
+def delete_ip_route(namespace, ip_version, device=None, **kwargs):
+    """Delete a route.
+
+    :param namespace: The name of the namespace in which to delete the route
+    :param ip_version: IP version of the route (4 or 6)
+    :param device: Name of the output device of the route
+    :param kwargs: the pyroute2 route arguments, see add_ip_route
+    """
+    family = _IP_VERSION_FAMILY_MAP[ip_version]
+    try:
+        _run_iproute_route('delete', namespace, device, family=family,
+                           **kwargs)
+    except NetlinkError as e:
+        # trying to delete a non-existent route shouldn't raise an error
+        if e.code == errno.ESRCH:
+            return
+        raise
+
+
+def _get_routes(ip, namespace, ip_version, device, table):
+    family = _IP_VERSION_FAMILY_MAP[ip_version]
+    if device:
+        oif = _get_link_id(device, namespace)
+        links = {oif: device}
+    else:
+        links = _get_link_names(ip)
+    routes = [route for route in ip.get_routes(family=family)
+              if (route.get_attr('RTA_TABLE') or route['table']) == table and
+              (not device or route.get_attr('RTA_OIF') == oif)]
+    return routes, links
+
+
+@privileged.default.entrypoint
+def list_ip_routes(namespace, ip_version, device=None,
+                   table=RT_TABLE_MAIN):
+    """List the routes of a routing table.
+
+    :param namespace: The name of the namespace from which to get the routes
+    :param ip_version: IP version of the routes to return (4 or 6)
+    :param device: If set, only the routes using this device are returned
+    :param table: The id of the routing table
+    :return: a list of dictionaries, each representing a route.
+    The dictionary format is: {'dst': ip_address, 'dst_len': prefix length,
+                               'gateway': ip_address,
+                               'device': device_name,
+                               'prefsrc': ip_address, 'priority': metric,
+                               'scope': scope, 'proto': protocol,
+                               'type': route type}
+    """
+    try:
+        with _get_iproute(namespace) as ip:
+            routes, links = _get_routes(ip, namespace, ip_version, device,
+                                        table)
+    except NetlinkError as e:
+        _translate_ip_device_exception(e, device, namespace)
+        raise
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise NetworkNamespaceNotFound(netns_name=namespace)
+        raise
+    return [{'dst': route.get_attr('RTA_DST'),
+             'dst_len': route['dst_len'],
+             'gateway': route.get_attr('RTA_GATEWAY'),
+             'device': links.get(route.get_attr('RTA_OIF')),
+             'prefsrc': route.get_attr('RTA_PREFSRC'),
+             'priority': route.get_attr('RTA_PRIORITY'),
+             'scope': route['scope'],
+             'proto': route['proto'],
+             'type': route['type']}
+            for route in routes]
+
+
+@privileged.default.entrypoint
+def flush_ip_routes(namespace, ip_version, table=RT_TABLE_MAIN):
+    """Delete all the routes of a routing table.
+
+    :param namespace: The name of the namespace in which to delete the routes
+    :param ip_version: IP version of the routes to delete (4 or 6)
+    :param table: The id of the routing table
+    """
+    try:
+        with _get_iproute(namespace) as ip:
+            routes, _links = _get_routes(ip, namespace, ip_version, None,
+                                         table)
+            for route in routes:
+                # the dumped route identifies it, as in "ip route flush"
+                try:
+                    ip.nlm_request(route, msg_type=rtnl.RTM_DELROUTE,
+                                   msg_flags=(netlink.NLM_F_REQUEST |
+                                              netlink.NLM_F_ACK))
+                except NetlinkError as e:
+                    if e.code != errno.ESRCH:
+                        raise
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise NetworkNamespaceNotFound(netns_name=namespace)
+        raise
+
+
+@privileged.default.entrypoint
+def get_ip_addresses(namespace, ip_version=None, device=None):
+    """List the IP addresses.
+
+    :param namespace: The name of the namespace from which to get the
+        addresses
+    :param ip_version: IP version of the addresses to return (4 or 6), all
+        the addresses are returned if not set
+    :param device: If set, only the addresses of this device are returned
+    :return: a list of dictionaries, each representing an address.
+    The dictionary format is: {'device': device_name,
+                               'address': ip_address,
+                               'prefixlen': prefix length,
+                               'scope': scope,
+                               'broadcast': ip_address,
+                               'flags': IFA_F_* flags}
+    """
+    family = _IP_VERSION_FAMILY_MAP.get(ip_version, socket.AF_UNSPEC)
+    try:
+        with _get_iproute(namespace) as ip:
+            if device:
+                links = {_get_link_id(device, namespace): device}
+                addresses = list(ip.get_addr(family=family,
+                                             index=list(links)[0]))
+            else:
+                links = _get_link_names(ip)
+                addresses = list(ip.get_addr(family=family))
+    except NetlinkError as e:
+        _translate_ip_device_exception(e, device, namespace)
+        raise
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise NetworkNamespaceNotFound(netns_name=namespace)
+        raise
+    # IFA_LOCAL is the address of the interface, IFA_ADDRESS is the address
+    # of the peer for point to point IPv4 interfaces
+    return [{'device': links.get(address['index']),
+             'address': (address.get_attr('IFA_LOCAL') or
+                         address.get_attr('IFA_ADDRESS')),
+             'prefixlen': address['prefixlen'],
+             'scope': address['scope'],
+             'broadcast': address.get_attr('IFA_BROADCAST'),
+             'flags': address.get_attr('IFA_FLAGS') or address['flags']}
+            for address in addresses]
+
+
+def _get_batch_error(e):
+    if isinstance(e, BATCH_EXCEPTIONS):
+        return [type(e).__name__, str(e)]
+    return [RuntimeError.__name__, str(e)]
+
+
+@privileged.default.entrypoint
+def run_batch(namespace, operations):
+    """Run several operations in a namespace with a single netlink socket.
+
+    :param namespace: The name of the namespace of the operations
+    :param operations: list of (function name, args, kwargs) of the
+        functions of BATCH_OPERATIONS, in the order to run them
+    :return: a list with, for each operation, None if it succeeded or the
+        [exception class name, message] of its failure, see
+        get_batch_exception. A failure doesn't stop the next operations.
+    """
+    for name, _args, _kwargs in operations:
+        if name not in BATCH_OPERATIONS:
+            raise ValueError(_("Operation %s can't be batched") % name)
+    try:
+        iproute = _get_iproute(namespace)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise NetworkNamespaceNotFound(netns_name=namespace)
+        raise
+
+    results = []
+    with iproute as ip:
+        _batch.namespace = namespace
+        _batch.ip = ip
+        _batch.link_ids = {}
+        try:
+            for name, args, kwargs in operations:
+                try:
+                    globals()[name](*args, **kwargs)
+                    results.append(None)
+                except Exception as e:
+                    results.append(_get_batch_error(e))
+                if name == 'set_link_attribute':
+                    # the device could have been renamed or moved
+                    _batch.link_ids.clear()
+        finally:
+            _batch.ip = _batch.namespace = _batch.link_ids = None
+    return results
+
+
+def get_batch_exception(error):
+    """Return the exception of an operation error returned by run_batch."""
+    name, message = error
+    for exception in BATCH_EXCEPTIONS:
+        if exception.__name__ == name:
+            return exception(message)
+    return RuntimeError(message)
+
+
 @privileged.default.entrypoint
 def create_netns(name, **kwargs):
     """Create a network namespace.
@@ -404,9 +899,22 @@ def remove_netns(name, **kwargs):
 
     :param name: The name of the namespace to remove
     """
+    _netns_pool.invalidate(name)
     netns.remove(name, **kwargs)
 
 
+@privileged.default.entrypoint
+def get_netns_pool_stats():
+    """Return the counters of the namespace netlink handle pool.
+
+    :return: a dictionary with the number of handles opened ('opens'), reused
+        ('hits'), evicted from the pool ('evictions') and closed because
+        their namespace was deleted or replaced ('purges'), and the number
+        of handles in the pool ('size')
+    """
+    return _netns_pool.get_stats()
+
+
 @privileged.default.entrypoint
 def list_netns(**kwargs):
     """List network namespaces.
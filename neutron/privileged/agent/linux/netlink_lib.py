@@ -257,6 +257,60 @@ def list_entries(zone):
     return sorted(parsed_entries, key=lambda x: x[3])
 
 
+def _get_zone(raw_entry):
+    match = re.search(r'\bzone=(\d+)\b', raw_entry)
+    return int(match.group(1)) if match else None
+
+
+def _match_filter(parsed_entry, entry_filter):
+    ipversion, protocol, src, dst = entry_filter
+    return (parsed_entry[0] == ipversion and
+            protocol in (None, parsed_entry[1]) and
+            src in (None, parsed_entry[4]) and
+            dst in (None, parsed_entry[5]))
+
+
+@privileged.default.entrypoint
+def delete_entries_by_filters(filters):
+    """Delete the entries matching any of the filters of their zone
+
+    The conntrack table is dumped once per ip version for all the filters,
+    and the matching entries are deleted with a single conntrack handler.
+
+    :param filters: list of filters in format
+        (zone, ipversion, protocol, src_ip, dst_ip), protocol, src_ip and
+        dst_ip being None to match any value. Only the entries of the
+        protocols of ATTR_POSITIONS are matched, even by a None protocol.
+    example: [(4097, 4, 'tcp', None, '10.0.0.1'),
+              (4097, 4, None, '10.0.0.2', '10.0.0.1')]
+    :return: number of deleted entries
+    """
+    zone_filters = {}
+    for entry_filter in filters:
+        zone_filters.setdefault(int(entry_filter[0]), []).append(
+            tuple(entry_filter[1:]))
+
+    entries = []
+    for ipversion in IP_VERSIONS:
+        with ConntrackManager(nl_constants.IPVERSION_SOCKET[ipversion]) \
+                as conntrack:
+            raw_entries = conntrack.list_entries()
+
+        for raw_entry in raw_entries:
+            zone = _get_zone(raw_entry)
+            _entry = raw_entry.split()
+            if zone not in zone_filters or _entry[1] not in ATTR_POSITIONS:
+                continue
+            parsed_entry = _parse_entry(_entry, ipversion, zone)
+            if any(_match_filter(parsed_entry, entry_filter)
+                   for entry_filter in zone_filters[zone]):
+                entries.append(parsed_entry)
+
+    if entries:
+        _delete_entries(entries)
+    return len(entries)
+
+
 @privileged.default.entrypoint
 def delete_entries(entries):
     """Delete selected entries
@@ -264,6 +318,10 @@ def delete_entries(entries):
     :param entries: list of parsed (as tuple) entries to delete
     :return: None
     """
+    _delete_entries(entries)
+
+
+def _delete_entries(entries):
     entry_args = []
     for entry in entries:
         entry_arg = {'ipversion': entry[0], 'protocol': entry[1]}
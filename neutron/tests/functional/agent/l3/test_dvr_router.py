@@ -947,22 +947,13 @@ class TestDvrRouter(framework.L3AgentTestFramework):
 
     def _get_fixed_ip_rule_priority(self, namespace, fip):
         iprule = ip_lib.IPRule(namespace)
-        lines = iprule.rule._as_root([4], ['show']).splitlines()
-        for line in lines:
-            if fip in line:
-                info = iprule.rule._parse_line(4, line)
-                return info['priority']
+        for rule in iprule.rule.list_rules(4):
+            if fip in (rule.get('from'), rule.get('to')):
+                return rule['priority']
 
     def _fixed_ip_rule_exists(self, namespace, ip):
         iprule = ip_lib.IPRule(namespace)
-        lines = iprule.rule._as_root([4], ['show']).splitlines()
-        for line in lines:
-            if ip in line:
-                info = iprule.rule._parse_line(4, line)
-                if info['from'] == ip:
-                    return True
-
-        return False
+        return any(rule['from'] == ip for rule in iprule.rule.list_rules(4))
 
     def test_dvr_router_add_internal_network_set_arp_cache(self):
         # Check that, when the router is set up and there are
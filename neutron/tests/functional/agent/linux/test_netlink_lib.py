@@ -129,3 +129,15 @@ class NetlinkLibTestCase(functional_base.BaseSudoTestCase):
         )
         remain_entries = ()
         self._delete_entry(delete_entries, remain_entries, _zone)
+
+    def test_delete_entries_by_filters(self):
+        _zone = self._find_unused_zone_id(111, 130)
+        self._create_entries(zone=_zone)
+        deleted = nl_lib.delete_entries_by_filters(
+            [(_zone, 4, 'tcp', None, '2.2.2.2'),
+             (_zone, 4, None, '1.1.1.1', '3.3.3.3'),
+             (_zone, 4, 'icmp', '1.1.1.1', None)])
+        self.assertEqual(2, deleted)
+        entries_list = nl_lib.list_entries(zone=_zone)
+        self.assertEqual(
+            [(4, 'udp', 4, 5, '1.1.1.1', '2.2.2.2', _zone)], entries_list)
@@ -0,0 +1,104 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_serialization import jsonutils
+
+from neutron.agent.common import loop_stats
+from neutron.tests import base
+
+
+class TestHistogram(base.BaseTestCase):
+
+    def test_observe(self):
+        histogram = loop_stats.Histogram()
+        for value in (0.001, 0.01, 0.3, 100):
+            histogram.observe(value)
+        result = histogram.to_dict()
+        self.assertEqual(4, result['count'])
+        self.assertAlmostEqual(100.311, result['sum'])
+        self.assertEqual(100, result['max'])
+        buckets = dict((str(bound), count)
+                       for bound, count in result['buckets'])
+        self.assertEqual(2, buckets['0.01'])
+        self.assertEqual(1, buckets['0.5'])
+        self.assertEqual(1, buckets['+Inf'])
+        self.assertEqual(4, sum(buckets.values()))
+
+
+class TestLoopStats(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLoopStats, self).setUp()
+        self.now = 1000
+        mock.patch.object(loop_stats.time, 'time',
+                          side_effect=lambda: self.now).start()
+        self.stats = loop_stats.LoopStats(slow_threshold=10)
+
+    def _run_iteration(self):
+        self.stats.start_iteration()
+        with self.stats.phase('scan'):
+            self.now += 2
+        with self.stats.phase('flow_install'):
+            self.now += 1
+            with self.stats.phase('rpc_fetch'):
+                self.now += 4
+        with self.stats.phase('flow_install'):
+            self.now += 1
+        return self.stats.end_iteration(5, 9)
+
+    def test_phases(self):
+        self.assertEqual({'scan': 2, 'flow_install': 2, 'rpc_fetch': 4,
+                          'other': 1}, self._run_iteration())
+        self.assertEqual(9, self.stats.last_iteration['elapsed'])
+        self.assertEqual(5, self.stats.last_iteration['iter_num'])
+        self._run_iteration()
+        self.assertEqual(2, self.stats.iterations)
+        self.assertEqual(2, self.stats.histograms['total'].count)
+        self.assertEqual(8, self.stats.histograms['rpc_fetch'].sum)
+
+    def test_phases_cleared_between_iterations(self):
+        self._run_iteration()
+        self.stats.start_iteration()
+        self.assertEqual({'other': 1}, self.stats.end_iteration(6, 1))
+
+    def test_slow_iteration_logged(self):
+        with mock.patch.object(loop_stats.LOG, 'warning') as warning:
+            self._run_iteration()
+            self.assertFalse(warning.called)
+            self.stats.start_iteration()
+            with self.stats.phase('scan'):
+                self.now += 20
+            self.stats.end_iteration(6, 21)
+            self.assertEqual(1, warning.call_count)
+            self.assertEqual('scan=20.000, other=1.000',
+                             warning.call_args[0][1]['phases'])
+        self.assertEqual(1, self.stats.slow_iterations)
+
+    def test_write_stats_file(self):
+        self.stats.stats_file = self.get_temp_file_path('stats.json')
+        self._run_iteration()
+        with open(self.stats.stats_file) as f:
+            stats = jsonutils.loads(f.read())
+        self.assertEqual(1, stats['iterations'])
+        self.assertEqual(
+            {'scan', 'flow_install', 'rpc_fetch', 'other', 'total'},
+            set(stats['histograms']))
+        self.assertEqual(4, stats['last_iteration']['phases']['rpc_fetch'])
+
+    def test_write_stats_file_failure(self):
+        self.stats.stats_file = '/nonexistent/stats.json'
+        with mock.patch.object(loop_stats.LOG, 'exception') as exc:
+            self._run_iteration()
+            self._run_iteration()
+        self.assertEqual(1, exc.call_count)
+        self.assertIsNone(self.stats.stats_file)
@@ -622,6 +622,51 @@ class OVS_Lib_Test(base.BaseTestCase):
 
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def test_add_tunnel_ports(self):
+        tunnels = collections.OrderedDict([("gre-1", "9.9.9.9"),
+                                           ("gre-2", "8.8.8.8")])
+        local_ip = "1.1.1.1"
+        command = []
+        for pname, remote_ip in tunnels.items():
+            if command:
+                command.append("--")
+            command.extend(["--may-exist", "add-port", self.BR_NAME, pname])
+            command.extend(["--", "set", "Interface", pname])
+            command.extend(["type=gre", "options:df_default=true",
+                            "options:remote_ip=" + remote_ip,
+                            "options:local_ip=" + local_ip,
+                            "options:in_key=flow",
+                            "options:out_key=flow",
+                            "options:egress_pkt_mark=0"])
+        # Each element is a tuple of (expected mock call, return_value)
+        expected_calls_and_values = [
+            (self._vsctl_mock(*command), None),
+            (self._vsctl_mock("--if-exists", "--columns=name,ofport",
+                              "list", "Interface", "gre-1", "gre-2"),
+             self._encode_ovs_json(['name', 'ofport'],
+                                   [['gre-1', 6], ['gre-2', []]])),
+            # the ofport not assigned yet is retrieved again
+            (self._vsctl_mock("--columns=ofport", "list", "Interface",
+                              "gre-2"),
+             self._encode_ovs_json(['ofport'], [[7]])),
+        ]
+        tools.setup_mock_calls(self.execute, expected_calls_and_values)
+
+        self.assertEqual({"gre-1": 6, "gre-2": 7},
+                         self.br.add_tunnel_ports(tunnels, local_ip))
+
+        tools.verify_mock_calls(self.execute, expected_calls_and_values)
+
+    def test_add_tunnel_ports_no_tunnels(self):
+        self.assertEqual({}, self.br.add_tunnel_ports({}, "1.1.1.1"))
+        self.assertFalse(self.execute.called)
+
+    def test_delete_ports_by_name(self):
+        self.br.delete_ports_by_name(["gre-1", "gre-2"])
+        self._verify_vsctl_mock(
+            "--if-exists", "del-port", self.BR_NAME, "gre-1", "--",
+            "--if-exists", "del-port", self.BR_NAME, "gre-2")
+
     def _encode_ovs_json(self, headings, data):
         # See man ovs-vsctl(8) for the encoding details.
         r = {"data": [],
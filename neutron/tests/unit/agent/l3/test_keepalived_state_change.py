@@ -0,0 +1,105 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.l3 import keepalived_state_change
+from neutron.agent.linux import daemon
+from neutron.agent.linux import ip_lib
+from neutron.agent.linux import ip_monitor
+from neutron.tests import base
+
+INTERFACE = 'ha-interface'
+CIDR = '169.254.0.1/24'
+
+
+class TestMonitorDaemon(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMonitorDaemon, self).setUp()
+        self.daemon = keepalived_state_change.MonitorDaemon(
+            None, 'router-id', None, None, 'ns', '/conf_dir',
+            INTERFACE, CIDR)
+        self.daemon_run = mock.patch.object(daemon.Daemon, 'run').start()
+        self.handle_initial_state = mock.patch.object(
+            self.daemon, 'handle_initial_state').start()
+        self.handle_event = mock.patch.object(
+            self.daemon, 'handle_event').start()
+
+    @mock.patch.object(ip_monitor, 'IPMonitor')
+    def test_run_as_root(self, ip_monitor_cls):
+        monitor = ip_monitor_cls.return_value
+        monitor.iter_events.return_value = [mock.sentinel.event]
+        self.daemon.run(run_as_root=True)
+
+        ip_monitor_cls.assert_called_once_with(namespace='ns',
+                                               run_as_root=True)
+        monitor.start.assert_called_once_with()
+        # the privileges are not dropped, the root helper is used instead
+        self.daemon_run.assert_not_called()
+        self.handle_initial_state.assert_called_once_with()
+        self.handle_event.assert_called_once_with(mock.sentinel.event)
+
+    @mock.patch.object(ip_monitor, 'NetlinkIPMonitor')
+    def test_run(self, ip_monitor_cls):
+        monitor = ip_monitor_cls.return_value
+        monitor.iter_events.return_value = [mock.sentinel.event]
+        self.daemon.run()
+
+        ip_monitor_cls.assert_called_once_with(
+            namespace='ns', resync_callback=self.handle_initial_state)
+        monitor.start.assert_called_once_with()
+        self.daemon_run.assert_called_once_with()
+        self.handle_initial_state.assert_called_once_with()
+        self.handle_event.assert_called_once_with(mock.sentinel.event)
+
+
+class TestMonitorDaemonInitialState(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMonitorDaemonInitialState, self).setUp()
+        self.daemon = keepalived_state_change.MonitorDaemon(
+            None, 'router-id', None, None, 'ns', '/conf_dir',
+            INTERFACE, CIDR)
+        self.addr_list = mock.patch.object(ip_lib.IpAddrCommand,
+                                           'list').start()
+        self.write_state_change = mock.patch.object(
+            self.daemon, 'write_state_change',
+            side_effect=self._write_state_change).start()
+        self.notify_agent = mock.patch.object(self.daemon,
+                                              'notify_agent').start()
+
+    def _write_state_change(self, state):
+        self.daemon._state = state
+
+    def test_handle_initial_state_master(self):
+        self.addr_list.return_value = [{'cidr': CIDR}]
+        self.daemon.handle_initial_state()
+        self.write_state_change.assert_called_once_with('master')
+        self.notify_agent.assert_called_once_with('master')
+
+    def test_handle_initial_state_backup(self):
+        self.addr_list.return_value = []
+        self.daemon.handle_initial_state()
+        self.write_state_change.assert_not_called()
+        self.notify_agent.assert_not_called()
+
+    def test_handle_initial_state_resync(self):
+        self.addr_list.return_value = [{'cidr': CIDR}]
+        self.daemon.handle_initial_state()
+        self.daemon.handle_initial_state()
+        self.assertEqual(1, self.notify_agent.call_count)
+        # the address was removed while the monitor events were lost
+        self.addr_list.return_value = []
+        self.daemon.handle_initial_state()
+        self.write_state_change.assert_called_with('backup')
+        self.notify_agent.assert_called_with('backup')
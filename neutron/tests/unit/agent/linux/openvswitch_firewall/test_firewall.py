@@ -13,6 +13,7 @@
 #    under the License.
 
 import mock
+import netaddr
 from neutron_lib.callbacks import events as callbacks_events
 from neutron_lib.callbacks import registry as callbacks_registry
 from neutron_lib.callbacks import resources as callbacks_resources
@@ -294,6 +295,35 @@ class TestConjIdMap(base.BaseTestCase):
         self.assertIn(reallocated, ids)
 
 
+class TestAddressAggregate(base.BaseTestCase):
+    def setUp(self):
+        super(TestAddressAggregate, self).setUp()
+        self.aggregate = ovsfw.AddressAggregate()
+
+    def test_update_merges_contiguous_addresses(self):
+        self.aggregate.update(
+            {'10.0.%d.%d' % (i // 256, i % 256) for i in range(4096)})
+        self.assertEqual(['10.0.0.0/20'], self.aggregate.prefixes)
+
+    def test_update_member_removed(self):
+        self.aggregate.update({'10.0.0.%d' % i for i in range(4)})
+        self.aggregate.update({'10.0.0.%d' % i for i in range(3)})
+        self.assertEqual(['10.0.0.0/31', '10.0.0.2/32'],
+                         self.aggregate.prefixes)
+
+    def test_update_member_removed_covered_by_network(self):
+        self.aggregate.update({'10.0.0.0/24', '10.0.0.5', '10.0.1.1'})
+        self.aggregate.update({'10.0.0.0/24', '10.0.1.1'})
+        self.assertEqual(['10.0.0.0/24', '10.0.1.1/32'],
+                         self.aggregate.prefixes)
+
+    def test_update_network_removed(self):
+        self.aggregate.update({'10.0.0.0/24', '10.0.0.5', '10.0.1.1'})
+        self.aggregate.update({'10.0.0.5', '10.0.1.1'})
+        self.assertEqual(['10.0.0.5/32', '10.0.1.1/32'],
+                         self.aggregate.prefixes)
+
+
 class TestConjIPFlowManager(base.BaseTestCase):
     def setUp(self):
         super(TestConjIPFlowManager, self).setUp()
@@ -328,6 +358,41 @@ class TestConjIPFlowManager(base.BaseTestCase):
                        dl_type=2048, nw_src='10.22.3.4/32', priority=73,
                        reg_net=self.vlan_tag, table=82)])
 
+    def test_update_flows_for_vlan_aggregates_addresses(self):
+        remote_group = self.driver.sg_port_map.get_sg.return_value
+        remote_group.get_ethertype_filtered_addresses.return_value = [
+            '10.22.3.%d' % i for i in range(256)]
+        with mock.patch.object(self.manager.conj_id_map,
+                               'get_conj_id') as get_conj_id_mock:
+            get_conj_id_mock.return_value = self.conj_id
+            self.manager.add(self.vlan_tag, 'sg', 'remote_id',
+                             constants.INGRESS_DIRECTION, constants.IPv4, 0)
+            self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.assertEqual(self.driver._add_flow.call_args_list,
+            [mock.call(actions='conjunction(16,1/2)', ct_state='+est-rel-rpl',
+                       dl_type=2048, nw_src='10.22.3.0/24', priority=70,
+                       reg_net=self.vlan_tag, table=82),
+             mock.call(actions='conjunction(17,1/2)', ct_state='+new-est',
+                       dl_type=2048, nw_src='10.22.3.0/24', priority=70,
+                       reg_net=self.vlan_tag, table=82)])
+
+        # A member leaving the group splits the aggregate
+        self.driver.reset_mock()
+        remote_group.get_ethertype_filtered_addresses.return_value = [
+            '10.22.3.%d' % i for i in range(255)]
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.driver.delete_flows_for_ip_addresses.assert_called_once_with(
+            {'10.22.3.0/24'}, constants.INGRESS_DIRECTION, constants.IPv4,
+            self.vlan_tag)
+        self.assertEqual(
+            ['10.22.3.0/25', '10.22.3.128/26', '10.22.3.192/27',
+             '10.22.3.224/28', '10.22.3.240/29', '10.22.3.248/30',
+             '10.22.3.252/31', '10.22.3.254/32'],
+            sorted(self.manager.flow_state[self.vlan_tag][(
+                constants.INGRESS_DIRECTION, constants.IPv4)],
+                key=lambda prefix: netaddr.IPNetwork(prefix)))
+        self.assertEqual(16, self.driver._add_flow.call_count)
+
     def test_sg_removed(self):
         with mock.patch.object(self.manager.conj_id_map,
                                'get_conj_id') as get_id_mock, \
@@ -571,7 +636,18 @@ class TestOVSFirewallDriver(base.BaseTestCase):
         self.mock_bridge.reset_mock()
 
         self.firewall.update_port_filter(port_dict)
-        self.assertTrue(self.mock_bridge.br.delete_flows.called)
+        # Only the flows of the rules of the removed security group are
+        # deleted, all the other port flows are kept
+        self.assertFalse(self.mock_bridge.br.delete_flows.called)
+        self.mock_bridge.br.do_action_flows.assert_called_once_with(
+            'del', mock.ANY)
+        deleted_flows = self.mock_bridge.br.do_action_flows.call_args[0][1]
+        self.assertTrue(deleted_flows)
+        for flow in deleted_flows:
+            self.assertTrue(flow['strict'])
+            self.assertNotIn('actions', flow)
+            self.assertEqual(constants.PROTO_NUM_TCP, flow['nw_proto'])
+            self.assertEqual(ovs_consts.RULES_INGRESS_TABLE, flow['table'])
         conj_id = self.firewall.conj_ip_manager.conj_id_map.get_conj_id(
             2, 2, constants.EGRESS_DIRECTION, constants.IPv6)
         filter_rules = [mock.call(
@@ -627,10 +703,76 @@ class TestOVSFirewallDriver(base.BaseTestCase):
                      'security_groups': [1]}
         self._prepare_security_group()
         self.firewall.prepare_port_filter(port_dict)
+        port_dict['allowed_address_pairs'] = [
+            {'mac_address': 'aa:bb:cc:dd:ee:ff',
+             'ip_address': '192.168.0.1'}]
         with self.firewall.defer_apply():
             self.firewall.update_port_filter(port_dict)
         self.assertEqual(2, self.mock_bridge.apply_flows.call_count)
 
+    def test_update_port_filter_rules_changed_only(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        self._prepare_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.mock_bridge.reset_mock()
+        self.firewall.update_security_group_rules(1, [
+            {'ethertype': constants.IPv4,
+             'protocol': constants.PROTO_NAME_TCP,
+             'direction': constants.INGRESS_DIRECTION,
+             'port_range_min': 123,
+             'port_range_max': 123},
+            {'ethertype': constants.IPv4,
+             'protocol': constants.PROTO_NAME_UDP,
+             'direction': constants.INGRESS_DIRECTION,
+             'port_range_min': 53,
+             'port_range_max': 53}])
+        with mock.patch.object(self.firewall,
+                               'delete_all_port_flows') as delete_all,\
+                mock.patch.object(self.firewall,
+                                  'initialize_port_flows') as init_flows:
+            with self.firewall.defer_apply():
+                self.firewall.update_port_filter(port_dict)
+        self.assertFalse(delete_all.called)
+        self.assertFalse(init_flows.called)
+        self.assertFalse(self.mock_bridge.br.do_action_flows.called)
+        self.assertEqual(1, self.mock_bridge.apply_flows.call_count)
+        # Only the flows of the new UDP rule are added
+        added_flows = [c[1] for c in self.mock_bridge.add_flow.call_args_list]
+        self.assertEqual(2, len(added_flows))
+        for flow in added_flows:
+            self.assertEqual(constants.PROTO_NUM_UDP, flow['nw_proto'])
+            self.assertEqual('0x0035', flow['udp_dst'])
+
+    def test_update_port_filter_rules_removed_deleted_after_apply(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        self._prepare_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.mock_bridge.reset_mock()
+        self.firewall.update_security_group_rules(1, [])
+        manager = mock.Mock()
+        manager.attach_mock(self.mock_bridge.apply_flows, 'apply_flows')
+        manager.attach_mock(self.mock_bridge.br.do_action_flows,
+                            'do_action_flows')
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(port_dict)
+            self.assertFalse(self.mock_bridge.br.do_action_flows.called)
+        self.assertEqual(['apply_flows', 'do_action_flows'],
+                         [c[0] for c in manager.mock_calls])
+        self.assertFalse(self.mock_bridge.add_flow.called)
+
+    def test_update_port_filter_nothing_changed(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        self._prepare_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.mock_bridge.reset_mock()
+        self.firewall.update_port_filter(port_dict)
+        self.assertFalse(self.mock_bridge.br.add_flow.called)
+        self.assertFalse(self.mock_bridge.br.delete_flows.called)
+        self.assertFalse(self.mock_bridge.br.do_action_flows.called)
+
     def test_remove_port_filter(self):
         port_dict = {'device': 'port-id',
                      'security_groups': [1]}
@@ -29,6 +29,7 @@ from neutron.common import exceptions as n_exc
 from neutron.conf.agent import common as config
 from neutron.conf.agent import dhcp as dhcp_config
 from neutron.conf import common as base_config
+from neutron.privileged.agent.linux import ip_lib as priv_ip_lib
 from neutron.tests import base
 from neutron.tests import tools
 
@@ -1030,6 +1031,8 @@ class TestBase(TestConfBase):
         mock.patch('neutron.agent.linux.utils.execute').start()
         self.safe = self.replace_p.start()
         self.execute = self.execute_p.start()
+        mock.patch.object(priv_ip_lib, 'get_ip_addresses',
+                          return_value=[]).start()
 
         self.makedirs = mock.patch('os.makedirs').start()
         self.rmtree = mock.patch('shutil.rmtree').start()
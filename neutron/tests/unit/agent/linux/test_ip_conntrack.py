@@ -13,8 +13,10 @@
 #    limitations under the License.
 
 import mock
+from oslo_config import cfg
 
 from neutron.agent.linux import ip_conntrack
+from neutron.privileged.agent.linux import netlink_lib
 from neutron.tests import base
 
 
@@ -39,3 +41,78 @@ class IPConntrackTestCase(base.BaseTestCase):
         dev_info_list = [dev_info for _ in range(10)]
         self.mgr._delete_conntrack_state(dev_info_list, rule)
         self.assertEqual(1, len(self.execute.mock_calls))
+
+    def test_process_queue_coalesces_updates(self):
+        rule = {'ethertype': 'IPv4', 'direction': 'ingress'}
+        dev_info = {'device': 'tapdevice', 'fixed_ips': ['1.2.3.4']}
+        for _ in range(3):
+            self.mgr.delete_conntrack_state_by_rule([dev_info], rule)
+        self.mgr._process_queue()
+        self.assertTrue(self.mgr._queue.empty())
+        self.execute.assert_called_once_with(
+            ['conntrack', '-D', '-f', 'ipv4', '-d', '1.2.3.4', '-w', 100],
+            run_as_root=True, check_exit_code=True, extra_ok_codes=[1])
+        self.assertEqual(3, self.mgr.max_queue_depth)
+
+
+class IPConntrackNetlinkTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IPConntrackNetlinkTestCase, self).setUp()
+        cfg.CONF.set_override('conntrack_netlink_delete', True, 'AGENT')
+        self.execute = mock.Mock()
+        self.delete_entries = mock.patch.object(
+            netlink_lib, 'delete_entries_by_filters', return_value=0).start()
+        self.mgr = ip_conntrack.IpConntrackManager(
+            lambda table: ['test --physdev-in tapdevice -j CT --zone 100'],
+            {}, {}, self.execute, zone_per_port=True)
+        self.dev_info = {'device': 'tapdevice',
+                         'fixed_ips': ['1.2.3.4', 'fe80::1']}
+
+    def test_delete_by_rule_and_remote_ips(self):
+        self.mgr.delete_conntrack_state_by_rule(
+            [self.dev_info],
+            {'ethertype': 'IPv4', 'direction': 'egress', 'protocol': '6'})
+        self.mgr.delete_conntrack_state_by_rule(
+            [self.dev_info],
+            {'ethertype': 'IPv6', 'direction': 'ingress',
+             'protocol': 'icmp'})
+        self.mgr.delete_conntrack_state_by_remote_ips(
+            [self.dev_info], 'IPv4', ['5.6.7.8'])
+        self.mgr._process_queue()
+
+        self.delete_entries.assert_called_once_with(mock.ANY)
+        self.assertEqual(
+            set([(100, 4, 'tcp', '1.2.3.4', None),
+                 (100, 6, 'icmpv6', None, 'fe80::1')]),
+            set(self.delete_entries.call_args[0][0]))
+        # netlink_lib doesn't match the entries of all the protocols
+        self.execute.assert_has_calls([
+            mock.call(['conntrack', '-D', '-f', 'ipv4', '-d', '1.2.3.4',
+                       '-w', 100, '-s', '5.6.7.8'],
+                      run_as_root=True, check_exit_code=True,
+                      extra_ok_codes=[1]),
+            mock.call(['conntrack', '-D', '-f', 'ipv4', '-s', '1.2.3.4',
+                       '-w', 100, '-d', '5.6.7.8'],
+                      run_as_root=True, check_exit_code=True,
+                      extra_ok_codes=[1])], any_order=True)
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_delete_unsupported_protocol_with_conntrack(self):
+        self.mgr.delete_conntrack_state_by_rule(
+            [self.dev_info],
+            {'ethertype': 'IPv4', 'direction': 'ingress',
+             'protocol': 'sctp'})
+        self.mgr._process_queue()
+
+        self.assertFalse(self.delete_entries.called)
+        self.execute.assert_called_once_with(
+            ['conntrack', '-D', '-p', 'sctp', '-f', 'ipv4', '-d', '1.2.3.4',
+             '-w', 100],
+            run_as_root=True, check_exit_code=True, extra_ok_codes=[1])
+
+    def test_no_netlink_in_namespace(self):
+        mgr = ip_conntrack.IpConntrackManager(
+            lambda table: [], {}, {}, self.execute, namespace='ns')
+        self.assertFalse(mgr.use_netlink)
+        self.assertTrue(self.mgr.use_netlink)
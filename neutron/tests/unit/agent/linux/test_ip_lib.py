@@ -18,8 +18,10 @@ import socket
 
 import mock
 import netaddr
+from neutron_lib import constants
 from neutron_lib import exceptions
 import pyroute2
+from pyroute2.netlink.rtnl import ifaddrmsg
 from pyroute2.netlink.rtnl import ifinfmsg
 from pyroute2.netlink.rtnl import ndmsg
 from pyroute2 import NetlinkError
@@ -38,127 +40,96 @@ NETNS_SAMPLE = [
     'cccccccc-cccc-cccc-cccc-cccccccccccc']
 
 
-ADDR_SAMPLE = ("""
-2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq state UP qlen 1000
-    link/ether dd:cc:aa:b9:76:ce brd ff:ff:ff:ff:ff:ff
-    inet 172.16.77.240/24 brd 172.16.77.255 scope global eth0
-    inet6 2001:470:9:1224:5595:dd51:6ba2:e788/64 scope global temporary dynamic
-       valid_lft 14187sec preferred_lft 3387sec
-    inet6 fe80::3023:39ff:febc:22ae/64 scope link tentative
-        valid_lft forever preferred_lft forever
-    inet6 fe80::3023:39ff:febc:22af/64 scope link tentative dadfailed
-        valid_lft forever preferred_lft forever
-    inet6 2001:470:9:1224:fd91:272:581e:3a32/64 scope global temporary """
-               """deprecated dynamic
-       valid_lft 14187sec preferred_lft 0sec
-    inet6 2001:470:9:1224:4508:b885:5fb:740b/64 scope global temporary """
-               """deprecated dynamic
-       valid_lft 14187sec preferred_lft 0sec
-    inet6 2001:470:9:1224:dfcc:aaff:feb9:76ce/64 scope global dynamic
-       valid_lft 14187sec preferred_lft 3387sec
-    inet6 fe80::dfcc:aaff:feb9:76ce/64 scope link
-       valid_lft forever preferred_lft forever
-""")
-
-ADDR_SAMPLE2 = ("""
-2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq state UP qlen 1000
-    link/ether dd:cc:aa:b9:76:ce brd ff:ff:ff:ff:ff:ff
-    inet 172.16.77.240/24 scope global eth0
-    inet6 2001:470:9:1224:5595:dd51:6ba2:e788/64 scope global temporary dynamic
-       valid_lft 14187sec preferred_lft 3387sec
-    inet6 fe80::3023:39ff:febc:22ae/64 scope link tentative
-        valid_lft forever preferred_lft forever
-    inet6 fe80::3023:39ff:febc:22af/64 scope link tentative dadfailed
-        valid_lft forever preferred_lft forever
-    inet6 2001:470:9:1224:fd91:272:581e:3a32/64 scope global temporary """
-                """deprecated dynamic
-       valid_lft 14187sec preferred_lft 0sec
-    inet6 2001:470:9:1224:4508:b885:5fb:740b/64 scope global temporary """
-                """deprecated dynamic
-       valid_lft 14187sec preferred_lft 0sec
-    inet6 2001:470:9:1224:dfcc:aaff:feb9:76ce/64 scope global dynamic
-       valid_lft 14187sec preferred_lft 3387sec
-    inet6 fe80::dfcc:aaff:feb9:76ce/64 scope link
-       valid_lft forever preferred_lft forever
-""")
-
-
-ADDR_SAMPLE3 = ("""
-2: eth0@NONE: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq state UP
-    link/ether dd:cc:aa:b9:76:ce brd ff:ff:ff:ff:ff:ff
-    inet 172.16.77.240/24 brd 172.16.77.255 scope global eth0
-""")
-
-GATEWAY_SAMPLE1 = ("""
-default via 10.35.19.254  metric 100
-10.35.16.0/22  proto kernel  scope link  src 10.35.17.97
-""")
-
-GATEWAY_SAMPLE2 = ("""
-default via 10.35.19.254  metric 100
-""")
-
-GATEWAY_SAMPLE3 = ("""
-10.35.16.0/22  proto kernel  scope link  src 10.35.17.97
-""")
-
-GATEWAY_SAMPLE4 = ("""
-default via 10.35.19.254
-""")
-
-GATEWAY_SAMPLE5 = ("""
-default via 192.168.99.1 proto static
-""")
-
-GATEWAY_SAMPLE6 = ("""
-default via 192.168.99.1 proto static metric 100
-""")
-
-GATEWAY_SAMPLE7 = ("""
-default dev qg-31cd36 metric 1
-""")
-
-IPv6_GATEWAY_SAMPLE1 = ("""
-default via 2001:470:9:1224:4508:b885:5fb:740b metric 100
-2001:db8::/64 proto kernel scope link src 2001:470:9:1224:dfcc:aaff:feb9:76ce
-""")
-
-IPv6_GATEWAY_SAMPLE2 = ("""
-default via 2001:470:9:1224:4508:b885:5fb:740b metric 100
-""")
-
-IPv6_GATEWAY_SAMPLE3 = ("""
-2001:db8::/64 proto kernel scope link src 2001:470:9:1224:dfcc:aaff:feb9:76ce
-""")
-
-IPv6_GATEWAY_SAMPLE4 = ("""
-default via fe80::dfcc:aaff:feb9:76ce
-""")
-
-IPv6_GATEWAY_SAMPLE5 = ("""
-default via 2001:470:9:1224:4508:b885:5fb:740b metric 1024
-""")
-
-DEVICE_ROUTE_SAMPLE = ("10.0.0.0/24  scope link  src 10.0.0.2")
-
-SUBNET_SAMPLE1 = ("10.0.0.0/24 dev qr-23380d11-d2  scope link  src 10.0.0.1\n"
-                  "10.0.0.0/24 dev tap1d7888a7-10  scope link  src 10.0.0.2")
-SUBNET_SAMPLE2 = ("10.0.0.0/24 dev tap1d7888a7-10  scope link  src 10.0.0.2\n"
-                  "10.0.0.0/24 dev qr-23380d11-d2  scope link  src 10.0.0.1")
-
-RULE_V4_SAMPLE = ("""
-0:      from all lookup local
-32766:  from all lookup main
-32767:  from all lookup default
-101:    from 192.168.45.100 lookup 2
-""")
-
-RULE_V6_SAMPLE = ("""
-0:      from all lookup local
-32766:  from all lookup main
-32767:  from all lookup default
-201:    from 2001:db8::1 lookup 3
-""")
+def _get_address(address, prefixlen, scope=0,
+                 flags=ifaddrmsg.IFA_F_PERMANENT, broadcast=None):
+    return {'device': 'tap0', 'address': address, 'prefixlen': prefixlen,
+            'scope': scope, 'broadcast': broadcast, 'flags': flags}
+
+
+ADDR_SAMPLE_V6 = [
+    _get_address('2001:470:9:1224:5595:dd51:6ba2:e788', 64,
+                 flags=ifaddrmsg.IFA_F_TEMPORARY),
+    _get_address('fe80::3023:39ff:febc:22ae', 64, scope=253,
+                 flags=(ifaddrmsg.IFA_F_PERMANENT |
+                        ifaddrmsg.IFA_F_TENTATIVE)),
+    _get_address('fe80::3023:39ff:febc:22af', 64, scope=253,
+                 flags=(ifaddrmsg.IFA_F_PERMANENT |
+                        ifaddrmsg.IFA_F_TENTATIVE |
+                        ifaddrmsg.IFA_F_DADFAILED)),
+    _get_address('2001:470:9:1224:fd91:272:581e:3a32', 64,
+                 flags=(ifaddrmsg.IFA_F_TEMPORARY |
+                        ifaddrmsg.IFA_F_DEPRECATED)),
+    _get_address('2001:470:9:1224:4508:b885:5fb:740b', 64,
+                 flags=(ifaddrmsg.IFA_F_TEMPORARY |
+                        ifaddrmsg.IFA_F_DEPRECATED)),
+    _get_address('2001:470:9:1224:dfcc:aaff:feb9:76ce', 64, flags=0),
+    _get_address('fe80::dfcc:aaff:feb9:76ce', 64, scope=253)]
+
+ADDR_SAMPLE = [_get_address('172.16.77.240', 24,
+                            broadcast='172.16.77.255')] + ADDR_SAMPLE_V6
+
+ADDR_SAMPLE2 = [_get_address('172.16.77.240', 24)] + ADDR_SAMPLE_V6
+
+
+def _get_route(dst=None, dst_len=0, gateway=None, device='eth0',
+               prefsrc=None, priority=None, scope=0, proto=3):
+    return {'dst': dst, 'dst_len': dst_len, 'gateway': gateway,
+            'device': device, 'prefsrc': prefsrc, 'priority': priority,
+            'scope': scope, 'proto': proto, 'type': 1}
+
+
+GATEWAY_SAMPLE1 = [
+    _get_route(gateway='10.35.19.254', priority=100),
+    _get_route('10.35.16.0', 22, scope=253, proto=2, prefsrc='10.35.17.97')]
+
+GATEWAY_SAMPLE2 = [_get_route(gateway='10.35.19.254', priority=100)]
+
+GATEWAY_SAMPLE3 = [
+    _get_route('10.35.16.0', 22, scope=253, proto=2, prefsrc='10.35.17.97')]
+
+GATEWAY_SAMPLE4 = [_get_route(gateway='10.35.19.254')]
+
+GATEWAY_SAMPLE5 = [_get_route(gateway='192.168.99.1', proto=4)]
+
+GATEWAY_SAMPLE6 = [_get_route(gateway='192.168.99.1', proto=4,
+                              priority=100)]
+
+GATEWAY_SAMPLE7 = [_get_route(device='qg-31cd36', scope=253, priority=1)]
+
+IPv6_GATEWAY_SAMPLE1 = [
+    _get_route(gateway='2001:470:9:1224:4508:b885:5fb:740b', priority=100),
+    _get_route('2001:db8::', 64, proto=2,
+               prefsrc='2001:470:9:1224:dfcc:aaff:feb9:76ce')]
+
+IPv6_GATEWAY_SAMPLE2 = [
+    _get_route(gateway='2001:470:9:1224:4508:b885:5fb:740b', priority=100)]
+
+IPv6_GATEWAY_SAMPLE3 = [
+    _get_route('2001:db8::', 64, proto=2,
+               prefsrc='2001:470:9:1224:dfcc:aaff:feb9:76ce')]
+
+IPv6_GATEWAY_SAMPLE4 = [_get_route(gateway='fe80::dfcc:aaff:feb9:76ce')]
+
+IPv6_GATEWAY_SAMPLE5 = [
+    _get_route(gateway='2001:470:9:1224:4508:b885:5fb:740b', priority=1024)]
+
+
+def _get_rule(priority, table, src=None, src_len=0, action=1, **kwargs):
+    rule = {'priority': priority, 'table': table, 'action': action,
+            'src': src, 'src_len': src_len, 'dst': None, 'dst_len': 0,
+            'iifname': None, 'oifname': None, 'fwmark': None,
+            'fwmask': None}
+    rule.update(kwargs)
+    return rule
+
+
+RULE_V4_SAMPLE = [_get_rule(0, 255), _get_rule(32766, 254),
+                  _get_rule(32767, 253),
+                  _get_rule(101, 2, '192.168.45.100', 32)]
+
+RULE_V6_SAMPLE = [_get_rule(0, 255), _get_rule(32766, 254),
+                  _get_rule(32767, 253),
+                  _get_rule(201, 3, '2001:db8::1', 128)]
 
 
 class TestSubProcessBase(base.BaseTestCase):
@@ -639,48 +610,85 @@ class TestIPCmdBase(base.BaseTestCase):
 class TestIpRuleCommand(TestIPCmdBase):
     def setUp(self):
         super(TestIpRuleCommand, self).setUp()
-        self.parent._as_root.return_value = ''
         self.command = 'rule'
         self.rule_cmd = ip_lib.IpRuleCommand(self.parent)
+        self.list_rules = mock.patch.object(priv_lib, 'list_ip_rules',
+                                            return_value=[]).start()
+        self.add_rule = mock.patch.object(priv_lib, 'add_ip_rule').start()
+        self.delete_rule = mock.patch.object(priv_lib,
+                                             'delete_ip_rule').start()
 
     def _test_add_rule(self, ip, table, priority):
         ip_version = netaddr.IPNetwork(ip).version
         self.rule_cmd.add(ip, table=table, priority=priority)
-        self._assert_sudo([ip_version], (['show']))
-        self._assert_sudo([ip_version], ('add', 'from', ip,
-                                         'priority', str(priority),
-                                         'table', str(table),
-                                         'type', 'unicast'))
+        self.list_rules.assert_called_once_with(self.parent.namespace,
+                                                ip_version)
+        self.add_rule.assert_called_once_with(
+            self.parent.namespace, ip_version, priority=priority,
+            table=table, src=ip, src_len=netaddr.IPNetwork(ip).prefixlen,
+            action=1)
 
     def _test_add_rule_exists(self, ip, table, priority, output):
-        self.parent._as_root.return_value = output
+        self.list_rules.return_value = output
         ip_version = netaddr.IPNetwork(ip).version
         self.rule_cmd.add(ip, table=table, priority=priority)
-        self._assert_sudo([ip_version], (['show']))
+        self.list_rules.assert_called_once_with(self.parent.namespace,
+                                                ip_version)
+        self.add_rule.assert_not_called()
 
     def _test_delete_rule(self, ip, table, priority):
         ip_version = netaddr.IPNetwork(ip).version
         self.rule_cmd.delete(ip, table=table, priority=priority)
-        self._assert_sudo([ip_version],
-                          ('del', 'from', ip, 'priority', str(priority),
-                           'table', str(table), 'type', 'unicast'))
-
-    def test__parse_line(self):
-        def test(ip_version, line, expected):
-            actual = self.rule_cmd._parse_line(ip_version, line)
+        self.delete_rule.assert_called_once_with(
+            self.parent.namespace, ip_version, priority=priority,
+            table=table, src=ip, src_len=netaddr.IPNetwork(ip).prefixlen,
+            action=1)
+
+    def test__parse_rule(self):
+        def test(ip_version, rule, expected):
+            actual = self.rule_cmd._parse_rule(ip_version, rule)
             self.assertEqual(expected, actual)
 
-        test(4, "4030201:\tfrom 1.2.3.4/24 lookup 10203040",
+        test(4, _get_rule(4030201, 10203040, '1.2.3.4', 24),
              {'from': '1.2.3.4/24',
               'table': '10203040',
               'type': 'unicast',
               'priority': '4030201'})
-        test(6, "1024:    from all iif qg-c43b1928-48 lookup noscope",
+        test(4, _get_rule(100, 254, '1.2.3.4', 32),
+             {'from': '1.2.3.4',
+              'table': 'main',
+              'type': 'unicast',
+              'priority': '100'})
+        test(6, _get_rule(1024, 16, iifname='qg-c43b1928-48'),
              {'priority': '1024',
               'from': '::/0',
               'type': 'unicast',
               'iif': 'qg-c43b1928-48',
-              'table': 'noscope'})
+              'table': '16'})
+        test(4, _get_rule(200, 0, action=6, fwmark=0x400, fwmask=0xff),
+             {'priority': '200',
+              'from': '0.0.0.0/0',
+              'type': 'blackhole',
+              'fwmark': '0x400/0xff'})
+
+    def test__make_pyroute2_args(self):
+        actual = self.rule_cmd._make_pyroute2_args(
+            {'from': '10.0.0.0/24', 'priority': '100', 'table': 'main',
+             'fwmark': '0x400/0xff', 'type': 'unicast'})
+        self.assertEqual({'priority': 100, 'src': '10.0.0.0', 'src_len': 24,
+                          'table': 254, 'fwmark': 0x400, 'fwmask': 0xff,
+                          'action': 1}, actual)
+
+    def test__make_pyroute2_args_iif(self):
+        actual = self.rule_cmd._make_pyroute2_args(
+            {'from': '::/0', 'iif': 'qg-c43b1928-48', 'type': 'unicast'})
+        self.assertEqual({'priority': None, 'iifname': 'qg-c43b1928-48',
+                          'table': 254, 'action': 1}, actual)
+
+    def test__make_pyroute2_args_invalid(self):
+        self.assertRaises(ip_lib.InvalidArgument,
+                          self.rule_cmd._make_pyroute2_args,
+                          {'from': '::/0', 'tos': '0x10'})
 
     def test__make_canonical_all_v4(self):
         actual = self.rule_cmd._make_canonical(4, {'from': 'all'})
@@ -865,34 +873,35 @@ class TestIpAddrCommand(TestIPCmdBase):
         flush.assert_called_once_with(
             6, self.parent.name, self.addr_cmd._parent.namespace)
 
-    def test_list(self):
+    @mock.patch.object(priv_lib, 'get_ip_addresses')
+    def test_list(self, get_addresses):
         expected_brd = [
-            dict(name='eth0', scope='global', tentative=False, dadfailed=False,
+            dict(name='tap0', scope='global', tentative=False, dadfailed=False,
                  dynamic=False, cidr='172.16.77.240/24',
                  broadcast='172.16.77.255')]
         expected_no_brd = [
-            dict(name='eth0', scope='global', tentative=False, dadfailed=False,
+            dict(name='tap0', scope='global', tentative=False, dadfailed=False,
                  dynamic=False, cidr='172.16.77.240/24', broadcast=None)]
         expected_ipv6 = [
-            dict(name='eth0', scope='global', dadfailed=False, tentative=False,
+            dict(name='tap0', scope='global', dadfailed=False, tentative=False,
                  dynamic=True, cidr='2001:470:9:1224:5595:dd51:6ba2:e788/64',
                  broadcast=None),
-            dict(name='eth0', scope='link', dadfailed=False, tentative=True,
+            dict(name='tap0', scope='link', dadfailed=False, tentative=True,
                  dynamic=False, cidr='fe80::3023:39ff:febc:22ae/64',
                  broadcast=None),
-            dict(name='eth0', scope='link', dadfailed=True, tentative=True,
+            dict(name='tap0', scope='link', dadfailed=True, tentative=True,
                  dynamic=False, cidr='fe80::3023:39ff:febc:22af/64',
                  broadcast=None),
-            dict(name='eth0', scope='global', dadfailed=False, tentative=False,
+            dict(name='tap0', scope='global', dadfailed=False, tentative=False,
                  dynamic=True, cidr='2001:470:9:1224:fd91:272:581e:3a32/64',
                  broadcast=None),
-            dict(name='eth0', scope='global', dadfailed=False, tentative=False,
+            dict(name='tap0', scope='global', dadfailed=False, tentative=False,
                  dynamic=True, cidr='2001:470:9:1224:4508:b885:5fb:740b/64',
                  broadcast=None),
-            dict(name='eth0', scope='global', dadfailed=False, tentative=False,
+            dict(name='tap0', scope='global', dadfailed=False, tentative=False,
                  dynamic=True, cidr='2001:470:9:1224:dfcc:aaff:feb9:76ce/64',
                  broadcast=None),
-            dict(name='eth0', scope='link', dadfailed=False, tentative=False,
+            dict(name='tap0', scope='link', dadfailed=False, tentative=False,
                  dynamic=False, cidr='fe80::dfcc:aaff:feb9:76ce/64',
                  broadcast=None)]
 
@@ -901,12 +910,15 @@ class TestIpAddrCommand(TestIPCmdBase):
             (ADDR_SAMPLE2, expected_no_brd + expected_ipv6)]
 
         for test_case, expected in cases:
-            self.parent._run = mock.Mock(return_value=test_case)
+            get_addresses.reset_mock()
+            get_addresses.return_value = test_case
             self.assertEqual(expected, self.addr_cmd.list())
-            self._assert_call([], ('show', 'tap0'))
+            get_addresses.assert_called_once_with(
+                self.parent.namespace, ip_version=None, device='tap0')
 
-    def test_wait_until_address_ready(self):
-        self.parent._run.return_value = ADDR_SAMPLE
+    @mock.patch.object(priv_lib, 'get_ip_addresses',
+                       return_value=ADDR_SAMPLE)
+    def test_wait_until_address_ready(self, get_addresses):
         # this address is not tentative or failed so it should return
         self.assertIsNone(self.addr_cmd.wait_until_address_ready(
             '2001:470:9:1224:fd91:272:581e:3a32'))
@@ -925,41 +937,49 @@ class TestIpAddrCommand(TestIPCmdBase):
             self.addr_cmd.wait_until_address_ready(tentative_address,
                                                    wait_time=1)
 
-    def test_list_filtered(self):
+    @mock.patch.object(priv_lib, 'get_ip_addresses')
+    def test_list_filtered(self, get_addresses):
         expected_brd = [
-            dict(name='eth0', scope='global', tentative=False, dadfailed=False,
+            dict(name='tap0', scope='global', tentative=False, dadfailed=False,
                  dynamic=False, cidr='172.16.77.240/24',
                  broadcast='172.16.77.255')]
         expected_no_brd = [
-            dict(name='eth0', scope='global', tentative=False, dadfailed=False,
+            dict(name='tap0', scope='global', tentative=False, dadfailed=False,
                  dynamic=False, cidr='172.16.77.240/24', broadcast=None)]
 
         cases = [
             (ADDR_SAMPLE, expected_brd), (ADDR_SAMPLE2, expected_no_brd)]
 
         for test_case, expected in cases:
-            output = '\n'.join(test_case.split('\n')[0:4])
-            self.parent._run.return_value = output
+            get_addresses.return_value = test_case
             self.assertEqual(
                 expected,
                 self.addr_cmd.list(
                     'global', filters=['permanent']))
-            self._assert_call([], ('show', 'tap0', 'permanent', 'scope',
-                              'global'))
-
-    def test_get_devices_with_ip(self):
-        # This can only verify that get_devices_with_ip() returns a dict
-        # with the correct entry, it doesn't actually test that it only
-        # returns items filtered by the arguments since it isn't calling
-        # /sbin/ip at all.
-        self.parent._run.return_value = ADDR_SAMPLE3
+
+    @mock.patch.object(priv_lib, 'get_ip_addresses',
+                       return_value=ADDR_SAMPLE)
+    def test_list_filtered_flags(self, get_addresses):
+        addresses = self.addr_cmd.list(filters=['tentative', '-dadfailed'])
+        self.assertEqual(['fe80::3023:39ff:febc:22ae/64'],
+                         [address['cidr'] for address in addresses])
+
+    def test_list_invalid_filter(self):
+        self.assertRaises(ip_lib.InvalidArgument, self.addr_cmd.list,
+                          filters=['deprecated'])
+
+    @mock.patch.object(priv_lib, 'get_ip_addresses',
+                       return_value=ADDR_SAMPLE)
+    def test_get_devices_with_ip(self, get_addresses):
         devices = self.addr_cmd.get_devices_with_ip(to='172.16.77.240/24')
+        get_addresses.assert_called_once_with(
+            self.parent.namespace, ip_version=None, device=None)
         self.assertEqual(1, len(devices))
         expected = {'cidr': '172.16.77.240/24',
                     'broadcast': '172.16.77.255',
                     'dadfailed': False,
                     'dynamic': False,
-                    'name': 'eth0',
+                    'name': 'tap0',
                     'scope': 'global',
                     'tentative': False}
         self.assertEqual(expected, devices[0])
@@ -974,7 +994,7 @@ class TestIpRouteCommand(TestIPCmdBase):
         self.ip_version = 4
         self.table = 14
         self.metric = 100
-        self.cidr = '192.168.45.100/24'
+        self.cidr = '192.168.45.0/24'
         self.ip = '10.0.0.1'
         self.gateway = '192.168.45.100'
         self.test_cases = [{'sample': GATEWAY_SAMPLE1,
@@ -994,43 +1014,60 @@ class TestIpRouteCommand(TestIPCmdBase):
                                          'metric': 100}},
                            {'sample': GATEWAY_SAMPLE7,
                             'expected': {'metric': 1}}]
+        self.list_routes = mock.patch.object(priv_lib,
+                                             'list_ip_routes').start()
+        self.add_route = mock.patch.object(priv_lib, 'add_ip_route').start()
+        self.delete_route = mock.patch.object(priv_lib,
+                                              'delete_ip_route').start()
+        self.flush_routes = mock.patch.object(priv_lib,
+                                              'flush_ip_routes').start()
+
+    @property
+    def _dst(self):
+        net = netaddr.IPNetwork(self.cidr)
+        return {'dst': str(net.ip), 'dst_len': net.prefixlen}
+
+    @property
+    def _gateway_dst(self):
+        return {'dst_len': 0}
+
+    @property
+    def _link_scope(self):
+        # ip route adds the IPv4 routes without a gateway in the link scope
+        return {'scope': 253} if self.ip_version == 4 else {}
+
+    def _assert_route_call(self, route_func, **kwargs):
+        route_func.assert_called_once_with(
+            self.parent.namespace, self.ip_version, device=self.parent.name,
+            **kwargs)
 
     def test_add_gateway(self):
         self.route_cmd.add_gateway(self.gateway, self.metric, self.table)
-        self._assert_sudo([self.ip_version],
-                          ('replace', 'default',
-                           'via', self.gateway,
-                           'metric', self.metric,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.add_route, gateway=self.gateway,
+                                priority=self.metric, table=self.table,
+                                proto=3, **self._gateway_dst)
 
     def test_add_gateway_subtable(self):
         self.route_cmd.table(self.table).add_gateway(self.gateway, self.metric)
-        self._assert_sudo([self.ip_version],
-                          ('replace', 'default',
-                           'via', self.gateway,
-                           'metric', self.metric,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.add_route, gateway=self.gateway,
+                                priority=self.metric, table=self.table,
+                                proto=3, **self._gateway_dst)
 
     def test_del_gateway_success(self):
         self.route_cmd.delete_gateway(self.gateway, table=self.table)
-        self._assert_sudo([self.ip_version],
-                          ('del', 'default',
-                           'via', self.gateway,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.delete_route, gateway=self.gateway,
+                                table=self.table, scope=255,
+                                **self._gateway_dst)
 
     def test_del_gateway_success_subtable(self):
         self.route_cmd.table(table=self.table).delete_gateway(self.gateway)
-        self._assert_sudo([self.ip_version],
-                          ('del', 'default',
-                           'via', self.gateway,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.delete_route, gateway=self.gateway,
+                                table=self.table, scope=255,
+                                **self._gateway_dst)
 
     def test_del_gateway_cannot_find_device(self):
-        self.parent._as_root.side_effect = RuntimeError("Cannot find device")
+        self.delete_route.side_effect = priv_lib.NetworkInterfaceNotFound(
+            device=self.parent.name, namespace=self.parent.namespace)
 
         exc = self.assertRaises(exceptions.DeviceNotFoundError,
                           self.route_cmd.delete_gateway,
@@ -1038,83 +1075,114 @@ class TestIpRouteCommand(TestIPCmdBase):
         self.assertIn(self.parent.name, str(exc))
 
     def test_del_gateway_other_error(self):
-        self.parent._as_root.side_effect = RuntimeError()
+        self.delete_route.side_effect = RuntimeError()
 
         self.assertRaises(RuntimeError, self.route_cmd.delete_gateway,
                           self.gateway, table=self.table)
 
     def test_get_gateway(self):
         for test_case in self.test_cases:
-            self.parent._run = mock.Mock(return_value=test_case['sample'])
-            self.assertEqual(self.route_cmd.get_gateway(),
+            self.list_routes.return_value = test_case['sample']
+            self.assertEqual(self.route_cmd.get_gateway(
+                                 ip_version=self.ip_version),
                              test_case['expected'])
 
+    def test_get_gateway_filtered(self):
+        self.list_routes.return_value = self.test_cases[0]['sample']
+        self.assertIsNone(self.route_cmd.get_gateway(
+            scope='link', ip_version=self.ip_version))
+        self.assertIsNone(self.route_cmd.get_gateway(
+            filters=['proto', 'ra'], ip_version=self.ip_version))
+        self.assertEqual(self.test_cases[0]['expected'],
+                         self.route_cmd.get_gateway(
+                             scope='global', filters=['proto', 'boot'],
+                             ip_version=self.ip_version))
+
+    def test_get_gateway_table_filter(self):
+        self.list_routes.return_value = self.test_cases[0]['sample']
+        self.assertEqual(self.test_cases[0]['expected'],
+                         self.route_cmd.get_gateway(
+                             filters=['table', self.table],
+                             ip_version=self.ip_version))
+        self.list_routes.assert_called_once_with(
+            self.parent.namespace, self.ip_version, device=self.parent.name,
+            table=self.table)
+
     def test_flush_route_table(self):
         self.route_cmd.flush(self.ip_version, self.table)
-        self._assert_sudo([self.ip_version], ('flush', 'table', self.table))
+        self.flush_routes.assert_called_once_with(
+            self.parent.namespace, self.ip_version, table=self.table)
+
+    def test_flush_route_table_not_set(self):
+        self.assertRaises(ip_lib.InvalidArgument, self.route_cmd.flush,
+                          self.ip_version)
+        self.flush_routes.assert_not_called()
 
     def test_add_route(self):
         self.route_cmd.add_route(self.cidr, self.ip, self.table)
-        self._assert_sudo([self.ip_version],
-                          ('replace', self.cidr,
-                           'via', self.ip,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.add_route, gateway=self.ip,
+                                table=self.table, proto=3, **self._dst)
 
     def test_add_route_no_via(self):
         self.route_cmd.add_route(self.cidr, table=self.table)
-        self._assert_sudo([self.ip_version],
-                          ('replace', self.cidr,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.add_route, table=self.table, proto=3,
+                                **dict(self._dst, **self._link_scope))
 
     def test_add_route_with_scope(self):
         self.route_cmd.add_route(self.cidr, scope='link')
-        self._assert_sudo([self.ip_version],
-                          ('replace', self.cidr,
-                           'dev', self.parent.name,
-                           'scope', 'link'))
+        self._assert_route_call(self.add_route, table=254, proto=3,
+                                scope=253, **self._dst)
+
+    def test_add_route_with_metric_and_src(self):
+        self.route_cmd.add_route(self.cidr, self.ip, metric=self.metric,
+                                 src=self.gateway, proto='static')
+        self._assert_route_call(self.add_route, gateway=self.ip, table=254,
+                                priority=self.metric, prefsrc=self.gateway,
+                                proto=4, **self._dst)
+
+    def test_add_route_invalid_argument(self):
+        self.assertRaises(ip_lib.InvalidArgument, self.route_cmd.add_route,
+                          self.cidr, self.ip, mtu=1400)
+        self.add_route.assert_not_called()
 
     def test_add_route_no_device(self):
-        self.parent._as_root.side_effect = RuntimeError("Cannot find device")
+        self.add_route.side_effect = priv_lib.NetworkInterfaceNotFound(
+            device=self.parent.name, namespace=self.parent.namespace)
         self.assertRaises(exceptions.DeviceNotFoundError,
                           self.route_cmd.add_route,
                           self.cidr, self.ip, self.table)
 
     def test_delete_route(self):
         self.route_cmd.delete_route(self.cidr, self.ip, self.table)
-        self._assert_sudo([self.ip_version],
-                          ('del', self.cidr,
-                           'via', self.ip,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.delete_route, gateway=self.ip,
+                                table=self.table, scope=255, **self._dst)
 
     def test_delete_route_no_via(self):
         self.route_cmd.delete_route(self.cidr, table=self.table)
-        self._assert_sudo([self.ip_version],
-                          ('del', self.cidr,
-                           'dev', self.parent.name,
-                           'table', self.table))
+        self._assert_route_call(self.delete_route, table=self.table,
+                                scope=255, **self._dst)
 
     def test_delete_route_with_scope(self):
         self.route_cmd.delete_route(self.cidr, scope='link')
-        self._assert_sudo([self.ip_version],
-                          ('del', self.cidr,
-                           'dev', self.parent.name,
-                           'scope', 'link'))
+        self._assert_route_call(self.delete_route, table=254, scope=253,
+                                **self._dst)
 
     def test_delete_route_no_device(self):
-        self.parent._as_root.side_effect = RuntimeError("Cannot find device")
+        self.delete_route.side_effect = priv_lib.NetworkInterfaceNotFound(
+            device=self.parent.name, namespace=self.parent.namespace)
         self.assertRaises(exceptions.DeviceNotFoundError,
                           self.route_cmd.delete_route,
                           self.cidr, self.ip, self.table)
 
     def test_list_routes(self):
-        self.parent._run.return_value = (
-            "default via 172.124.4.1 dev eth0 metric 100\n"
-            "10.0.0.0/22 dev eth0 scope link\n"
-            "172.24.4.0/24 dev eth0 proto kernel src 172.24.4.2\n")
+        self.list_routes.return_value = [
+            _get_route(gateway='172.124.4.1', priority=100),
+            _get_route('10.0.0.0', 22, scope=253),
+            _get_route('172.24.4.0', 24, proto=2, prefsrc='172.24.4.2')]
         routes = self.route_cmd.table(self.table).list_routes(self.ip_version)
+        self.list_routes.assert_called_once_with(
+            self.parent.namespace, self.ip_version, device=self.parent.name,
+            table=self.table)
         self.assertEqual([{'cidr': '0.0.0.0/0',
                            'dev': 'eth0',
                            'metric': '100',
@@ -1130,32 +1198,47 @@ class TestIpRouteCommand(TestIPCmdBase):
                            'src': '172.24.4.2',
                            'table': 14}], routes)
 
+    def test_list_routes_filtered(self):
+        self.list_routes.return_value = self.test_cases[0]['sample']
+        gateway = self.test_cases[0]['expected']['gateway']
+        routes = self.route_cmd.list_routes(self.ip_version, table='main',
+                                            via=gateway)
+        self.list_routes.assert_called_once_with(
+            self.parent.namespace, self.ip_version, device=self.parent.name,
+            table=254)
+        self.assertEqual([{'cidr': constants.IP_ANY[self.ip_version],
+                           'dev': 'eth0',
+                           'metric': '100',
+                           'table': 'main',
+                           'via': gateway}], routes)
+
+    def test_list_routes_invalid_filter(self):
+        self.list_routes.return_value = GATEWAY_SAMPLE1
+        self.assertRaises(ip_lib.InvalidArgument,
+                          self.route_cmd.list_routes, self.ip_version,
+                          type='local')
+
     def test_list_onlink_routes_subtable(self):
-        self.parent._run.return_value = (
-            "10.0.0.0/22\n"
-            "172.24.4.0/24 proto kernel src 172.24.4.2\n")
+        self.list_routes.return_value = [
+            _get_route('10.0.0.0', 22, scope=253),
+            _get_route('172.24.4.0', 24, scope=253, proto=2,
+                       prefsrc='172.24.4.2')]
         routes = self.route_cmd.table(self.table).list_onlink_routes(
             self.ip_version)
         self.assertEqual(['10.0.0.0/22'], [r['cidr'] for r in routes])
-        self._assert_call([self.ip_version],
-                          ('list', 'dev', self.parent.name,
-                           'table', self.table, 'scope', 'link'))
+        self.list_routes.assert_called_once_with(
+            self.parent.namespace, self.ip_version, device=self.parent.name,
+            table=self.table)
 
     def test_add_onlink_route_subtable(self):
         self.route_cmd.table(self.table).add_onlink_route(self.cidr)
-        self._assert_sudo([self.ip_version],
-                          ('replace', self.cidr,
-                           'dev', self.parent.name,
-                           'table', self.table,
-                           'scope', 'link'))
+        self._assert_route_call(self.add_route, table=self.table, proto=3,
+                                scope=253, **self._dst)
 
     def test_delete_onlink_route_subtable(self):
         self.route_cmd.table(self.table).delete_onlink_route(self.cidr)
-        self._assert_sudo([self.ip_version],
-                          ('del', self.cidr,
-                           'dev', self.parent.name,
-                           'table', self.table,
-                           'scope', 'link'))
+        self._assert_route_call(self.delete_route, table=self.table,
+                                scope=253, **self._dst)
 
 
 class TestIPv6IpRouteCommand(TestIpRouteCommand):
@@ -1184,9 +1267,9 @@ class TestIPv6IpRouteCommand(TestIpRouteCommand):
                              'metric': 1024}}]
 
     def test_list_routes(self):
-        self.parent._run.return_value = (
-            "default via 2001:db8::1 dev eth0 metric 100\n"
-            "2001:db8::/64 dev eth0 proto kernel src 2001:db8::2\n")
+        self.list_routes.return_value = [
+            _get_route(gateway='2001:db8::1', priority=100),
+            _get_route('2001:db8::', 64, proto=2, prefsrc='2001:db8::2')]
         routes = self.route_cmd.table(self.table).list_routes(self.ip_version)
         self.assertEqual([{'cidr': '::/0',
                            'dev': 'eth0',
@@ -1204,37 +1287,13 @@ class TestIPRoute(TestIpRouteCommand):
     """Leverage existing tests for IpRouteCommand for IPRoute
 
     This test leverages the tests written for IpRouteCommand.  The difference
-    is that the 'dev' argument should not be passed for each of the commands.
-    So, this test removes the dev argument from the expected arguments in each
-    assert.
+    is that the device of the routes isn't given to the privileged functions,
+    the routes of all the devices are selected.
     """
     def setUp(self):
         super(TestIPRoute, self).setUp()
         self.parent = ip_lib.IPRoute()
-        self.parent._run = mock.Mock()
-        self.parent._as_root = mock.Mock()
         self.route_cmd = self.parent.route
-        self.check_dev_args = False
-
-    def _remove_dev_args(self, args):
-        def args_without_dev():
-            previous = None
-            for arg in args:
-                if 'dev' not in (arg, previous):
-                    yield arg
-                previous = arg
-
-        return tuple(arg for arg in args_without_dev())
-
-    def _assert_call(self, options, args):
-        if not self.check_dev_args:
-            args = self._remove_dev_args(args)
-        super(TestIPRoute, self)._assert_call(options, args)
-
-    def _assert_sudo(self, options, args, use_root_namespace=False):
-        if not self.check_dev_args:
-            args = self._remove_dev_args(args)
-        super(TestIPRoute, self)._assert_sudo(options, args)
 
     def test_del_gateway_cannot_find_device(self):
         # This test doesn't make sense for this case since dev won't be passed
@@ -1615,10 +1674,14 @@ class TestIpNeighCommand(TestIPCmdBase):
     def setUp(self):
         super(TestIpNeighCommand, self).setUp()
         self.parent.name = 'tap0'
+        self.parent.namespace = 'ns1'
         self.command = 'neigh'
         self.neigh_cmd = ip_lib.IpNeighCommand(self.parent)
         self.addCleanup(privileged.default.set_client_mode, True)
         privileged.default.set_client_mode(False)
+        # do not pool the handles of the mocked namespace
+        mock.patch.object(priv_lib, '_get_netns_inode',
+                          return_value=None).start()
 
     @mock.patch.object(pyroute2, 'NetNS')
     def test_add_entry(self, mock_netns):
@@ -1685,6 +1748,66 @@ class TestIpNeighCommand(TestIPCmdBase):
         self._assert_sudo([4], ('flush', 'to', '192.168.0.1'))
 
 
+class TestBatchOperations(base.BaseTestCase):
+    def setUp(self):
+        super(TestBatchOperations, self).setUp()
+        self.run_batch = mock.patch.object(priv_lib, 'run_batch').start()
+        self.run_batch.side_effect = lambda ns, ops: [None] * len(ops)
+        self.device = ip_lib.IPDevice('tap0', namespace='ns1')
+
+    @mock.patch.object(priv_lib, 'add_neigh_entry')
+    @mock.patch.object(priv_lib, 'set_link_attribute')
+    def test_batch_operations(self, set_link_attribute, add_neigh_entry):
+        with ip_lib.batch_operations('ns1'):
+            self.device.link.set_up()
+            ip_lib.add_neigh_entry('192.168.0.1', 'aa:bb:cc:dd:ee:ff',
+                                   'tap0', namespace='ns1')
+            self.run_batch.assert_not_called()
+        self.run_batch.assert_called_once_with('ns1', [
+            ('set_link_attribute', ('tap0', 'ns1'), {'state': 'up'}),
+            ('add_neigh_entry',
+             (4, '192.168.0.1', 'aa:bb:cc:dd:ee:ff', 'tap0', 'ns1'), {})])
+        set_link_attribute.assert_not_called()
+        add_neigh_entry.assert_not_called()
+
+    @mock.patch.object(priv_lib, 'set_link_attribute')
+    def test_batch_operations_other_namespace(self, set_link_attribute):
+        with ip_lib.batch_operations('ns2'):
+            self.device.link.set_up()
+            set_link_attribute.assert_called_once_with(
+                'tap0', 'ns1', state='up')
+        self.run_batch.assert_not_called()
+
+    def test_batch_operations_nested(self):
+        with ip_lib.batch_operations('ns1'):
+            with ip_lib.batch_operations('ns1'):
+                self.device.link.set_up()
+            self.device.link.set_down()
+        self.assertEqual(1, self.run_batch.call_count)
+        self.assertEqual(2, len(self.run_batch.call_args[0][1]))
+
+    def test_batch_operations_error(self):
+        self.run_batch.side_effect = None
+        self.run_batch.return_value = [
+            ['IpAddressAlreadyExists', 'address exists'],
+            ['RuntimeError', 'other error']]
+        with testtools.ExpectedException(ip_lib.IpAddressAlreadyExists,
+                                         'address exists'):
+            with ip_lib.batch_operations('ns1'):
+                self.device.addr.add('192.168.0.1/24')
+                self.device.addr.add('192.168.1.1/24')
+
+    @mock.patch.object(ip_lib.IPDevice, 'delete_conntrack_state')
+    def test_delete_addr_and_conntrack_state(self, delete_conntrack_state):
+        with ip_lib.batch_operations('ns1'):
+            self.device.delete_addr_and_conntrack_state('192.168.0.1/24')
+            delete_conntrack_state.assert_not_called()
+        self.run_batch.assert_called_once_with('ns1', [
+            ('delete_ip_address', (4, '192.168.0.1', 24, 'tap0', 'ns1'),
+             {})])
+        delete_conntrack_state.assert_called_once_with('192.168.0.1/24')
+
+
 class TestArpPing(TestIPCmdBase):
     @mock.patch.object(ip_lib, 'IPWrapper')
     @mock.patch('eventlet.spawn_n')
@@ -1809,267 +1932,3 @@ class TestConntrack(base.BaseTestCase):
         device.delete_socket_conntrack_state(ip_str, dport, protocol)
         self.execute.assert_called_once_with(expect_cmd, check_exit_code=True,
                                              extra_ok_codes=[1])
-<<<<<<< HEAD
-=======
-
-
-class ParseIpRuleTestCase(base.BaseTestCase):
-
-    BASE_RULE = {
-        'family': 2, 'dst_len': 0, 'res2': 0, 'tos': 0, 'res1': 0, 'flags': 0,
-        'header': {
-            'pid': 18152, 'length': 44, 'flags': 2, 'error': None, 'type': 32,
-            'sequence_number': 281},
-        'attrs': {'FRA_TABLE': 255, 'FRA_SUPPRESS_PREFIXLEN': 4294967295},
-        'table': 255, 'action': 1, 'src_len': 0, 'event': 'RTM_NEWRULE'}
-
-    def setUp(self):
-        super(ParseIpRuleTestCase, self).setUp()
-        self.rule = copy.deepcopy(self.BASE_RULE)
-
-    def test_parse_priority(self):
-        self.rule['attrs']['FRA_PRIORITY'] = 1000
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('1000', parsed_rule['priority'])
-
-    def test_parse_from_ipv4(self):
-        self.rule['attrs']['FRA_SRC'] = '192.168.0.1'
-        self.rule['src_len'] = 24
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('192.168.0.1/24', parsed_rule['from'])
-
-    def test_parse_from_ipv6(self):
-        self.rule['attrs']['FRA_SRC'] = '2001:db8::1'
-        self.rule['src_len'] = 64
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 6)
-        self.assertEqual('2001:db8::1/64', parsed_rule['from'])
-
-    def test_parse_from_any_ipv4(self):
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('0.0.0.0/0', parsed_rule['from'])
-
-    def test_parse_from_any_ipv6(self):
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 6)
-        self.assertEqual('::/0', parsed_rule['from'])
-
-    def test_parse_to_ipv4(self):
-        self.rule['attrs']['FRA_DST'] = '192.168.10.1'
-        self.rule['dst_len'] = 24
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('192.168.10.1/24', parsed_rule['to'])
-
-    def test_parse_to_ipv6(self):
-        self.rule['attrs']['FRA_DST'] = '2001:db8::1'
-        self.rule['dst_len'] = 64
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 6)
-        self.assertEqual('2001:db8::1/64', parsed_rule['to'])
-
-    def test_parse_to_none(self):
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertIsNone(parsed_rule.get('to'))
-
-    def test_parse_table(self):
-        self.rule['attrs']['FRA_TABLE'] = 255
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('local', parsed_rule['table'])
-        self.rule['attrs']['FRA_TABLE'] = 254
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('main', parsed_rule['table'])
-        self.rule['attrs']['FRA_TABLE'] = 253
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('default', parsed_rule['table'])
-        self.rule['attrs']['FRA_TABLE'] = 1000
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('1000', parsed_rule['table'])
-
-    def test_parse_fwmark(self):
-        self.rule['attrs']['FRA_FWMARK'] = 1000
-        self.rule['attrs']['FRA_FWMASK'] = 10
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('0x3e8/0xa', parsed_rule['fwmark'])
-
-    def test_parse_fwmark_none(self):
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertIsNone(parsed_rule.get('fwmark'))
-
-    def test_parse_iif(self):
-        self.rule['attrs']['FRA_IIFNAME'] = 'input_interface_name'
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('input_interface_name', parsed_rule['iif'])
-
-    def test_parse_iif_none(self):
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertIsNone(parsed_rule.get('iif'))
-
-    def test_parse_oif(self):
-        self.rule['attrs']['FRA_OIFNAME'] = 'output_interface_name'
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertEqual('output_interface_name', parsed_rule['oif'])
-
-    def test_parse_oif_none(self):
-        parsed_rule = ip_lib._parse_ip_rule(self.rule, 4)
-        self.assertIsNone(parsed_rule.get('oif'))
-
-
-class ListIpRulesTestCase(base.BaseTestCase):
-
-    def test_list_ip_rules(self):
-        rule1 = {'family': 2, 'src_len': 24, 'action': 1,
-                 'attrs': {'FRA_SRC': '10.0.0.1', 'FRA_TABLE': 100}}
-        rule2 = {'family': 2, 'src_len': 0, 'action': 6,
-                 'attrs': {'FRA_TABLE': 255}}
-        rules = [rule1, rule2]
-        with mock.patch.object(priv_lib, 'list_ip_rules') as mock_list_rules:
-            mock_list_rules.return_value = rules
-            retval = ip_lib.list_ip_rules(mock.ANY, 4)
-        reference = [
-            {'type': 'unicast', 'from': '10.0.0.1/24', 'priority': '0',
-             'table': '100'},
-            {'type': 'blackhole', 'from': '0.0.0.0/0', 'priority': '0',
-             'table': 'local'}]
-        self.assertEqual(reference, retval)
-
-
-class ParseLinkDeviceTestCase(base.BaseTestCase):
-
-    def setUp(self):
-        super(ParseLinkDeviceTestCase, self).setUp()
-        self._mock_get_ip_addresses = mock.patch.object(priv_lib,
-                                                        'get_ip_addresses')
-        self.mock_get_ip_addresses = self._mock_get_ip_addresses.start()
-        self.addCleanup(self._stop_mock)
-
-    def _stop_mock(self):
-        self._mock_get_ip_addresses.stop()
-
-    def test_parse_link_devices(self):
-        device = ({'index': 1, 'attrs': [['IFLA_IFNAME', 'int_name']]})
-        self.mock_get_ip_addresses.return_value = [
-            {'prefixlen': 24, 'scope': 200, 'attrs': [
-                ['IFA_ADDRESS', '192.168.10.20'],
-                ['IFA_FLAGS', ifaddrmsg.IFA_F_PERMANENT]]},
-            {'prefixlen': 64, 'scope': 200, 'attrs': [
-                ['IFA_ADDRESS', '2001:db8::1'],
-                ['IFA_FLAGS', ifaddrmsg.IFA_F_PERMANENT]]}]
-
-        retval = ip_lib._parse_link_device('namespace', device)
-        expected = [{'scope': 'site', 'cidr': '192.168.10.20/24',
-                     'dynamic': False, 'dadfailed': False, 'name': 'int_name',
-                     'broadcast': None, 'tentative': False},
-                    {'scope': 'site', 'cidr': '2001:db8::1/64',
-                     'dynamic': False, 'dadfailed': False, 'name': 'int_name',
-                     'broadcast': None, 'tentative': False}]
-        self.assertEqual(expected, retval)
-
-
-class GetDevicesInfoTestCase(base.BaseTestCase):
-
-    DEVICE_LO = {
-        'index': 2,
-        'attrs': (('IFLA_IFNAME', 'lo'), ('IFLA_OPERSTATE', 'UP'),
-                  ('IFLA_LINKMODE', 0), ('IFLA_MTU', 1000),
-                  ('IFLA_PROMISCUITY', 0),
-                  ('IFLA_ADDRESS', '5a:76:ed:cc:ce:90'),
-                  ('IFLA_BROADCAST', 'ff:ff:ff:ff:ff:f0'), )
-    }
-
-    DEVICE_DUMMY = {
-        'index': 2,
-        'attrs': (('IFLA_IFNAME', 'int_01'), ('IFLA_OPERSTATE', 'DOWN'),
-                  ('IFLA_LINKMODE', 0), ('IFLA_MTU', 1500),
-                  ('IFLA_PROMISCUITY', 0),
-                  ('IFLA_ADDRESS', '5a:76:ed:cc:ce:90'),
-                  ('IFLA_BROADCAST', 'ff:ff:ff:ff:ff:f0'),
-                  ('IFLA_LINKINFO', {
-                      'attrs': (('IFLA_INFO_KIND', 'dummy'), )}))
-    }
-    DEVICE_VLAN = {
-        'index': 5,
-        'attrs': (('IFLA_IFNAME', 'int_02'), ('IFLA_OPERSTATE', 'DOWN'),
-                  ('IFLA_LINKMODE', 0), ('IFLA_MTU', 1400),
-                  ('IFLA_PROMISCUITY', 0),
-                  ('IFLA_ADDRESS', '5a:76:ed:cc:ce:91'),
-                  ('IFLA_BROADCAST', 'ff:ff:ff:ff:ff:f1'),
-                  ('IFLA_LINKINFO', {'attrs': (
-                      ('IFLA_INFO_KIND', 'vlan'),
-                      ('IFLA_INFO_DATA', {'attrs': (('IFLA_VLAN_ID', 1000), )})
-                  )}))
-    }
-    DEVICE_VXLAN = {
-        'index': 9,
-        'attrs': (('IFLA_IFNAME', 'int_03'), ('IFLA_OPERSTATE', 'UP'),
-                  ('IFLA_LINKMODE', 0), ('IFLA_MTU', 1300),
-                  ('IFLA_PROMISCUITY', 0),
-                  ('IFLA_ADDRESS', '5a:76:ed:cc:ce:92'),
-                  ('IFLA_BROADCAST', 'ff:ff:ff:ff:ff:f2'),
-                  ('IFLA_LINKINFO', {'attrs': (
-                      ('IFLA_INFO_KIND', 'vxlan'),
-                      ('IFLA_INFO_DATA', {'attrs': (
-                          ('IFLA_VXLAN_ID', 1001),
-                          ('IFLA_VXLAN_GROUP', '239.1.1.1'))})
-                  )}))
-    }
-
-    def setUp(self):
-        super(GetDevicesInfoTestCase, self).setUp()
-        self.mock_getdevs = mock.patch.object(priv_lib,
-                                              'get_link_devices').start()
-
-    def test_get_devices_info_lo(self):
-        self.mock_getdevs.return_value = (self.DEVICE_LO, )
-        ret = ip_lib.get_devices_info('namespace')
-        expected = {'index': 2,
-                    'name': 'lo',
-                    'operstate': 'UP',
-                    'linkmode': 0,
-                    'mtu': 1000,
-                    'promiscuity': 0,
-                    'mac': '5a:76:ed:cc:ce:90',
-                    'broadcast': 'ff:ff:ff:ff:ff:f0'}
-        self.assertEqual(expected, ret[0])
-
-    def test_get_devices_info_dummy(self):
-        self.mock_getdevs.return_value = (self.DEVICE_DUMMY, )
-        ret = ip_lib.get_devices_info('namespace')
-        expected = {'index': 2,
-                    'name': 'int_01',
-                    'operstate': 'DOWN',
-                    'linkmode': 0,
-                    'mtu': 1500,
-                    'promiscuity': 0,
-                    'mac': '5a:76:ed:cc:ce:90',
-                    'broadcast': 'ff:ff:ff:ff:ff:f0',
-                    'kind': 'dummy'}
-        self.assertEqual(expected, ret[0])
-
-    def test_get_devices_info_vlan(self):
-        self.mock_getdevs.return_value = (self.DEVICE_VLAN, )
-        ret = ip_lib.get_devices_info('namespace')
-        expected = {'index': 5,
-                    'name': 'int_02',
-                    'operstate': 'DOWN',
-                    'linkmode': 0,
-                    'mtu': 1400,
-                    'promiscuity': 0,
-                    'mac': '5a:76:ed:cc:ce:91',
-                    'broadcast': 'ff:ff:ff:ff:ff:f1',
-                    'kind': 'vlan',
-                    'vlan_id': 1000}
-        self.assertEqual(expected, ret[0])
-
-    def test_get_devices_info_vxlan(self):
-        self.mock_getdevs.return_value = (self.DEVICE_VXLAN, )
-        ret = ip_lib.get_devices_info('namespace')
-        expected = {'index': 9,
-                    'name': 'int_03',
-                    'operstate': 'UP',
-                    'linkmode': 0,
-                    'mtu': 1300,
-                    'promiscuity': 0,
-                    'mac': '5a:76:ed:cc:ce:92',
-                    'broadcast': 'ff:ff:ff:ff:ff:f2',
-                    'kind': 'vxlan',
-                    'vxlan_id': 1001,
-                    'vxlan_group': '239.1.1.1'}
-        self.assertEqual(expected, ret[0])
->>>>>>> e7a2b6d179... Add IPWrapper.get_devices_info using PyRoute2
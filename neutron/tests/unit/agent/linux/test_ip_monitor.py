@@ -13,10 +13,41 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import socket
+
+import mock
+import pyroute2
+from pyroute2.netlink.rtnl import ifaddrmsg
+from pyroute2.netlink.rtnl import ifinfmsg
+from pyroute2 import netns
+
 from neutron.agent.linux import ip_monitor
 from neutron.tests import base
 
 
+def _get_message(msg_class, event, attrs, **fields):
+    msg = msg_class()
+    msg.update(fields)
+    msg['event'] = event
+    msg['attrs'] = list(attrs.items())
+    return msg
+
+
+def _get_addr_message(event, index, address, prefixlen,
+                      family=socket.AF_INET):
+    attrs = {'IFA_ADDRESS': address}
+    if family == socket.AF_INET:
+        attrs['IFA_LOCAL'] = address
+    return _get_message(ifaddrmsg.ifaddrmsg, event, attrs, index=index,
+                        family=family, prefixlen=prefixlen)
+
+
+def _get_link_message(event, index, name):
+    return _get_message(ifinfmsg.ifinfmsg, event, {'IFLA_IFNAME': name},
+                        index=index)
+
+
 class TestIPMonitorEvent(base.BaseTestCase):
     def test_from_text_parses_added_line(self):
         event = ip_monitor.IPMonitorEvent.from_text(
@@ -34,3 +65,118 @@ class TestIPMonitorEvent(base.BaseTestCase):
         self.assertEqual('lo', event.interface)
         self.assertFalse(event.added)
         self.assertEqual('127.0.0.2/8', event.cidr)
+
+    def test_from_netlink_added(self):
+        event = ip_monitor.IPMonitorEvent.from_netlink(
+            _get_addr_message('RTM_NEWADDR', 3, '192.168.3.59', 24),
+            'wlp3s0')
+        self.assertEqual('wlp3s0', event.interface)
+        self.assertTrue(event.added)
+        self.assertEqual('192.168.3.59/24', event.cidr)
+        self.assertEqual('3: wlp3s0    inet 192.168.3.59/24', str(event))
+
+    def test_from_netlink_deleted(self):
+        event = ip_monitor.IPMonitorEvent.from_netlink(
+            _get_addr_message('RTM_DELADDR', 1, 'fe80::1', 64,
+                              family=socket.AF_INET6), 'lo')
+        self.assertEqual('lo', event.interface)
+        self.assertFalse(event.added)
+        self.assertEqual('fe80::1/64', event.cidr)
+        # the line is parsed as the ones of "ip monitor"
+        parsed = ip_monitor.IPMonitorEvent.from_text(event.line)
+        self.assertEqual((event.added, event.interface, event.cidr),
+                         (parsed.added, parsed.interface, parsed.cidr))
+
+
+class TestNetlinkIPMonitor(base.BaseTestCase):
+    def setUp(self):
+        super(TestNetlinkIPMonitor, self).setUp()
+        self.iproute_cls = mock.patch.object(pyroute2, 'IPRoute').start()
+        self.ip = self.iproute_cls.return_value
+        self.ip.get_links.return_value = [
+            _get_link_message('RTM_NEWLINK', 1, 'lo'),
+            _get_link_message('RTM_NEWLINK', 2, 'eth0')]
+        self.setns = mock.patch.object(netns, 'setns').start()
+        self.monitor = ip_monitor.NetlinkIPMonitor()
+
+    def test_start(self):
+        self.monitor.start()
+        self.assertTrue(self.monitor.is_active())
+        self.ip.bind.assert_called_once_with(
+            groups=ip_monitor.NetlinkIPMonitor.GROUPS)
+        self.setns.assert_not_called()
+
+    def test_start_in_namespace(self):
+        self.monitor = ip_monitor.NetlinkIPMonitor(namespace='ns1')
+        with mock.patch.object(ip_monitor, 'open',
+                               mock.mock_open(), create=True) as open_mock:
+            self.monitor.start()
+        open_mock.assert_called_once_with(ip_monitor.NETNS_SELF_PATH)
+        self.setns.assert_has_calls([
+            mock.call('ns1', flags=0),
+            mock.call(open_mock.return_value)])
+        self.assertTrue(self.monitor.is_active())
+
+    def test_start_error(self):
+        self.ip.bind.side_effect = OSError
+        self.assertRaises(OSError, self.monitor.start)
+        self.ip.close.assert_called_once_with()
+        self.assertFalse(self.monitor.is_active())
+
+    def test_stop(self):
+        self.monitor.start()
+        self.monitor.stop()
+        self.ip.close.assert_called_once_with()
+        self.assertFalse(self.monitor.is_active())
+
+    def test_iter_events(self):
+        self.monitor.start()
+
+        def get():
+            if self.ip.get.call_count == 1:
+                return [
+                    _get_addr_message('RTM_NEWADDR', 2, '10.0.0.1', 24),
+                    _get_link_message('RTM_NEWLINK', 3, 'eth1'),
+                    _get_addr_message('RTM_NEWADDR', 3, 'fe80::1', 64,
+                                      family=socket.AF_INET6),
+                    _get_addr_message('RTM_DELADDR', 2, '10.0.0.1', 24),
+                    _get_link_message('RTM_DELLINK', 3, 'eth1')]
+            self.monitor.stop()
+            raise OSError()
+
+        self.ip.get.side_effect = get
+        events = [(event.added, event.interface, event.cidr)
+                  for event in self.monitor]
+        self.assertEqual([(True, 'eth0', '10.0.0.1/24'),
+                          (True, 'eth1', 'fe80::1/64'),
+                          (False, 'eth0', '10.0.0.1/24')], events)
+        self.assertNotIn(3, self.monitor._links)
+
+    def test_iter_events_error(self):
+        self.monitor.start()
+        self.ip.get.side_effect = OSError()
+        self.assertRaises(OSError, list, self.monitor.iter_events())
+
+    def test_iter_events_overflow(self):
+        resync_callback = mock.Mock()
+        self.monitor = ip_monitor.NetlinkIPMonitor(
+            resync_callback=resync_callback)
+        self.monitor.start()
+
+        def get():
+            if self.ip.get.call_count == 1:
+                # eth0 was renamed while the events were lost
+                self.ip.get_links.return_value = [
+                    _get_link_message('RTM_NEWLINK', 2, 'eth1')]
+                raise OSError(errno.ENOBUFS, 'No buffer space available')
+            if self.ip.get.call_count == 2:
+                return [_get_addr_message('RTM_NEWADDR', 2, '10.0.0.1', 24)]
+            self.monitor.stop()
+            raise OSError()
+
+        self.ip.get.side_effect = get
+        events = [(event.added, event.interface, event.cidr)
+                  for event in self.monitor]
+        self.assertEqual([(True, 'eth1', '10.0.0.1/24')], events)
+        self.assertEqual(2, self.ip.get_links.call_count)
+        resync_callback.assert_called_once_with()
@@ -163,3 +163,134 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
         self.expect_destroy()
         self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
         self.verify_mock_calls()
+
+
+class IpsetManagerDeferApplyTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerDeferApplyTestCase, self).setUp()
+        self.ipset = ipset_manager.IpsetManager()
+        self.execute = mock.patch.object(self.ipset, "execute").start()
+
+    def restore_call(self, lines):
+        return mock.call(['ipset', 'restore', '-exist'],
+                         process_input='\n'.join(lines),
+                         run_as_root=True,
+                         check_exit_code=True)
+
+    def set_lines(self, set_name, addresses, family='inet'):
+        new_set_name = set_name + ipset_manager.SWAP_SUFFIX
+        lines = ['create %s hash:net family %s' % (set_name, family),
+                 'create %s hash:net family %s' % (new_set_name, family)]
+        lines.extend('add %s %s' % (new_set_name, ip)
+                     for ip in self.ipset._sanitize_addresses(addresses))
+        lines.extend(['swap %s %s' % (new_set_name, set_name),
+                      'destroy %s' % new_set_name])
+        return lines
+
+    def test_defer_apply_single_restore(self):
+        other_set_name = self.ipset.get_name('other_sgid', 'IPv6')
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:2])
+            self.ipset.set_members('other_sgid', 'IPv6', ['fe80::1'])
+            self.assertTrue(self.ipset.set_name_exists(TEST_SET_NAME))
+            self.assertFalse(self.execute.called)
+
+        self.assertEqual(
+            [self.restore_call(
+                self.set_lines(TEST_SET_NAME, FAKE_IPS[:2]) +
+                self.set_lines(other_set_name, ['fe80::1'], 'inet6'))],
+            self.execute.mock_calls)
+
+    def test_defer_apply_members_and_destroy(self):
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:2])
+        self.ipset.set_members('other_sgid', ETHERTYPE, FAKE_IPS[:1])
+        self.execute.reset_mock()
+
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[1:3])
+            self.ipset.destroy('other_sgid', ETHERTYPE)
+
+        self.assertEqual(
+            [self.restore_call(
+                ['add %s 10.0.0.3/32' % TEST_SET_NAME,
+                 'del %s 10.0.0.1/32' % TEST_SET_NAME,
+                 'destroy %s' % self.ipset.get_name('other_sgid',
+                                                    ETHERTYPE)])],
+            self.execute.mock_calls)
+        self.assertEqual(['10.0.0.2/32', '10.0.0.3/32'],
+                         sorted(self.ipset.ipset_sets[TEST_SET_NAME]))
+
+    def test_defer_apply_without_changes(self):
+        with self.ipset.defer_apply():
+            pass
+        self.assertFalse(self.execute.called)
+
+    def test_defer_apply_failed_line(self):
+        other_set_name = self.ipset.get_name('other_sgid', ETHERTYPE)
+        lines = (self.set_lines(TEST_SET_NAME, FAKE_IPS[:1]) +
+                 self.set_lines(other_set_name, FAKE_IPS[:1]))
+        self.execute.side_effect = [
+            RuntimeError('ipset v7.1: Error in line 3: Syntax error'), None]
+
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:1])
+        self.ipset.set_members('other_sgid', ETHERTYPE, FAKE_IPS[:1])
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+
+        # only the failed line is dropped, the lines after it are still
+        # applied with a single restore
+        self.assertEqual([self.restore_call(lines),
+                          self.restore_call(lines[3:])],
+                         self.execute.mock_calls)
+        # and the set of the failed line is created by the next update
+        self.assertFalse(self.ipset.set_name_exists(TEST_SET_NAME))
+        self.assertTrue(self.ipset.set_name_exists(other_set_name))
+
+    def test_defer_apply_several_failed_lines(self):
+        other_set_name = self.ipset.get_name('other_sgid', ETHERTYPE)
+        lines = (self.set_lines(TEST_SET_NAME, FAKE_IPS[:1]) +
+                 self.set_lines(other_set_name, FAKE_IPS[:1]))
+        self.execute.side_effect = [
+            RuntimeError('ipset v7.1: Error in line 1: Syntax error'),
+            RuntimeError('ipset v7.1: Error in line 3: Syntax error'),
+            None]
+
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:1])
+        self.ipset.set_members('other_sgid', ETHERTYPE, FAKE_IPS[:1])
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+
+        self.assertEqual([self.restore_call(lines),
+                          self.restore_call(lines[1:]),
+                          self.restore_call(lines[4:])],
+                         self.execute.mock_calls)
+
+    def test_defer_apply_ignored_failure(self):
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:2])
+        self.execute.reset_mock()
+        self.execute.side_effect = [
+            RuntimeError('ipset v7.1: Error in line 2: Element not exist')]
+
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[1:3])
+
+        self.assertEqual(1, self.execute.call_count)
+        self.assertTrue(self.ipset.set_name_exists(TEST_SET_NAME))
+
+    def test_defer_apply_failure_without_line(self):
+        other_set_name = self.ipset.get_name('other_sgid', ETHERTYPE)
+        lines = (self.set_lines(TEST_SET_NAME, FAKE_IPS[:1]) +
+                 self.set_lines(other_set_name, FAKE_IPS[:1]))
+        self.execute.side_effect = [RuntimeError('fail')]
+
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:1])
+        self.ipset.set_members('other_sgid', ETHERTYPE, FAKE_IPS[:1])
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+
+        # the lines are not applied one by one
+        self.assertEqual([self.restore_call(lines)],
+                         self.execute.mock_calls)
+        self.assertFalse(self.ipset.set_name_exists(TEST_SET_NAME))
+        self.assertFalse(self.ipset.set_name_exists(other_set_name))
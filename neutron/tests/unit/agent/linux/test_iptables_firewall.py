@@ -1785,6 +1785,23 @@ class IptablesFirewallTestCase(BaseIptablesFirewallTestCase):
         self.iptables_inst.assert_has_calls([mock.call.defer_apply_on(),
                                              mock.call.defer_apply_off()])
 
+    def test_defer_apply_ipset(self):
+        managers = mock.Mock()
+        managers.attach_mock(self.iptables_inst, 'iptables')
+        self.firewall.ipset = managers.ipset
+        with self.firewall.defer_apply():
+            pass
+        # the ipsets are applied before the rules and destroyed after them
+        self.assertEqual([mock.call.iptables.defer_apply_on(),
+                          mock.call.ipset.defer_apply_on(),
+                          mock.call.ipset.defer_apply_off(),
+                          mock.call.iptables.defer_apply_off(),
+                          mock.call.ipset.defer_apply_on(),
+                          mock.call.ipset.defer_apply_off()],
+                         [call for call in managers.mock_calls
+                          if call[0].endswith('defer_apply_on') or
+                          call[0].endswith('defer_apply_off')])
+
     def test_filter_defer_with_exception(self):
         try:
             with self.firewall.defer_apply():
@@ -1315,6 +1315,103 @@ class IptablesManagerStateFulTestCaseEmptyCustomBinaryNameIPv6(
     use_ipv6 = True
 
 
+class IptablesManagerIncrementalApplyTestCase(IptablesManagerBaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalApplyTestCase, self).setUp()
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        self.execute.return_value = ''
+        self.time = mock.patch.object(iptables_manager.time, 'time',
+                                      return_value=1000).start()
+        self.iptables = iptables_manager.IptablesManager()
+
+    def _executed_commands(self):
+        commands = [call[0][0][0] for call in self.execute.call_args_list]
+        self.execute.reset_mock()
+        return commands
+
+    def _add_rule(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+
+    def test_apply_skips_save(self):
+        self.iptables.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         self._executed_commands())
+
+        self._add_rule()
+        restore_input = self.execute.call_args[1]['process_input']
+        self.assertEqual(['iptables-restore'], self._executed_commands())
+        self.assertIn(':%(bn)s-filter - [0:0]\n'
+                      '-I %(bn)s-filter 1 -j DROP\n' % IPTABLES_ARG,
+                      restore_input)
+
+    def test_apply_without_changes(self):
+        self.iptables.apply()
+        self._executed_commands()
+        self.iptables.apply()
+        self.assertEqual([], self._executed_commands())
+
+    def test_apply_full_resync_after_interval(self):
+        self.iptables.apply()
+        self._executed_commands()
+        self.time.return_value += (
+            cfg.CONF.AGENT.iptables_full_resync_interval)
+        self._add_rule()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         self._executed_commands())
+
+    def test_apply_no_periodic_full_resync(self):
+        cfg.CONF.set_override('iptables_full_resync_interval', 0, 'AGENT')
+        self.iptables.apply()
+        self._executed_commands()
+        self.time.return_value += 3600
+        self._add_rule()
+        self.assertEqual(['iptables-restore'], self._executed_commands())
+
+    def test_apply_full_resync_after_failure(self):
+        self.iptables.apply()
+        self._executed_commands()
+        self.execute.side_effect = [RuntimeError, None]
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self.iptables.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         self._executed_commands())
+
+    def test_apply_full_resync_after_new_table(self):
+        self.iptables = iptables_manager.IptablesManager(state_less=True)
+        self.iptables.apply()
+        self._executed_commands()
+        self.iptables.initialize_mangle_table()
+        self.iptables.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         self._executed_commands())
+        self.assertIn('mangle', self.iptables._applied_tables['iptables'])
+
+    def test_full_resync_detects_modified_table(self):
+        self.iptables.apply()
+        self.time.return_value += (
+            cfg.CONF.AGENT.iptables_full_resync_interval)
+        with mock.patch.object(iptables_manager, 'LOG') as log:
+            self.iptables.apply()
+        # iptables-save returned an empty ruleset instead of the rules
+        # applied by the first run
+        self.assertTrue(log.warning.called)
+
+    def test_disabled(self):
+        cfg.CONF.set_override('iptables_incremental_apply', False, 'AGENT')
+        self.iptables.apply()
+        self._executed_commands()
+        self._add_rule()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         self._executed_commands())
+        self.assertEqual({}, self.iptables._applied_tables)
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -0,0 +1,71 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from neutron_lib import constants
+
+from neutron.agent.linux import ip_conntrack
+from neutron.agent.linux import nftables_firewall
+from neutron.agent.linux import nftables_manager
+from neutron.conf.agent import securitygroups_rpc as security_config
+from neutron.tests import base
+
+
+class NftSetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(NftSetManagerTestCase, self).setUp()
+        self.nft_manager = mock.Mock(namespace=None)
+        self.manager = nftables_firewall.NftSetManager(self.nft_manager)
+        self.set_name = self.manager.get_name('fake_sgid', constants.IPv6)
+
+    def test_set_members(self):
+        self.assertEqual(
+            (['fe80::1/128'], []),
+            self.manager.set_members('fake_sgid', constants.IPv6,
+                                     ['fe80::1']))
+        self.nft_manager.set_members.assert_called_once_with(
+            self.set_name, 6, ['fe80::1/128'])
+        self.assertTrue(self.manager.set_name_exists(self.set_name))
+
+        self.nft_manager.reset_mock()
+        self.manager.set_members('fake_sgid', constants.IPv6, ['fe80::1'])
+        self.nft_manager.set_members.assert_not_called()
+
+    def test_destroy(self):
+        self.manager.set_members('fake_sgid', constants.IPv6, ['fe80::1'])
+        self.manager.destroy('fake_sgid', constants.IPv6)
+        self.nft_manager.remove_set.assert_called_once_with(self.set_name, 6)
+        self.assertFalse(self.manager.set_name_exists(self.set_name))
+
+        self.nft_manager.reset_mock()
+        self.manager.destroy('fake_sgid', constants.IPv6)
+        self.nft_manager.remove_set.assert_not_called()
+
+
+class NftablesFirewallDriverTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(NftablesFirewallDriverTestCase, self).setUp()
+        security_config.register_securitygroups_opts()
+
+    @mock.patch.object(ip_conntrack, 'get_conntrack')
+    def test_managers(self, get_conntrack):
+        driver = nftables_firewall.NftablesFirewallDriver()
+        self.assertIsInstance(driver.iptables,
+                              nftables_manager.NftablesManager)
+        self.assertTrue(driver.iptables.bridge)
+        self.assertIsInstance(driver.ipset, nftables_firewall.NftSetManager)
+        self.assertIs(driver.iptables, driver.ipset.nft_manager)
+        get_conntrack.assert_called_once_with(
+            driver.iptables.get_rules_for_table, driver.filtered_ports,
+            driver.unfiltered_ports, namespace=None, zone_per_port=False)
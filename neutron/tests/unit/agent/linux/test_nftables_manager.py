@@ -0,0 +1,268 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_config import cfg
+
+from neutron.agent.linux import iptables_manager
+from neutron.agent.linux import nftables_manager
+from neutron.common import constants
+from neutron.common import exceptions as n_exc
+from neutron.tests import base
+
+
+def fake_translate(process_input, family='ip'):
+    """Translate '-A chain rule' lines the way iptables-restore-translate
+    would for the rules used by these tests.
+    """
+    output = ['# Translated by iptables-restore-translate v1.8.4']
+    table = None
+    for line in process_input.split('\n'):
+        if line.startswith('*'):
+            table = line[1:]
+            output.append('add table %s %s' % (family, table))
+        elif line.startswith(':'):
+            output.append('add chain %s %s %s' % (family, table,
+                                                  line[1:].split(' ')[0]))
+        elif line.startswith('-A '):
+            chain, rule = (line[3:].split(' ', 1) + [''])[:2]
+            rule = rule.replace('-j ', 'jump ').replace('-i ', 'iifname ')
+            output.append('add rule %s %s %s %s' % (family, table, chain,
+                                                    rule.strip()))
+    return '\n'.join(output) + '\n'
+
+
+class NftablesManagerTestCase(base.BaseTestCase):
+
+    bridge = False
+
+    def setUp(self):
+        super(NftablesManagerTestCase, self).setUp()
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        self.execute = mock.Mock(side_effect=self._execute)
+        self.nft_inputs = []
+        self.translate_inputs = []
+        self.manager = nftables_manager.NftablesManager(
+            _execute=self.execute, state_less=True, use_ipv6=True,
+            binary_name='test', bridge=self.bridge)
+        self.family = 'bridge' if self.bridge else 'ip'
+
+    def _execute(self, cmd, process_input=None, **kwargs):
+        if cmd[0].endswith('-restore-translate'):
+            self.translate_inputs.append(process_input)
+            family = 'ip' if cmd[0].startswith('iptables') else 'ip6'
+            return fake_translate(process_input, family)
+        if cmd[:2] == ['nft', '-f']:
+            self.nft_inputs.append(process_input.split('\n'))
+        return ''
+
+    def test_get_iptables_manager(self):
+        self.assertIsInstance(
+            nftables_manager.get_iptables_manager(
+                constants.PACKET_FILTER_BACKEND_NFTABLES),
+            nftables_manager.NftablesManager)
+        manager = nftables_manager.get_iptables_manager(
+            constants.PACKET_FILTER_BACKEND_IPTABLES)
+        self.assertNotIsInstance(manager, nftables_manager.NftablesManager)
+        self.assertIsInstance(manager, iptables_manager.IptablesManager)
+
+    def test_apply_creates_tables(self):
+        self.manager.ipv4['filter'].add_chain('test')
+        self.manager.ipv4['filter'].add_rule('test', '-j DROP')
+        self.manager.apply()
+
+        self.assertEqual(1, len(self.nft_inputs))
+        commands = self.nft_inputs[0]
+        self.assertEqual(['add table ip test-filter4',
+                          'delete table ip test-filter4',
+                          'add table ip test-filter4'], commands[:3])
+        self.assertIn('add table ip6 test-filter6', commands)
+        self.assertIn('add chain ip test-filter4 INPUT { type filter hook '
+                      'input priority 0; policy accept; }', commands)
+        self.assertIn('add chain ip test-raw4 PREROUTING { type filter hook '
+                      'prerouting priority -300; policy accept; }', commands)
+        self.assertIn('add chain ip test-filter4 test-test', commands)
+        self.assertIn('add rule ip test-filter4 test-test jump DROP',
+                      commands)
+        self.assertIn('add rule ip test-filter4 INPUT jump test-INPUT',
+                      commands)
+        self.assertIn('add rule ip6 test-filter6 INPUT jump test-INPUT',
+                      commands)
+        # the chains are created before the rules
+        self.assertLess(commands.index('add chain ip test-filter4 test-test'),
+                        commands.index('add rule ip test-filter4 test-test '
+                                       'jump DROP'))
+        # one translation per ip version
+        self.assertEqual(2, len(self.translate_inputs))
+
+    def test_apply_only_changed_chains(self):
+        self.manager.ipv4['filter'].add_chain('test')
+        self.manager.apply()
+        self.nft_inputs = []
+        self.translate_inputs = []
+
+        self.manager.ipv4['filter'].add_rule('test', '-j DROP')
+        self.manager.apply()
+
+        self.assertEqual(
+            [['flush chain %s test-filter4 test-test' % self.family,
+              'add rule %s test-filter4 test-test jump DROP' % self.family,
+              '']], self.nft_inputs)
+        self.assertEqual(['*filter\n:test-test - [0:0]\n'
+                          '-A test-test -j DROP\nCOMMIT\n'],
+                         self.translate_inputs)
+
+    def test_apply_skips_duplicate_rules(self):
+        self.manager.ipv4['filter'].add_chain('test')
+        self.manager.ipv4['filter'].add_rule('test', '-j DROP')
+        self.manager.ipv4['filter'].add_rule('test', '-j ACCEPT')
+        self.manager.ipv4['filter'].add_rule('test', '-j DROP', top=True)
+        self.manager.apply()
+
+        self.assertEqual(
+            ['*filter', ':test-test - [0:0]', '-A test-test -j DROP',
+             '-A test-test -j ACCEPT'],
+            [line for line in self.translate_inputs[0].split('\n')
+             if 'test-test' in line or line == '*filter'])
+
+    def test_apply_without_changes(self):
+        self.manager.apply()
+        self.execute.reset_mock()
+        self.assertEqual([], self.manager.apply())
+        self.execute.assert_not_called()
+
+    def test_apply_removed_chain(self):
+        self.manager.ipv4['filter'].add_chain('test')
+        self.manager.ipv4['filter'].add_rule('INPUT', '-j $test')
+        self.manager.apply()
+        self.nft_inputs = []
+
+        self.manager.ipv4['filter'].remove_chain('test')
+        self.manager.apply()
+
+        commands = self.nft_inputs[0]
+        self.assertEqual(
+            ['flush chain %s test-filter4 test-test' % self.family,
+             'delete chain %s test-filter4 test-test' % self.family, ''],
+            commands[-3:])
+        self.assertIn('flush chain %s test-filter4 test-INPUT' % self.family,
+                      commands)
+
+    def test_apply_failure_recreates_tables(self):
+        self.manager.apply()
+        self.execute.side_effect = RuntimeError
+        self.manager.ipv4['filter'].add_chain('test')
+        self.assertRaises(RuntimeError, self.manager.apply)
+
+        self.execute.side_effect = self._execute
+        self.nft_inputs = []
+        self.manager.apply()
+        self.assertIn('delete table %s test-filter4' % self.family,
+                      self.nft_inputs[0])
+
+    def test_apply_untranslatable_rule(self):
+        self.manager.apply()
+        self.execute.side_effect = None
+        self.execute.return_value = '# -A test-INPUT -m foo -j DROP\n'
+        self.manager.ipv4['filter'].add_rule('INPUT', '-m foo -j DROP')
+        self.assertRaises(n_exc.IpTablesApplyException, self.manager.apply)
+
+    def test_set_members(self):
+        self.manager.set_members('NIPv4sg', 4, ['10.0.0.1/32'])
+        self.assertEqual([], self.nft_inputs)
+
+        self.manager.apply()
+        commands = self.nft_inputs[0]
+        family = self.family
+        self.assertIn('add set %s test-filter4 NIPv4sg { type ipv4_addr; '
+                      'flags interval; auto-merge; }' % family, commands)
+        self.assertIn('add element %s test-filter4 NIPv4sg { 10.0.0.1/32 }' %
+                      family, commands)
+
+        self.nft_inputs = []
+        self.manager.set_members('NIPv4sg', 4, ['10.0.0.1/32', '10.0.0.2/32'])
+        self.assertEqual(
+            [['add set %s test-filter4 NIPv4sg { type ipv4_addr; '
+              'flags interval; auto-merge; }' % family,
+              'flush set %s test-filter4 NIPv4sg' % family,
+              'add element %s test-filter4 NIPv4sg '
+              '{ 10.0.0.1/32, 10.0.0.2/32 }' % family, '']],
+            self.nft_inputs)
+
+        self.nft_inputs = []
+        self.manager.remove_set('NIPv4sg', 4)
+        self.assertEqual([['delete set %s test-filter4 NIPv4sg' % family,
+                           '']], self.nft_inputs)
+
+    def test_get_rules_for_table(self):
+        self.execute.side_effect = None
+        self.execute.return_value = (
+            'table %s test-raw4 {\n'
+            '    chain test-PREROUTING {\n'
+            '        iifname "tap1" counter ct zone set 4097\n'
+            '        iifname "qvb2" counter packets 0 bytes 0 ct zone set 2\n'
+            '    }\n'
+            '}\n' % self.family)
+        self.assertEqual(
+            ['-A PREROUTING -m physdev --physdev-in tap1 -j CT --zone 4097',
+             '-A PREROUTING -m physdev --physdev-in qvb2 -j CT --zone 2'],
+            self.manager.get_rules_for_table('raw'))
+
+        self.execute.side_effect = self._execute
+        self.manager.apply()
+        self.assertEqual(['-A PREROUTING -j test-PREROUTING',
+                          '-A OUTPUT -j test-OUTPUT'],
+                         self.manager.get_rules_for_table('raw'))
+
+    def test_get_traffic_counters(self):
+        self.manager.ipv4['filter'].add_chain('test')
+        listing = ('table ip test-filter4 {\n'
+                   '    chain test-test {\n'
+                   '        counter packets %d bytes %d accept\n'
+                   '        counter packets 1 bytes 10 drop\n'
+                   '    }\n'
+                   '}\n')
+        self.execute.side_effect = None
+        self.execute.return_value = listing % (2, 20)
+        self.assertEqual({'pkts': 3, 'bytes': 30},
+                         self.manager.get_traffic_counters('test', zero=True))
+        self.execute.assert_called_once_with(
+            ['nft', 'list', 'chain', self.family, 'test-filter4',
+             'test-test'],
+            run_as_root=True)
+
+        self.execute.return_value = listing % (5, 50)
+        self.assertEqual({'pkts': 3, 'bytes': 30},
+                         self.manager.get_traffic_counters('test'))
+
+
+class NftablesManagerBridgeTestCase(NftablesManagerTestCase):
+
+    bridge = True
+
+    def test_apply_creates_tables(self):
+        self.manager.ipv4['filter'].add_rule(
+            'INPUT', '-m physdev --physdev-in tap1 --physdev-is-bridged '
+                     '-j ACCEPT')
+        self.manager.apply()
+
+        commands = self.nft_inputs[0]
+        self.assertIn('add table bridge test-filter4', commands)
+        self.assertIn('add table bridge test-filter6', commands)
+        self.assertIn('add rule bridge test-filter4 INPUT meta protocol != ip '
+                      'accept', commands)
+        self.assertIn('add rule bridge test-filter6 INPUT meta protocol != '
+                      'ip6 accept', commands)
+        self.assertIn('add rule bridge test-filter4 test-INPUT iifname tap1 '
+                      'jump ACCEPT', commands)
+        self.assertIn('-A test-INPUT -i tap1 -j ACCEPT',
+                      self.translate_inputs[0])
@@ -40,6 +40,19 @@ class TestGetPollingManager(base.BaseTestCase):
                 mock_stop.assert_has_calls([mock.call()])
             mock_start.assert_has_calls([mock.call()])
 
+    def test_manage_port_tracker_polling_minimizer(self):
+        mock_target = ('neutron.agent.linux.polling.'
+                       'PortTrackerPollingMinimizer')
+        with mock.patch('%s.start' % mock_target) as mock_start:
+            with mock.patch('%s.stop' % mock_target) as mock_stop:
+                with polling.get_polling_manager(
+                        minimize_polling=True,
+                        ovsdb_port_monitor='native') as pm:
+                    self.assertEqual(pm.__class__,
+                                     polling.PortTrackerPollingMinimizer)
+                mock_stop.assert_has_calls([mock.call()])
+            mock_start.assert_has_calls([mock.call()])
+
 
 class TestInterfacePollingMinimizer(base.BaseTestCase):
 
@@ -69,3 +82,29 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+
+class TestPortTrackerPollingMinimizer(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPortTrackerPollingMinimizer, self).setUp()
+        self.pm = polling.PortTrackerPollingMinimizer()
+
+    def test_start_stop_port_tracker(self):
+        with mock.patch.object(self.pm.port_tracker, 'start') as mock_start:
+            self.pm.start()
+        mock_start.assert_called_once_with()
+        with mock.patch.object(self.pm.port_tracker, 'stop') as mock_stop:
+            self.pm.stop()
+        mock_stop.assert_called_once_with()
+
+    def test__is_polling_required(self):
+        self.assertFalse(self.pm._is_polling_required())
+        self.pm.port_tracker._new_events['added'].append({'name': 'tap1'})
+        self.assertTrue(self.pm._is_polling_required())
+
+    def test_get_events(self):
+        events = {'added': [{'name': 'tap1'}], 'removed': []}
+        with mock.patch.object(self.pm.port_tracker, 'get_events',
+                               return_value=events):
+            self.assertEqual(events, self.pm.get_events())
@@ -0,0 +1,194 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from ovs.db import idl
+
+from neutron.agent.ovsdb.native import port_tracker
+from neutron.tests import base
+
+
+def _row(table, uuid, **columns):
+    row = mock.Mock(uuid=uuid, **columns)
+    row._table.name = table
+    return row
+
+
+class TestPortTracker(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPortTracker, self).setUp()
+        self.tracker = port_tracker.PortTracker()
+
+    def _add_vif(self, name, iface_id, ofport=1, tag=1,
+                 event=idl.ROW_CREATE):
+        port = _row('Port', 'port-%s' % name, tag=[tag])
+        port.name = name
+        iface = _row('Interface', 'iface-%s' % name, ofport=[ofport],
+                     external_ids={'iface-id': iface_id,
+                                   'attached-mac': 'fa:16:3e:00:00:01'})
+        iface.name = name
+        self.tracker.notify(event, port)
+        self.tracker.notify(event, iface)
+        return port, iface
+
+    def _set_bridge(self, ports, name='br-int', event=idl.ROW_CREATE):
+        bridge = _row('Bridge', 'bridge-%s' % name, ports=ports)
+        bridge.name = name
+        self.tracker.notify(event, bridge)
+
+    def test_get_vif_port_set(self):
+        port1, _ = self._add_vif('tap1', 'id1')
+        port2, _ = self._add_vif('tap2', 'id2', ofport=[])
+        port3, _ = self._add_vif('tap3', 'id3')
+        self._set_bridge([port1, port2])
+        self._set_bridge([port3], name='br-ex')
+        self.assertEqual({'id1'}, self.tracker.get_vif_port_set('br-int'))
+        self.assertEqual({'id3'}, self.tracker.get_vif_port_set('br-ex'))
+        self.assertEqual(set(), self.tracker.get_vif_port_set('br-tun'))
+
+    def test_get_port_tag_dict(self):
+        port1, _ = self._add_vif('tap1', 'id1', tag=5)
+        port2 = _row('Port', 'port-patch', tag=[])
+        port2.name = 'patch-tun'
+        self.tracker.notify(idl.ROW_CREATE, port2)
+        self._set_bridge([port1, port2])
+        self.assertEqual({'tap1': 5, 'patch-tun': []},
+                         self.tracker.get_port_tag_dict('br-int'))
+
+    def test_cache_dropped_on_change(self):
+        port1, _ = self._add_vif('tap1', 'id1', tag=5)
+        self._set_bridge([port1])
+        self.assertEqual({'tap1': 5},
+                         self.tracker.get_port_tag_dict('br-int'))
+        port1.tag = [6]
+        self.tracker.notify(idl.ROW_UPDATE, port1)
+        self.assertEqual({'tap1': 6},
+                         self.tracker.get_port_tag_dict('br-int'))
+
+    def test_get_events(self):
+        port1, iface1 = self._add_vif('tap1', 'id1', ofport=[])
+        self._set_bridge([port1])
+        iface1.ofport = [3]
+        self.tracker.notify(idl.ROW_UPDATE, iface1)
+        self.assertTrue(self.tracker.has_updates)
+        events = self.tracker.get_events()
+        self.assertEqual(['tap1'], [e['name'] for e in events['added']])
+        self.assertEqual(3, events['added'][0]['ofport'])
+        self.assertEqual([], events['removed'])
+        self.assertFalse(self.tracker.has_updates)
+
+        self.tracker.notify(idl.ROW_DELETE, iface1)
+        self.tracker.notify(idl.ROW_DELETE, port1)
+        events = self.tracker.get_events()
+        self.assertEqual([], events['added'])
+        self.assertEqual(['tap1'], [e['name'] for e in events['removed']])
+        self.assertFalse(self.tracker.port_exists('tap1'))
+
+    def test_resync(self):
+        port1, iface1 = self._add_vif('tap1', 'id1')
+        port2, _ = self._add_vif('tap2', 'id2')
+        self._set_bridge([port1, port2])
+        self._set_bridge([], name='br-ex')
+        self.tracker.get_events()
+        self.assertEqual({'id1', 'id2'},
+                         self.tracker.get_vif_port_set('br-int'))
+        # tap2 and br-ex were deleted while the IDL was disconnected
+        tables = {
+            'Bridge': mock.Mock(rows={'bridge-br-int': mock.ANY}),
+            'Port': mock.Mock(rows={port1.uuid: port1}),
+            'Interface': mock.Mock(rows={iface1.uuid: iface1})}
+        self.tracker.resync(tables)
+        events = self.tracker.get_events()
+        self.assertEqual([], events['added'])
+        self.assertEqual(['tap2'], [e['name'] for e in events['removed']])
+        self.assertTrue(self.tracker.port_exists('tap1'))
+        self.assertFalse(self.tracker.port_exists('tap2'))
+        self.assertEqual({'id1'}, self.tracker.get_vif_port_set('br-int'))
+        self.assertEqual({'br-int'}, {bridge['name'] for bridge in
+                                      self.tracker._bridges.values()})
+
+    def test_port_exists(self):
+        self._add_vif('tap1', 'id1')
+        self.assertTrue(self.tracker.port_exists('tap1'))
+        self.assertFalse(self.tracker.port_exists('tap2'))
+
+    def test_ignores_other_tables(self):
+        self.tracker.notify(idl.ROW_CREATE, _row('Open_vSwitch', 'uuid'))
+        self.assertFalse(self.tracker.has_updates)
+
+    @mock.patch.object(port_tracker.connection, 'Connection')
+    @mock.patch.object(port_tracker.n_connection, 'idl_factory')
+    def test_start_stop(self, mock_idl_factory, mock_connection):
+        self.assertFalse(self.tracker.is_active)
+        self.tracker.start()
+        mock_idl_factory.assert_called_once_with(
+            port_tracker.PortTrackerIdl,
+            tables=port_tracker.MONITORED_TABLES, tracker=self.tracker)
+        mock_connection.return_value.start.assert_called_once_with()
+        self.assertTrue(self.tracker.is_active)
+        self._add_vif('tap1', 'id1')
+        self.tracker.stop()
+        mock_connection.return_value.stop.assert_called_once_with()
+        self.assertFalse(self.tracker.is_active)
+        self.assertFalse(self.tracker.has_updates)
+        self.assertFalse(self.tracker.port_exists('tap1'))
+
+
+class TestPortTrackerIdl(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPortTrackerIdl, self).setUp()
+        self.session_seqno = 1
+        session = mock.Mock()
+        session.get_seqno.side_effect = lambda: self.session_seqno
+
+        def _init(idl_self, remote, schema_helper):
+            idl_self._session = session
+            idl_self.change_seqno = 0
+            idl_self.tables = mock.sentinel.tables
+
+        mock.patch.object(idl.Idl, '__init__', autospec=True,
+                          side_effect=_init).start()
+        self.idl_run = mock.patch.object(idl.Idl, 'run').start()
+        self.tracker = mock.Mock()
+        self.idl = port_tracker.PortTrackerIdl(
+            mock.sentinel.remote, mock.sentinel.schema_helper, self.tracker)
+
+    def _run(self, reconnect=False, change=False):
+        def _idl_run():
+            if reconnect:
+                self.session_seqno += 1
+            if change:
+                self.idl.change_seqno += 1
+            return change
+
+        self.idl_run.side_effect = _idl_run
+        self.assertEqual(change, self.idl.run())
+
+    def test_run_resyncs_tracker_after_reconnect(self):
+        self._run(change=True)
+        # the session disconnects then reconnects
+        self._run(reconnect=True)
+        self._run(reconnect=True)
+        self.assertFalse(self.tracker.resync.called)
+        # the replica is reloaded
+        self._run(change=True)
+        self.tracker.resync.assert_called_once_with(mock.sentinel.tables)
+        self._run(change=True)
+        self.assertEqual(1, self.tracker.resync.call_count)
+
+    def test_run_changes_before_disconnect(self):
+        self._run(reconnect=True, change=True)
+        self.assertFalse(self.tracker.resync.called)
+        self._run(change=True)
+        self.tracker.resync.assert_called_once_with(mock.sentinel.tables)
@@ -16,9 +16,13 @@ import mock
 from neutron_lib.callbacks import events
 from neutron_lib.callbacks import registry
 from neutron_lib import context
+import oslo_messaging
+from oslo_serialization import jsonutils
+from oslo_utils import uuidutils
 
 from neutron.agent import resource_cache
 from neutron.api.rpc.callbacks import events as events_rpc
+from neutron.objects import securitygroup
 from neutron.tests import base
 
 
@@ -31,6 +35,9 @@ class OVOLikeThing(object):
             self.fields.append(k)
             setattr(self, k, v)
 
+    def __iter__(self):
+        return iter(self.fields)
+
     def to_dict(self):
         return {f: getattr(self, f) for f in self.fields}
 
@@ -38,6 +45,56 @@ class OVOLikeThing(object):
         return getattr(self, k, None)
 
 
+class TombstoneStoreTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(TombstoneStoreTestCase, self).setUp()
+        self.now = 1000
+        mock.patch.object(resource_cache.time, 'time',
+                          side_effect=lambda: self.now).start()
+
+    def test_expire_after_ttl(self):
+        store = resource_cache.TombstoneStore(ttl=100)
+        store.add(1)
+        self.now += 60
+        store.add(2)
+        self.assertIn(1, store)
+        self.assertEqual(2, len(store))
+        self.now += 50
+        self.assertNotIn(1, store)
+        self.assertIn(2, store)
+        self.assertEqual(1, len(store))
+        self.assertEqual(1, store.evicted)
+        self.now += 60
+        self.assertNotIn(2, store)
+        self.assertEqual(0, len(store))
+        self.assertEqual(2, store.evicted)
+
+    def test_ids_kept_for_at_least_ttl(self):
+        store = resource_cache.TombstoneStore(ttl=100)
+        for obj_id in range(10):
+            store.add(obj_id)
+            self.now += 10
+        # the newest ID of the oldest generation is still in the window
+        self.now = 1000 + 90 + 99
+        self.assertIn(9, store)
+
+    def test_max_size_evicts_oldest_generation(self):
+        store = resource_cache.TombstoneStore(ttl=0, max_size=8)
+        for obj_id in range(9):
+            store.add(obj_id)
+        self.assertNotIn(0, store)
+        self.assertNotIn(1, store)
+        self.assertIn(2, store)
+        self.assertEqual(7, len(store))
+        self.assertEqual(2, store.evicted)
+
+    def test_add_duplicate(self):
+        store = resource_cache.TombstoneStore(ttl=100, max_size=10)
+        store.add(1)
+        store.add(1)
+        self.assertEqual(1, len(store))
+
+
 class RemoteResourceCacheTestCase(base.BaseTestCase):
     def setUp(self):
         super(RemoteResourceCacheTestCase, self).setUp()
@@ -71,7 +128,8 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
                                            name=('a', 'b'))
         self._pullmock.bulk_pull.assert_called_once_with(
             mock.ANY, 'goose',
-            filter_kwargs={'id': (66, 67), 'name': ('a', 'b')})
+            filter_kwargs={'id': (66, 67), 'name': ('a', 'b')},
+            page_size=500)
 
         self._pullmock.bulk_pull.reset_mock()
         self.rcache._flood_cache_for_query('goose', id=(66, ), name=('a', ))
@@ -83,7 +141,7 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
         # specific query
         self.rcache._flood_cache_for_query('goose', id=(67, ))
         self._pullmock.bulk_pull.assert_called_once_with(
-            mock.ANY, 'goose', filter_kwargs={'id': (67, )})
+            mock.ANY, 'goose', filter_kwargs={'id': (67, )}, page_size=500)
 
         self.assertItemsEqual(
             resources, [rec['updated'] for rec in received_kw])
@@ -120,6 +178,68 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
                               self.rcache.match_resources_with_func('goose',
                                                                     has_large))
 
+    def _make_indexed_cache(self):
+        rcache = resource_cache.RemoteResourceCache(
+            ['goose'], indexes={'goose': ('size', 'flocks')})
+        mock.patch.object(rcache, '_puller').start()
+        return rcache
+
+    def test_get_resources_indexed(self):
+        rcache = self._make_indexed_cache()
+        geese = [OVOLikeThing(3, size='large', flocks=['a', 'b'], age=1),
+                 OVOLikeThing(5, size='medium', flocks=['b'], age=2),
+                 OVOLikeThing(4, size='large', flocks=[], age=3),
+                 OVOLikeThing(6, size='small', flocks=['c'], age=1)]
+        for goose in geese:
+            rcache.record_resource_update(self.ctx, 'goose', goose)
+        with mock.patch.object(rcache, 'match_resources_with_func') as m:
+            self.assertItemsEqual(
+                [geese[0], geese[2]],
+                rcache.get_resources('goose', {'size': ('large', )}))
+            self.assertItemsEqual(
+                [geese[0], geese[1]],
+                rcache.get_resources('goose', {'flocks': ('b', )}))
+            self.assertItemsEqual(
+                [geese[0], geese[1], geese[3]],
+                rcache.get_resources('goose', {'flocks': ('b', 'c')}))
+            self.assertItemsEqual(
+                [geese[0]],
+                rcache.get_resources('goose', {'flocks': ('b', ),
+                                               'size': ('large', )}))
+            # non-indexed keys are matched on the indexed candidates
+            self.assertItemsEqual(
+                [geese[1]],
+                rcache.get_resources('goose', {'flocks': ('b', 'c'),
+                                               'age': (2, )}))
+            self.assertEqual(
+                [], rcache.get_resources('goose', {'size': ('tiny', )}))
+            self.assertFalse(m.called)
+        # filters without indexed keys fall back to a scan
+        self.assertItemsEqual(
+            [geese[0], geese[3]],
+            rcache.get_resources('goose', {'age': (1, )}))
+
+    def test_indexes_follow_updates_and_deletes(self):
+        rcache = self._make_indexed_cache()
+        rcache.record_resource_update(
+            self.ctx, 'goose', OVOLikeThing(3, size='large', flocks=['a']))
+        rcache.record_resource_update(
+            self.ctx, 'goose', OVOLikeThing(3, size='small', flocks=['b'],
+                                            revision_number=11))
+        self.assertEqual(
+            [], rcache.get_resources('goose', {'size': ('large', )}))
+        self.assertEqual(
+            [], rcache.get_resources('goose', {'flocks': ('a', )}))
+        self.assertEqual(
+            [3], [g.id for g in rcache.get_resources('goose',
+                                                     {'flocks': ('b', )})])
+        rcache.record_resource_delete(self.ctx, 'goose', 3)
+        self.assertEqual(
+            [], rcache.get_resources('goose', {'flocks': ('b', )}))
+        # empty buckets are dropped from the index
+        self.assertEqual({'size': {}, 'flocks': {}},
+                         rcache._indexes_by_type['goose'])
+
     def test__is_stale(self):
         goose = OVOLikeThing(3, size='large')
         self.rcache.record_resource_update(self.ctx, 'goose', goose)
@@ -182,6 +302,23 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
         self.rcache.record_resource_delete(self.ctx, 'goose', 3)
         self.assertEqual(2, len(received_kw))
 
+    def test_record_resource_delete_tombstone_expires(self):
+        self.rcache._deleted_ids_by_type['goose'] = (
+            resource_cache.TombstoneStore(ttl=100))
+        with mock.patch.object(resource_cache.time, 'time',
+                               return_value=1000):
+            self.rcache.record_resource_delete(self.ctx, 'goose', 3)
+            self.assertTrue(
+                self.rcache._is_stale('goose', OVOLikeThing(3)))
+            self.assertEqual({'held': 1, 'evicted': 0},
+                             self.rcache.get_tombstone_stats()['goose'])
+        with mock.patch.object(resource_cache.time, 'time',
+                               return_value=1100):
+            self.assertFalse(
+                self.rcache._is_stale('goose', OVOLikeThing(3)))
+            self.assertEqual({'held': 0, 'evicted': 1},
+                             self.rcache.get_tombstone_stats()['goose'])
+
     def test_resource_change_handler(self):
         with mock.patch.object(resource_cache.RemoteResourceWatcher,
                                '_init_rpc_listeners'):
@@ -198,3 +335,182 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
         for goose in geese:
             self.assertIsNone(
                 self.rcache.get_resource_by_id('goose', goose.id))
+
+
+class RemoteResourceCacheSnapshotTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(RemoteResourceCacheSnapshotTestCase, self).setUp()
+        self.ctx = context.get_admin_context()
+        self.path = self.get_temp_file_path('cache.json')
+        self.sgs = [self._make_sg() for _ in range(3)]
+        self.rcache = self._make_cache()
+        for sg in self.sgs:
+            self.rcache.record_resource_update(self.ctx, 'SecurityGroup', sg)
+        self.rcache.save_snapshot()
+
+    def _make_cache(self):
+        rcache = resource_cache.RemoteResourceCache(
+            ['SecurityGroup'], indexes={'SecurityGroup': ('name', )},
+            snapshot_path=self.path)
+        self._pullmock = mock.patch.object(rcache, '_puller').start()
+        return rcache
+
+    def _make_sg(self, **kwargs):
+        sg_id = kwargs.pop('id', uuidutils.generate_uuid())
+        kwargs.setdefault('revision_number', 1)
+        kwargs.setdefault('name', 'sg')
+        return securitygroup.SecurityGroup(self.ctx, id=sg_id, **kwargs)
+
+    def _get_sg(self, rcache, sg_id):
+        return rcache._type_cache('SecurityGroup').get(sg_id)
+
+    def test_save_snapshot(self):
+        with open(self.path) as f:
+            snapshot = jsonutils.loads(f.read())
+        self.assertEqual(resource_cache.SNAPSHOT_VERSION,
+                         snapshot['version'])
+        self.assertEqual(securitygroup.SecurityGroup.VERSION,
+                         snapshot['resources']['SecurityGroup']['version'])
+        self.assertItemsEqual(
+            [sg.id for sg in self.sgs],
+            [o['versioned_object.data']['id']
+             for o in snapshot['resources']['SecurityGroup']['objects']])
+
+    def test_load_snapshot_reconciles_with_server(self):
+        updated = self._make_sg(id=self.sgs[1].id, revision_number=2,
+                                name='updated')
+        rcache = self._make_cache()
+        self._pullmock.bulk_pull_revisions.return_value = {
+            self.sgs[0].id: 1, self.sgs[1].id: 2}
+        self._pullmock.bulk_pull.return_value = [updated]
+        rcache.load_snapshot()
+
+        self._pullmock.bulk_pull_revisions.assert_called_once_with(
+            mock.ANY, 'SecurityGroup', filter_kwargs={'id': mock.ANY})
+        self._pullmock.bulk_pull.assert_called_once_with(
+            mock.ANY, 'SecurityGroup',
+            filter_kwargs={'id': (self.sgs[1].id, )}, page_size=mock.ANY)
+        self.assertEqual(self.sgs[0].to_dict(),
+                         self._get_sg(rcache, self.sgs[0].id).to_dict())
+        self.assertEqual('updated',
+                         self._get_sg(rcache, self.sgs[1].id).name)
+        # deleted while the agent was down
+        self.assertIsNone(self._get_sg(rcache, self.sgs[2].id))
+        # restored objects are indexed
+        self.assertEqual(
+            [self.sgs[0].id],
+            [sg.id for sg in rcache.get_resources('SecurityGroup',
+                                                {'name': ('sg', )})])
+
+    def test_load_snapshot_keeps_resources_pushed_meanwhile(self):
+        pushed = self._make_sg(id=self.sgs[0].id, revision_number=3,
+                               name='pushed')
+        rcache = self._make_cache()
+
+        def push_during_reconcile(*args, **kwargs):
+            rcache.record_resource_update(self.ctx, 'SecurityGroup', pushed)
+            rcache.record_resource_delete(self.ctx, 'SecurityGroup',
+                                          self.sgs[1].id)
+            return {sg.id: 1 for sg in self.sgs}
+
+        self._pullmock.bulk_pull_revisions.side_effect = (
+            push_during_reconcile)
+        rcache.load_snapshot()
+        self.assertEqual('pushed', self._get_sg(rcache, self.sgs[0].id).name)
+        self.assertIsNone(self._get_sg(rcache, self.sgs[1].id))
+        self.assertEqual('sg', self._get_sg(rcache, self.sgs[2].id).name)
+
+    def test_warm_cache_only_pulls_outdated_resources(self):
+        rcache = self._make_cache()
+        self._pullmock.bulk_pull_revisions.return_value = {
+            sg.id: 1 for sg in self.sgs}
+        rcache.load_snapshot()
+        self.assertFalse(self._pullmock.bulk_pull.called)
+
+        new_sg = self._make_sg()
+        self._pullmock.bulk_pull_revisions.return_value = {
+            self.sgs[0].id: 1, new_sg.id: 1}
+        self._pullmock.bulk_pull.return_value = [new_sg]
+        rcache._flood_cache_for_query('SecurityGroup', name=('sg', ))
+        self._pullmock.bulk_pull.assert_called_once_with(
+            mock.ANY, 'SecurityGroup', filter_kwargs={'id': (new_sg.id, )},
+            page_size=mock.ANY)
+        self.assertIsNotNone(self._get_sg(rcache, new_sg.id))
+
+    def test_load_snapshot_unsupported_by_server(self):
+        rcache = self._make_cache()
+        self._pullmock.bulk_pull_revisions.side_effect = (
+            oslo_messaging.UnsupportedVersion('1.2'))
+        rcache.load_snapshot()
+        self.assertEqual({}, rcache._type_cache('SecurityGroup'))
+        self.assertFalse(rcache._warm)
+
+    def test_load_snapshot_ignores_other_object_versions(self):
+        with open(self.path) as f:
+            snapshot = jsonutils.loads(f.read())
+        snapshot['resources']['SecurityGroup']['version'] = '0.1'
+        with open(self.path, 'w') as f:
+            jsonutils.dump(snapshot, f)
+        rcache = self._make_cache()
+        rcache.load_snapshot()
+        self.assertFalse(self._pullmock.bulk_pull_revisions.called)
+        self.assertEqual({}, rcache._type_cache('SecurityGroup'))
+
+    def test_load_snapshot_missing_or_corrupted(self):
+        with open(self.path, 'w') as f:
+            f.write('{')
+        rcache = self._make_cache()
+        rcache.load_snapshot()
+        self.assertFalse(rcache._warm)
+        rcache._snapshot_path = self.get_temp_file_path('missing.json')
+        rcache.load_snapshot()
+        self.assertFalse(rcache._warm)
+
+
+class RemoteResourceCacheChangedFieldsTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(RemoteResourceCacheChangedFieldsTestCase, self).setUp()
+        self.ctx = context.get_admin_context()
+        self.rcache = resource_cache.RemoteResourceCache(['SecurityGroup'])
+        self.sg_id = uuidutils.generate_uuid()
+        self.rule_id = uuidutils.generate_uuid()
+
+    def _make_sg(self, revision_number, port_range_max=80, **kwargs):
+        rule = securitygroup.SecurityGroupRule(
+            self.ctx, id=self.rule_id, security_group_id=self.sg_id,
+            direction='ingress', ethertype='IPv4', protocol='tcp',
+            port_range_min=80, port_range_max=port_range_max)
+        kwargs.setdefault('name', 'sg')
+        return securitygroup.SecurityGroup(
+            self.ctx, id=self.sg_id, rules=[rule],
+            revision_number=revision_number, **kwargs)
+
+    def test_new_resource(self):
+        sg = self._make_sg(1)
+        self.assertEqual(set(sg.to_dict()) - {'revision_number'},
+                         self.rcache._get_changed_fields(None, sg))
+
+    def test_same_revision_is_not_compared(self):
+        self.assertEqual(set(), self.rcache._get_changed_fields(
+            self._make_sg(1), self._make_sg(1, name='other')))
+
+    def test_unchanged_fields(self):
+        with mock.patch.object(securitygroup.SecurityGroup,
+                               'to_dict') as to_dict:
+            self.assertEqual(set(), self.rcache._get_changed_fields(
+                self._make_sg(1), self._make_sg(2)))
+            self.assertFalse(to_dict.called)
+
+    def test_changed_fields(self):
+        self.assertEqual({'name'}, self.rcache._get_changed_fields(
+            self._make_sg(1), self._make_sg(2, name='other')))
+        self.assertEqual({'description'}, self.rcache._get_changed_fields(
+            self._make_sg(1), self._make_sg(2, description='new')))
+
+    def test_changed_nested_objects(self):
+        self.assertEqual({'rules'}, self.rcache._get_changed_fields(
+            self._make_sg(1), self._make_sg(2, port_range_max=90)))
+        updated = self._make_sg(2)
+        updated.rules = []
+        self.assertEqual({'rules'}, self.rcache._get_changed_fields(
+            self._make_sg(1), updated))
@@ -173,6 +173,19 @@ class AgentRPCMethods(base.BaseTestCase):
             create_connection.assert_has_calls(expected)
 
 
+class TestCreateCacheForL2Agent(base.BaseTestCase):
+
+    def test_watcher_started_before_snapshot_load(self):
+        with mock.patch.object(rpc.resource_cache,
+                               'RemoteResourceCache') as rcache_cls:
+            rcache = rpc.create_cache_for_l2_agent()
+        self.assertEqual(rcache_cls.return_value, rcache)
+        self.assertEqual(
+            [mock.call.start_watcher(), mock.call.load_snapshot()],
+            [c for c in rcache.mock_calls
+             if c[0] in ('start_watcher', 'load_snapshot')])
+
+
 class TestCacheBackedPluginApi(base.BaseTestCase):
 
     def setUp(self):
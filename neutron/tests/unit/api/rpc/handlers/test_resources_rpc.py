@@ -16,6 +16,7 @@
 import mock
 from neutron_lib.agent import topics
 from neutron_lib import context
+import oslo_messaging
 from oslo_utils import uuidutils
 from oslo_versionedobjects import fields as obj_fields
 import testtools
@@ -168,6 +169,66 @@ class ResourcesPullRpcApiTestCase(ResourcesRpcBaseTestCase):
             version=TEST_VERSION, filter_kwargs=filter_kwargs)
         self.assertEqual(expected_objs, result)
 
+    def test_bulk_pull_paginated(self):
+        self.obj_registry.register(FakeResource)
+        expected_objs = sorted(
+            [_create_test_resource(self.context) for _ in range(5)],
+            key=lambda obj: obj.id)
+        self.cctxt_mock.call.side_effect = [
+            [e.obj_to_primitive() for e in expected_objs[:2]],
+            [e.obj_to_primitive() for e in expected_objs[2:4]],
+            [e.obj_to_primitive() for e in expected_objs[4:]]]
+        self.rpc.pagination_supported = True
+
+        filter_kwargs = {'a': 'b'}
+        result = self.rpc.bulk_pull(
+            self.context, FakeResource.obj_name(),
+            filter_kwargs=filter_kwargs, page_size=2)
+
+        self.rpc.client.prepare.assert_called_once_with(version='1.3')
+        self.cctxt_mock.call.assert_has_calls([
+            mock.call(self.context, 'bulk_pull', resource_type='FakeResource',
+                      version=TEST_VERSION, filter_kwargs=filter_kwargs,
+                      marker=marker, limit=2)
+            for marker in (None, expected_objs[1].id, expected_objs[3].id)])
+        self.assertEqual(expected_objs, result)
+
+    def test_bulk_pull_paginated_unsupported(self):
+        self.obj_registry.register(FakeResource)
+        expected_objs = [_create_test_resource(self.context)]
+        self.cctxt_mock.call.side_effect = [
+            oslo_messaging.UnsupportedVersion('1.3'),
+            [e.obj_to_primitive() for e in expected_objs],
+            [e.obj_to_primitive() for e in expected_objs]]
+        self.rpc.pagination_supported = True
+        self.addCleanup(setattr, self.rpc, 'pagination_supported', True)
+
+        for _ in range(2):
+            result = self.rpc.bulk_pull(
+                self.context, FakeResource.obj_name(), page_size=2)
+            self.assertEqual(expected_objs, result)
+        self.assertFalse(self.rpc.pagination_supported)
+        # pagination isn't attempted again
+        self.assertEqual(3, self.cctxt_mock.call.call_count)
+        self.cctxt_mock.call.assert_called_with(
+            self.context, 'bulk_pull', resource_type='FakeResource',
+            version=TEST_VERSION, filter_kwargs=None)
+
+    def test_bulk_pull_revisions(self):
+        self.cctxt_mock.call.return_value = [
+            [r.id, 3] for r in self.resource_objs]
+
+        filter_kwargs = {'a': 'b'}
+        result = self.rpc.bulk_pull_revisions(
+            self.context, FakeResource.obj_name(),
+            filter_kwargs=filter_kwargs)
+
+        self.rpc.client.prepare.assert_called_once_with(version='1.2')
+        self.cctxt_mock.call.assert_called_once_with(
+            self.context, 'bulk_pull_revisions', resource_type='FakeResource',
+            filter_kwargs=filter_kwargs)
+        self.assertEqual({r.id: 3 for r in self.resource_objs}, result)
+
     def test_pull_resource_not_found(self):
         resource_dict = _create_test_dict()
         resource_id = resource_dict['id']
@@ -238,6 +299,29 @@ class ResourcesPullRpcCallbackTestCase(ResourcesRpcBaseTestCase):
                 version=TEST_VERSION, filter_kwargs={'id': r1.id})
             self.assertEqual([r1.obj_to_primitive()], objs)
 
+    def test_bulk_pull_paginated(self):
+        with mock.patch.object(FakeResource, 'get_objects_page',
+                               create=True,
+                               return_value=[self.resource_obj]) as m:
+            objs = self.callbacks.bulk_pull(
+                self.context, resource_type=FakeResource.obj_name(),
+                version=TEST_VERSION, filter_kwargs={'field': 'foo'},
+                marker='marker', limit=10)
+        m.assert_called_once_with(self.context, marker='marker', limit=10,
+                                  field='foo')
+        self.assertEqual([self.resource_obj.obj_to_primitive()], objs)
+
+    def test_bulk_pull_revisions(self):
+        r1 = self.resource_obj
+        r2 = _create_test_resource(self.context)
+        with mock.patch.object(FakeResource, 'get_revision_numbers',
+                               return_value=[(r1.id, 1), (r2.id, 2)]) as m:
+            revisions = self.callbacks.bulk_pull_revisions(
+                self.context, resource_type=FakeResource.obj_name(),
+                filter_kwargs={'id': (r1.id, r2.id)})
+        m.assert_called_once_with(self.context, id=(r1.id, r2.id))
+        self.assertEqual([[r1.id, 1], [r2.id, 2]], revisions)
+
     @mock.patch.object(FakeResource, 'obj_to_primitive')
     def test_pull_backports_to_older_version(self, to_prim_mock):
         with mock.patch.object(resources_rpc.prod_registry, 'pull',
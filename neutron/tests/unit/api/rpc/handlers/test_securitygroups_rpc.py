@@ -69,7 +69,10 @@ class SecurityGroupServerAPIShimTestCase(base.BaseTestCase):
         objects.register_objects()
         resource_types = [resources.PORT, resources.SECURITYGROUP,
                           resources.SECURITYGROUPRULE]
-        self.rcache = resource_cache.RemoteResourceCache(resource_types)
+        indexes = {resources.PORT: ('security_group_ids', ),
+                   resources.SECURITYGROUPRULE: ('security_group_id', )}
+        self.rcache = resource_cache.RemoteResourceCache(resource_types,
+                                                         indexes=indexes)
         # prevent any server lookup attempts
         mock.patch.object(self.rcache, '_flood_cache_for_query').start()
         self.shim = securitygroups_rpc.SecurityGroupServerAPIShim(self.rcache)
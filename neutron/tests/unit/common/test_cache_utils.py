@@ -11,6 +11,10 @@
 #    under the License.
 
 import mock
+from neutron_lib.callbacks import events
+from neutron_lib.callbacks import registry
+from neutron_lib.callbacks import resources
+from oslo_cache import core as oslo_cache
 from oslo_config import cfg
 from oslo_config import fixture as config_fixture
 
@@ -117,3 +121,129 @@ class TestCachingDecorator(base.BaseTestCase):
         self.decor._cache = False
         retval = self.decor.func((1, 2))
         self.assertEqual(self.decor.func_retval, retval)
+
+
+class TestLRUCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestLRUCache, self).setUp()
+        self.now = 1000
+        mock.patch.object(cache.time, 'time',
+                          side_effect=lambda: self.now).start()
+        self.cache = cache.LRUCache(max_size=3, ttl=60, negative_ttl=10)
+
+    def test_get_set(self):
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('a'))
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(1, self.cache.get_stats()['size'])
+
+    def test_evicts_least_recently_used(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('b'))
+        for key in ('a', 'c', 'd'):
+            self.assertEqual(key, self.cache.get(key))
+        self.assertEqual(1, self.cache.get_stats()['evictions'])
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', None)
+        self.now += 10
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('b'))
+        self.now += 50
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('a'))
+        self.assertEqual(2, self.cache.get_stats()['expirations'])
+
+    def test_no_ttl(self):
+        self.cache = cache.LRUCache(max_size=3)
+        self.cache.set('a', None)
+        self.now += 3600
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_get_or_load(self):
+        load = mock.Mock(side_effect=[None, 'value'])
+        self.assertIsNone(self.cache.get_or_load('a', load, 1, b=2))
+        self.assertIsNone(self.cache.get_or_load('a', load, 1, b=2))
+        load.assert_called_once_with(1, b=2)
+        # the negative entry expires before the other ones
+        self.now += 10
+        self.assertEqual('value', self.cache.get_or_load('a', load, 1, b=2))
+        self.assertEqual(2, load.call_count)
+
+    def test_get_or_load_invalidated_while_loading(self):
+        def load(invalidate):
+            invalidate()
+            return 'stale'
+
+        for invalidate in (lambda: self.cache.invalidate('a'),
+                           self.cache.clear):
+            self.assertEqual('stale', self.cache.get_or_load('a', load,
+                                                             invalidate))
+            self.assertIs(oslo_cache.NO_VALUE, self.cache.get('a'))
+        # invalidating another key doesn't prevent caching the result
+        self.cache.get_or_load('a', load, lambda: self.cache.invalidate('b'))
+        self.assertEqual('stale', self.cache.get('a'))
+        self.assertFalse(self.cache._loading)
+        self.assertFalse(self.cache._load_invalidations)
+
+    def test_get_or_load_failure(self):
+        load = mock.Mock(side_effect=ValueError)
+        self.assertRaises(ValueError, self.cache.get_or_load, 'a', load)
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('a'))
+        self.assertFalse(self.cache._loading)
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.invalidate('a')
+        self.cache.invalidate('c')
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('a'))
+        self.assertEqual(2, self.cache.get('b'))
+        self.cache.clear()
+        self.assertEqual(0, self.cache.get_stats()['size'])
+        self.assertEqual(2, self.cache.get_stats()['invalidations'])
+
+    def test_subscribe(self):
+        self.cache.subscribe(resources.PORT, [events.AFTER_UPDATE])
+        self.cache.set('port1', 1)
+        self.cache.set('port2', 2)
+        registry.notify(resources.PORT, events.AFTER_UPDATE, self,
+                        port={'id': 'port1'})
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('port1'))
+        registry.publish(resources.PORT, events.AFTER_UPDATE, self,
+                         payload=events.DBEventPayload(
+                             mock.ANY, resource_id='port2'))
+        self.assertIs(oslo_cache.NO_VALUE, self.cache.get('port2'))
+
+    def test_subscribe_key_func(self):
+        key_func = mock.Mock(return_value=None)
+        self.cache.subscribe(resources.NETWORK, [events.AFTER_DELETE],
+                             key_func=key_func)
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        registry.notify(resources.NETWORK, events.AFTER_DELETE, self,
+                        network_id='net')
+        key_func.assert_called_once_with(
+            resources.NETWORK, events.AFTER_DELETE, self, network_id='net')
+        self.assertEqual(0, self.cache.get_stats()['size'])
+
+    def test_get_stats(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', None)
+        self.cache.get('a')
+        self.cache.get('b')
+        self.cache.get('c')
+        self.assertEqual({'hits': 1, 'negative_hits': 1, 'misses': 1,
+                          'evictions': 0, 'expirations': 0,
+                          'invalidations': 0, 'size': 2},
+                         self.cache.get_stats())
+
+    def test_cache_method_results(self):
+        decor = _CachingDecorator()
+        decor._cache = self.cache
+        decor.func(1)
+        decor.func(1)
+        self.assertEqual(1, self.cache.get_stats()['hits'])
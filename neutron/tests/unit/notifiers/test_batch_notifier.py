@@ -61,3 +61,67 @@ class TestBatchNotifier(base.BaseTestCase):
                 # wait for coroutines to finish
                 eventlet.sleep(0.1)
             self.assertTrue(send_events.called)
+
+    def test_queue_event_single_flusher(self):
+        for i in range(5):
+            self.notifier.queue_event(mock.Mock())
+        self.assertEqual(5, len(self.notifier.pending_events))
+        self.assertEqual(1, self.spawn_n.call_count)
+
+    def test_flusher_exits_when_idle(self):
+        with mock.patch.object(self.notifier, 'callback') as send_events, \
+                mock.patch('eventlet.sleep') as sleep:
+            self.notifier.queue_event(mock.Mock())
+            self.notifier._run_flusher()
+            self.assertEqual(1, send_events.call_count)
+            self.assertEqual(1, sleep.call_count)
+            # a new flusher is started for the next event
+            self.notifier.queue_event(mock.Mock())
+            self.assertEqual(2, self.spawn_n.call_count)
+
+    def test_flusher_sends_events_queued_while_sleeping(self):
+        events = [mock.Mock() for _ in range(3)]
+        with mock.patch.object(self.notifier, 'callback') as send_events, \
+                mock.patch('eventlet.sleep') as sleep:
+            sleep.side_effect = (
+                lambda interval: self.notifier.queue_event(events.pop()) if
+                events else None)
+            self.notifier.queue_event(mock.Mock())
+            self.notifier._run_flusher()
+            self.assertEqual(4, send_events.call_count)
+            self.assertEqual(0, len(self.notifier.pending_events))
+
+    def test_max_batch_size(self):
+        self.notifier.max_batch_size = 2
+        with mock.patch.object(self.notifier, 'callback') as send_events:
+            for i in range(5):
+                self.notifier.queue_event(i + 1)
+            self.notifier._notify()
+            self.assertEqual([mock.call([1, 2]), mock.call([3, 4]),
+                              mock.call([5])],
+                             send_events.call_args_list)
+
+    def test_coalesce_events(self):
+        self.notifier.key_func = lambda event: event[0]
+        for event in (('a', 1), ('b', 1), ('a', 2), ('c', 1)):
+            self.notifier.queue_event(event)
+        self.assertEqual([('b', 1), ('a', 2), ('c', 1)],
+                         self.notifier.pending_events)
+
+    def test_get_stats(self):
+        self.notifier.key_func = lambda event: event
+        self.notifier.max_batch_size = 2
+        for event in (1, 2, 1, 3):
+            self.notifier.queue_event(event)
+        self.assertEqual(3, self.notifier.get_stats()['queue_depth'])
+        self.notifier._notify()
+        stats = self.notifier.get_stats()
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(4, stats['events_queued'])
+        self.assertEqual(1, stats['events_coalesced'])
+        self.assertEqual(3, stats['events_sent'])
+        self.assertEqual(2, stats['batches_sent'])
+        self.assertEqual(1, stats['last_batch_size'])
+        self.assertEqual(2, stats['largest_batch_size'])
+        self.assertGreaterEqual(stats['max_flush_latency'],
+                                stats['last_flush_latency'])
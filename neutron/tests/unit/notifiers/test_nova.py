@@ -363,3 +363,17 @@ class TestNovaNotify(base.BaseTestCase):
             1, len(self.nova_notifier.batch_notifier.pending_events))
         self.assertEqual(expected_event,
                          self.nova_notifier.batch_notifier.pending_events[0])
+
+    def test_queue_event_coalesces_port_events(self):
+        device_id = '32102d7b-1cf4-404d-b50a-97aae1f55f87'
+        port_id = 'bee50827-bcee-4cc8-91c1-a27b0ce54222'
+        events = [{'server_uuid': device_id, 'name': name, 'status': status,
+                   'tag': port_id}
+                  for name, status in ((nova.VIF_PLUGGED, 'failed'),
+                                       (nova.VIF_UNPLUGGED, 'completed'),
+                                       (nova.VIF_PLUGGED, 'completed'))]
+        with mock.patch('eventlet.spawn_n'):
+            for event in events:
+                self.nova_notifier.batch_notifier.queue_event(event)
+        self.assertEqual(events[1:],
+                         self.nova_notifier.batch_notifier.pending_events)
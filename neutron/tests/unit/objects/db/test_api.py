@@ -189,3 +189,28 @@ class CRUDScenarioTestCase(testlib_api.SqlTestCase):
         self.assertEqual(
             descriptions,
             {obj.description for obj in objs})
+
+    def test_get_revision_numbers(self):
+        objs = [api.create_object(self.obj_cls, self.ctxt, {'name': name})
+                for name in ('foo', 'bar')]
+        self.assertItemsEqual(
+            [(obj.id, obj.standard_attr.revision_number) for obj in objs],
+            api.get_revision_numbers(self.obj_cls, self.ctxt))
+        self.assertEqual(
+            [(objs[0].id, objs[0].standard_attr.revision_number)],
+            api.get_revision_numbers(self.obj_cls, self.ctxt, name='foo'))
+
+    def test_get_objects_paginated_by_id(self):
+        objs = sorted(
+            [api.create_object(self.obj_cls, self.ctxt, {'name': 'foo%d' % i})
+             for i in range(5)], key=lambda obj: obj.id)
+
+        def get_page(marker):
+            pager = base.Pager(sorts=[('id', True)], limit=2, marker=marker)
+            return api.get_objects(self.obj_cls, self.ctxt, _pager=pager)
+
+        self.assertEqual(objs[:2], get_page(None))
+        self.assertEqual(objs[2:4], get_page(objs[1].id))
+        # the marker object doesn't need to exist anymore
+        api.delete_object(self.obj_cls, self.ctxt, id=objs[3].id)
+        self.assertEqual(objs[4:], get_page(objs[3].id))
@@ -1925,6 +1925,32 @@ class BaseDbObjectTestCase(_BaseObjectTestCase,
                           self._test_class.count, self.context,
                           fake_field='xxx')
 
+    def test_get_objects_page(self):
+        if 'id' not in self._test_class.fields:
+            self.skipTest('No id field found in test class %r'
+                          % self._test_class)
+        objs = [self._make_object(fields) for fields in self.obj_fields]
+        for obj in objs:
+            obj.create()
+        ids = sorted(obj.id for obj in objs)
+        self.assertEqual(
+            ids[:1], [obj.id for obj in self._test_class.get_objects_page(
+                self.context, limit=1)])
+        self.assertEqual(
+            ids[1:], [obj.id for obj in self._test_class.get_objects_page(
+                self.context, marker=ids[0], limit=len(ids))])
+
+    def test_get_revision_numbers(self):
+        if not self._test_class.has_standard_attributes():
+            self.skipTest('No standard attributes found in test class %r'
+                          % self._test_class)
+        objs = [self._make_object(fields) for fields in self.obj_fields]
+        for obj in objs:
+            obj.create()
+        self.assertItemsEqual(
+            [(obj.id, obj.revision_number) for obj in objs],
+            self._test_class.get_revision_numbers(self.context))
+
     def test_objects_exist(self):
         for fields in self.obj_fields:
             self._make_object(fields).create()
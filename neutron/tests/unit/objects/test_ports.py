@@ -281,6 +281,39 @@ class PortDbObjectTestCase(obj_test_base.BaseDbObjectTestCase,
                     self.context, id=(objs[i].id, ),
                     security_group_ids=(group, )))
 
+    def test_get_objects_page_security_group_ids(self):
+        group = self._create_test_security_group_id()
+        objs = [self._make_object(fields) for fields in self.obj_fields]
+        for obj in objs[:2]:
+            obj.security_group_ids = {group}
+        for obj in objs:
+            obj.create()
+        ids = sorted(obj.id for obj in objs[:2])
+
+        self.assertEqual(
+            ids[:1], [obj.id for obj in ports.Port.get_objects_page(
+                self.context, limit=1, security_group_ids=(group, ))])
+        # the port without the security group isn't returned
+        self.assertEqual(
+            ids[1:], [obj.id for obj in ports.Port.get_objects_page(
+                self.context, marker=ids[0], limit=len(objs),
+                security_group_ids=(group, ))])
+
+    def test_get_revision_numbers_security_group_ids(self):
+        groups = [self._create_test_security_group_id() for _ in range(2)]
+        objs = [self._make_object(fields) for fields in self.obj_fields]
+        objs[0].security_group_ids = {groups[0]}
+        for obj in objs:
+            obj.create()
+
+        self.assertEqual(
+            [(objs[0].id, objs[0].revision_number)],
+            ports.Port.get_revision_numbers(
+                self.context, security_group_ids=(groups[0], )))
+        self.assertEqual(
+            [], ports.Port.get_revision_numbers(
+                self.context, security_group_ids=(groups[1], )))
+
     def test__attach_security_group(self):
         obj = self._make_object(self.obj_fields[0])
         obj.create()
@@ -11,9 +11,12 @@
 #    under the License.
 
 import mock
+import ryu.exception as ryu_exc
 from ryu.ofproto import ofproto_v1_3
 from ryu.ofproto import ofproto_v1_3_parser
+import testtools
 
+from neutron.conf.plugins.ml2.drivers import ovs_conf
 from neutron.plugins.ml2.drivers.openvswitch.agent.openflow.native \
     import ofswitch
 from neutron.tests import base
@@ -104,3 +107,104 @@ class TestBundledOpenFlowBridge(base.BaseTestCase):
         args, kwargs = self.br.br._send_msg.call_args_list[1]
         self.assertEqual(ofproto_v1_3.ONF_BCT_COMMIT_REQUEST,
                          args[0].type)
+
+
+class FakeOpenFlowSwitch(ofswitch.OpenFlowSwitchMixin):
+    default_cookie = 0x1234
+
+    def _get_dp(self):
+        return self.dp, ofproto_v1_3, ofproto_v1_3_parser
+
+
+class TestFlowsTransaction(base.BaseTestCase):
+    def setUp(self):
+        super(TestFlowsTransaction, self).setUp()
+        ovs_conf.register_ovs_agent_opts()
+        self.br = FakeOpenFlowSwitch(ryu_app=mock.Mock())
+        self.br.dp = mock.Mock()
+        self.sent = []
+        self.send_msg = mock.patch('ryu.app.ofctl.api.send_msg',
+                                   side_effect=self._send_msg).start()
+
+    def _send_msg(self, app, msg, reply_cls=None, reply_multi=False):
+        self.sent.append(msg)
+        if isinstance(msg, ofproto_v1_3_parser.ONFBundleCtrlMsg):
+            # each reply type follows the type of its request
+            return FakeReply(msg.type + 1)
+        return []
+
+    def _install(self, port):
+        self.br.install_drop(in_port=port)
+
+    def _assert_flows(self, ports, msgs):
+        self.assertEqual(ports, [msg.match['in_port'] for msg in msgs])
+
+    def test_flows_committed_in_bundle(self):
+        with self.br.flows_transaction() as br:
+            self.assertIs(self.br, br)
+            self._install(1)
+            self._install(2)
+            self.assertEqual([], self.sent)
+        self.assertEqual(4, len(self.sent))
+        open_msg, add1, add2, commit_msg = self.sent
+        self.assertEqual(ofproto_v1_3.ONF_BCT_OPEN_REQUEST, open_msg.type)
+        self.assertEqual(ofproto_v1_3.ONF_BF_ATOMIC |
+                         ofproto_v1_3.ONF_BF_ORDERED, open_msg.flags)
+        self.assertEqual(ofproto_v1_3.ONF_BCT_COMMIT_REQUEST,
+                         commit_msg.type)
+        for add in (add1, add2):
+            self.assertIsInstance(add, ofproto_v1_3_parser.ONFBundleAddMsg)
+            self.assertEqual(open_msg.bundle_id, add.bundle_id)
+        self._assert_flows([1, 2], [add1.message, add2.message])
+        self.assertEqual(set(), self.br.active_bundles)
+
+    def test_single_flow_sent_without_bundle(self):
+        with self.br.flows_transaction():
+            self._install(1)
+        self.assertEqual(1, len(self.sent))
+        self._assert_flows([1], self.sent)
+
+    def test_nested_transactions(self):
+        with self.br.flows_transaction():
+            self._install(1)
+            with self.br.flows_transaction():
+                self._install(2)
+            self.assertEqual([], self.sent)
+        self.assertEqual(4, len(self.sent))
+
+    def test_nothing_sent_on_exception(self):
+        with testtools.ExpectedException(ValueError):
+            with self.br.flows_transaction():
+                self._install(1)
+                self._install(2)
+                raise ValueError()
+        self.assertEqual([], self.sent)
+        # the flows are sent right away after the transaction
+        self._install(3)
+        self._assert_flows([3], self.sent)
+
+    def test_queries_sent_right_away(self):
+        with self.br.flows_transaction():
+            self._install(1)
+            self.br.dump_flows(table_id=0)
+            self.assertEqual(1, len(self.sent))
+            self.assertIsInstance(self.sent[0],
+                                  ofproto_v1_3_parser.OFPFlowStatsRequest)
+
+    def test_bundle_discarded_on_add_error(self):
+        def send_msg(app, msg, reply_cls=None, reply_multi=False):
+            if (isinstance(msg, ofproto_v1_3_parser.ONFBundleAddMsg) and
+                    msg.message.match['in_port'] == 2):
+                raise ryu_exc.RyuException()
+            return self._send_msg(app, msg, reply_cls, reply_multi)
+
+        self.send_msg.side_effect = send_msg
+        with testtools.ExpectedException(RuntimeError):
+            with self.br.flows_transaction():
+                self._install(1)
+                self._install(2)
+                self._install(3)
+        # the other flows were added before the bundle is discarded
+        self.assertEqual(4, len(self.sent))
+        self.assertEqual(ofproto_v1_3.ONF_BCT_DISCARD_REQUEST,
+                         self.sent[-1].type)
@@ -12,9 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import sys
 import time
 
+import eventlet
 import mock
 from neutron_lib.agent import constants as agent_consts
 from neutron_lib import constants as n_const
@@ -460,6 +462,34 @@ class TestOvsNeutronAgent(object):
                                       updated_ports)
         self.assertEqual(expected, actual)
 
+    def test_scan_ports_uses_port_tracker(self):
+        tracker = mock.Mock(is_active=True)
+        tracker.get_vif_port_set.return_value = set([1, 3])
+        tracker.get_port_tag_dict.return_value = {}
+        self.agent.port_tracker = tracker
+        with mock.patch.object(self.agent.int_br,
+                               'get_vif_port_set') as get_vif_port_set,\
+                mock.patch.object(self.agent.int_br,
+                                  'get_port_tag_dict') as get_port_tag_dict:
+            actual = self.agent.scan_ports(set([1, 2]), False)
+        expected = dict(current=set([1, 3]), added=set([3]),
+                        removed=set([2]))
+        self.assertEqual(expected, actual)
+        tracker.get_vif_port_set.assert_called_once_with(
+            self.agent.int_br.br_name)
+        tracker.get_port_tag_dict.assert_called_once_with(
+            self.agent.int_br.br_name)
+        self.assertFalse(get_vif_port_set.called)
+        self.assertFalse(get_port_tag_dict.called)
+
+    def test_scan_ports_inactive_port_tracker(self):
+        self.agent.port_tracker = mock.Mock(is_active=False)
+        actual = self.mock_scan_ports(set([1, 3]), set([1, 2]))
+        expected = dict(current=set([1, 3]), added=set([3]),
+                        removed=set([2]))
+        self.assertEqual(expected, actual)
+        self.assertFalse(self.agent.port_tracker.get_vif_port_set.called)
+
     def _test_process_ports_events(self, events, registered_ports,
                                    ancillary_ports, expected_ports,
                                    expected_ancillary, updated_ports=None,
@@ -800,6 +830,65 @@ class TestOvsNeutronAgent(object):
                                                    mock.ANY, mock.ANY,
                                                    agent_restarted=True)
 
+    def test_bind_devices_commits_flows_before_tagging(self):
+        self.agent.prevent_arp_spoofing = True
+        self.agent.vlan_manager.add('net1', 1, None, None, 1)
+        vif_port = mock.Mock(port_name='tap1', ofport=1)
+        port_details = [{'network_id': 'net1', 'vif_port': vif_port,
+                         'device': 'tap1', 'admin_state_up': True}]
+        events = []
+        with mock.patch.object(
+            self.agent.plugin_rpc, 'update_device_list',
+            return_value={'failed_devices_up': [],
+                          'failed_devices_down': []}),\
+                mock.patch.object(
+                    self.agent, 'setup_arp_spoofing_protection',
+                    side_effect=lambda *args: events.append('flows')),\
+                mock.patch.object(self.agent, 'int_br') as int_br:
+            int_br.get_ports_attributes.return_value = [
+                {'name': 'tap1', 'tag': []}]
+            int_br.flows_transaction.return_value.__exit__.side_effect = (
+                lambda *args: events.append('commit'))
+            int_br.set_db_attribute.side_effect = (
+                lambda *args: events.append('tag'))
+            self.agent._bind_devices(port_details)
+        self.assertEqual(['flows', 'commit', 'tag'], events)
+        int_br.set_db_attribute.assert_called_once_with(
+            "Port", 'tap1', "tag", 1)
+
+    def test_bind_devices_stores_port_flows_fingerprints(self):
+        self.agent.prevent_arp_spoofing = True
+        self.agent.skip_unchanged_port_flows = True
+        self.agent.vlan_manager.add('net1', 1, None, None, 1)
+        vif_port = mock.Mock(port_name='tap1', ofport=1)
+        port_details = [{'network_id': 'net1', 'vif_port': vif_port,
+                         'device': 'tap1', 'admin_state_up': True}]
+        events = []
+        with mock.patch.object(
+            self.agent.plugin_rpc, 'update_device_list',
+            return_value={'failed_devices_up': [],
+                          'failed_devices_down': []}),\
+                mock.patch.object(
+                    self.agent, '_setup_port_flows',
+                    return_value={'flows_fingerprint': 'fp'}) as setup,\
+                mock.patch.object(self.agent, 'int_br') as int_br:
+            int_br.get_ports_attributes.return_value = [
+                {'name': 'tap1', 'tag': 1, 'other_config': {'tag': '1'}}]
+            int_br.flows_transaction.return_value.__exit__.side_effect = (
+                lambda *args: events.append('commit'))
+            int_br.set_db_attribute.side_effect = (
+                lambda *args: events.append(args))
+            self.agent._bind_devices(port_details)
+        int_br.get_ports_attributes.assert_called_once_with(
+            "Port", columns=["name", "tag", "other_config"], ports=['tap1'],
+            if_exists=True)
+        setup.assert_called_once_with(vif_port, port_details[0], mock.ANY,
+                                      {'tag': '1'}, [])
+        self.assertEqual(
+            ['commit',
+             ("Port", 'tap1', "other_config", {'flows_fingerprint': 'fp'})],
+            events)
+
     def _test_arp_spoofing(self, enable_prevent_arp_spoofing):
         self.agent.prevent_arp_spoofing = enable_prevent_arp_spoofing
 
@@ -976,6 +1065,44 @@ class TestOvsNeutronAgent(object):
             self.assertEqual(set([dev_mock]), failed_devices.get('added'))
             self.assertFalse(treat_vif_port.called)
 
+    def test_treat_devices_added_updated_in_chunks(self):
+        self.agent.device_details_chunk_size = 2
+        devices = ['dev%d' % i for i in range(5)]
+        events = []
+
+        def get_details(context, devices, *args):
+            events.append(('fetch', devices))
+            return {'devices': [{'device': d} for d in devices
+                                if d != 'dev3'],
+                    'failed_devices': [d for d in devices if d == 'dev3']}
+
+        def get_vifs_by_ids(devices):
+            return {d: mock.Mock() for d in devices if d != 'dev4'}
+
+        def wire(port):
+            events.append('wire')
+            # wiring a port yields while waiting for OVS
+            eventlet.sleep(0)
+
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list_and_failed_devices',
+                               side_effect=get_details),\
+                mock.patch.object(self.agent.int_br, 'get_vifs_by_ids',
+                                  side_effect=get_vifs_by_ids),\
+                mock.patch.object(self.agent.ext_manager, 'delete_port'),\
+                mock.patch.object(self.agent, 'port_dead', side_effect=wire):
+            skip_devs, _, _, failed_devices = (
+                self.agent.treat_devices_added_or_updated(devices, False))
+        self.assertEqual(['dev4'], skip_devs)
+        self.assertEqual({'dev3'}, failed_devices)
+        # the details of the next chunk are fetched while the devices of the
+        # current chunk are wired
+        self.assertEqual([('fetch', ['dev0', 'dev1']),
+                          'wire',
+                          ('fetch', ['dev2', 'dev3']),
+                          'wire', 'wire',
+                          ('fetch', ['dev4'])], events)
+
     def test_treat_devices_added_updated_put_port_down(self):
         fake_details_dict = {'admin_state_up': False,
                              'port_id': 'xxx',
@@ -1158,6 +1285,24 @@ class TestOvsNeutronAgent(object):
     def test_process_network_port_with_empty_port(self):
         self._test_process_network_ports({})
 
+    def test_process_network_ports_records_phases(self):
+        self.agent.loop_stats.start_iteration()
+        self._test_process_network_ports(
+            {'current': set(['tap0']),
+             'removed': set(['eth0']),
+             'added': set(['eth1'])})
+        phases = self.agent.loop_stats.end_iteration(0, 100)
+        self.assertEqual({'flow_install', 'firewall', 'other'}, set(phases))
+
+    def test_loop_count_and_wait_records_iteration(self):
+        with mock.patch.object(self.agent.loop_stats,
+                               'end_iteration') as end_iteration,\
+                mock.patch('time.time', return_value=10),\
+                mock.patch('time.sleep'):
+            self.agent.iter_num = 3
+            self.agent.loop_count_and_wait(8, {})
+        end_iteration.assert_called_once_with(3, 2)
+
     def test_hybrid_plug_flag_based_on_firewall(self):
         cfg.CONF.set_default(
             'firewall_driver',
@@ -1819,7 +1964,10 @@ class TestOvsNeutronAgent(object):
         self.agent.enable_tunneling = True
         with mock.patch.object(self.agent, 'tun_br', autospec=True) as tun_br:
             self.agent.reclaim_local_vlan('net2')
-            tun_br.delete_port.assert_called_once_with('gre-02020202')
+            tun_br.delete_ports_by_name.assert_called_once_with(
+                ['gre-02020202'])
+            tun_br.cleanup_tunnel_port.assert_called_once_with('2')
+            self.assertNotIn('2', self.agent.tun_br_ofports['gre'].values())
 
     def _test_ext_br_recreated(self, setup_bridges_side_effect):
         bridge_mappings = {'physnet0': 'br-ex0',
@@ -2000,14 +2148,14 @@ class TestOvsNeutronAgent(object):
                                return_value=fake_tunnel_details),\
                 mock.patch.object(
                     self.agent,
-                    '_setup_tunnel_port') as _setup_tunnel_port_fn,\
+                    '_setup_tunnel_ports') as _setup_tunnel_ports_fn,\
                 mock.patch.object(self.agent,
                                   'cleanup_stale_flows') as cleanup:
             self.agent.tunnel_types = ['vxlan']
             self.agent.tunnel_sync()
-            expected_calls = [mock.call(self.agent.tun_br, 'vxlan-64651f0f',
-                                        '100.101.31.15', 'vxlan')]
-            _setup_tunnel_port_fn.assert_has_calls(expected_calls)
+            _setup_tunnel_ports_fn.assert_called_once_with(
+                self.agent.tun_br, {'100.101.31.15': 'vxlan-64651f0f'},
+                'vxlan')
             self.assertEqual([], cleanup.mock_calls)
 
     def test_tunnel_sync_invalid_ip_address(self):
@@ -2018,15 +2166,14 @@ class TestOvsNeutronAgent(object):
                                return_value=fake_tunnel_details),\
                 mock.patch.object(
                     self.agent,
-                    '_setup_tunnel_port') as _setup_tunnel_port_fn,\
+                    '_setup_tunnel_ports') as _setup_tunnel_ports_fn,\
                 mock.patch.object(self.agent,
                                   'cleanup_stale_flows') as cleanup:
             self.agent.tunnel_types = ['vxlan']
             self.agent.tunnel_sync()
-            _setup_tunnel_port_fn.assert_called_once_with(self.agent.tun_br,
-                                                          'vxlan-64646464',
-                                                          '100.100.100.100',
-                                                          'vxlan')
+            _setup_tunnel_ports_fn.assert_called_once_with(
+                self.agent.tun_br, {'100.100.100.100': 'vxlan-64646464'},
+                'vxlan')
             self.assertEqual([], cleanup.mock_calls)
 
     def test_tunnel_sync_setup_tunnel_flood_flow_once(self):
@@ -2036,20 +2183,42 @@ class TestOvsNeutronAgent(object):
                                'tunnel_sync',
                                return_value=fake_tunnel_details),\
                 mock.patch.object(
-                    self.agent,
-                    '_setup_tunnel_port') as _setup_tunnel_port_fn,\
+                    self.agent, 'tun_br', autospec=True) as tun_br,\
                 mock.patch.object(
                     self.agent,
                     '_setup_tunnel_flood_flow') as _setup_tunnel_flood_flow:
+            tun_br.add_tunnel_ports.return_value = {'vxlan-c8c8c8c8': 1,
+                                                    'vxlan-64646464': 2}
             self.agent.tunnel_types = ['vxlan']
             self.agent.tunnel_sync()
-            expected_calls = [mock.call(self.agent.tun_br, 'vxlan-c8c8c8c8',
-                                        '200.200.200.200', 'vxlan'),
-                              mock.call(self.agent.tun_br, 'vxlan-64646464',
-                                        '100.100.100.100', 'vxlan')]
-            _setup_tunnel_port_fn.assert_has_calls(expected_calls)
-            _setup_tunnel_flood_flow.assert_called_once_with(self.agent.tun_br,
-                                                             'vxlan')
+            tun_br.add_tunnel_ports.assert_called_once_with(
+                {'vxlan-c8c8c8c8': '200.200.200.200',
+                 'vxlan-64646464': '100.100.100.100'},
+                self.agent.local_ip, 'vxlan', self.agent.vxlan_udp_port,
+                self.agent.dont_fragment, self.agent.tunnel_csum,
+                self.agent.tos)
+            tun_br.setup_tunnel_port.assert_has_calls(
+                [mock.call('vxlan', 1), mock.call('vxlan', 2)],
+                any_order=True)
+            _setup_tunnel_flood_flow.assert_called_once_with(tun_br, 'vxlan')
+            self.assertEqual({'200.200.200.200': 1, '100.100.100.100': 2},
+                             self.agent.tun_br_ofports['vxlan'])
+
+    def test_setup_tunnel_ports_skips_failed_ports(self):
+        tun_br = mock.MagicMock()
+        tun_br.add_tunnel_ports.return_value = {
+            'vxlan-c8c8c8c8': ovs_lib.INVALID_OFPORT, 'vxlan-64646464': 2}
+        self.agent._setup_tunnel_ports(
+            tun_br, {'200.200.200.200': 'vxlan-c8c8c8c8',
+                     '100.100.100.100': 'vxlan-64646464',
+                     'fe80::1': 'vxlan-fe800001'}, 'vxlan')
+        # the IPv6 remote IP does not match the IPv4 local IP
+        self.assertEqual({'vxlan-c8c8c8c8': '200.200.200.200',
+                          'vxlan-64646464': '100.100.100.100'},
+                         tun_br.add_tunnel_ports.call_args[0][0])
+        tun_br.setup_tunnel_port.assert_called_once_with('vxlan', 2)
+        self.assertEqual({'100.100.100.100': 2},
+                         self.agent.tun_br_ofports['vxlan'])
 
     def test_tunnel_update(self):
         kwargs = {'tunnel_ip': '10.10.10.10',
@@ -2232,6 +2401,101 @@ class TestOvsNeutronAgent(object):
             self.agent._handle_sigterm(None, None)
         self.assertFalse(mock_set_rpc.called)
 
+    def _get_port_flows_args(self):
+        port = mock.Mock(ofport=1, vif_mac='fa:16:3e:00:00:01',
+                         vif_id='port1', port_name='tap1')
+        details = {'device_owner': 'compute:nova',
+                   'fixed_ips': [{'ip_address': '10.0.0.2'}],
+                   'allowed_address_pairs': []}
+        return port, details, mock.Mock(vlan=1)
+
+    def test_setup_port_flows_skips_unchanged_port(self):
+        self.agent.skip_unchanged_port_flows = True
+        port, details, lvm = self._get_port_flows_args()
+        with mock.patch.object(self.agent,
+                               'setup_arp_spoofing_protection') as setup:
+            other_config = self.agent._setup_port_flows(
+                port, details, lvm, {'tag': '1'}, [])
+            cookie = self.agent.port_flows_cookies[1]
+            self.assertIn(cookie, self.agent.int_br.reserved_cookies)
+            self.assertEqual(cookie, setup.call_args[0][0].default_cookie)
+            self.assertEqual('1', other_config['tag'])
+            self.assertEqual('%x' % cookie,
+                             other_config[constants.PORT_FLOWS_COOKIE])
+            fingerprint = other_config[constants.PORT_FLOWS_FINGERPRINT]
+
+            setup.reset_mock()
+            self.assertIsNone(self.agent._setup_port_flows(
+                port, details, lvm, other_config, []))
+            setup.assert_not_called()
+
+            details['fixed_ips'].append({'ip_address': '10.0.0.3'})
+            other_config = self.agent._setup_port_flows(
+                port, details, lvm, other_config, [])
+            self.assertEqual(cookie, setup.call_args[0][0].default_cookie)
+            self.assertEqual('%x' % cookie,
+                             other_config[constants.PORT_FLOWS_COOKIE])
+            self.assertNotEqual(
+                fingerprint, other_config[constants.PORT_FLOWS_FINGERPRINT])
+
+    def _test_setup_port_flows_after_restart(self, installed_cookies):
+        self.agent.skip_unchanged_port_flows = True
+        port, details, lvm = self._get_port_flows_args()
+        other_config = {
+            constants.PORT_FLOWS_COOKIE: '1234',
+            constants.PORT_FLOWS_FINGERPRINT:
+                self.agent._get_port_flows_fingerprint(port, details, lvm)}
+        with mock.patch.object(self.agent,
+                               'setup_arp_spoofing_protection') as setup,\
+                mock.patch.object(self.agent.int_br, 'get_table_cookies',
+                                  return_value=installed_cookies) as cookies:
+            result = self.agent._setup_port_flows(
+                port, details, lvm, other_config, [])
+        cookies.assert_called_once_with(constants.MAC_SPOOF_TABLE)
+        self.assertEqual({1: 0x1234}, self.agent.port_flows_cookies)
+        # the flows of the port must not be deleted as stale
+        self.assertIn(0x1234, self.agent.int_br.reserved_cookies)
+        return setup, result
+
+    def test_setup_port_flows_after_restart_unchanged(self):
+        setup, result = self._test_setup_port_flows_after_restart({0x1234})
+        setup.assert_not_called()
+        self.assertIsNone(result)
+
+    def test_setup_port_flows_after_restart_flows_missing(self):
+        setup, result = self._test_setup_port_flows_after_restart({0x5678})
+        self.assertEqual(0x1234, setup.call_args[0][0].default_cookie)
+        self.assertEqual('1234', result[constants.PORT_FLOWS_COOKIE])
+
+    def test_setup_port_flows_after_restart_cleanup_started(self):
+        self.agent.skip_unchanged_port_flows = True
+        self.agent.stale_flows_cleaner = mock.Mock(started=True)
+        port, details, lvm = self._get_port_flows_args()
+        other_config = {
+            constants.PORT_FLOWS_COOKIE: '1234',
+            constants.PORT_FLOWS_FINGERPRINT:
+                self.agent._get_port_flows_fingerprint(port, details, lvm)}
+        with mock.patch.object(self.agent,
+                               'setup_arp_spoofing_protection') as setup,\
+                mock.patch.object(self.agent.int_br, 'get_table_cookies',
+                                  return_value={0x1234}):
+            result = self.agent._setup_port_flows(
+                port, details, lvm, other_config, [])
+        # some flows of the port may have been deleted as stale before
+        # its cookie was reserved
+        self.assertIn(0x1234, self.agent.int_br.reserved_cookies)
+        self.assertEqual(0x1234, setup.call_args[0][0].default_cookie)
+        self.assertEqual('1234', result[constants.PORT_FLOWS_COOKIE])
+
+    def test_setup_port_flows_disabled(self):
+        port, details, lvm = self._get_port_flows_args()
+        with mock.patch.object(self.agent,
+                               'setup_arp_spoofing_protection') as setup:
+            self.assertIsNone(self.agent._setup_port_flows(
+                port, details, lvm, {}, []))
+        setup.assert_called_once_with(self.agent.int_br, port, details)
+        self.assertEqual({}, self.agent.port_flows_cookies)
+
     def test_arp_spoofing_network_port(self):
         int_br = mock.create_autospec(self.agent.int_br)
         self.agent.setup_arp_spoofing_protection(
@@ -2333,6 +2597,24 @@ class TestOvsNeutronAgent(object):
         # make sure the state was updated with the new map
         self.assertEqual(newmap, self.agent.vifname_to_ofport_map)
 
+    def test_update_stale_ofport_rules_clears_port_flows(self):
+        self.agent.prevent_arp_spoofing = True
+        self.agent.vifname_to_ofport_map = {'port1': 1, 'port2': 2}
+        self.agent.port_flows_cookies = {1: 0x1234, 2: 0x5678}
+        self.agent.port_flows_fingerprints = {1: 'fp1', 2: 'fp2'}
+        self.agent.int_br = mock.Mock()
+        port_br = self.agent.int_br.clone.return_value
+        self.agent.int_br.get_vif_port_to_ofport_map.return_value = {
+            'port2': 2}
+        self.agent.update_stale_ofport_rules()
+        port_br.set_agent_uuid_stamp.assert_called_once_with(0x1234)
+        port_br.delete_arp_spoofing_protection.assert_called_once_with(
+            port=1)
+        port_br.uninstall_flows.assert_called_once_with(in_port=1)
+        self.agent.int_br.unset_cookie.assert_called_once_with(0x1234)
+        self.assertEqual({2: 0x5678}, self.agent.port_flows_cookies)
+        self.assertEqual({2: 'fp2'}, self.agent.port_flows_fingerprints)
+
     def test_update_stale_ofport_rules_treats_moved(self):
         self.agent.prevent_arp_spoofing = True
         self.agent.vifname_to_ofport_map = {'port1': 1, 'port2': 2}
@@ -2409,6 +2691,58 @@ class TestOvsNeutronAgent(object):
             else:
                 bridge.set_datapath_id.assert_called_once_with(dpid)
 
+    def test_cleanup_stale_flows_incremental(self):
+        self.agent.stale_flows_cleanup_batch_size = 2
+        self.agent.phys_brs = {}
+        self.agent.enable_tunneling = False
+        with mock.patch.object(self.agent.int_br, 'of_tables', [0, 1, 2]),\
+                mock.patch.object(self.agent.int_br, 'get_stale_flow_cookies',
+                                  return_value=collections.Counter({0x1: 1})
+                                  ) as get_stale,\
+                mock.patch.object(self.agent.int_br,
+                                  'cleanup_table_flows') as cleanup_table,\
+                mock.patch.object(self.agent.int_br,
+                                  'cleanup_flows') as cleanup_flows:
+            self.agent.cleanup_stale_flows()
+            get_stale.assert_not_called()
+            self.agent.continue_stale_flows_cleanup()
+            self.assertEqual([mock.call(0, [0x1]), mock.call(1, [0x1])],
+                             cleanup_table.mock_calls)
+            self.assertIsNotNone(self.agent.stale_flows_cleaner)
+            self.agent.continue_stale_flows_cleanup()
+            cleanup_table.assert_called_with(2, [0x1])
+            self.assertIsNone(self.agent.stale_flows_cleaner)
+            self.agent.continue_stale_flows_cleanup()
+            self.assertEqual(3, cleanup_table.call_count)
+            self.assertEqual([mock.call(0), mock.call(1), mock.call(2)],
+                             get_stale.mock_calls)
+            cleanup_flows.assert_not_called()
+
+    def test_continue_stale_flows_cleanup_error(self):
+        self.agent.stale_flows_cleaner = mock.Mock()
+        self.agent.stale_flows_cleaner.run_batch.side_effect = RuntimeError
+        self.agent.continue_stale_flows_cleanup()
+        self.assertIsNotNone(self.agent.stale_flows_cleaner)
+
+    def test_rpc_loop_continues_stale_flows_cleanup_when_idle(self):
+        with mock.patch.object(self.agent, '_agent_has_updates',
+                               return_value=False),\
+                mock.patch.object(self.agent,
+                                  'continue_stale_flows_cleanup') as cont,\
+                mock.patch.object(self.agent, 'process_port_info') as ppi,\
+                mock.patch.object(self.agent, 'tunnel_sync'),\
+                mock.patch.object(self.agent,
+                                  'check_ovs_status',
+                                  return_value=constants.OVS_NORMAL),\
+                mock.patch.object(self.agent, '_check_and_handle_signal',
+                                  side_effect=[True, True, False]),\
+                mock.patch.object(self.agent, 'loop_count_and_wait'):
+            self.agent.rpc_loop(polling_manager=mock.Mock(),
+                                bridges_monitor=mock.Mock(
+                                    bridges_added=[]))
+        ppi.assert_not_called()
+        self.assertEqual(2, cont.call_count)
+
 
 class TestOvsNeutronAgentOFCtl(TestOvsNeutronAgent,
                                ovs_test_base.OVSOFCtlTestBase):
@@ -2432,6 +2766,30 @@ class TestOvsNeutronAgentOFCtl(TestOvsNeutronAgent,
             ]
             self.assertEqual(expected, del_flow.mock_calls)
 
+    def test_get_stale_flow_cookies(self):
+        with mock.patch.object(self.agent.int_br,
+                               'dump_flows_for_table') as dump_flows:
+            self.agent.int_br.set_agent_uuid_stamp(1234)
+            dump_flows.return_value = '\n'.join([
+                'cookie=0x4d2, duration=50.156s, table=2, priority=1',
+                'cookie=0x4321, duration=54.143s, table=2, priority=2',
+                'cookie=0x4321, duration=50.125s, table=2, priority=0',
+                'cookie=0x2345, duration=50.125s, table=2, priority=3',
+            ])
+            self.assertEqual(
+                {'0x4321': 2, '0x2345': 1},
+                self.agent.int_br.get_stale_flow_cookies(2))
+            dump_flows.assert_called_once_with(2)
+
+    def test_cleanup_table_flows(self):
+        with mock.patch.object(self.agent.int_br,
+                               'delete_flows') as del_flow:
+            self.agent.int_br.cleanup_table_flows(2, ['0x4321', '0x2345'])
+            self.assertEqual(
+                [mock.call(cookie='0x4321/-1', table=2),
+                 mock.call(cookie='0x2345/-1', table=2)],
+                del_flow.mock_calls)
+
 
 class TestOvsNeutronAgentRyu(TestOvsNeutronAgent,
                              ovs_test_base.OVSRyuTestBase):
@@ -2465,6 +2823,32 @@ class TestOvsNeutronAgentRyu(TestOvsNeutronAgent,
             self.assertEqual(len(constants.INT_BR_ALL_TABLES) * len(expected),
                              len(uninstall_flows.mock_calls))
 
+    def test_get_stale_flow_cookies(self):
+        with mock.patch.object(self.agent.int_br,
+                               'dump_flows') as dump_flows:
+            self.agent.int_br.set_agent_uuid_stamp(1234)
+            dump_flows.return_value = [
+                # mock ryu.ofproto.ofproto_v1_3_parser.OFPFlowStats
+                mock.Mock(cookie=1234, table_id=2),
+                mock.Mock(cookie=17185, table_id=2),
+                mock.Mock(cookie=17185, table_id=2),
+                mock.Mock(cookie=9029, table_id=2),
+            ]
+            self.assertEqual(
+                {17185: 2, 9029: 1},
+                self.agent.int_br.get_stale_flow_cookies(2))
+            dump_flows.assert_called_once_with(2)
+
+    def test_cleanup_table_flows(self):
+        uint64_max = (1 << 64) - 1
+        with mock.patch.object(self.agent.int_br,
+                               'uninstall_flows') as uninstall_flows:
+            self.agent.int_br.cleanup_table_flows(2, [17185, 9029])
+            self.assertEqual(
+                [mock.call(table_id=2, cookie=17185, cookie_mask=uint64_max),
+                 mock.call(table_id=2, cookie=9029, cookie_mask=uint64_max)],
+                uninstall_flows.mock_calls)
+
 
 class AncillaryBridgesTest(object):
 
@@ -0,0 +1,91 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+import mock
+
+from neutron.plugins.ml2.drivers.openvswitch.agent import stale_flows
+from neutron.tests import base
+
+
+def _get_bridge(of_tables, stale):
+    bridge = mock.Mock(of_tables=of_tables)
+    bridge.get_stale_flow_cookies.side_effect = (
+        lambda table_id: collections.Counter(stale.get(table_id, {})))
+    return bridge
+
+
+class TestStaleFlowsCleaner(base.BaseTestCase):
+    def setUp(self):
+        super(TestStaleFlowsCleaner, self).setUp()
+        self.br1 = _get_bridge([0, 1, 2], {0: {0x1: 2, 0x2: 1},
+                                           2: {0x1: 3}})
+        self.br2 = _get_bridge([0], {0: {0x5: 1}})
+        self.cleaner = stale_flows.StaleFlowsCleaner([self.br1, self.br2], 2)
+
+    def _assert_cleanup_calls(self, bridge, calls):
+        self.assertEqual(
+            [mock.call(table_id, mock.ANY) for table_id, _cookies in calls],
+            bridge.cleanup_table_flows.mock_calls)
+        for call, (_table_id, cookies) in zip(
+                bridge.cleanup_table_flows.call_args_list, calls):
+            self.assertItemsEqual(cookies, call[0][1])
+
+    def test_run_batch(self):
+        self.assertFalse(self.cleaner.done)
+        self.assertFalse(self.cleaner.started)
+        self.assertFalse(self.cleaner.run_batch())
+        self.assertTrue(self.cleaner.started)
+        # each batch only dumps the flows of its tables
+        self.assertEqual([mock.call(0), mock.call(1)],
+                         self.br1.get_stale_flow_cookies.mock_calls)
+        self.br2.get_stale_flow_cookies.assert_not_called()
+        self._assert_cleanup_calls(self.br1, [(0, [0x1, 0x2])])
+        self.assertTrue(self.cleaner.run_batch())
+        self._assert_cleanup_calls(self.br1, [(0, [0x1, 0x2]), (2, [0x1])])
+        self._assert_cleanup_calls(self.br2, [(0, [0x5])])
+        self.assertTrue(self.cleaner.done)
+        stats = self.cleaner.get_stats()
+        self.assertEqual(4, stats['tables_total'])
+        self.assertEqual(4, stats['tables_cleaned'])
+        self.assertEqual(7, stats['flows_deleted'])
+        self.assertEqual(2, stats['batches'])
+
+    def test_run_batch_no_stale_flows(self):
+        self.cleaner = stale_flows.StaleFlowsCleaner(
+            [_get_bridge([0, 1], {})], 2)
+        self.assertTrue(self.cleaner.run_batch())
+        self.assertEqual(0, self.cleaner.get_stats()['flows_deleted'])
+
+    def test_run_batch_retries_failed_dump(self):
+        self.br1.get_stale_flow_cookies.side_effect = [
+            RuntimeError, {}, {}, {}]
+        self.assertRaises(RuntimeError, self.cleaner.run_batch)
+        self.assertFalse(self.cleaner.done)
+        self.assertEqual(0, self.cleaner.get_stats()['tables_cleaned'])
+        self.assertFalse(self.cleaner.run_batch())
+        self.assertEqual([0, 0, 1],
+                         [c[0][0] for c in
+                          self.br1.get_stale_flow_cookies.call_args_list])
+
+    def test_run_batch_retries_failed_table(self):
+        self.br1.cleanup_table_flows.side_effect = [
+            None, RuntimeError, None]
+        self.assertFalse(self.cleaner.run_batch())
+        self.assertRaises(RuntimeError, self.cleaner.run_batch)
+        self.assertEqual(2, self.cleaner.get_stats()['tables_cleaned'])
+        self.assertTrue(self.cleaner.run_batch())
+        self.assertEqual([0, 2, 2],
+                         [c[0][0] for c in
+                          self.br1.cleanup_table_flows.call_args_list])
+        self.assertEqual(4, self.cleaner.get_stats()['tables_cleaned'])
@@ -13,10 +13,18 @@
 #    under the License.
 
 import errno
+import socket
 
 import mock
 import pyroute2
+from pyroute2 import netlink
+from pyroute2.netlink import rtnl
+from pyroute2.netlink.rtnl import fibmsg
+from pyroute2.netlink.rtnl import ifaddrmsg
+from pyroute2.netlink.rtnl import ifinfmsg
+from pyroute2.netlink.rtnl import rtmsg
 
+from neutron import privileged
 from neutron.privileged.agent.linux import ip_lib as priv_lib
 from neutron.tests import base
 
@@ -210,3 +218,318 @@ class IpLibTestCase(base.BaseTestCase):
                 self.fail("OSError exception not raised")
             except OSError as e:
                 self.assertEqual(errno.EINVAL, e.errno)
+
+
+def _get_message(msg_class, attrs=None, **fields):
+    msg = msg_class()
+    msg.update(fields)
+    msg['attrs'] = list((attrs or {}).items())
+    return msg
+
+
+class IpRuleRouteTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpRuleRouteTestCase, self).setUp()
+        self.addCleanup(privileged.default.set_client_mode, True)
+        privileged.default.set_client_mode(False)
+        iproute_cls = mock.patch.object(pyroute2, "IPRoute").start()
+        self.ip = iproute_cls.return_value.__enter__.return_value
+        self.ip.link_lookup.return_value = [2]
+        self.ip.get_links.return_value = [
+            _get_message(ifinfmsg.ifinfmsg, {'IFLA_IFNAME': 'eth0'},
+                         index=2),
+            _get_message(ifinfmsg.ifinfmsg, {'IFLA_IFNAME': 'eth1'},
+                         index=3)]
+
+    def test_add_ip_rule(self):
+        priv_lib.add_ip_rule(None, 4, priority=100, table=2)
+        self.ip.rule.assert_called_once_with(
+            "add", family=socket.AF_INET, priority=100, table=2)
+
+    def test_add_ip_rule_exists(self):
+        self.ip.rule.side_effect = pyroute2.NetlinkError(code=errno.EEXIST)
+        priv_lib.add_ip_rule(None, 6, priority=100, table=2)
+        self.ip.rule.assert_called_once_with(
+            "add", family=socket.AF_INET6, priority=100, table=2)
+
+    def test_delete_ip_rule_not_exists(self):
+        self.ip.rule.side_effect = pyroute2.NetlinkError(code=errno.ENOENT)
+        priv_lib.delete_ip_rule(None, 4, priority=100)
+
+    def test_delete_ip_rule_error(self):
+        self.ip.rule.side_effect = pyroute2.NetlinkError(code=errno.EINVAL)
+        self.assertRaises(pyroute2.NetlinkError, priv_lib.delete_ip_rule,
+                          None, 4, priority=100)
+
+    def test_list_ip_rules(self):
+        self.ip.get_rules.return_value = [
+            _get_message(fibmsg.fibmsg, {'FRA_TABLE': 255}, table=255,
+                         action=1),
+            _get_message(fibmsg.fibmsg,
+                         {'FRA_PRIORITY': 100, 'FRA_TABLE': 1000,
+                          'FRA_SRC': '10.0.0.0', 'FRA_FWMARK': 0x400},
+                         table=252, action=1, src_len=24)]
+        rules = priv_lib.list_ip_rules(None, 4)
+        self.ip.get_rules.assert_called_once_with(family=socket.AF_INET)
+        self.assertEqual(
+            [{'priority': 0, 'table': 255, 'action': 1, 'src': None,
+              'src_len': 0, 'dst': None, 'dst_len': 0, 'iifname': None,
+              'oifname': None, 'fwmark': None, 'fwmask': None},
+             {'priority': 100, 'table': 1000, 'action': 1,
+              'src': '10.0.0.0', 'src_len': 24, 'dst': None, 'dst_len': 0,
+              'iifname': None, 'oifname': None, 'fwmark': 0x400,
+              'fwmask': None}], rules)
+
+    def test_list_ip_rules_namespace_not_exists(self):
+        pyroute2.IPRoute.side_effect = OSError(errno.ENOENT, "No netns")
+        self.assertRaises(priv_lib.NetworkNamespaceNotFound,
+                          priv_lib.list_ip_rules, "testns", 4)
+
+    def test_add_ip_route(self):
+        priv_lib.add_ip_route(None, 4, device="eth0", dst="10.0.0.0",
+                              dst_len=24, table=254)
+        self.ip.link_lookup.assert_called_once_with(ifname="eth0")
+        self.ip.route.assert_called_once_with(
+            "replace", family=socket.AF_INET, oif=2, dst="10.0.0.0",
+            dst_len=24, table=254)
+
+    def test_add_ip_route_interface_not_exists(self):
+        self.ip.link_lookup.return_value = []
+        self.assertRaises(priv_lib.NetworkInterfaceNotFound,
+                          priv_lib.add_ip_route, None, 4, device="eth0",
+                          dst_len=0)
+
+    def test_delete_ip_route_not_exists(self):
+        self.ip.route.side_effect = pyroute2.NetlinkError(code=errno.ESRCH)
+        priv_lib.delete_ip_route(None, 6, dst_len=0, gateway="fe80::1")
+        self.ip.route.assert_called_once_with(
+            "delete", family=socket.AF_INET6, dst_len=0, gateway="fe80::1")
+
+    def _get_routes(self):
+        return [
+            _get_message(rtmsg.rtmsg,
+                         {'RTA_TABLE': 254, 'RTA_OIF': 2,
+                          'RTA_GATEWAY': '10.0.0.1', 'RTA_PRIORITY': 100},
+                         table=254, proto=3, type=1),
+            _get_message(rtmsg.rtmsg,
+                         {'RTA_TABLE': 254, 'RTA_OIF': 3,
+                          'RTA_DST': '10.0.0.0', 'RTA_PREFSRC': '10.0.0.2'},
+                         table=254, dst_len=24, scope=253, proto=2, type=1),
+            _get_message(rtmsg.rtmsg,
+                         {'RTA_TABLE': 1000, 'RTA_OIF': 2,
+                          'RTA_GATEWAY': '10.0.0.1'},
+                         table=252, proto=3, type=1)]
+
+    def test_list_ip_routes(self):
+        self.ip.get_routes.return_value = self._get_routes()
+        routes = priv_lib.list_ip_routes(None, 4)
+        self.ip.get_routes.assert_called_once_with(family=socket.AF_INET)
+        self.assertEqual(
+            [{'dst': None, 'dst_len': 0, 'gateway': '10.0.0.1',
+              'device': 'eth0', 'prefsrc': None, 'priority': 100,
+              'scope': 0, 'proto': 3, 'type': 1},
+             {'dst': '10.0.0.0', 'dst_len': 24, 'gateway': None,
+              'device': 'eth1', 'prefsrc': '10.0.0.2', 'priority': None,
+              'scope': 253, 'proto': 2, 'type': 1}], routes)
+
+    def test_list_ip_routes_device_and_table(self):
+        self.ip.get_routes.return_value = self._get_routes()
+        routes = priv_lib.list_ip_routes(None, 4, device="eth0", table=1000)
+        self.ip.get_links.assert_not_called()
+        self.assertEqual(
+            [{'dst': None, 'dst_len': 0, 'gateway': '10.0.0.1',
+              'device': 'eth0', 'prefsrc': None, 'priority': None,
+              'scope': 0, 'proto': 3, 'type': 1}], routes)
+
+    def test_flush_ip_routes(self):
+        routes = self._get_routes()
+        self.ip.get_routes.return_value = routes
+        self.ip.nlm_request.side_effect = [
+            None, pyroute2.NetlinkError(code=errno.ESRCH)]
+        priv_lib.flush_ip_routes(None, 4)
+        self.ip.nlm_request.assert_has_calls([
+            mock.call(route, msg_type=rtnl.RTM_DELROUTE,
+                      msg_flags=netlink.NLM_F_REQUEST | netlink.NLM_F_ACK)
+            for route in routes[:2]])
+        self.assertEqual(2, self.ip.nlm_request.call_count)
+
+    def test_get_ip_addresses(self):
+        self.ip.get_addr.return_value = [
+            _get_message(ifaddrmsg.ifaddrmsg,
+                         {'IFA_ADDRESS': '10.0.0.2', 'IFA_LOCAL': '10.0.0.2',
+                          'IFA_BROADCAST': '10.0.0.255'},
+                         index=2, prefixlen=24, flags=0x80),
+            _get_message(ifaddrmsg.ifaddrmsg,
+                         {'IFA_ADDRESS': 'fe80::1', 'IFA_FLAGS': 0x40},
+                         index=3, prefixlen=64, scope=253, flags=0)]
+        addresses = priv_lib.get_ip_addresses(None)
+        self.ip.get_addr.assert_called_once_with(family=socket.AF_UNSPEC)
+        self.assertEqual(
+            [{'device': 'eth0', 'address': '10.0.0.2', 'prefixlen': 24,
+              'scope': 0, 'broadcast': '10.0.0.255', 'flags': 0x80},
+             {'device': 'eth1', 'address': 'fe80::1', 'prefixlen': 64,
+              'scope': 253, 'broadcast': None, 'flags': 0x40}], addresses)
+
+    def test_get_ip_addresses_device(self):
+        self.ip.get_addr.return_value = []
+        priv_lib.get_ip_addresses(None, ip_version=6, device="eth0")
+        self.ip.get_addr.assert_called_once_with(family=socket.AF_INET6,
+                                                 index=2)
+        self.ip.get_links.assert_not_called()
+
+
+class RunBatchTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(RunBatchTestCase, self).setUp()
+        self.addCleanup(privileged.default.set_client_mode, True)
+        privileged.default.set_client_mode(False)
+        iproute_cls = mock.patch.object(pyroute2, "NetNS").start()
+        self.ip = iproute_cls.return_value.__enter__.return_value
+        self.ip.link_lookup.return_value = [2]
+
+    def test_run_batch_single_socket(self):
+        results = priv_lib.run_batch("testns", [
+            ("set_link_attribute", ("eth0", "testns"), {"state": "up"}),
+            ("add_neigh_entry", (4, "192.168.0.1", "aa:bb:cc:dd:ee:ff",
+                                 "eth0", "testns"), {}),
+            ("delete_neigh_entry", (4, "192.168.0.2", "aa:bb:cc:dd:ee:ff",
+                                    "eth0", "testns"), {})])
+        self.assertEqual([None, None, None], results)
+        pyroute2.NetNS.assert_called_once_with("testns", flags=0)
+        self.ip.link.assert_called_once_with("set", index=2, state="up")
+        self.assertEqual(2, self.ip.neigh.call_count)
+        # the link id is looked up again after a link change only
+        self.assertEqual(2, self.ip.link_lookup.call_count)
+        self.assertIsNone(priv_lib._batch.ip)
+
+    def test_run_batch_errors(self):
+        self.ip.link_lookup.side_effect = [[], [2]]
+        self.ip.neigh.side_effect = ValueError("neigh failure")
+        results = priv_lib.run_batch("testns", [
+            ("set_link_attribute", ("eth0", "testns"), {"state": "up"}),
+            ("add_neigh_entry", (4, "192.168.0.1", "aa:bb:cc:dd:ee:ff",
+                                 "eth0", "testns"), {})])
+        self.assertEqual("NetworkInterfaceNotFound", results[0][0])
+        self.assertEqual(["RuntimeError", "neigh failure"], results[1])
+        self.assertIsInstance(priv_lib.get_batch_exception(results[0]),
+                              priv_lib.NetworkInterfaceNotFound)
+        self.assertIsInstance(priv_lib.get_batch_exception(results[1]),
+                              RuntimeError)
+
+    def test_run_batch_namespace_not_exists(self):
+        pyroute2.NetNS.side_effect = OSError(errno.ENOENT, "No netns")
+        self.assertRaises(
+            priv_lib.NetworkNamespaceNotFound, priv_lib.run_batch,
+            "testns", [("set_link_attribute", ("eth0", "testns"),
+                        {"state": "up"})])
+
+    def test_run_batch_invalid_operation(self):
+        self.assertRaises(
+            ValueError, priv_lib.run_batch,
+            "testns", [("delete_interface", ("eth0", "testns"), {})])
+        pyroute2.NetNS.assert_not_called()
+
+
+class NetNSPoolTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(NetNSPoolTestCase, self).setUp()
+        self.pool = priv_lib._NetNSPool(2)
+        self.netns = mock.patch.object(pyroute2, "NetNS").start()
+        self.netns.side_effect = lambda *args, **kwargs: mock.Mock()
+        self.inode = mock.patch.object(priv_lib, "_get_netns_inode",
+                                       return_value=1).start()
+
+    def _use(self, namespace):
+        with self.pool.get(namespace) as ip:
+            return ip
+
+    def test_get_reuses_handle(self):
+        ip = self._use("ns1")
+        self.assertIs(ip, self._use("ns1"))
+        self.netns.assert_called_once_with("ns1", flags=0)
+        ip.close.assert_not_called()
+        self.assertEqual({'opens': 1, 'hits': 1, 'evictions': 0,
+                          'purges': 0}, self.pool.stats)
+
+    def test_get_evicts_least_recently_used(self):
+        ip1 = self._use("ns1")
+        ip2 = self._use("ns2")
+        self._use("ns1")
+        self._use("ns3")
+        ip2.close.assert_called_once_with()
+        ip1.close.assert_not_called()
+        self.assertEqual(['ns1', 'ns3'], list(self.pool._handles))
+        self.assertEqual({'opens': 3, 'hits': 1, 'evictions': 1,
+                          'purges': 0}, self.pool.stats)
+
+    def test_get_evicted_handle_in_use(self):
+        with self.pool.get("ns1") as ip1:
+            self._use("ns2")
+            self._use("ns3")
+            ip1.close.assert_not_called()
+        ip1.close.assert_called_once_with()
+
+    def test_get_replaced_namespace(self):
+        ip = self._use("ns1")
+        self.inode.return_value = 2
+        self.assertIsNot(ip, self._use("ns1"))
+        ip.close.assert_called_once_with()
+
+    def test_get_unnamed_namespace(self):
+        self.inode.return_value = None
+        self.netns.side_effect = None
+        self.assertEqual(self.netns.return_value, self.pool.get("ns1"))
+        self.assertEqual({}, self.pool._handles)
+
+    def test_get_namespace_not_exists(self):
+        self.netns.side_effect = OSError(errno.ENOENT, "No netns")
+        self.assertRaises(OSError, self.pool.get, "ns1")
+        self.assertEqual(0, self.pool.stats['opens'])
+
+    def test_invalidate(self):
+        ip = self._use("ns1")
+        self.pool.invalidate("ns1")
+        ip.close.assert_called_once_with()
+        self.assertIsNot(ip, self._use("ns1"))
+
+    def test_purge(self):
+        ip1 = self._use("ns1")
+        ip2 = self._use("ns2")
+        # ns1 deleted and ns2 replaced by other processes
+        self.inode.side_effect = lambda namespace: {"ns2": 2}.get(namespace)
+        self.pool.purge()
+        ip1.close.assert_called_once_with()
+        ip2.close.assert_called_once_with()
+        self.assertEqual({}, self.pool._handles)
+        self.assertEqual(2, self.pool.stats['purges'])
+
+    def test_purge_handle_in_use(self):
+        with self.pool.get("ns1") as ip:
+            self.inode.return_value = None
+            self.pool.purge()
+            ip.close.assert_not_called()
+        ip.close.assert_called_once_with()
+
+    @mock.patch.object(priv_lib, "NETNS_POOL_PURGE_INTERVAL", 10)
+    @mock.patch("time.time")
+    def test_get_purges_periodically(self, mock_time):
+        mock_time.return_value = 100
+        ip = self._use("ns1")
+        self.inode.return_value = 2
+        mock_time.return_value = 105
+        self._use("ns2")
+        ip.close.assert_not_called()
+        mock_time.return_value = 110
+        self._use("ns2")
+        ip.close.assert_called_once_with()
+        self.assertEqual(['ns2'], list(self.pool._handles))
+
+    def test_get_stats(self):
+        self._use("ns1")
+        self._use("ns2")
+        self.inode.side_effect = lambda namespace: {"ns2": 1}.get(namespace)
+        self.assertEqual({'opens': 2, 'hits': 0, 'evictions': 0,
+                          'purges': 1, 'size': 1}, self.pool.get_stats())
@@ -340,3 +340,26 @@ class NetlinkLibTestCase(base.BaseTestCase):
         nl_lib.nfct.nfct_close.assert_called_once_with(nl_lib.nfct.nfct_open(
             nl_constants.CONNTRACK,
             nl_constants.NFNL_SUBSYS_CTNETLINK))
+
+    def test_get_zone(self):
+        self.assertEqual(4097, nl_lib._get_zone(
+            'ipv4 2 tcp 6 431999 ESTABLISHED src=1.1.1.1 dst=2.2.2.2 '
+            'sport=1 dport=2 src=2.2.2.2 dst=1.1.1.1 sport=2 dport=1 '
+            '[ASSURED] mark=0 zone=4097 use=1'))
+        self.assertIsNone(nl_lib._get_zone(
+            'ipv4 2 udp 17 29 src=1.1.1.1 dst=2.2.2.2 sport=4 dport=5 '
+            'src=2.2.2.2 dst=1.1.1.1 sport=5 dport=4 mark=0 use=1'))
+
+    def test_match_filter(self):
+        entry = (4, 'tcp', 1, 2, '1.1.1.1', '2.2.2.2', 1)
+        self.assertTrue(nl_lib._match_filter(entry, (4, None, None, None)))
+        self.assertTrue(nl_lib._match_filter(
+            entry, (4, 'tcp', '1.1.1.1', '2.2.2.2')))
+        self.assertTrue(nl_lib._match_filter(entry,
+                                             (4, None, None, '2.2.2.2')))
+        self.assertFalse(nl_lib._match_filter(entry,
+                                              (6, None, None, None)))
+        self.assertFalse(nl_lib._match_filter(entry,
+                                              (4, 'udp', None, None)))
+        self.assertFalse(nl_lib._match_filter(entry,
+                                              (4, None, '2.2.2.2', None)))
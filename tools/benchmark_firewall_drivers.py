@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the OVS and iptables security group firewall drivers.
+
+Generates a synthetic topology of ports sharing a security group, with a
+number of port range rules and one rule referencing a remote group of a
+given size, then reports for each driver the time to prepare, update (after
+a rule change and after a remote group member change) and remove the port
+filters, the number of flows or iptables rules installed and the peak
+memory allocated by Python during each phase.
+
+By default the drivers run against fakes: an in-memory OVS bridge emulating
+ovs-ofctl add-flows and del-flows, and an in-memory iptables-save and
+iptables-restore. With --bridge the OVS driver uses a local Open vSwitch
+bridge created for the run, with --namespace the iptables driver applies its
+rules in an existing network namespace; both require root.
+
+Usage: python tools/benchmark_firewall_drivers.py [--ports N] [--rules N]
+       [--members N] [--driver {ovs,iptables,all}]
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import resource
+import tempfile
+import time
+
+from neutron_lib import constants
+from oslo_config import cfg
+
+from neutron.agent.common import ovs_lib
+from neutron.agent.linux import iptables_firewall
+from neutron.agent.linux.openvswitch_firewall import firewall as ovsfw
+from neutron.conf.agent import common as agent_config
+from neutron.conf.agent import securitygroups_rpc as sg_config
+from neutron.plugins.ml2.drivers.openvswitch.agent.common import constants \
+    as ovs_consts
+from neutron.plugins.ml2.drivers.openvswitch.agent.openflow.ovs_ofctl \
+    import ovs_bridge
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2.7, only the peak RSS of the process is reported
+    tracemalloc = None
+
+SG_ID = 'sg-bench'
+REMOTE_SG_ID = 'sg-remote'
+VLAN_TAG = 10
+
+
+class FakeOVSBridge(ovs_bridge.OVSAgentBridge):
+    """OVS bridge keeping its ports and flows in memory.
+
+    add-flows replaces the flow with the same match, del-flows removes the
+    flows matching all the given fields, or exactly the given match with
+    --strict; this is enough for the flows generated by the firewall.
+    """
+
+    def __init__(self, br_name):
+        # BaseOVS.__init__ connects to ovsdb, which the fake doesn't need
+        self.br_name = br_name
+        self.datapath_type = ovs_consts.OVS_DATAPATH_SYSTEM
+        self._default_cookie = ovs_lib.generate_random_cookie()
+        self._highest_protocol_needed = ovs_consts.OPENFLOW10
+        self._reserved_cookies = set()
+        self.vifs = {}
+        self.flows = {}
+        self.ofctl_calls = 0
+
+    def add_vif(self, name, port_id, mac, ofport):
+        self.vifs[port_id] = ovs_lib.VifPort(name, ofport, port_id, mac, self)
+
+    def add_protocols(self, *protocols):
+        pass
+
+    def get_port_name_list(self):
+        return [vif.port_name for vif in self.vifs.values()]
+
+    def get_vif_port_by_id(self, port_id):
+        return self.vifs.get(port_id)
+
+    def db_get_val(self, table, record, column, check_error=False,
+                   log_errors=True):
+        if table == 'Port' and column == 'other_config':
+            return {'tag': str(VLAN_TAG)}
+        return {}
+
+    @staticmethod
+    def _parse_match(flow_str):
+        match = flow_str.split('actions=', 1)[0].rstrip(',')
+        fields = {}
+        for field in match.split(','):
+            # protocol shorthands like 'ip' or 'tcp6' have no value
+            name, _sep, value = field.partition('=')
+            fields[name] = value.split('/')[0] if name == 'cookie' else value
+        fields.pop('hard_timeout', None)
+        fields.pop('idle_timeout', None)
+        return fields.pop('cookie', None), frozenset(fields.items())
+
+    def run_ofctl(self, cmd, args, process_input=None):
+        self.ofctl_calls += 1
+        flow_strs = process_input.split('\n') if process_input else []
+        strict = '--strict' in args
+        for flow_str in flow_strs:
+            cookie, match = self._parse_match(flow_str)
+            if cmd == 'add-flows':
+                self.flows[match] = cookie
+                continue
+            for installed, installed_cookie in list(self.flows.items()):
+                if cookie and cookie != installed_cookie:
+                    continue
+                if match == installed if strict else match <= installed:
+                    del self.flows[installed]
+
+    def count_flows(self):
+        return len(self.flows)
+
+
+class FakeIptables(object):
+    """In-memory iptables-save and iptables-restore of one host.
+
+    Only the statements generated by IptablesManager are supported.
+    """
+
+    def __init__(self):
+        self.tables = collections.defaultdict(
+            lambda: collections.defaultdict(collections.OrderedDict))
+        self.restore_calls = 0
+        self.restored_lines = 0
+
+    def _save(self, cmd, table_name=None):
+        lines = []
+        for table, chains in sorted(self.tables[cmd].items()):
+            if table_name and table != table_name:
+                continue
+            lines.append('*%s' % table)
+            lines += [':%s - [0:0]' % chain for chain in chains]
+            for chain, rules in chains.items():
+                lines += [('-A %s %s' % (chain, rule)).rstrip()
+                          for rule in rules]
+            lines.append('COMMIT')
+        return '\n'.join(lines) + '\n'
+
+    def _restore(self, cmd, process_input):
+        self.restore_calls += 1
+        table = None
+        for line in process_input.split('\n'):
+            if not line or line.startswith('#') or line == 'COMMIT':
+                continue
+            self.restored_lines += 1
+            chains = self.tables[cmd][table] if table else None
+            if line.startswith('*'):
+                table = line[1:]
+            elif line.startswith(':'):
+                chains.setdefault(line[1:].split(' ', 1)[0], [])
+            elif line.startswith('-X '):
+                chains.pop(line[3:], None)
+            elif line.startswith('-D '):
+                chain, index = line[3:].split(' ')
+                del chains[chain][int(index) - 1]
+            elif line.startswith('-I '):
+                chain, index, rule = (line[3:].split(' ', 2) + [''])[:3]
+                chains.setdefault(chain, []).insert(int(index) - 1, rule)
+
+    def count_rules(self):
+        return sum(len(rules)
+                   for tables in self.tables.values()
+                   for chains in tables.values()
+                   for rules in chains.values())
+
+    def execute(self, cmd, process_input=None, **kwargs):
+        binary = cmd[0]
+        if binary.endswith('-save'):
+            table = cmd[2] if cmd[1:2] == ['-t'] else None
+            return self._save(binary[:-len('-save')], table)
+        if binary.endswith('-restore'):
+            self._restore(binary[:-len('-restore')], process_input)
+        elif cmd[1:] == ['--version']:
+            return '%s v1.6.2' % binary
+        return ''
+
+
+def make_rules(num_rules):
+    rules = []
+    for i in range(num_rules):
+        rules.append({'ethertype': constants.IPv4,
+                      'direction': constants.INGRESS_DIRECTION,
+                      'protocol': constants.PROTO_NAME_TCP,
+                      'port_range_min': 1000 + i * 10,
+                      'port_range_max': 1000 + i * 10 + 5,
+                      'source_ip_prefix': '192.168.%d.0/24' % (i % 256)})
+    rules.append({'ethertype': constants.IPv4,
+                  'direction': constants.INGRESS_DIRECTION,
+                  'protocol': constants.PROTO_NAME_TCP,
+                  'port_range_min': 22,
+                  'port_range_max': 22,
+                  'remote_group_id': REMOTE_SG_ID})
+    rules.append({'ethertype': constants.IPv4,
+                  'direction': constants.EGRESS_DIRECTION})
+    return rules
+
+
+def make_members(num_members, offset=0):
+    return {constants.IPv4: ['10.%d.%d.%d' % (
+        (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+        for i in range(offset + 1, offset + num_members + 1)]}
+
+
+def make_ports(num_ports):
+    ports = []
+    for i in range(num_ports):
+        mac = 'fa:16:3e:%02x:%02x:%02x' % (
+            (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+        ports.append({'device': 'port-%08d' % i,
+                      'name': 'tap%08d' % i,
+                      'ofport': i + 1,
+                      'mac_address': mac,
+                      'network_id': 'net-bench',
+                      'fixed_ips': ['172.16.%d.%d' % (i // 250, i % 250 + 1)],
+                      'allowed_address_pairs': [],
+                      'security_groups': [SG_ID],
+                      'security_group_source_groups': [REMOTE_SG_ID],
+                      'port_security_enabled': True})
+    return ports
+
+
+class OVSFirewallTarget(object):
+    name = 'ovs'
+    unit = 'flows'
+
+    def __init__(self, ports, bridge_name=None):
+        if bridge_name:
+            self.bridge = ovs_bridge.OVSAgentBridge(bridge_name)
+            self.bridge.create()
+            for port in ports:
+                self.bridge.replace_port(
+                    port['name'], ('type', 'internal'),
+                    ('external_ids', {'iface-id': port['device'],
+                                      'attached-mac': port['mac_address'],
+                                      'iface-status': 'active'}))
+                self.bridge.set_db_attribute(
+                    'Port', port['name'], 'other_config',
+                    {'tag': str(VLAN_TAG)})
+        else:
+            self.bridge = FakeOVSBridge('br-bench')
+            for port in ports:
+                self.bridge.add_vif(port['name'], port['device'],
+                                    port['mac_address'], port['ofport'])
+        self.driver = ovsfw.OVSFirewallDriver(self.bridge)
+
+    def count(self):
+        return self.bridge.count_flows()
+
+    def cleanup(self):
+        if not isinstance(self.bridge, FakeOVSBridge):
+            self.bridge.destroy()
+
+
+class IptablesFirewallTarget(object):
+    name = 'iptables'
+    unit = 'rules'
+
+    def __init__(self, ports, namespace=None):
+        self.driver = iptables_firewall.IptablesFirewallDriver(
+            namespace=namespace)
+        self.fake = None
+        if not namespace:
+            self.fake = FakeIptables()
+            self.driver.iptables.execute = self.fake.execute
+            self.driver.ipset.execute = self.fake.execute
+            self.driver.ipconntrack.execute = self.fake.execute
+
+    def count(self):
+        if self.fake:
+            return self.fake.count_rules()
+        return sum(len(table.rules)
+                   for tables in (self.driver.iptables.ipv4,
+                                  self.driver.iptables.ipv6)
+                   for table in tables.values())
+
+    def cleanup(self):
+        pass
+
+
+class Phase(object):
+    """Measure the duration and the peak memory of a benchmark phase."""
+
+    def __init__(self, name):
+        self.name = name
+        self.duration = None
+        self.peak_memory = None
+
+    def __enter__(self):
+        if tracemalloc:
+            tracemalloc.start()
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.time() - self._start
+        if tracemalloc:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def run(target, ports, args):
+    driver = target.driver
+    rules = make_rules(args.rules)
+    phases = []
+
+    with Phase('prepare') as phase:
+        with driver.defer_apply():
+            driver.update_security_group_rules(SG_ID, rules)
+            driver.update_security_group_rules(REMOTE_SG_ID, [])
+            driver.update_security_group_members(
+                REMOTE_SG_ID, make_members(args.members))
+            for port in ports:
+                driver.prepare_port_filter(port)
+    phases.append((phase, target.count()))
+
+    with Phase('update rules') as phase:
+        with driver.defer_apply():
+            driver.update_security_group_rules(SG_ID, rules[1:])
+            for port in ports:
+                driver.update_port_filter(port)
+    phases.append((phase, target.count()))
+
+    with Phase('update members') as phase:
+        with driver.defer_apply():
+            driver.update_security_group_members(
+                REMOTE_SG_ID, make_members(args.members, offset=1))
+            for port in ports:
+                driver.update_port_filter(port)
+    phases.append((phase, target.count()))
+
+    with Phase('remove') as phase:
+        with driver.defer_apply():
+            for port in ports:
+                driver.remove_port_filter(port)
+    phases.append((phase, target.count()))
+
+    for phase, count in phases:
+        memory = ('%10.1f' % (phase.peak_memory / 1024.0 / 1024)
+                  if phase.peak_memory is not None else '%10s' % '-')
+        print('%-10s %-16s %10.3f %10d %s %s' % (
+            target.name, phase.name, phase.duration, count, target.unit,
+            memory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--ports', type=int, default=100,
+                        help='number of ports sharing the security group')
+    parser.add_argument('--rules', type=int, default=50,
+                        help='number of port range rules of the group')
+    parser.add_argument('--members', type=int, default=1000,
+                        help='number of members of the remote group')
+    parser.add_argument('--driver', choices=('ovs', 'iptables', 'all'),
+                        default='all')
+    parser.add_argument('--bridge',
+                        help='run the OVS driver against this local bridge, '
+                             'created and destroyed by the benchmark')
+    parser.add_argument('--namespace',
+                        help='run the iptables driver in this existing '
+                             'network namespace')
+    args = parser.parse_args()
+
+    agent_config.register_agent_state_opts_helper(cfg.CONF)
+    agent_config.register_root_helper(cfg.CONF)
+    sg_config.register_securitygroups_opts(cfg.CONF)
+    cfg.CONF([], project='neutron')
+    cfg.CONF.set_override('lock_path', tempfile.mkdtemp(),
+                          group='oslo_concurrency')
+
+    ports = make_ports(args.ports)
+    print('%d ports, %d rules, %d remote group members' % (
+        args.ports, args.rules + 2, args.members))
+    print('%-10s %-16s %10s %17s %10s' % ('driver', 'phase', 'seconds',
+                                          'installed', 'peak MiB'))
+    targets = []
+    if args.driver in ('ovs', 'all'):
+        targets.append(lambda: OVSFirewallTarget(ports, args.bridge))
+    if args.driver in ('iptables', 'all'):
+        targets.append(lambda: IptablesFirewallTarget(ports, args.namespace))
+    for make_target in targets:
+        target = make_target()
+        try:
+            run(target, ports, args)
+        finally:
+            target.cleanup()
+    print('peak RSS of the process: %.1f MiB' % (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
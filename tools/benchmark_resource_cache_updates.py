@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Microbenchmark of the change detection done by the agent resource cache.
+
+Measures how many port updates per second RemoteResourceCache can compare
+against the cached copy, with the previous to_dict() based comparison and
+with the field-level comparison, for updates that change a top-level
+field, a nested object and nothing at all.
+
+Usage: python tools/benchmark_resource_cache_updates.py [--ports N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import netaddr
+from neutron_lib import context
+from oslo_utils import uuidutils
+
+from neutron.agent import resource_cache
+from neutron.objects import ports
+
+
+def make_port(ctx, port_id, revision_number, name='port', host='host'):
+    network_id = '11111111-2222-3333-4444-555555555555'
+    fixed_ips = [
+        ports.IPAllocation(ctx, port_id=port_id, network_id=network_id,
+                           subnet_id='66666666-7777-8888-9999-%012d' % i,
+                           ip_address=netaddr.IPAddress('10.0.%d.5' % i))
+        for i in range(2)]
+    binding = ports.PortBinding(
+        ctx, port_id=port_id, host=host, vif_type='ovs', vnic_type='normal',
+        profile={}, status='ACTIVE',
+        vif_details={'port_filter': True, 'ovs_hybrid_plug': False})
+    return ports.Port(
+        ctx, id=port_id, name=name, network_id=network_id,
+        mac_address=netaddr.EUI('fa:16:3e:00:00:01'), admin_state_up=True,
+        status='ACTIVE', device_id=port_id,
+        device_owner='compute:nova', project_id='project',
+        revision_number=revision_number, fixed_ips=fixed_ips,
+        binding=binding, bindings=[binding],
+        security_group_ids={network_id},
+        allowed_address_pairs=[], extra_dhcp_opts=[])
+
+
+def to_dict_changed_fields(old, new):
+    # the comparison done before field-level diffing was introduced
+    new = new.to_dict()
+    changed = set(new)
+    if old:
+        for k, v in old.to_dict().items():
+            if v == new.get(k):
+                changed.discard(k)
+    for ignore in ('revision_number', 'updated_at'):
+        changed.discard(ignore)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--ports', type=int, default=1000,
+                        help='number of port updates per run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    ctx = context.get_admin_context()
+    get_changed_fields = resource_cache.RemoteResourceCache._get_changed_fields
+    scenarios = {
+        'name changed': {'name': 'renamed'},
+        'binding changed': {'host': 'other-host'},
+        'nothing changed': {},
+    }
+    print('%-16s %14s %14s %8s' % ('update', 'to_dict/s', 'fields/s',
+                                   'speedup'))
+    for scenario, kwargs in sorted(scenarios.items()):
+        pairs = []
+        for _ in range(args.ports):
+            port_id = uuidutils.generate_uuid()
+            old = make_port(ctx, port_id, 1)
+            new = make_port(ctx, port_id, 2, **kwargs)
+            # both comparisons must agree for the results to be meaningful
+            assert (to_dict_changed_fields(old, new) ==
+                    get_changed_fields(old, new))
+            pairs.append((old, new))
+
+        def run(func):
+            return min(timeit.repeat(
+                lambda: [func(old, new) for old, new in pairs],
+                number=1, repeat=args.repeat))
+        before = run(to_dict_changed_fields)
+        after = run(get_changed_fields)
+        print('%-16s %14d %14d %7.1fx' % (
+            scenario, args.ports / before, args.ports / after,
+            before / after))
+
+
+if __name__ == '__main__':
+    main()